@@ -9,7 +9,6 @@ RED='\e[1;31m'
 NC='\e[0m'
 
 SERVER_JAR="paper.jar"
-SERVER_PATTERN="java.*-Xmx.*-jar paper\.jar nogui"
 SCRIPTS_DIR="scripts"
 
 show_menu() {
@@ -22,11 +21,20 @@ show_menu() {
     else
         installed=false
     fi
-    if pgrep -f "$SERVER_PATTERN" &>/dev/null; then
-        running=true
-    else
+    # online, starting, stopping, unresponsive o stopped (ver server_ping.py)
+    health=$(python3 "$SCRIPTS_DIR/server_ping.py" check || true)
+    if [[ "$health" == "stopped" || -z "$health" ]]; then
         running=false
+    else
+        running=true
     fi
+    case "$health" in
+        online)       health_label="${GREEN}en línea${NC}" ;;
+        starting)     health_label="${YELLOW}arrancando${NC}" ;;
+        stopping)     health_label="${YELLOW}deteniéndose${NC}" ;;
+        unresponsive) health_label="${RED}en ejecución, pero no acepta conexiones${NC}" ;;
+        *)            health_label="detenido" ;;
+    esac
 
     # Construir arrays vacíos
     MENU_LABELS=()
@@ -40,10 +48,14 @@ show_menu() {
         MENU_COLORS+=("$ORANGE")
     else
         if $running; then
-            # Instalado y corriendo: solo abrir consola
-            MENU_LABELS+=("1. Abrir consola (screen -r minecraft)")
-            MENU_CMDS+=("screen -r minecraft")
+            # Instalado y corriendo: consola o detener
+            MENU_LABELS+=("1. Abrir consola (supervisor.py console)")
+            MENU_CMDS+=("python3 $SCRIPTS_DIR/supervisor.py console")
             MENU_COLORS+=("$GREEN")
+
+            MENU_LABELS+=("2. Detener servidor (supervisor.py stop)")
+            MENU_CMDS+=("python3 $SCRIPTS_DIR/supervisor.py stop")
+            MENU_COLORS+=("$RED")
         else
             # Instalado pero no corriendo: menú completo
             MENU_LABELS+=("1. Iniciar servidor (start.sh)")
@@ -87,6 +99,8 @@ show_menu() {
     local pad=$(( (inner - ${#title}) / 2 ))
     printf "| %*s%s%*s |\n" "$pad" "" "$title" $((inner - pad - ${#title})) ""
     echo "$border"
+    echo -e "  Estado: $health_label"
+    echo "$border"
 
     # Imprimir opciones con color
     for i in "${!MENU_LABELS[@]}"; do
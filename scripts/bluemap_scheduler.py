@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+
+"""
+Load-aware scheduling of BlueMap's render threads, over RCON.
+
+On a 4-core Pi, BlueMap's render threads compete with the main tick thread.
+Every CHECK_INTERVAL the scheduler picks one of three modes from MSPT, the
+player count and pregen.py:
+
+    full     nobody online and MSPT low: render at normal priority
+    low      players online (or pre-generation running): render threads
+             reniced to RENDER_NICE so they only use spare CPU
+    paused   MSPT above MSPT_PAUSE for MSPT_STRIKES checks: 'bluemap stop'
+
+Lowering a thread's priority needs no privileges, raising it does, so going
+back to 'full' restarts the render threads ('bluemap stop' + 'bluemap start'),
+which are created again at the server's own priority.
+
+BlueMap's own periodic full update is disabled by configure-server.py; the
+scheduler runs 'bluemap update' for every map once FULL_UPDATE_INTERVAL has
+passed, as soon as the server is idle. The seconds spent in each mode are kept
+in .cache/bluemap-scheduler.json and exported by exporter.py.
+
+    bluemap_scheduler.py status
+    bluemap_scheduler.py run          # when the bot isn't running
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+from pregen import load_state as load_pregen_state
+from rcon import RconClient, RconError, read_rcon_settings, server_status, strip_formatting
+from supervisor import SupervisorError, async_request
+
+# --- Configuration ---
+STATE_FILE = Path(".cache/bluemap-scheduler.json")
+MAPS_DIR = Path("plugins/BlueMap/maps")
+# Seconds between checks
+CHECK_INTERVAL = 30
+# Stop rendering above MSPT_PAUSE for this many checks in a row; back to normal below MSPT_RESUME
+MSPT_PAUSE = 45
+MSPT_RESUME = 30
+MSPT_STRIKES = 2
+# Seconds the server must stay empty and calm before full-speed rendering
+IDLE_GRACE = 120
+# Niceness of the render threads while players are online
+RENDER_NICE = 19
+# Java thread names of BlueMap's renderers, as seen in /proc/<pid>/task/*/comm (15 characters at most)
+RENDER_THREAD_RE = re.compile(r"bluemap.*render", re.IGNORECASE)
+# Minutes between full map updates (BlueMap's former full-update-interval)
+FULL_UPDATE_INTERVAL = 2880
+MODES = ("full", "low", "paused")
+
+# --- Classes ---
+
+class RenderScheduler:
+    """
+    Switches BlueMap between full, low-priority and paused rendering.
+
+    Args:
+        command (callable): Async function running an RCON command and returning its answer.
+        fetch_status (callable): Async function returning rcon.server_status().
+        log (callable): Receives the scheduler's own events.
+    """
+
+    def __init__(self, command, fetch_status, log=print):
+        self.command = command
+        self.fetch_status = fetch_status
+        self.log = log
+        self._strikes = 0
+        self._idle_since = None
+        self._reniced = set()   # thread ids already lowered
+
+    async def _set_mode(self, state: dict, mode: str, pid: int, reason: str | None):
+        previous = state.get("mode")
+        if mode == "paused":
+            if previous != "paused":
+                await self.command("bluemap stop")
+        elif mode == "full":
+            if previous in ("low", "paused", None):
+                # New threads start at the server's priority again
+                if previous != "paused":
+                    await self.command("bluemap stop")
+                await self.command("bluemap start")
+                self._reniced.clear()
+        else:
+            if previous == "paused":
+                await self.command("bluemap start")
+                self._reniced.clear()
+            # Renice on every check: BlueMap may have started new threads
+            lowered = renice_render_threads(pid, RENDER_NICE, self._reniced)
+            if previous != "low" and not lowered and not self._reniced:
+                self.log("bluemap: no render threads found to renice")
+        if mode != previous:
+            self.log(f"bluemap rendering: {mode}" + (f" ({reason})" if reason else ""))
+        state.update(mode=mode, reason=reason)
+
+    async def step(self) -> dict:
+        """One check: accounts the elapsed time and switches mode if needed. Returns the saved state."""
+        state = load_state()
+        now = time.time()
+        seconds = state.setdefault("seconds", dict.fromkeys(MODES, 0.0))
+        if state.get("mode") in MODES and state.get("checked"):
+            # A gap (bot or server down) isn't counted
+            seconds[state["mode"]] += min(now - state["checked"], 2 * CHECK_INTERVAL)
+        state["checked"] = now
+        # The first full update is due one interval after the scheduler first runs
+        state.setdefault("last_full_update", now)
+
+        try:
+            pid = (await async_request("status"))["pid"]
+            status = await self.fetch_status()
+        except (SupervisorError, RconError, KeyError, TypeError):
+            pid = None
+        if pid is None:
+            state.update(mode=None, reason="servidor detenido")
+            self._strikes, self._idle_since = 0, None
+            save_state(state)
+            return state
+        if state.get("pid") != pid:
+            # BlueMap starts rendering at full speed with every boot
+            state.update(pid=pid, mode="full")
+            self._reniced.clear()
+
+        players = status["players"]["online"] or 0
+        mspt = status["mspt"]["avg"] if status["mspt"] else 0.0
+        self._strikes = self._strikes + 1 if mspt > MSPT_PAUSE else 0
+        pregen_running = load_pregen_state().get("phase") == "running"
+        if players or mspt > MSPT_RESUME or pregen_running:
+            self._idle_since = None
+        elif self._idle_since is None:
+            self._idle_since = now
+        idle = self._idle_since is not None and now - self._idle_since >= IDLE_GRACE
+
+        if self._strikes >= MSPT_STRIKES:
+            await self._set_mode(state, "paused", pid, f"MSPT {mspt:.0f} ms")
+        elif players or pregen_running:
+            reason = f"{players} jugador(es) conectado(s)" if players else "pregeneración en curso"
+            await self._set_mode(state, "low", pid, reason)
+        elif idle and state.get("mode") != "full":
+            await self._set_mode(state, "full", pid, None)
+
+        if idle and now - state.get("last_full_update", 0) >= FULL_UPDATE_INTERVAL * 60:
+            for map_id in map_ids():
+                await self.command(f"bluemap update {map_id}")
+            state["last_full_update"] = now
+            self.log("bluemap: full update queued")
+        state["pending"] = parse_pending(strip_formatting(await self.command("bluemap")))
+        save_state(state)
+        return state
+
+    async def run(self, interval: float = CHECK_INTERVAL):
+        """Checks forever."""
+        while True:
+            try:
+                await self.step()
+            except RconError as e:
+                self.log(f"bluemap scheduler check failed: {e}")
+            except Exception as e:  # a bad check must not leave BlueMap in its last mode for good
+                self.log(f"bluemap scheduler check failed: {e!r}")
+            await asyncio.sleep(interval)
+
+# --- Functions ---
+
+def load_state() -> dict:
+    try:
+        return json.loads(STATE_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state: dict):
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=STATE_FILE.parent, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def map_ids(maps_dir: Path = MAPS_DIR) -> list[str]:
+    """BlueMap map ids (one .conf per map), 'world' if none are found."""
+    return sorted(p.stem for p in maps_dir.glob("*.conf")) or ["world"]
+
+
+def render_thread_ids(pid: int) -> list[int]:
+    tids = []
+    for task in Path(f"/proc/{pid}/task").glob("*"):
+        try:
+            if RENDER_THREAD_RE.search((task / "comm").read_text()):
+                tids.append(int(task.name))
+        except (OSError, ValueError):
+            continue
+    return tids
+
+
+def renice_render_threads(pid: int, nice: int, done: set) -> int:
+    """Lowers the priority of the render threads not lowered yet. Returns how many were changed."""
+    changed = 0
+    for tid in render_thread_ids(pid):
+        if tid in done:
+            continue
+        try:
+            os.setpriority(os.PRIO_PROCESS, tid, nice)
+            done.add(tid)
+            changed += 1
+        except OSError:
+            continue
+    return changed
+
+
+def parse_pending(answer: str) -> int | None:
+    """Queued render tasks from the answer of 'bluemap', if it reports them."""
+    match = re.search(r"(\d+)\s+(?:render[- ]?tasks?\s+)?(?:are\s+)?(?:pending|queued)", answer, re.IGNORECASE) \
+        or re.search(r"(?:pending|queued)[^\d\n]{0,30}(\d+)", answer, re.IGNORECASE)
+    return int(match.group(1)) if match else None
+
+
+def describe(state: dict) -> str:
+    seconds = state.get("seconds", {})
+    total = sum(seconds.values()) or 1
+    lines = [f"BlueMap rendering: {state.get('mode') or 'unknown'}"
+             + (f" ({state['reason']})" if state.get("reason") else "")]
+    for mode in MODES:
+        lines.append(f"  {mode:<7} {seconds.get(mode, 0) / 3600:8.1f} h  {100 * seconds.get(mode, 0) / total:5.1f}%")
+    if state.get("pending") is not None:
+        lines.append(f"  pending render tasks: {state['pending']}")
+    if state.get("last_full_update"):
+        lines.append(f"  last full update: {time.strftime('%Y-%m-%d %H:%M', time.localtime(state['last_full_update']))}")
+    return "\n".join(lines)
+
+# --- Main ---
+
+async def _run() -> int:
+    client = RconClient(*read_rcon_settings())
+
+    async def fetch_status():
+        return await server_status(client)
+
+    try:
+        await RenderScheduler(client.command, fetch_status).run()
+    finally:
+        await client.close()
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Pauses or deprioritizes BlueMap rendering while the server is busy.")
+    sub = parser.add_subparsers(dest="action", required=True)
+    sub.add_parser("status", help="show the current mode and the time spent in each")
+    sub.add_parser("run", help="schedule until interrupted")
+    args = parser.parse_args()
+
+    if args.action == "status":
+        print(describe(load_state()))
+        return 0
+    try:
+        return asyncio.run(_run())
+    except RconError as e:
+        print(f"bluemap_scheduler: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 0
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+Single-pass, transactional editing of server configuration files.
+
+Every file is read once, the first time an edit targets it. Edits are plain
+functions that take the current text and return the new text, and they are
+applied in memory one after the other. commit() then writes each file at
+most once, atomically (temporary file + rename in the same directory), and
+only if its content actually changed. If any edit failed nothing is written,
+so a run never leaves the configuration half-applied.
+
+    tx = ConfigTransaction()
+    tx.apply("server.properties", optimize_server_properties, max_players, ...)
+    tx.apply("spigot.yml", convert_tabs_to_spaces)
+    tx.apply("spigot.yml", optimize_spigot_yml)
+    print(tx.diff("spigot.yml"))     # dry run
+    tx.commit()
+"""
+
+import os
+import shutil
+import difflib
+import tempfile
+from pathlib import Path
+
+# --- Classes ---
+
+class ConfigFile:
+    """The original and in-memory contents of a configuration file."""
+
+    def __init__(self, path: Path, original: str):
+        self.path = path
+        self.original = original
+        self.content = original
+
+    @property
+    def changed(self) -> bool:
+        return self.content != self.original
+
+
+class ConfigTransaction:
+    """
+    Collects edits to several configuration files and writes them in one go.
+
+    Args:
+        encoding (str): Encoding used to read and write every file.
+    """
+
+    def __init__(self, encoding: str = "utf-8"):
+        self.encoding = encoding
+        self.files: dict[Path, ConfigFile] = {}
+        # (path, edit name, exception) for every edit that failed
+        self.errors: list[tuple[Path, str, Exception]] = []
+
+    def load(self, path) -> ConfigFile:
+        """Returns the in-memory file, reading it from disk only the first time."""
+        path = Path(path)
+        if path not in self.files:
+            with open(path, "r", encoding=self.encoding, newline="") as f:
+                self.files[path] = ConfigFile(path, f.read())
+        return self.files[path]
+
+    def apply(self, path, edit, *args, **kwargs) -> bool:
+        """
+        Applies edit(content, *args, **kwargs) -> new content to a file in memory.
+
+        Returns:
+            bool: True if the edit succeeded; failures are recorded in self.errors.
+        """
+        try:
+            config_file = self.load(path)
+            config_file.content = edit(config_file.content, *args, **kwargs)
+            return True
+        except Exception as e:
+            self.errors.append((Path(path), getattr(edit, "__name__", str(edit)), e))
+            return False
+
+    def changed_files(self) -> list[ConfigFile]:
+        return [f for f in self.files.values() if f.changed]
+
+    def diff(self, path) -> str:
+        """Returns a unified diff between the file on disk and its in-memory content."""
+        config_file = self.files[Path(path)]
+        return "".join(difflib.unified_diff(
+            config_file.original.splitlines(keepends=True),
+            config_file.content.splitlines(keepends=True),
+            fromfile=f"a/{config_file.path}", tofile=f"b/{config_file.path}",
+        ))
+
+    def _write_atomic(self, config_file: ConfigFile):
+        path = config_file.path
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent or Path("."), prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding=self.encoding, newline="") as f:
+                f.write(config_file.content)
+                f.flush()
+                os.fsync(f.fileno())
+            shutil.copymode(path, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        config_file.original = config_file.content
+
+    def commit(self) -> list[Path]:
+        """
+        Writes every changed file, unless an edit failed.
+
+        Returns:
+            list[Path]: The files that were written.
+
+        Raises:
+            RuntimeError: If any edit failed (nothing is written in that case).
+        """
+        if self.errors:
+            raise RuntimeError(f"{len(self.errors)} edits failed; no files were written")
+        written = []
+        for config_file in self.changed_files():
+            self._write_atomic(config_file)
+            written.append(config_file.path)
+        return written
@@ -0,0 +1,614 @@
+#!/usr/bin/env python3
+
+"""
+Comment-preserving parsers for HOCON (.conf) and Java .properties files.
+
+The text is parsed once into a keyed index: every key is stored under its
+full path (e.g. ("player-count-settings", "max-players")) together with the
+character span of its value in the source. Setting any number of keys is then
+a single splice over the original text: only the value spans change, so
+comments, blank lines, key order, indentation and separators ("=" or ":")
+stay exactly as they were, and a key is never confused with a key of the same
+name inside another block.
+
+    doc = HoconDocument(text)
+    doc.get("player-count-settings.max-players")     # '10'
+    new_text = doc.set_many({"metrics": False, "log": {}})
+
+    props = PropertiesDocument(text)
+    new_text = props.set_many({"max-players": 20, "online-mode": False})
+
+Also usable from the command line:
+
+    config_parsers.py show FILE                           # every key, its line and value
+    config_parsers.py bench FILE... [--repeat N] [--scale N]   # compare with the regex approach
+"""
+
+import re
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+# --- Configuration ---
+# Indentation used for keys added to an object that has no other children
+DEFAULT_INDENT = "  "
+
+# Tokens of the HOCON scanner; "//" starts a comment, a single "/" doesn't
+_BLANK = re.compile(r'(?:[ \t\ufeff\r\n,]+|(?:#|//)[^\n]*)*')
+_BLANK_INLINE = re.compile(r'(?:[ \t\ufeff]+|(?:#|//)[^\n]*)*')
+_QUOTED = re.compile(r'"(?:[^"\\\n]|\\.)*"')
+_UNQUOTED_KEY = re.compile(r'(?:[^ \t\r\n.:={}\[\],+#"/]|/(?!/))+')
+_UNQUOTED_VALUE = re.compile(r'(?:[^ \t\r\n,{}\[\]#"/]|/(?!/))+')
+# Fast path for the common member shapes: blanks then '}' or an unquoted (dotted) key,
+# the separator, and a value that is a single string/number/word
+_MEMBER_START = re.compile(_BLANK.pattern + r'(?:(?P<close>\})|(?P<key>' + _UNQUOTED_KEY.pattern
+                           + r'(?:\.' + _UNQUOTED_KEY.pattern + r')*))?')
+_SEPARATOR = re.compile(r'[ \t]*(\+=|[:=])?[ \t]*')
+_SCALAR = re.compile(r'(?:' + _QUOTED.pattern + '|' + _UNQUOTED_VALUE.pattern + r')(?=[ \t]*(?:[\r\n,}\]#]|//|$))')
+# Start of a .properties entry: indentation, key (with escapes) and separator
+_PROPERTIES_KEY = re.compile(r'[ \t\f\ufeff]*((?:[^=: \t\f\\\r\n]|\\[\s\S])*)[ \t\f]*(?:[=:][ \t\f]*)?')
+
+# --- Classes ---
+
+class Raw(str):
+    """A value that is written verbatim, e.g. a multi-line HOCON array."""
+
+
+class HoconEntry:
+    """A key of a HOCON document and the span of its value in the source."""
+
+    def __init__(self, path: tuple, key_start: int, value_start: int, value_end: int, kind: str):
+        self.path = path
+        self.key_start = key_start
+        self.value_start = value_start
+        self.value_end = value_end
+        # "object", "array" or "value"
+        self.kind = kind
+
+
+class _HoconObject:
+    """Where an object starts and ends, and how its children are laid out."""
+
+    def __init__(self, open_pos: int, close_pos: int, indent: str | None = None, sep: str | None = None):
+        self.open_pos = open_pos
+        self.close_pos = close_pos
+        self.indent = indent
+        self.sep = sep
+
+
+class HoconDocument:
+    """
+    Keyed, span-preserving view of a HOCON file (BlueMap, MiniMOTD, ...).
+
+    Args:
+        text (str): The file content.
+
+    Raises:
+        ValueError: If the text isn't valid HOCON (the message includes the line).
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.entries: dict[tuple, list[HoconEntry]] = {}
+        self.objects: dict[tuple, _HoconObject] = {}
+        self._parse()
+
+    # -- parsing --
+
+    def _error(self, message: str, pos: int):
+        raise ValueError(f"{message} at line {self.text.count(chr(10), 0, pos) + 1}")
+
+    def _skip_blank(self, pos: int, newlines: bool = True) -> int:
+        """Skips whitespace, comments and (optionally) newlines and commas."""
+        return (_BLANK if newlines else _BLANK_INLINE).match(self.text, pos).end()
+
+    def _skip_string(self, pos: int) -> int:
+        text = self.text
+        if text.startswith('"""', pos):
+            end = text.find('"""', pos + 3)
+            if end == -1:
+                self._error("unterminated triple-quoted string", pos)
+            end += 3
+            # Quotes right before the closing delimiter belong to the string
+            while end < len(text) and text[end] == '"':
+                end += 1
+            return end
+        match = _QUOTED.match(text, pos)
+        if not match:
+            self._error("unterminated string", pos)
+        return match.end()
+
+    def _parse_key(self, pos: int) -> tuple[tuple, int]:
+        text, n = self.text, len(self.text)
+        parts = []
+        while True:
+            if pos < n and text[pos] == '"':
+                end = self._skip_string(pos)
+                parts.append(json.loads(text[pos:end]))
+            else:
+                match = _UNQUOTED_KEY.match(text, pos)
+                if not match:
+                    self._error("expected a key", pos)
+                end = match.end()
+                parts.append(text[pos:end])
+            pos = end
+            if pos < n and text[pos] == ".":
+                pos += 1
+                continue
+            return tuple(parts), pos
+
+    def _parse_value(self, pos: int, path: tuple | None) -> tuple[str, int]:
+        """
+        Parses a (possibly concatenated) value starting at pos.
+
+        Objects found on the way are indexed under 'path', unless it is None
+        (objects inside arrays aren't addressable by key).
+
+        Returns:
+            tuple[str, int]: The kind of value and where it ends (trailing blanks excluded).
+        """
+        text, n = self.text, len(self.text)
+        kinds = []
+        end = pos
+        while pos < n:
+            c = text[pos]
+            if c in " \t":
+                pos += 1
+                continue
+            if c in "\r\n,}]#" or text.startswith("//", pos):
+                break
+            if c == "{":
+                pos = self._parse_object(pos, path)
+                kinds.append("object")
+            elif c == "[":
+                pos = self._parse_array(pos)
+                kinds.append("array")
+            elif c == '"':
+                pos = self._skip_string(pos)
+                kinds.append("value")
+            elif text.startswith("${", pos):
+                close = text.find("}", pos)
+                if close == -1:
+                    self._error("unterminated substitution", pos)
+                pos = close + 1
+                kinds.append("value")
+            else:
+                pos = _UNQUOTED_VALUE.match(text, pos).end()
+                kinds.append("value")
+            end = pos
+        if not kinds:
+            self._error("expected a value", pos)
+        return (kinds[0] if len(kinds) == 1 else "value"), end
+
+    def _parse_array(self, pos: int) -> int:
+        pos += 1
+        while True:
+            pos = self._skip_blank(pos)
+            if pos >= len(self.text):
+                self._error("unterminated array", pos)
+            if self.text[pos] == "]":
+                return pos + 1
+            _, pos = self._parse_value(pos, None)
+
+    def _parse_object(self, pos: int, path: tuple | None, root: bool = False) -> int:
+        """Parses the members of an object; pos is its '{' (or the start of a braceless root)."""
+        text, n = self.text, len(self.text)
+        open_pos = pos
+        if not root:
+            pos += 1
+        obj = _HoconObject(open_pos, n)
+        while True:
+            member = _MEMBER_START.match(text, pos)
+            pos = member.end()
+            if member.group("close"):
+                if root:
+                    self._error("unexpected '}'", pos - 1)
+                obj.close_pos = pos - 1
+                break
+            if pos >= n:
+                if not root:
+                    self._error("unterminated object", open_pos)
+                break
+
+            if member.group("key"):
+                key_start = member.start("key")
+                key = tuple(member.group("key").split("."))
+            else:
+                # Quoted keys are rare; they take the slow path
+                key_start = pos
+                key, pos = self._parse_key(pos)
+            separator = _SEPARATOR.match(text, pos)
+            if not separator.group(1) and text[separator.end():separator.end() + 1] != "{":
+                self._error(f"expected ':' or '=' after '{'.'.join(key)}'", separator.end())
+            value_start = separator.end()
+
+            if obj.indent is None:
+                line_start = text.rfind("\n", 0, key_start) + 1
+                obj.indent = text[line_start:key_start] if not text[line_start:key_start].strip() else None
+            if obj.sep is None and separator.group(1):
+                obj.sep = separator.group()
+
+            full_path = None if path is None else path + key
+            scalar = _SCALAR.match(text, value_start)
+            if scalar:
+                kind, pos = "value", scalar.end()
+            else:
+                kind, pos = self._parse_value(value_start, full_path)
+            if full_path is not None:
+                self.entries.setdefault(full_path, []).append(
+                    HoconEntry(full_path, key_start, value_start, pos, kind))
+
+        if path is not None:
+            self.objects[path] = obj
+        return pos
+
+    def _parse(self):
+        pos = self._skip_blank(0)
+        if pos < len(self.text) and self.text[pos] == "{":
+            # Root object written with explicit braces
+            end = self._skip_blank(self._parse_object(pos, ()))
+            if end < len(self.text):
+                self._error("unexpected content after the root object", end)
+        else:
+            self._parse_object(0, (), root=True)
+
+    # -- queries and edits --
+
+    def get(self, path, default=None) -> str | None:
+        """Returns the source text of the last value set for 'path' ("a.b" or a tuple)."""
+        entries = self.entries.get(_split_path(path))
+        if not entries:
+            return default
+        entry = entries[-1]
+        return self.text[entry.value_start:entry.value_end]
+
+    def __contains__(self, path) -> bool:
+        return _split_path(path) in self.entries
+
+    def _insertion(self, path: tuple, value_text: str) -> tuple[int, int, str]:
+        """Builds the edit that adds 'path' to the deepest object that already exists."""
+        depth = len(path) - 1
+        while path[:depth] not in self.objects:
+            depth -= 1
+        obj = self.objects[path[:depth]]
+        key = ".".join(_format_hocon_key(part) for part in path[depth:])
+        sep = obj.sep or ": "
+        text = self.text
+
+        if depth == 0 and obj.close_pos == len(text):
+            prefix = "" if not text or text.endswith("\n") else "\n"
+            return len(text), len(text), f"{prefix}{obj.indent or ''}{key}{sep}{value_text}\n"
+        body = text[obj.open_pos + 1:obj.close_pos]
+        if "\n" not in body:
+            # Inline object such as {x: 0, z: 0}
+            joiner = ", " if body.strip() else ""
+            return obj.close_pos, obj.close_pos, f"{joiner}{key}{sep}{value_text}"
+        line_start = text.rfind("\n", 0, obj.close_pos) + 1
+        indent = obj.indent
+        if indent is None:
+            parent_line = text.rfind("\n", 0, obj.open_pos) + 1
+            parent_indent = re.match(r"[ \t]*", text[parent_line:]).group()
+            indent = parent_indent + DEFAULT_INDENT
+        if text[line_start:obj.close_pos].strip():
+            return obj.close_pos, obj.close_pos, f"\n{indent}{key}{sep}{value_text}\n"
+        return line_start, line_start, f"{indent}{key}{sep}{value_text}\n"
+
+    def set_many(self, values: dict, add_missing: bool = False) -> str:
+        """
+        Returns the text with several keys set at once; the document itself is unchanged.
+
+        Args:
+            values (dict): Path ("a.b" or a tuple) -> new value. Python values are
+                           formatted as HOCON; Raw values are written verbatim.
+            add_missing (bool): Add keys that don't exist yet to their deepest existing
+                                parent object. Otherwise they are ignored.
+
+        Raises:
+            ValueError: If two of the keys overlap (e.g. an object and a key inside it).
+        """
+        edits = []
+        for path, value in values.items():
+            path = _split_path(path)
+            value_text = format_hocon_value(value)
+            entries = self.entries.get(path)
+            if entries:
+                edits.extend((e.value_start, e.value_end, value_text) for e in entries)
+            elif add_missing:
+                edits.append(self._insertion(path, value_text))
+        return _splice(self.text, edits)
+
+
+class PropertiesEntry:
+    """A key of a .properties file and the span of its (raw, escaped) value."""
+
+    def __init__(self, key: str, key_start: int, value_start: int, value_end: int):
+        self.key = key
+        self.key_start = key_start
+        self.value_start = value_start
+        self.value_end = value_end
+
+
+class PropertiesDocument:
+    """
+    Keyed, span-preserving view of a Java .properties file (server.properties).
+
+    Supports the full syntax read by java.util.Properties: '=', ':' or
+    whitespace separators, '#'/'!' comments, escapes and continuation lines.
+
+    Args:
+        text (str): The file content.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.entries: dict[str, list[PropertiesEntry]] = {}
+        self._parse()
+
+    def _parse(self):
+        text, n = self.text, len(self.text)
+        pos = 0
+        while pos < n:
+            line_end = _logical_line_end(text, pos)
+            match = _PROPERTIES_KEY.match(text, pos, line_end)
+            key_start, key_end = match.span(1)
+            if key_start >= line_end or text[key_start] in "#!\r":
+                # Blank line or comment
+                pos = line_end + 1
+                continue
+            i = match.end()
+            value_end = line_end - 1 if line_end > i and text[line_end - 1] == "\r" else line_end
+
+            key = _unescape_properties(text[key_start:key_end])
+            self.entries.setdefault(key, []).append(PropertiesEntry(key, key_start, i, value_end))
+            pos = line_end + 1
+
+    def get(self, key: str, default=None) -> str | None:
+        """Returns the decoded value of the last occurrence of 'key'."""
+        entries = self.entries.get(key)
+        if not entries:
+            return default
+        entry = entries[-1]
+        return _unescape_properties(self.text[entry.value_start:entry.value_end])
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def set_many(self, values: dict, add_missing: bool = False) -> str:
+        """
+        Returns the text with several keys set at once; the document itself is unchanged.
+
+        Args:
+            values (dict): Key -> new value (booleans are written as true/false).
+            add_missing (bool): Append keys that don't exist yet at the end of the file.
+        """
+        edits = []
+        appended = []
+        for key, value in values.items():
+            value_text = format_properties_value(value)
+            entries = self.entries.get(key)
+            if entries:
+                edits.extend((e.value_start, e.value_end, value_text) for e in entries)
+            elif add_missing:
+                appended.append(f"{_escape_properties(key, is_key=True)}={value_text}\n")
+        if appended:
+            n = len(self.text)
+            prefix = "" if not self.text or self.text.endswith("\n") else "\n"
+            edits.append((n, n, prefix + "".join(appended)))
+        return _splice(self.text, edits)
+
+# --- Functions ---
+
+def _split_path(path) -> tuple:
+    if isinstance(path, tuple):
+        return path
+    return tuple(path.split("."))
+
+
+def _splice(text: str, edits: list[tuple[int, int, str]]) -> str:
+    """Applies (start, end, replacement) edits to text in a single pass."""
+    if not edits:
+        return text
+    edits = sorted(enumerate(edits), key=lambda item: (item[1][0], item[1][1], item[0]))
+    parts = []
+    last = 0
+    for _, (start, end, replacement) in edits:
+        if start < last:
+            raise ValueError(f"overlapping edits at offset {start}")
+        parts.append(text[last:start])
+        parts.append(replacement)
+        last = end
+    parts.append(text[last:])
+    return "".join(parts)
+
+
+def _format_hocon_key(key: str) -> str:
+    if re.fullmatch(r"[A-Za-z0-9_-]+", key):
+        return key
+    return json.dumps(key, ensure_ascii=False)
+
+
+def format_hocon_value(value) -> str:
+    """Formats a Python value as HOCON (Raw strings are returned as they are)."""
+    if isinstance(value, Raw):
+        return str(value)
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, str):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(format_hocon_value(item) for item in value) + "]"
+    if isinstance(value, dict):
+        if not value:
+            return "{}"
+        members = (f"{_format_hocon_key(str(k))}: {format_hocon_value(v)}" for k, v in value.items())
+        return "{ " + ", ".join(members) + " }"
+    raise TypeError(f"can't format {type(value).__name__} as HOCON")
+
+
+def _logical_line_end(text: str, pos: int) -> int:
+    """Returns the index of the newline ending the logical line at pos (continuations included)."""
+    n = len(text)
+    while True:
+        end = text.find("\n", pos)
+        if end == -1:
+            return n
+        physical = text[pos:end].rstrip("\r")
+        backslashes = len(physical) - len(physical.rstrip("\\"))
+        if backslashes % 2 == 0:
+            return end
+        pos = end + 1
+
+
+_PROPERTIES_ESCAPES = {"t": "\t", "n": "\n", "r": "\r", "f": "\f"}
+
+
+def _unescape_properties(raw: str) -> str:
+    # Continuation lines: the backslash, the newline and the next line's indentation go away
+    raw = re.sub(r"\\\r?\n[ \t\f]*", "", raw)
+    out = []
+    i = 0
+    while i < len(raw):
+        c = raw[i]
+        if c == "\\" and i + 1 < len(raw):
+            nxt = raw[i + 1]
+            if nxt == "u" and re.fullmatch(r"[0-9a-fA-F]{4}", raw[i + 2:i + 6]):
+                out.append(chr(int(raw[i + 2:i + 6], 16)))
+                i += 6
+                continue
+            out.append(_PROPERTIES_ESCAPES.get(nxt, nxt))
+            i += 2
+        else:
+            out.append(c)
+            i += 1
+    return "".join(out)
+
+
+def _escape_properties(value: str, is_key: bool = False) -> str:
+    out = []
+    for i, c in enumerate(value):
+        if c == "\\":
+            out.append("\\\\")
+        elif c in "\t\n\r\f":
+            out.append("\\" + {"\t": "t", "\n": "n", "\r": "r", "\f": "f"}[c])
+        elif c in "=:#!":
+            out.append("\\" + c)
+        elif c == " " and (is_key or i == 0):
+            out.append("\\ ")
+        else:
+            out.append(c)
+    return "".join(out)
+
+
+def format_properties_value(value) -> str:
+    """Formats a Python value the way java.util.Properties stores it."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return _escape_properties(str(value))
+
+
+def parse_config(text: str, path: Path) -> HoconDocument | PropertiesDocument:
+    """Parses text with the parser matching the file extension."""
+    if Path(path).suffix == ".properties":
+        return PropertiesDocument(text)
+    return HoconDocument(text)
+
+# --- Benchmark ---
+
+def _regex_set_many(text: str, values: dict, properties: bool) -> str:
+    """The approach this module replaces: one whole-file scan per key, matched by key name only."""
+    if properties:
+        lines = []
+        for line in text.splitlines(keepends=True):
+            for key, value in values.items():
+                if line.startswith(f"{key}="):
+                    line = f"{key}={value}\n"
+                    break
+            lines.append(line)
+        return "".join(lines)
+    for path, value in values.items():
+        key = re.escape(path[-1])
+        text = re.sub(rf"^\s*{key}\s*[:=].*", f"{path[-1]}: {value}", text, flags=re.MULTILINE)
+    return text
+
+
+def _time_per_run(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def bench(files: list[Path], repeat: int, scale: int) -> int:
+    """
+    Times setting every scalar key of each file with both approaches.
+
+    Each file can be repeated 'scale' times to simulate larger configs
+    (duplicate keys are valid in both formats).
+    """
+    print(f"{'file':<36} {'size':>9} {'keys':>5} {'regex ms':>9} {'parser ms':>10} {'speedup':>8} {'ambiguous':>9}")
+    for file in files:
+        try:
+            text = file.read_text(encoding="utf-8") * scale
+        except OSError as e:
+            print(f"{str(file):<36} ERROR: {e}", file=sys.stderr)
+            return 1
+        properties = file.suffix == ".properties"
+        doc = parse_config(text, file)
+
+        if properties:
+            values = {key: doc.get(key) for key in doc.entries}
+            new_values = {key: Raw(doc.text[e[-1].value_start:e[-1].value_end]) for key, e in doc.entries.items()}
+            ambiguous = 0
+        else:
+            scalars = [path for path, entries in doc.entries.items() if entries[-1].kind == "value"]
+            values = {path: doc.get(path) for path in scalars}
+            new_values = {path: Raw(value) for path, value in values.items()}
+            # Keys whose name also appears somewhere else: a name-based regex edits both
+            names = [path[-1] for path in doc.entries]
+            ambiguous = sum(1 for path in scalars if names.count(path[-1]) > 1)
+
+        regex_ms = _time_per_run(lambda: _regex_set_many(text, values, properties), repeat)
+        parser_ms = _time_per_run(lambda: parse_config(text, file).set_many(new_values), repeat)
+        speedup = regex_ms / parser_ms if parser_ms else float("inf")
+        print(f"{str(file)[-36:]:<36} {len(text):>9} {len(values):>5} {regex_ms:>9.3f} {parser_ms:>10.3f} {speedup:>7.1f}x {ambiguous:>9}")
+    return 0
+
+# --- Main ---
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Inspects HOCON/.properties files and benchmarks the parsers.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show_parser = sub.add_parser("show", help="print every key of a file with its line and value")
+    show_parser.add_argument("file", type=Path)
+    bench_parser = sub.add_parser("bench", help="compare the parsers with per-key regex substitution")
+    bench_parser.add_argument("files", type=Path, nargs="+")
+    bench_parser.add_argument("--repeat", type=int, default=200, help="runs per measurement (default: 200)")
+    bench_parser.add_argument("--scale", type=int, default=1, help="repeat each file N times to simulate a larger one")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        return bench(args.files, max(1, args.repeat), max(1, args.scale))
+
+    try:
+        text = args.file.read_text(encoding="utf-8")
+        doc = parse_config(text, args.file)
+    except (OSError, ValueError) as e:
+        print(f"config_parsers: {args.file}: {e}", file=sys.stderr)
+        return 1
+    for entry in sorted((e for entries in doc.entries.values() for e in entries), key=lambda e: e.key_start):
+        line = text.count("\n", 0, entry.key_start) + 1
+        name = entry.key if isinstance(doc, PropertiesDocument) else ".".join(entry.path)
+        print(f"{line:>5}  {name} = {text[entry.value_start:entry.value_end]}")
+    return 0
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,8 +2,12 @@
 
 import os
 import yaml
-import re
+import argparse
 from colorama import init, Fore, Style
+from config_engine import ConfigTransaction
+from config_parsers import HoconDocument, PropertiesDocument, Raw
+from tuning import PROFILES, DEFAULT_PROFILE, TUNING_FILE, compute_profile, detect_host, save_profile
+from pregen import set_target as set_pregen_target
 
 # Initialize Colorama
 init(autoreset=True)
@@ -43,45 +47,16 @@ def get_user_input(prompt, default=None):
         else:
             print_warning("Este campo no puede estar vacío. Por favor, introduce un valor.")
 
-def convert_tabs_to_spaces(file_path, spaces_per_tab=2):
+def convert_tabs_to_spaces(content, spaces_per_tab=2):
     """
-    Reads a file, replaces tabs with spaces, and rewrites it.
+    Replaces tabs with spaces.
     This helps prevent YAML syntax errors caused by tabs.
     """
-    try:
-        with open(file_path, 'r') as f:
-            content = f.read()
-
-        new_content = content.replace('\t', ' ' * spaces_per_tab)
-
-        if new_content != content:
-            with open(file_path, 'w') as f:
-                f.write(new_content)
-            print_success(f"Tabulaciones convertidas a espacios en {file_path}.")
-        else:
-            print_success(f"No se encontraron tabulaciones en {file_path}.")
-
-    except FileNotFoundError:
-        print_warning(f"No se encontró el archivo {file_path} para limpiar tabulaciones.")
-    except Exception as e:
-        print_error(f"al limpiar tabulaciones en {file_path}: {e}")
+    return content.replace('\t', ' ' * spaces_per_tab)
 
-def configure_seed(file_path, seed_data):
-    try:
-        with open(file_path, 'r') as f:
-            lines = f.readlines()
-        with open(file_path, 'w') as f:
-            for line in lines:
-                if line.startswith("level-seed="):
-                    f.write(f"level-seed={seed_data['seed']}\n")
-                else:
-                    f.write(line)
-                
-        print_success(f"{file_path} optimizado.")
-    except FileNotFoundError:
-        print_error(f"No se encontró el archivo {file_path}.")
-    except Exception as e:
-        print_error(f"al optimizar {file_path}: {e}")
+def configure_seed(content, seed_data):
+    """Sets level-seed in the server.properties content."""
+    return PropertiesDocument(content).set_many({"level-seed": seed_data['seed']})
 
 def get_seed_data():
     seeds = [
@@ -182,289 +157,127 @@ def get_seed_data():
             print()
 
 
-def optimize_server_properties(file_path, max_players, RCON_PASSWORD, selected_seed=None):
-    """Optimizes the server.properties file."""
-    print_status(f"\nOptimizando {file_path}...")
-    try:
-        with open(file_path, 'r') as f:
-            lines = f.readlines()
-
-        with open(file_path, 'w') as f:
-            for line in lines:
-                if line.startswith("max-players="):
-                    f.write(f"max-players={max_players}\n")
-                elif line.startswith("view-distance="):
-                    f.write("view-distance=11\n")
-                elif line.startswith("simulation-distance="):
-                    f.write("simulation-distance=7\n")
-                elif line.startswith("entity-broadcast-range-percentage="):
-                    f.write("entity-broadcast-range-percentage=50\n")
-                elif line.startswith("spawn-protection="):
-                    f.write("spawn-protection=16\n")
-                elif line.startswith("spawn-animals="):
-                    f.write("spawn-animals=true\n")
-                elif line.startswith("spawn-npcs="):
-                    f.write("spawn-npcs=true\n")
-                elif line.startswith("online-mode="):
-                    f.write("online-mode=false\n")
-                elif line.startswith("save-user-cache-on-stop-only="):
-                    f.write("save-user-cache-on-stop-only=true\n")
-                elif line.startswith("enforce-secure-profile="):
-                    f.write("enforce-secure-profile=false\n")
-                elif line.startswith("enable-rcon="):
-                    f.write(f"enable-rcon=true\n")
-                elif line.startswith("rcon.password="):
-                    f.write(f"rcon.password={RCON_PASSWORD}\n")
-                elif line.startswith("level-seed="):
-                    if selected_seed:
-                        f.write(f"level-seed={selected_seed['seed']}\n")
-                    else:
-                        f.write("level-seed=\n")
-                else:
-                    f.write(line)
-
-        print_success(f"{file_path} optimizado.")
-    except FileNotFoundError:
-        print_error(f"No se encontró el archivo {file_path}.")
-    except Exception as e:
-        print_error(f"al optimizar {file_path}: {e}")
-
-def optimize_spigot_yml(file_path):
-    """Optimizes the spigot.yml file using PyYAML, preserving existing keys."""
-    print_status(f"\nOptimizando {file_path}...")
-    convert_tabs_to_spaces(file_path) # Clean tabs before loading
-    try:
-        with open(file_path, 'r') as f:
-            spigot_config = yaml.safe_load(f)
-
-        # Ensure the base structure exists
-        if 'world-settings' not in spigot_config:
-            spigot_config['world-settings'] = {}
-        if 'default' not in spigot_config['world-settings']:
-            spigot_config['world-settings']['default'] = {}
-
-        default_settings = spigot_config['world-settings']['default']
-
-        # --- Modify/add simple keys directly in default ---
-        default_settings['mob-spawn-range'] = 4
-        default_settings['nerf-spawner-mobs'] = True
-        default_settings['tick-inactive-villagers'] = False
-        default_settings['mob-spawner-tick-rate'] = 2
-        default_settings['arrow-despawn-rate'] = 300
-        default_settings['item-despawn-rate'] = 4000
-
-        # --- Modify or create complex blocks, preserving sub-keys ---
-
-        # entity-activation-range
-        if 'entity-activation-range' not in default_settings:
-            default_settings['entity-activation-range'] = {}
-        ear_settings = default_settings['entity-activation-range']
-        ear_settings['animals'] = 24
-        ear_settings['monsters'] = 24
-        ear_settings['raiders'] = 48
-        ear_settings['misc'] = 8
-        ear_settings['water'] = 8
-        ear_settings['villagers'] = 24
-        ear_settings['flying-monsters'] = 24
-
-        # entity-tracking-range
-        if 'entity-tracking-range' not in default_settings:
-            default_settings['entity-tracking-range'] = {}
-        etr_settings = default_settings['entity-tracking-range']
-        etr_settings['players'] = 96
-        etr_settings['animals'] = 48
-        etr_settings['monsters'] = 48
-        etr_settings['misc'] = 32
-        etr_settings['display'] = 64
-        etr_settings['other'] = 32
-
-        # merge-radius
-        if 'merge-radius' not in default_settings:
-            default_settings['merge-radius'] = {}
-        merge_settings = default_settings['merge-radius']
-        merge_settings['item'] = 2.0
-        merge_settings['exp'] = 2.0
-
-        # Save changes
-        with open(file_path, 'w') as f:
-            yaml.dump(spigot_config, f, default_flow_style=False, indent=2, sort_keys=False)
-        print_success(f"{file_path} optimizado.")
-    except FileNotFoundError:
-        print_error(f"No se encontró el archivo {file_path}. Asegúrate de que el script se ejecuta en el directorio raíz del servidor.")
-    except yaml.YAMLError as e:
-        print_error(f"de sintaxis YAML en {file_path}: {e}")
-    except Exception as e:
-        print_error(f"al optimizar {file_path}: {e}")
-
-def update_minimotd_conf(file_path, max_players):
+def optimize_server_properties(content, max_players, RCON_PASSWORD, tuning, selected_seed=None):
+    """Optimizes the server.properties content; distances come from the tuning profile."""
+    return PropertiesDocument(content).set_many({
+        "max-players": max_players,
+        **tuning["server.properties"],
+        "spawn-protection": 16,
+        "spawn-animals": True,
+        "spawn-npcs": True,
+        "online-mode": False,
+        "save-user-cache-on-stop-only": True,
+        "enforce-secure-profile": False,
+        "enable-rcon": True,
+        "rcon.password": RCON_PASSWORD,
+        "level-seed": selected_seed['seed'] if selected_seed else "",
+    })
+
+def optimize_spigot_yml(content, tuning):
+    """Optimizes the spigot.yml content using PyYAML, preserving existing keys."""
+    spigot_config = yaml.safe_load(convert_tabs_to_spaces(content)) # Clean tabs before loading
+
+    # Ensure the base structure exists
+    if 'world-settings' not in spigot_config:
+        spigot_config['world-settings'] = {}
+    if 'default' not in spigot_config['world-settings']:
+        spigot_config['world-settings']['default'] = {}
+
+    default_settings = spigot_config['world-settings']['default']
+
+    # --- Modify/add simple keys directly in default ---
+    default_settings['mob-spawn-range'] = tuning["spigot.yml"]["mob-spawn-range"]
+    default_settings['nerf-spawner-mobs'] = True
+    default_settings['tick-inactive-villagers'] = False
+    default_settings['mob-spawner-tick-rate'] = 2
+    default_settings['arrow-despawn-rate'] = 300
+    default_settings['item-despawn-rate'] = 4000
+
+    # --- Modify or create complex blocks, preserving sub-keys ---
+
+    # entity-activation-range
+    if 'entity-activation-range' not in default_settings:
+        default_settings['entity-activation-range'] = {}
+    default_settings['entity-activation-range'].update(tuning["spigot.yml"]["entity-activation-range"])
+
+    # entity-tracking-range
+    if 'entity-tracking-range' not in default_settings:
+        default_settings['entity-tracking-range'] = {}
+    default_settings['entity-tracking-range'].update(tuning["spigot.yml"]["entity-tracking-range"])
+
+    # merge-radius
+    if 'merge-radius' not in default_settings:
+        default_settings['merge-radius'] = {}
+    merge_settings = default_settings['merge-radius']
+    merge_settings['item'] = 2.0
+    merge_settings['exp'] = 2.0
+
+    return yaml.dump(spigot_config, default_flow_style=False, indent=2, sort_keys=False)
+
+def update_minimotd_conf(content, max_players):
     """Updates the MiniMOTD configuration."""
-    print_status(f"Actualizando {file_path}...")
-    try:
-        with open(file_path, 'r') as f:
-            content = f.read()
-
-        # Update max-players
-        content = re.sub(r"^\s*max-players=.*", f"max-players={max_players}", content, flags=re.MULTILINE)
-
-        # Replace the entire motds block
-        new_motds_block = """motds=[
+    # Replace the entire motds block
+    new_motds_block = Raw("""[
     {
       icon=random
       line1="<blue>Hello <bold><red>¡Bienvenid@s!"
       line2="<italic><gradient:green:yellow>Diviértete"
     }
-]"""
-        # Find the 'motds=[' block and its closing ']'
-        content = re.sub(r"motds=\[\n.*?\]", new_motds_block, content, flags=re.DOTALL)
-
-        with open(file_path, 'w') as f:
-            f.write(content)
-        print_success(f"{file_path} actualizado.")
-    except FileNotFoundError:
-        print_error(f"No se encontró el archivo {file_path}.")
-    except Exception as e:
-        print_error(f"al actualizar {file_path}: {e}")
-
-def optimize_bluemap_maps_conf(file_path):
-    """Optimizes the plugins/BlueMap/maps/world.conf file with desired settings."""
-    print_status(f"\nOptimizando {file_path} (usando regex)...")
-    convert_tabs_to_spaces(file_path)
-
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        # Enable 3D views and high-res, disable flat view
-        content = re.sub(r"^\s*enable-perspective-view:.*", "enable-perspective-view: true", content, flags=re.MULTILINE)
-        content = re.sub(r"^\s*enable-free-flight-view:.*", "enable-free-flight-view: true", content, flags=re.MULTILINE)
-        content = re.sub(r"^\s*enable-hires:.*", "enable-hires: true", content, flags=re.MULTILINE)
-        content = re.sub(r"^\s*player-render-limit:\s*.*", "player-render-limit: 1", content, flags=re.MULTILINE)
-        content = re.sub(r"^\s*enable-flat-view:.*", "enable-flat-view: false", content, flags=re.MULTILINE)
-
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-        print_success(f"{file_path} optimizado.")
-    except FileNotFoundError:
-        print_error(f"No se encontró el archivo {file_path}.")
-    except Exception as e:
-        print_error(f"Error al optimizar {file_path}: {e}")
-
-def optimize_bluemap_core_conf(file_path):
-    """Optimizes the plugins/BlueMap/core.conf file using regex."""
-    print_status(f"\nOptimizando {file_path} (usando regex)...")
-    convert_tabs_to_spaces(file_path)
-
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        # Core settings
-        content = re.sub(r"^\s*accept-download:.*", "accept-download: true", content, flags=re.MULTILINE)
-        content = re.sub(r"^\s*render-thread-count:.*", "render-thread-count: 4", content, flags=re.MULTILINE)
-        content = re.sub(r"^\s*scan-for-mod-resources:.*", "scan-for-mod-resources: false", content, flags=re.MULTILINE)
-        content = re.sub(r"^\s*metrics:.*", "metrics: false", content, flags=re.MULTILINE)
-        content = re.sub(r"^\s*log:\s*\{.*?\}", "log: {}", content, flags=re.MULTILINE | re.DOTALL)
-
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-        print_success(f"{file_path} optimizado.")
-    except FileNotFoundError:
-        print_error(f"No se encontró el archivo {file_path}.")
-    except Exception as e:
-        print_error(f"Error al optimizar {file_path}: {e}")
-
-def optimize_bluemap_plugin_conf(file_path):
-    print_status(f"\nOptimizando plugin config: {file_path}")
-    convert_tabs_to_spaces(file_path)
-
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-
-        output = []
-        skip_block = False
-
-        for line in lines:
-            if skip_block:
-                if line.startswith(" ") or line.startswith("\t") or line.strip() in ["[", "]"] or '"' in line:
-                    continue
-                else:
-                    skip_block = False  # Terminó el bloque
-
-            if line.startswith("hidden-game-modes:"):
-                output.append('hidden-game-modes: ["spectator"]\n')
-                skip_block = True
-                continue
-
-            elif line.startswith("live-player-markers:"):
-                output.append("live-player-markers: true\n")
-            elif line.startswith("hide-vanished:"):
-                output.append("hide-vanished: true\n")
-            elif line.startswith("hide-invisible:"):
-                output.append("hide-invisible: true\n")
-            elif line.startswith("hide-sneaking:"):
-                output.append("hide-sneaking: true\n")
-            elif line.startswith("hide-below-sky-light:"):
-                output.append("hide-below-sky-light: 0\n")
-            elif line.startswith("hide-below-block-light:"):
-                output.append("hide-below-block-light: 0\n")
-            elif line.startswith("hide-different-world:"):
-                output.append("hide-different-world: true\n")
-            elif line.startswith("write-markers-interval:"):
-                output.append("write-markers-interval: 0\n")
-            elif line.startswith("write-players-interval:"):
-                output.append("write-players-interval: 0\n")
-            elif line.startswith("skin-download:"):
-                output.append("skin-download: false\n")
-            elif line.startswith("player-render-limit:"):
-                output.append("player-render-limit: 1\n")
-            elif line.startswith("full-update-interval:"):
-                output.append("full-update-interval: 2880\n")
-            else:
-                output.append(line)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.writelines(output)
-
-        print_success(f"Plugin config optimized: {file_path}")
-    except Exception as e:
-        print_error(f"Error optimizing plugin config {file_path}: {e}")
-
-
-def optimize_bluemap_webserver_conf(file_path):
-    """Optimizes the plugins/BlueMap/webserver.conf file by removing the log block."""
-    print_status(f"\nOptimizando {file_path} (desactivando logs)...")
-    convert_tabs_to_spaces(file_path) # Ensure no tabs before reading
-
-    try:
-        with open(file_path, 'r') as f:
-            content = f.read()
-
-        # Regex to target the entire 'log:' block and replace it with an empty block.
-        # This is the safest way to "disable" logging completely without causing YAML errors.
-        #content = re.sub(r"^\s*log:.*?(?=\n\S|\Z)", "log: {}", content, flags=re.MULTILINE | re.DOTALL)
-        content = re.sub(r"^\s*log:\s*\{.*?\}", "log: {}", content, flags=re.MULTILINE | re.DOTALL)
-
-
-        with open(file_path, 'w') as f:
-            f.write(content)
-        print_success(f"Logs de webserver deshabilitados en {file_path}.")
-    except FileNotFoundError:
-        print_error(f"No se encontró el archivo {file_path}.")
-    except Exception as e:
-        print_error(f"al optimizar {file_path}: {e}")
-
-def configure_tab_plugin(config_path, groups_path):
-    # --- Configurar config.yml ---
-    print_status(f"\nOptimizando '{config_path}'...")
-    try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            cfg = yaml.safe_load(f)
-    except FileNotFoundError:
-        print_error(f"Error: El archivo '{config_path}' no se encontró.")
-        return
-    except yaml.YAMLError as e:
-        print_error(f"Error al parsear '{config_path}': {e}")
-        return
+]""")
+    return HoconDocument(content).set_many({
+        "player-count-settings.max-players": max_players,
+        "motds": new_motds_block,
+    })
+
+def optimize_bluemap_maps_conf(content):
+    """Optimizes the plugins/BlueMap/maps/world.conf content with desired settings."""
+    # Enable 3D views and high-res, disable flat view
+    return HoconDocument(convert_tabs_to_spaces(content)).set_many({
+        "enable-perspective-view": True,
+        "enable-free-flight-view": True,
+        "enable-hires": True,
+        "player-render-limit": 1,
+        "enable-flat-view": False,
+    })
+
+def optimize_bluemap_core_conf(content, tuning):
+    """Optimizes the plugins/BlueMap/core.conf content."""
+    return HoconDocument(convert_tabs_to_spaces(content)).set_many({
+        "accept-download": True,
+        "render-thread-count": tuning["bluemap"]["render-thread-count"],
+        "scan-for-mod-resources": False,
+        "metrics": False,
+        "log": {},
+    })
+
+def optimize_bluemap_plugin_conf(content):
+    """Optimizes the plugins/BlueMap/plugin.conf content."""
+    return HoconDocument(convert_tabs_to_spaces(content)).set_many({
+        "hidden-game-modes": ["spectator"],
+        "live-player-markers": True,
+        "hide-vanished": True,
+        "hide-invisible": True,
+        "hide-sneaking": True,
+        "hide-below-sky-light": 0,
+        "hide-below-block-light": 0,
+        "hide-different-world": True,
+        "write-markers-interval": 0,
+        "write-players-interval": 0,
+        "skin-download": False,
+        "player-render-limit": 1,
+        # bluemap_scheduler.py runs the full update in an idle window instead
+        "full-update-interval": 0,
+    })
+
+def optimize_bluemap_webserver_conf(content):
+    """Optimizes the plugins/BlueMap/webserver.conf content by emptying the log block."""
+    # An empty block is the safest way to "disable" logging completely without
+    # leaving the file invalid; only the top-level 'log' key is touched.
+    return HoconDocument(convert_tabs_to_spaces(content)).set_many({"log": {}})
+
+def configure_tab_config(content):
+    """Configures the TAB plugin config.yml content."""
+    cfg = yaml.safe_load(content)
 
     cfg['header-footer'] = {
         'enabled': True,
@@ -534,25 +347,11 @@ def configure_tab_plugin(config_path, groups_path):
     }
     cfg["placeholderapi-refresh-intervals"] = new_refresh_intervals
 
-    # Guardar los cambios en config.yml
-    try:
-        with open(config_path, 'w', encoding='utf-8') as f:
-            yaml.dump(cfg, f, sort_keys=False, allow_unicode=True, indent=2)
-        print_success(f"'{config_path}' ha sido actualizado exitosamente.")
-    except IOError as e:
-        print_error(f"Error de E/S al escribir en '{config_path}': {e}")
-        return
+    return yaml.dump(cfg, sort_keys=False, allow_unicode=True, indent=2)
 
-    # --- Configurar groups.yml ---
-    try:
-        with open(groups_path, 'r', encoding='utf-8') as f:
-            groups_data = yaml.safe_load(f)
-    except FileNotFoundError:
-        print_error(f"Error: El archivo '{groups_path}' no se encontró.")
-        return
-    except yaml.YAMLError as e:
-        print_error(f"Error al parsear '{groups_path}': {e}")
-        return
+def configure_tab_groups(content):
+    """Configures the TAB plugin groups.yml content."""
+    groups_data = yaml.safe_load(content)
 
     if "_DEFAULT_" in groups_data:
         groups_data["_DEFAULT_"].update({
@@ -563,14 +362,10 @@ def configure_tab_plugin(config_path, groups_path):
     else:
         print_error("Advertencia: La sección '_DEFAULT_' no se encontró en groups.yml. No se pudo actualizar.")
 
-    try:
-        with open(groups_path, 'w', encoding='utf-8') as f:
-            yaml.dump(groups_data, f, sort_keys=False, allow_unicode=True, indent=2)
-        print_success(f"'{groups_path}' ha sido actualizado exitosamente.")
-    except IOError as e:
-        print_error(f"Error de E/S al escribir en '{groups_path}': {e}")
-        return
+    return yaml.dump(groups_data, sort_keys=False, allow_unicode=True, indent=2)
 
+def print_tab_instructions():
+    """Reminds the manual steps the TAB placeholders need."""
     print()
     os.system('echo "==============================================================================" | lolcat')
     print(f"""{Fore.RED}{Style.BRIGHT}\t\t\t¡¡¡IMPORTANTE!!!{Style.RESET_ALL}\n
@@ -581,8 +376,81 @@ def configure_tab_plugin(config_path, groups_path):
     os.system('echo "==============================================================================" | lolcat')
 
 
+def choose_profile(profile, max_players, interactive=True):
+    """Computes the tuning profile for this host, asking for its name if it wasn't given."""
+    if profile is None:
+        profile = DEFAULT_PROFILE
+        if interactive:
+            print_status("\n🧮 Perfiles de rendimiento disponibles:", Fore.LIGHTCYAN_EX)
+            for name in PROFILES:
+                print(f"   {Fore.LIGHTWHITE_EX}{name:<12}{Style.RESET_ALL} {PROFILES[name]}")
+            profile = get_user_input(f"⚙️  Perfil a aplicar (por defecto: {DEFAULT_PROFILE}): ", default=DEFAULT_PROFILE)
+        if profile not in PROFILES:
+            print_warning(f"Perfil '{profile}' desconocido. Usando {DEFAULT_PROFILE}.")
+            profile = DEFAULT_PROFILE
+
+    host = detect_host()
+    tuning = compute_profile(host, max_players, profile)
+    print_status(f"\n🧮 Perfil '{profile}' para {host.get('model') or 'este equipo'}: "
+                 f"{host['cores']} núcleos, {host['ram_mb']} MB de RAM, almacenamiento {host['storage']}", Fore.LIGHTCYAN_EX)
+    print_success(f"view-distance={tuning['server.properties']['view-distance']}, "
+                  f"simulation-distance={tuning['server.properties']['simulation-distance']}, "
+                  f"heap={tuning['jvm']['xmx_mb']}M, hilos de BlueMap={tuning['bluemap']['render-thread-count']}")
+    return tuning
+
+def print_diff(diff):
+    """Prints a unified diff with colors."""
+    for line in diff.splitlines():
+        if line.startswith(("+++", "---")):
+            print(Style.BRIGHT + line + Style.RESET_ALL)
+        elif line.startswith("+"):
+            print(Fore.GREEN + line + Style.RESET_ALL)
+        elif line.startswith("-"):
+            print(Fore.RED + line + Style.RESET_ALL)
+        elif line.startswith("@@"):
+            print(Fore.CYAN + line + Style.RESET_ALL)
+        else:
+            print(line)
+
+def apply_changes(tx, dry_run=False):
+    """
+    Reports the outcome of a ConfigTransaction and writes it unless dry_run is set.
+
+    Returns:
+        bool: False if any edit failed (nothing is written in that case).
+    """
+    for path, edit_name, error in tx.errors:
+        print_error(f"al aplicar {edit_name} en {path}: {error}")
+    if tx.errors:
+        print_error("No se ha modificado ningún archivo.")
+        return False
+
+    print_status("\n📝 Resumen de cambios:", Fore.LIGHTYELLOW_EX)
+    for config_file in tx.files.values():
+        if config_file.changed:
+            print_success(f"{config_file.path}: {'se modificaría' if dry_run else 'optimizado'}.")
+            if dry_run:
+                print_diff(tx.diff(config_file.path))
+        else:
+            print_success(f"{config_file.path}: ya estaba optimizado, sin cambios.")
+
+    if not dry_run:
+        tx.commit()
+    return True
+
 def main():
     """Main function to run the optimization process."""
+    parser = argparse.ArgumentParser(description="Optimiza la configuración del servidor y sus plugins.")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="muestra los cambios como diff sin escribir ningún archivo")
+    parser.add_argument("--profile", choices=PROFILES,
+                        help="perfil de rendimiento calculado según el hardware (por defecto se pregunta)")
+    parser.add_argument("--max-players", type=int, help="número máximo de jugadores (por defecto se pregunta)")
+    parser.add_argument("--rcon-password", help="contraseña de RCON (por defecto se pregunta)")
+    parser.add_argument("-y", "--non-interactive", action="store_true",
+                        help="no pregunta nada: usa los valores indicados o los de por defecto, sin semilla")
+    args = parser.parse_args()
+
     os.system('clear')
     
     # Header visual mejorado para el inicio
@@ -620,12 +488,24 @@ def main():
     print_status("\n📋 CONFIGURACIÓN INICIAL", Fore.LIGHTGREEN_EX + Style.BRIGHT)
     print_status("─" * 50, Fore.LIGHTGREEN_EX)
     
-    max_players_input = get_user_input("👥 Introduce el valor de max-players (por defecto: 3): ", default="3")
-    RCON_PASSWORD = get_user_input("🔐 Introduce la contraseña de RCON: ", default=rcon_passw())
-    o = get_user_input("🌱 ¿Deseas usar una semilla personalizada? (y/n): ", default="n").strip().lower()
+    interactive = not args.non_interactive
+    if args.max_players is not None:
+        max_players_input = str(args.max_players)
+    elif interactive:
+        max_players_input = get_user_input("👥 Introduce el valor de max-players (por defecto: 3): ", default="3")
+    else:
+        max_players_input = "3"
+    if args.rcon_password is not None:
+        RCON_PASSWORD = args.rcon_password
+    elif interactive:
+        RCON_PASSWORD = get_user_input("🔐 Introduce la contraseña de RCON: ", default=rcon_passw())
+    else:
+        RCON_PASSWORD = rcon_passw()
     selected_seed = None
-    if o == 'y':
-        selected_seed = get_seed_data()
+    if interactive:
+        o = get_user_input("🌱 ¿Deseas usar una semilla personalizada? (y/n): ", default="n").strip().lower()
+        if o == 'y':
+            selected_seed = get_seed_data()
 
     try:
         max_players = int(max_players_input)
@@ -635,15 +515,37 @@ def main():
         print_warning("El valor de max-players debe ser un número entero positivo. Usando 3 por defecto.")
         max_players = 3
 
-    optimize_server_properties(PROPS_FILE, max_players, RCON_PASSWORD, selected_seed)
-    optimize_spigot_yml(SPIGOT_FILE)
-    update_minimotd_conf(MOTD_CONF, max_players)
-    optimize_bluemap_plugin_conf(BLUEMAP_PLUGIN_CONF)
-    optimize_bluemap_core_conf(BLUEMAP_CORE_CONF)
-    optimize_bluemap_webserver_conf(BLUEMAP_WEBSERVER_CONF)
-    optimize_bluemap_maps_conf(BLUEMAP_WORLD_CONF)
-
-    configure_tab_plugin(TAB_CONF, TAB_GROUPS_CONF)
+    tuning = choose_profile(args.profile, max_players, interactive)
+
+    # Each file is read once, every edit is applied in memory and the file is
+    # written once (atomically) only if its content changed
+    print_status("\n⚙️  Aplicando optimizaciones...", Fore.LIGHTYELLOW_EX)
+    tx = ConfigTransaction()
+    tx.apply(PROPS_FILE, optimize_server_properties, max_players, RCON_PASSWORD, tuning, selected_seed)
+    tx.apply(SPIGOT_FILE, optimize_spigot_yml, tuning)
+    tx.apply(MOTD_CONF, update_minimotd_conf, max_players)
+    tx.apply(BLUEMAP_PLUGIN_CONF, optimize_bluemap_plugin_conf)
+    tx.apply(BLUEMAP_CORE_CONF, optimize_bluemap_core_conf, tuning)
+    tx.apply(BLUEMAP_WEBSERVER_CONF, optimize_bluemap_webserver_conf)
+    tx.apply(BLUEMAP_WORLD_CONF, optimize_bluemap_maps_conf)
+    tx.apply(TAB_CONF, configure_tab_config)
+    tx.apply(TAB_GROUPS_CONF, configure_tab_groups)
+
+    if not apply_changes(tx, args.dry_run):
+        exit(1)
+    if args.dry_run:
+        print_warning("Modo --dry-run: no se ha escrito ningún archivo.")
+        return
+    # start.sh sizes the JVM heap from the saved profile
+    save_profile(tuning)
+    print_success(f"Perfil guardado en {TUNING_FILE} (heap de la JVM para start.sh).")
+    if selected_seed:
+        # pregen.py pre-generates the terrain around the seed's coordinates while nobody plays
+        x, _, z = selected_seed['coordenadas']
+        set_pregen_target((x, z))
+        print_success(f"Pregeneración centrada en {x} {z} (actívala con /pregen start en el bot o pregen.py start).")
+
+    print_tab_instructions()
 
     # Mensaje de finalización mejorado
     print_status("\n" + "=" * 80, Fore.LIGHTGREEN_EX)
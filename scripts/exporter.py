@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+
+"""
+Prometheus metrics endpoint for the server and its host.
+
+Everything is gathered by a background task into a cache, and /metrics only
+serves the last rendering, so a scrape never adds RCON commands on the tick
+thread (or jcmd attaches to the JVM), whatever the scrape interval.
+
+    - Minecraft (RCON, every REFRESH_INTERVAL): TPS, MSPT (Paper's 5s/10s/1m
+      windows plus quantiles over the last 10 minutes of samples), players,
+      entities and loaded chunks per world
+    - Java process (/proc, plus jcmd every JCMD_INTERVAL): RSS, CPU time,
+      threads, open files, heap used, GC counts and time
+    - Host: CPU temperature, Raspberry Pi throttling flags (vcgencmd), CPU
+      frequency, load, memory and disk
+    - Update scripts: duration, exit code and time of their last run
+    - BlueMap (bluemap_scheduler.py): time rendering at full speed, at low
+      priority and paused, queued tasks and the last full update
+
+The Telegram bot serves it on EXPORTER_HOST:EXPORTER_PORT; without the bot:
+
+    exporter.py serve [--host 0.0.0.0] [--port 9225]
+    exporter.py dump                       # print one rendering and exit
+    exporter.py record update-paper 42 0   # used by the update scripts
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from collections import deque
+from rcon import RconClient, RconError, read_rcon_settings, server_status
+from supervisor import SupervisorError, async_request
+from metrics import process_cpu_ticks
+from bluemap_scheduler import load_state as load_scheduler_state
+
+# --- Configuration ---
+EXPORTER_HOST = os.environ.get("EXPORTER_HOST", "127.0.0.1")
+EXPORTER_PORT = int(os.environ.get("EXPORTER_PORT", "9225"))
+# Seconds between background refreshes (RCON, /proc, host)
+REFRESH_INTERVAL = 15
+# Seconds between jcmd attaches (heap and GC); each one starts a small JVM
+JCMD_INTERVAL = 60
+JCMD_TIMEOUT = 10
+# MSPT samples the quantiles are computed from (seconds)
+MSPT_WINDOW = 600
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+# Written by the update scripts through "exporter.py record"
+UPDATE_RUNS_FILE = Path(".cache/update-runs.json")
+SERVER_DIR = Path(".")
+# vcgencmd get_throttled bits
+THROTTLE_FLAGS = {
+    0: "under_voltage", 1: "arm_frequency_capped", 2: "throttled", 3: "soft_temperature_limit",
+    16: "under_voltage_occurred", 17: "arm_frequency_capped_occurred",
+    18: "throttled_occurred", 19: "soft_temperature_limit_occurred",
+}
+PERF_COUNTER_RE = re.compile(r'^([\w.]+)=(?:"(.*)"|(-?\d+))$', re.MULTILINE)
+
+# --- Classes ---
+
+class MetricWriter:
+    """Builds the Prometheus text exposition format, one HELP/TYPE per family."""
+
+    def __init__(self):
+        self.lines = []
+        self._declared = set()
+
+    def add(self, name: str, value, help_text: str, kind: str = "gauge", labels: dict | None = None):
+        if value is None:
+            return
+        if name not in self._declared:
+            self._declared.add(name)
+            self.lines.append(f"# HELP {name} {help_text}")
+            self.lines.append(f"# TYPE {name} {kind}")
+        if labels:
+            rendered = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+            name = f"{name}{{{rendered}}}"
+        self.lines.append(f"{name} {value}")
+
+    def render(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+class Exporter:
+    """
+    Refreshes all metrics in the background and keeps the rendered text.
+
+    Args:
+        fetch_status (callable): Async function returning rcon.server_status()
+                                 (the bot passes its cached status).
+        interval (float): Seconds between refreshes.
+    """
+
+    def __init__(self, fetch_status, interval: float = REFRESH_INTERVAL):
+        self.fetch_status = fetch_status
+        self.interval = interval
+        self.text = "# no data yet\n"
+        self._mspt = deque()           # (monotonic time, 5s average)
+        self._jvm = {}                 # last jcmd figures
+        self._jvm_pid = None
+        self._jvm_at = 0.0
+
+    async def refresh(self):
+        started = time.monotonic()
+        out = MetricWriter()
+        pid = None
+        try:
+            pid = (await async_request("status"))["pid"]
+        except SupervisorError:
+            pass
+        await self._minecraft(out)
+        if pid is not None:
+            await self._process(out, pid)
+        await asyncio.to_thread(self._host, out)
+        self._updates(out)
+        self._bluemap(out)
+        out.add("minecraft_exporter_refresh_seconds", round(time.monotonic() - started, 4),
+                "Time the last background refresh took.")
+        out.add("minecraft_exporter_last_refresh_timestamp_seconds", round(time.time(), 3),
+                "When the cached metrics were gathered.")
+        self.text = out.render()
+
+    async def _minecraft(self, out: MetricWriter):
+        try:
+            status = await self.fetch_status()
+        except RconError:
+            out.add("minecraft_up", 0, "Whether the server answers over RCON.")
+            return
+        out.add("minecraft_up", 1, "Whether the server answers over RCON.")
+        for window, value in zip(("1m", "5m", "15m"), status["tps"]):
+            out.add("minecraft_tps", value, "Ticks per second reported by Paper.", labels={"window": window})
+        if status["mspt"]:
+            for stat in ("avg", "min", "max"):
+                out.add("minecraft_mspt_5s", status["mspt"][stat], "Tick time over the last 5s (ms).",
+                        labels={"stat": stat})
+            now = time.monotonic()
+            self._mspt.append((now, status["mspt"]["avg"]))
+            while self._mspt and now - self._mspt[0][0] > MSPT_WINDOW:
+                self._mspt.popleft()
+            samples = sorted(value for _, value in self._mspt)
+            for q in QUANTILES:
+                out.add("minecraft_mspt_quantile", samples[min(int(q * len(samples)), len(samples) - 1)],
+                        f"Quantiles of the 5s tick time over the last {MSPT_WINDOW // 60} minutes (ms).",
+                        labels={"quantile": q})
+            out.add("minecraft_mspt_samples", len(samples), "MSPT samples behind the quantiles.")
+        players = status["players"]
+        out.add("minecraft_players_online", players["online"], "Players online.")
+        out.add("minecraft_players_max", players["max"], "Player slots.")
+        out.add("minecraft_entities", status.get("entities"), "Entities in loaded chunks.")
+        for world, chunks in status.get("chunks_by_world", {}).items():
+            out.add("minecraft_loaded_chunks", chunks, "Loaded chunks per world.", labels={"world": world})
+
+    async def _process(self, out: MetricWriter, pid: int):
+        proc = Path(f"/proc/{pid}")
+        try:
+            fields = dict(line.split(":", 1) for line in (proc / "status").read_text().splitlines() if ":" in line)
+            fds = len(os.listdir(proc / "fd"))
+        except OSError:
+            return  # exited between the status request and now
+        out.add("minecraft_jvm_resident_memory_bytes", int(fields["VmRSS"].split()[0]) * 1024,
+                "Resident memory of the Java process.")
+        out.add("minecraft_jvm_threads", int(fields["Threads"]), "Threads of the Java process.")
+        out.add("minecraft_jvm_open_fds", fds, "Open file descriptors of the Java process.")
+        ticks = process_cpu_ticks(pid)
+        if ticks is not None:
+            out.add("minecraft_jvm_cpu_seconds_total", round(ticks / os.sysconf("SC_CLK_TCK"), 2),
+                    "CPU time used by the Java process.", kind="counter")
+        if pid != self._jvm_pid or time.monotonic() - self._jvm_at > JCMD_INTERVAL:
+            self._jvm = await jvm_counters(pid)
+            self._jvm_pid, self._jvm_at = pid, time.monotonic()
+        out.add("minecraft_jvm_heap_used_bytes", self._jvm.get("heap_used"), "Java heap in use.")
+        out.add("minecraft_jvm_heap_capacity_bytes", self._jvm.get("heap_capacity"), "Java heap committed.")
+        for collector, (count, seconds) in self._jvm.get("gc", {}).items():
+            out.add("minecraft_jvm_gc_collections_total", count, "Garbage collections.",
+                    kind="counter", labels={"collector": collector})
+            out.add("minecraft_jvm_gc_seconds_total", seconds, "Time spent in garbage collection.",
+                    kind="counter", labels={"collector": collector})
+
+    async def heap_used_mb(self, pid: int) -> float | None:
+        """Heap in use from the last jcmd attach, so metrics.Collector doesn't start its own."""
+        if pid != self._jvm_pid or "heap_used" not in self._jvm or time.monotonic() - self._jvm_at > 2 * JCMD_INTERVAL:
+            return None
+        return self._jvm["heap_used"] / (1024 * 1024)
+
+    def _host(self, out: MetricWriter):
+        for zone in sorted(glob.glob("/sys/class/thermal/thermal_zone*")):
+            try:
+                temp = int(Path(zone, "temp").read_text()) / 1000
+                kind = Path(zone, "type").read_text().strip()
+            except (OSError, ValueError):
+                continue
+            out.add("minecraft_host_temperature_celsius", temp, "Thermal zone temperature.",
+                    labels={"zone": kind})
+        throttled = read_throttled()
+        if throttled is not None:
+            out.add("minecraft_host_throttled_raw", throttled, "vcgencmd get_throttled bit mask.")
+            for bit, flag in THROTTLE_FLAGS.items():
+                out.add("minecraft_host_throttled", (throttled >> bit) & 1,
+                        "Raspberry Pi throttling flags (1 = set).", labels={"flag": flag})
+        for cpu in sorted(glob.glob("/sys/devices/system/cpu/cpu[0-9]*/cpufreq/scaling_cur_freq")):
+            try:
+                out.add("minecraft_host_cpu_frequency_hertz", int(Path(cpu).read_text()) * 1000,
+                        "Current CPU frequency.", labels={"cpu": cpu.split("/")[5]})
+            except (OSError, ValueError):
+                continue
+        for window, load in zip(("1m", "5m", "15m"), os.getloadavg()):
+            out.add("minecraft_host_load", round(load, 2), "Load average.", labels={"window": window})
+        try:
+            meminfo = dict(line.split(":", 1) for line in Path("/proc/meminfo").read_text().splitlines())
+            out.add("minecraft_host_memory_total_bytes", int(meminfo["MemTotal"].split()[0]) * 1024, "Host memory.")
+            out.add("minecraft_host_memory_available_bytes", int(meminfo["MemAvailable"].split()[0]) * 1024,
+                    "Memory available for new processes.")
+        except (OSError, KeyError, ValueError):
+            pass
+        disk = shutil.disk_usage(SERVER_DIR)
+        out.add("minecraft_host_disk_free_bytes", disk.free, "Free space on the server's filesystem.")
+        out.add("minecraft_host_disk_total_bytes", disk.total, "Size of the server's filesystem.")
+
+    def _updates(self, out: MetricWriter):
+        for script, run in load_update_runs().items():
+            labels = {"script": script}
+            out.add("minecraft_update_last_duration_seconds", run.get("seconds"),
+                    "Duration of the last run of an update script.", labels=labels)
+            out.add("minecraft_update_last_exit_code", run.get("exit_code"),
+                    "Exit code of the last run of an update script.", labels=labels)
+            out.add("minecraft_update_last_run_timestamp_seconds", run.get("finished"),
+                    "When an update script last finished.", labels=labels)
+
+    def _bluemap(self, out: MetricWriter):
+        state = load_scheduler_state()
+        for mode, seconds in state.get("seconds", {}).items():
+            out.add("minecraft_bluemap_render_seconds_total", round(seconds, 1),
+                    "Time BlueMap rendering spent in each scheduler mode.", "counter", {"mode": mode})
+        if state.get("mode"):
+            for mode in state.get("seconds", {}):
+                out.add("minecraft_bluemap_render_mode", int(mode == state["mode"]),
+                        "Current BlueMap scheduler mode (1 for the active one).", labels={"mode": mode})
+        out.add("minecraft_bluemap_pending_tasks", state.get("pending"), "Render tasks queued in BlueMap.")
+        out.add("minecraft_bluemap_last_full_update_timestamp_seconds", state.get("last_full_update"),
+                "When the scheduler last queued a full map update.")
+
+    async def run(self):
+        """Refreshes forever."""
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:  # a bad refresh must not stop the exporter
+                print(f"exporter: refresh failed: {e}", file=sys.stderr)
+            await asyncio.sleep(self.interval)
+
+    async def handle(self, reader, writer):
+        """Minimal HTTP/1.1: GET /metrics returns the cached text."""
+        try:
+            request_line = (await asyncio.wait_for(reader.readline(), 10)).decode("latin-1").split()
+            while (await asyncio.wait_for(reader.readline(), 10)).strip():
+                pass  # headers are not needed
+            path = request_line[1] if len(request_line) > 1 else "/"
+            if request_line[:1] != ["GET"]:
+                status, body, content_type = "405 Method Not Allowed", "GET only\n", "text/plain"
+            elif path.split("?")[0] == "/metrics":
+                status, body, content_type = "200 OK", self.text, "text/plain; version=0.0.4; charset=utf-8"
+            elif path == "/":
+                status, body, content_type = "200 OK", '<a href="/metrics">metrics</a>\n', "text/html"
+            else:
+                status, body, content_type = "404 Not Found", "not found\n", "text/plain"
+            data = body.encode("utf-8")
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                         f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode("latin-1") + data)
+            await writer.drain()
+        except (OSError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = EXPORTER_HOST, port: int = EXPORTER_PORT):
+        """Starts the refresh task and the HTTP server; runs until cancelled."""
+        refresher = asyncio.create_task(self.run())
+        server = await asyncio.start_server(self.handle, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            refresher.cancel()
+
+# --- Functions ---
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def read_throttled() -> int | None:
+    """Raspberry Pi throttling bit mask from 'vcgencmd get_throttled' (None elsewhere)."""
+    if shutil.which("vcgencmd") is None:
+        return None
+    try:
+        output = subprocess.run(["vcgencmd", "get_throttled"], capture_output=True, text=True, timeout=5).stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    match = re.search(r"throttled=(0x[0-9a-fA-F]+)", output)
+    return int(match.group(1), 16) if match else None
+
+
+async def jvm_counters(pid: int) -> dict:
+    """
+    Heap and GC figures from 'jcmd PID PerfCounter.print'. The attach API works
+    even with -XX:+PerfDisableSharedMem, which only hides the counters from jstat.
+    """
+    try:
+        process = await asyncio.create_subprocess_exec(
+            "jcmd", str(pid), "PerfCounter.print",
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+    except OSError:
+        return {}
+    try:
+        output, _ = await asyncio.wait_for(process.communicate(), JCMD_TIMEOUT)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        return {}
+    return parse_perf_counters(output.decode("utf-8", errors="replace"))
+
+
+def parse_perf_counters(text: str) -> dict:
+    counters = {name: int(number) if number else string for name, string, number in PERF_COUNTER_RE.findall(text)}
+    frequency = counters.get("sun.os.hrt.frequency") or 1_000_000_000
+    result = {"gc": {}}
+    for name, value in counters.items():
+        match = re.fullmatch(r"sun\.gc\.collector\.(\d+)\.invocations", name)
+        if match:
+            prefix = f"sun.gc.collector.{match.group(1)}"
+            collector = counters.get(f"{prefix}.name") or match.group(1)
+            result["gc"][collector] = (value, round(counters.get(f"{prefix}.time", 0) / frequency, 3))
+    used = [value for name, value in counters.items()
+            if re.fullmatch(r"sun\.gc\.generation\.\d+\.space\.\d+\.used", name)]
+    capacity = [value for name, value in counters.items()
+                if re.fullmatch(r"sun\.gc\.generation\.\d+\.capacity", name)]
+    if used:
+        result["heap_used"] = sum(used)
+    if capacity:
+        result["heap_capacity"] = sum(capacity)
+    return result
+
+
+def load_update_runs() -> dict:
+    try:
+        return json.loads(UPDATE_RUNS_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def record_update_run(script: str, seconds: float, exit_code: int):
+    """Stores the last run of an update script atomically."""
+    runs = load_update_runs()
+    runs[script] = {"seconds": round(seconds, 3), "exit_code": exit_code, "finished": round(time.time())}
+    UPDATE_RUNS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=UPDATE_RUNS_FILE.parent, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(runs, f, indent=2)
+    os.replace(tmp_path, UPDATE_RUNS_FILE)
+
+
+def standalone_exporter() -> tuple[Exporter, RconClient | None]:
+    """An Exporter with its own RCON connection (when the bot isn't hosting it)."""
+    try:
+        client = RconClient(*read_rcon_settings())
+    except RconError as e:
+        print(f"exporter: {e}; only process and host metrics", file=sys.stderr)
+        client = None
+
+    async def fetch_status():
+        if client is None:
+            raise RconError("RCON not configured")
+        return await server_status(client)
+
+    return Exporter(fetch_status), client
+
+# --- Main ---
+
+async def _serve(host: str, port: int) -> int:
+    exporter, client = standalone_exporter()
+    print(f"Serving metrics on http://{host}:{port}/metrics")
+    try:
+        await exporter.serve(host, port)
+    finally:
+        if client is not None:
+            await client.close()
+    return 0
+
+
+async def _dump() -> int:
+    exporter, client = standalone_exporter()
+    try:
+        await exporter.refresh()
+    finally:
+        if client is not None:
+            await client.close()
+    sys.stdout.write(exporter.text)
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Prometheus metrics for the Minecraft server.")
+    sub = parser.add_subparsers(dest="action", required=True)
+    serve_parser = sub.add_parser("serve", help="serve /metrics")
+    serve_parser.add_argument("--host", default=EXPORTER_HOST)
+    serve_parser.add_argument("--port", type=int, default=EXPORTER_PORT)
+    sub.add_parser("dump", help="print the metrics once")
+    record_parser = sub.add_parser("record", help="store the last run of an update script")
+    record_parser.add_argument("script")
+    record_parser.add_argument("seconds", type=float)
+    record_parser.add_argument("exit_code", type=int, nargs="?", default=0)
+    args = parser.parse_args()
+
+    if args.action == "record":
+        record_update_run(args.script, args.seconds, args.exit_code)
+        return 0
+    try:
+        if args.action == "dump":
+            return asyncio.run(_dump())
+        return asyncio.run(_serve(args.host, args.port))
+    except KeyboardInterrupt:
+        return 0
+    except OSError as e:
+        print(f"exporter: {e}", file=sys.stderr)
+        return 1
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+
+# Requires: pip install requests
+
+"""
+On-disk cache for the JSON metadata we fetch from Hangar and Spiget.
+
+Each URL is stored as a small JSON file together with its ETag/Last-Modified
+validators. Inside the TTL the cached body is returned without touching the
+network; after that the request is revalidated with If-None-Match /
+If-Modified-Since, so an unchanged resource only costs a 304.
+
+It is used as a module by update-plugins.py/plugin_resolver.py and as a
+command from shell scripts:
+
+    http_cache.py get URL      # prints the (possibly cached) body
+    http_cache.py stats        # prints the hit/miss counts of the run
+    http_cache.py clear        # removes every cached entry
+
+A shell script can export HTTP_CACHE_STATS with a temporary file path; every
+`get` appends its outcome there and `stats` summarises them at the end.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import threading
+import requests
+from pathlib import Path
+
+# --- Configuration ---
+# Directory where cached responses are kept (relative to the server root)
+CACHE_DIR = Path(os.environ.get("HTTP_CACHE_DIR", ".cache/http"))
+# Seconds during which a cached response is served without revalidation
+DEFAULT_TTL = int(os.environ.get("HTTP_CACHE_TTL", 6 * 3600))
+# Seconds to wait for the remote API before giving up on a request
+HTTP_TIMEOUT = 30
+# Status codes worth caching: successful bodies and "not found" answers
+CACHEABLE_STATUS = (200, 404)
+
+# Outcome labels, in the order they are reported
+OUTCOMES = ("fresh", "revalidated", "miss", "stale", "error")
+
+# --- Classes ---
+
+class CachedResponse:
+    """Minimal response object mirroring the parts of requests.Response the updaters use."""
+
+    def __init__(self, url: str, status_code: int, text: str, outcome: str):
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+        # One of OUTCOMES: how this response was obtained
+        self.outcome = outcome
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}")
+
+
+class HttpCache:
+    """
+    Conditional-request cache for JSON API calls, safe to share between threads.
+
+    Args:
+        cache_dir (Path): Directory holding one file per cached URL.
+        ttl (int): Seconds a response is considered fresh.
+        enabled (bool): When False every call goes straight to the network.
+    """
+
+    def __init__(self, cache_dir: Path = CACHE_DIR, ttl: int = DEFAULT_TTL, enabled: bool = True):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.enabled = enabled
+        self.stats = dict.fromkeys(OUTCOMES, 0)
+        self._lock = threading.Lock()
+
+    def _entry_path(self, url: str) -> Path:
+        return self.cache_dir / (hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def _load(self, url: str) -> dict | None:
+        try:
+            with open(self._entry_path(url), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            return entry if entry.get("url") == url else None
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, url: str, entry: dict):
+        """Writes an entry atomically, so concurrent readers never see half a file."""
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._entry_path(url))
+        except OSError:
+            # A cache that can't be written only costs a full request next time
+            pass
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def get(self, session, url: str, timeout: int = HTTP_TIMEOUT) -> CachedResponse:
+        """
+        Fetches a URL through the cache.
+
+        Args:
+            session: A requests.Session (or the requests module) used for network calls.
+            url (str): The URL to fetch.
+            timeout (int): Request timeout in seconds.
+
+        Returns:
+            CachedResponse: The response, either from disk or from the network.
+
+        Raises:
+            requests.exceptions.RequestException: On network errors when no cached copy exists.
+        """
+        if not self.enabled:
+            response = session.get(url, timeout=timeout)
+            self._count("miss")
+            return CachedResponse(url, response.status_code, response.text, "miss")
+
+        entry = self._load(url)
+        now = time.time()
+        if entry and now - entry["fetched_at"] < self.ttl:
+            self._count("fresh")
+            return CachedResponse(url, entry["status"], entry["body"], "fresh")
+
+        headers = {}
+        if entry and entry["status"] == 200:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            response = session.get(url, headers=headers, timeout=timeout)
+        except requests.exceptions.RequestException:
+            if entry is None:
+                self._count("error")
+                raise
+            # Serve the stale copy rather than failing on a flaky connection
+            self._count("stale")
+            return CachedResponse(url, entry["status"], entry["body"], "stale")
+
+        if response.status_code == 304 and entry:
+            entry["fetched_at"] = now
+            self._store(url, entry)
+            self._count("revalidated")
+            return CachedResponse(url, entry["status"], entry["body"], "revalidated")
+
+        if response.status_code in CACHEABLE_STATUS:
+            self._store(url, {
+                "url": url,
+                "status": response.status_code,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "fetched_at": now,
+                "body": response.text,
+            })
+            outcome = "miss"
+        else:
+            outcome = "error"
+        self._count(outcome)
+        return CachedResponse(url, response.status_code, response.text, outcome)
+
+    def clear(self) -> int:
+        """Removes every cached entry and returns how many were deleted."""
+        removed = 0
+        for entry_path in self.cache_dir.glob("*.json"):
+            try:
+                entry_path.unlink()
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def summary(self) -> str:
+        """Returns a one-line hit/miss report."""
+        return format_stats(self.stats)
+
+# --- Functions ---
+
+def format_stats(stats: dict) -> str:
+    """Formats outcome counts as a one-line report."""
+    requests_saved = stats.get("fresh", 0)
+    bodies_saved = stats.get("revalidated", 0)
+    parts = ", ".join(f"{outcome} {stats.get(outcome, 0)}" for outcome in OUTCOMES)
+    return (f"HTTP cache: {parts} "
+            f"({requests_saved} requests and {requests_saved + bodies_saved} downloads avoided)")
+
+
+def record_outcome(outcome: str):
+    """Appends an outcome to the file named by HTTP_CACHE_STATS, if set."""
+    stats_file = os.environ.get("HTTP_CACHE_STATS")
+    if not stats_file:
+        return
+    try:
+        with open(stats_file, "a", encoding="utf-8") as f:
+            f.write(outcome + "\n")
+    except OSError:
+        pass
+
+
+def read_recorded_stats() -> dict:
+    """Counts the outcomes recorded in HTTP_CACHE_STATS."""
+    stats = dict.fromkeys(OUTCOMES, 0)
+    stats_file = os.environ.get("HTTP_CACHE_STATS")
+    if stats_file and os.path.exists(stats_file):
+        with open(stats_file, "r", encoding="utf-8") as f:
+            for line in f:
+                outcome = line.strip()
+                if outcome in stats:
+                    stats[outcome] += 1
+    return stats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Cached HTTP GET for plugin metadata APIs.")
+    parser.add_argument("--ttl", type=int, default=DEFAULT_TTL, help=f"seconds a response stays fresh (default: {DEFAULT_TTL})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    get_parser = sub.add_parser("get", help="print the body of URL, using the cache")
+    get_parser.add_argument("url")
+    sub.add_parser("stats", help="print the outcomes recorded in $HTTP_CACHE_STATS")
+    sub.add_parser("clear", help="remove every cached entry")
+    args = parser.parse_args()
+
+    cache = HttpCache(ttl=args.ttl)
+
+    if args.command == "stats":
+        print(format_stats(read_recorded_stats()))
+        return 0
+    if args.command == "clear":
+        print(f"Removed {cache.clear()} cached entries from {cache.cache_dir}.")
+        return 0
+
+    try:
+        response = cache.get(requests, args.url)
+    except requests.exceptions.RequestException as e:
+        record_outcome("error")
+        print(f"http_cache: {e}", file=sys.stderr)
+        return 1
+    record_outcome(response.outcome)
+    if response.status_code >= 400:
+        # Same exit code as `curl -f` on HTTP errors
+        print(f"http_cache: HTTP {response.status_code} for {args.url}", file=sys.stderr)
+        return 22
+    sys.stdout.write(response.text)
+    return 0
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
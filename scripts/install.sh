@@ -26,35 +26,21 @@ fi
 # Configurar Java predeterminado (opcional)
 #sudo update-alternatives --config java
 
-# Descargar el archivo JAR de PaperMC (última build de la versión)
+# Descargar el JAR de PaperMC (última build de la versión), verificado con el
+# SHA-256 de la API y guardado en .cache/paper/ con paper.jar como enlace.
+# Ver paper_builds.py (también lo usa update-paper.sh).
 echo -e "${GREEN}[+] Downloading latest PaperMC server jar...${NC}"
 VERSION="1.21.1"
-API_URL="https://api.papermc.io/v2/projects/paper/versions/${VERSION}/builds"
-
-# 1) Descargamos el JSON de builds
-JSON=$(wget -qO- "$API_URL")
-
-# 2) Extraemos el nombre del último JAR (p.ej. paper-1.21.1-128.jar)
-JAR_NAME=$(echo "$JSON" \
-  | grep -Po '"name":"\Kpaper-'${VERSION}'-[0-9]+\.jar' \
-  | tail -n1)
-
-# 3) Obtenemos el número de build
-BUILD_NUM=$(echo "$JAR_NAME" \
-  | sed -E "s/paper-${VERSION}-([0-9]+)\.jar/\1/")
-
-# Validación rápida
-if [[ -z "$JAR_NAME" || -z "$BUILD_NUM" ]]; then
-  echo -e "${RED}[!] Error: no se pudo determinar el JAR o el build.${NC}"
+if ! python3 -c "import requests" &>/dev/null; then
+  sudo apt install -y python3-requests
+fi
+python3 "$(dirname "${BASH_SOURCE[0]}")/paper_builds.py" update --version "$VERSION"
+update_rc=$?
+if [[ "$update_rc" != "0" && "$update_rc" != "3" ]]; then
+  echo -e "${RED}[!] Error: no se pudo descargar Paper ${VERSION}.${NC}"
   exit 1
 fi
 
-# 4) Construimos la URL y descargamos
-DOWNLOAD_URL="https://api.papermc.io/v2/projects/paper/versions/${VERSION}/builds/${BUILD_NUM}/downloads/${JAR_NAME}"
-wget -qO "paper.jar" "$DOWNLOAD_URL"
-
-echo -e "${GREEN}[+] Downloaded ${JAR_NAME}${NC}"
-
 # Aceptar el EULA
 echo "eula=true" > "eula.txt"
 
@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+
+"""
+Streaming lag detector on the server log.
+
+Follows logs/latest.log as it is written (inotify, with a polling fallback),
+remembers the read offset in .cache/ so nothing is parsed twice across
+restarts, and survives Paper's rotation (latest.log is gzipped away and
+recreated on every boot). Each line is parsed for lag signals:
+
+    - "Can't keep up! ... Running 5023ms or 100 ticks behind"
+    - watchdog "The server has not responded for N seconds!" thread dumps
+      (the first plugin frame of the main thread is the suspect)
+    - slow or failed chunk loads
+    - plugin exceptions (events, scheduled tasks, commands, enable/disable)
+
+Events are aggregated over a sliding window and turned into alerts with the
+worst offender; each kind of alert has a cooldown so a bad minute produces one
+message, not fifty. The Telegram bot runs watch() in the background; from the
+command line:
+
+    log_watch.py follow [--from-start]   # print alerts as they happen
+    log_watch.py scan [FILE]             # summarise the events of a log file
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import ctypes
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+from collections import deque, Counter
+from dataclasses import dataclass
+
+# --- Configuration ---
+LATEST_LOG = Path("logs/latest.log")
+OFFSETS_FILE = Path(".cache/log-offsets.json")
+# Seconds between forced checks when no inotify event arrives (and the polling interval without inotify)
+POLL_INTERVAL = 5
+# Seconds between offset saves while lines keep arriving
+SAVE_INTERVAL = 10
+# Sliding window the alerts look at (seconds)
+WINDOW = 120
+# Seconds before the same kind of alert can be sent again
+ALERT_COOLDOWN = 600
+# Alert thresholds inside the window
+LAG_ALERT_MS = 5000         # total time behind reported by "Can't keep up!"
+LAG_SINGLE_ALERT_MS = 10000  # one report this bad alerts on its own
+CHUNK_ALERTS = 5
+EXCEPTION_ALERTS = 3
+# Lines of a watchdog dump inspected for the suspect plugin
+DUMP_LINES = 60
+
+# [12:34:56] [Server thread/WARN]: message   (also [12:34:56 WARN]: message)
+LINE_RE = re.compile(r"^\[(?P<time>\d{2}:\d{2}:\d{2})(?: (?P<console_level>[A-Z]+))?\](?: \[(?P<thread>[^\]]*)/(?P<level>[A-Z]+)\])?:? (?P<message>.*)$")
+LAG_RE = re.compile(r"Can't keep up! Is the server overloaded\? Running (\d+)ms or (\d+) ticks behind")
+WATCHDOG_RE = re.compile(r"The server has not responded for (\d+) seconds!")
+WATCHDOG_STOPPED_RE = re.compile(r"The server has stopped responding!")
+DUMP_THREAD_RE = re.compile(r"(?:Current )?Thread: (.+)")
+# Dump frames look like "MyPlugin-1.0.jar//com.foo.Bar.run(Bar.java:42)", exception
+# frames like "at com.foo.Bar.run(Bar.java:42) ~[MyPlugin-1.0.jar:?]"
+STACK_JAR_RE = re.compile(r"([\w.+-]+?\.jar)//|~\[([^\]:]+?\.jar)")
+CHUNK_SLOW_RE = re.compile(r"[Cc]hunk.*?(\d+(?:\.\d+)?)\s*ms|took (\d+(?:\.\d+)?)\s*ms.*[Cc]hunk")
+CHUNK_ERROR_RE = re.compile(r"(?:Failed to|Couldn't|Could not|Unable to) (?:read|load|save|write) chunk|[Cc]hunk file at .+ is in the wrong location|[Cc]orrupt(?:ed)? chunk")
+PLUGIN_EXCEPTION_RES = (
+    re.compile(r"Could not pass event (?P<what>\S+) to (?P<plugin>\S+)"),
+    re.compile(r"Task #\d+ for (?P<plugin>\S+) .*generated an exception"),
+    re.compile(r"Error occurred while (?P<what>enabling|disabling) (?P<plugin>\S+)"),
+    re.compile(r"Unhandled exception executing command '(?P<what>[^']*)' in plugin (?P<plugin>\S+)"),
+    re.compile(r"Exception (?:when|while) .* (?:for|in|from) plugin (?P<plugin>\S+)"),
+)
+# Jars that are never the suspect of a watchdog dump
+SERVER_JARS = re.compile(r"^(?:paper|spigot|bukkit|craftbukkit|server|minecraft|java\.base|patched|mojang|fastutil|guava|netty|datafixerupper|brigadier).*", re.IGNORECASE)
+
+# inotify flags (linux/inotify.h)
+IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO = 0x2, 0x8, 0x40, 0x80
+IN_CREATE, IN_DELETE, IN_DELETE_SELF, IN_MOVE_SELF = 0x100, 0x200, 0x400, 0x800
+
+# --- Classes ---
+
+@dataclass
+class LogEvent:
+    """One lag signal found in the log."""
+    kind: str                   # lag | watchdog | chunk | exception
+    message: str
+    value: float = 0.0          # ms behind, seconds unresponsive or chunk-load ms
+    offender: str | None = None  # plugin (or jar) to blame, when known
+
+
+@dataclass
+class Alert:
+    kind: str
+    text: str
+
+
+class Inotify:
+    """
+    Minimal inotify watch on a directory through libc, readable from asyncio.
+
+    Raises:
+        OSError: If inotify isn't available (not Linux, or out of watches).
+    """
+
+    def __init__(self, directory: Path):
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"can't watch {directory}")
+
+    def drain(self):
+        """Discards pending events; the follower re-checks the file itself."""
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+
+    async def wait(self, timeout: float):
+        """Returns when something changed in the directory or after 'timeout' seconds."""
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+        loop.add_reader(self.fd, changed.set)
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(self.fd)
+        self.drain()
+
+    def close(self):
+        os.close(self.fd)
+
+
+class LogFollower:
+    """
+    Yields the complete lines appended to a log file, across rotations and restarts.
+
+    Args:
+        path (Path): Log file to follow.
+        offsets_file (Path): Where the read offset is saved.
+        from_start (bool): Read a file seen for the first time from the beginning
+                           instead of from its end.
+    """
+
+    def __init__(self, path: Path = LATEST_LOG, offsets_file: Path = OFFSETS_FILE, from_start: bool = False):
+        self.path = Path(path)
+        self.offsets_file = Path(offsets_file)
+        self.from_start = from_start
+        self._file = None
+        self._inode = None
+        self._offset = 0      # end of the last complete line read
+        self._partial = b""
+        self._saved_at = 0.0
+
+    def _load_offset(self) -> dict:
+        try:
+            return json.loads(self.offsets_file.read_text(encoding="utf-8")).get(str(self.path), {})
+        except (OSError, ValueError):
+            return {}
+
+    def save_offset(self):
+        """Writes the offset atomically, next to the offsets of other followed files."""
+        if self._inode is None:
+            return
+        try:
+            offsets = json.loads(self.offsets_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            offsets = {}
+        offsets[str(self.path)] = {"inode": self._inode, "offset": self._offset}
+        self.offsets_file.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.offsets_file.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(offsets, f, indent=2)
+        os.replace(tmp_path, self.offsets_file)
+        self._saved_at = time.monotonic()
+
+    def _open(self, rotated: bool) -> bool:
+        """Opens the current file; resumes at the saved offset when it is the same file."""
+        try:
+            handle = open(self.path, "rb")
+        except FileNotFoundError:
+            return False
+        st = os.fstat(handle.fileno())
+        saved = self._load_offset()
+        if rotated or self.from_start:
+            offset = 0
+        elif saved.get("inode") == st.st_ino and saved.get("offset", 0) <= st.st_size:
+            offset = saved["offset"]
+        elif saved:
+            offset = 0  # rotated while we weren't watching
+        else:
+            offset = st.st_size  # first run: don't replay old history as fresh alerts
+        handle.seek(offset)
+        self._file, self._inode, self._offset, self._partial = handle, st.st_ino, offset, b""
+        return True
+
+    def _read(self) -> list[str]:
+        data = self._file.read()
+        if not data:
+            return []
+        *complete, self._partial = (self._partial + data).split(b"\n")
+        self._offset += sum(len(line) + 1 for line in complete)
+        return [line.decode("utf-8", errors="replace").rstrip("\r") for line in complete]
+
+    def _rotated(self) -> bool:
+        """True when the path now names a different or truncated file."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False  # keep reading the old handle until the new file appears
+        return st.st_ino != self._inode or st.st_size < self._offset + len(self._partial)
+
+    def poll(self) -> list[str]:
+        """Returns the lines written since the last call (handles rotation)."""
+        if self._file is None and not self._open(rotated=False):
+            return []
+        lines = self._read()
+        if self._rotated():
+            lines += self._read()  # whatever was written before the switch
+            self._file.close()
+            self._file = None
+            if self._open(rotated=True):
+                lines += self._read()
+        if lines and time.monotonic() - self._saved_at > SAVE_INTERVAL:
+            self.save_offset()
+        return lines
+
+    async def lines(self):
+        """Async generator of new lines; waits on inotify, or polls without it."""
+        watcher = None
+        try:
+            while True:
+                if watcher is None and self.path.parent.is_dir():
+                    try:
+                        watcher = Inotify(self.path.parent)
+                    except OSError:
+                        watcher = False  # polling only
+                for line in self.poll():
+                    yield line
+                if watcher:
+                    await watcher.wait(POLL_INTERVAL)
+                else:
+                    await asyncio.sleep(POLL_INTERVAL if watcher is None else 1)
+        finally:
+            self.save_offset()
+            if watcher:
+                watcher.close()
+            if self._file is not None:
+                self._file.close()
+
+
+class LogParser:
+    """
+    Turns log lines into LogEvents. A watchdog event is only returned once its
+    thread dump has been read, so it carries the suspect plugin.
+    """
+
+    def __init__(self):
+        self._dump = None  # {"event", "lines_left", "main_thread", "stack"} while reading a dump
+
+    def feed(self, line: str) -> list[LogEvent]:
+        match = LINE_RE.match(line)
+        message = match.group("message") if match else line
+        events = []
+        if self._dump is not None:
+            if self._in_dump(match):
+                if self._read_dump(message):
+                    events.append(self.flush())
+                return events
+            events.append(self.flush())
+        if (m := LAG_RE.search(message)):
+            events.append(LogEvent("lag", f"{m.group(1)}ms / {m.group(2)} ticks behind", float(m.group(1))))
+        elif (m := WATCHDOG_RE.search(message)) or WATCHDOG_STOPPED_RE.search(message):
+            event = LogEvent("watchdog", message.strip(), float(m.group(1)) if m else 0.0)
+            self._dump = {"event": event, "lines_left": DUMP_LINES, "main_thread": False, "stack": False}
+        elif CHUNK_ERROR_RE.search(message):
+            events.append(LogEvent("chunk", message.strip()))
+        elif (m := CHUNK_SLOW_RE.search(message)) and _level(match) == "WARN":
+            events.append(LogEvent("chunk", message.strip(), float(m.group(1) or m.group(2))))
+        else:
+            for regex in PLUGIN_EXCEPTION_RES:
+                if (m := regex.search(message)):
+                    events.append(LogEvent("exception", message.strip(), offender=m.group("plugin")))
+                    break
+        return events
+
+    def flush(self) -> LogEvent | None:
+        """Ends a dump in progress and returns its watchdog event."""
+        dump, self._dump = self._dump, None
+        return dump["event"] if dump else None
+
+    def _in_dump(self, match) -> bool:
+        """The dump is logged at ERROR by the watchdog thread; anything else ends it."""
+        if self._dump["lines_left"] <= 0:
+            return False
+        if match is None:
+            return True
+        if match.group("thread"):
+            return "Watchdog" in match.group("thread")
+        return _level(match) == "ERROR"
+
+    def _read_dump(self, message: str) -> bool:
+        """Blames the first plugin frame of the server thread. True when the dump is over."""
+        dump = self._dump
+        dump["lines_left"] -= 1
+        if (m := DUMP_THREAD_RE.search(message)):
+            dump["main_thread"] = m.group(1).strip() == "Server thread"
+        elif (m := STACK_JAR_RE.search(message)):
+            dump["stack"] = True
+            jar = m.group(1) or m.group(2)
+            if dump["main_thread"] and dump["event"].offender is None and not SERVER_JARS.match(jar):
+                dump["event"].offender = jar[:-len(".jar")]
+        # The main thread's stack is closed by a separator line
+        return dump["stack"] and message.strip().startswith("---")
+
+
+class LagDetector:
+    """
+    Aggregates events over a sliding window and emits rate-limited alerts.
+
+    Args:
+        window (float): Seconds of history the thresholds look at.
+        cooldown (float): Seconds before the same kind of alert is sent again.
+    """
+
+    def __init__(self, window: float = WINDOW, cooldown: float = ALERT_COOLDOWN):
+        self.window = window
+        self.cooldown = cooldown
+        self.events: deque[tuple[float, LogEvent]] = deque()
+        self._last_alert: dict[str, float] = {}
+        self._suppressed: Counter = Counter()
+
+    def add(self, event: LogEvent, now: float | None = None) -> list[Alert]:
+        now = time.monotonic() if now is None else now
+        self.events.append((now, event))
+        while self.events and now - self.events[0][0] > self.window:
+            self.events.popleft()
+        alert = self._check(event)
+        if alert is None:
+            return []
+        last = self._last_alert.get(alert.kind)
+        if last is not None and now - last < self.cooldown:
+            self._suppressed[alert.kind] += 1
+            return []
+        self._last_alert[alert.kind] = now
+        suppressed = self._suppressed.pop(alert.kind, 0)
+        if suppressed:
+            alert.text += f"\n(+{suppressed} avisos similares silenciados)"
+        return [alert]
+
+    def _window(self, kind: str) -> list[LogEvent]:
+        return [event for _, event in self.events if event.kind == kind]
+
+    def _suspect(self) -> str | None:
+        """Plugin most blamed by dumps and exceptions in the window."""
+        blamed = Counter(event.offender for _, event in self.events if event.offender)
+        return blamed.most_common(1)[0][0] if blamed else None
+
+    def _check(self, event: LogEvent) -> Alert | None:
+        minutes = f"{self.window / 60:g} min"
+        if event.kind == "lag":
+            lags = self._window("lag")
+            total, worst = sum(e.value for e in lags), max(e.value for e in lags)
+            if total < LAG_ALERT_MS and worst < LAG_SINGLE_ALERT_MS:
+                return None
+            text = (f"🐢 Lag: {len(lags)} avisos \"Can't keep up\" en {minutes}, "
+                    f"{total / 1000:.1f}s de retraso en total (peor: {worst / 1000:.1f}s).")
+            if (suspect := self._suspect()):
+                text += f"\nSospechoso: {suspect}"
+            return Alert("lag", text)
+        if event.kind == "watchdog":
+            text = f"🧊 El servidor no responde: {event.message}"
+            if event.offender:
+                text += f"\nEl hilo principal estaba en: {event.offender}"
+            return Alert("watchdog", text)
+        if event.kind == "chunk":
+            chunks = self._window("chunk")
+            if len(chunks) < CHUNK_ALERTS:
+                return None
+            worst = max(chunks, key=lambda e: e.value)
+            text = f"🧱 {len(chunks)} avisos de carga de chunks en {minutes}. Peor: {worst.message[:200]}"
+            return Alert("chunk", text)
+        if event.kind == "exception":
+            counts = Counter(e.offender for e in self._window("exception"))
+            plugin, count = counts.most_common(1)[0]
+            if count < EXCEPTION_ALERTS:
+                return None
+            return Alert(f"exception:{plugin}", f"💥 {plugin}: {count} excepciones en {minutes}.\nÚltima: {event.message[:200]}")
+        return None
+
+# --- Functions ---
+
+def _level(match) -> str | None:
+    if match is None:
+        return None
+    return match.group("level") or match.group("console_level")
+
+
+async def watch(notify, path: Path = LATEST_LOG, from_start: bool = False):
+    """
+    Follows the log forever, awaiting notify(alert) for every alert.
+
+    Args:
+        notify (callable): Async function receiving an Alert.
+        path (Path): Log file to follow.
+        from_start (bool): Parse a file seen for the first time from its beginning.
+    """
+    parser, detector = LogParser(), LagDetector()
+    async for line in LogFollower(path, from_start=from_start).lines():
+        for event in parser.feed(line):
+            for alert in detector.add(event):
+                await notify(alert)
+
+
+def scan(path: Path) -> dict:
+    """Counts the events of a whole log file and the most blamed plugins."""
+    parser = LogParser()
+    kinds, offenders, lag_ms = Counter(), Counter(), []
+    events = []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            events.extend(parser.feed(line.rstrip("\n")))
+    if (pending := parser.flush()):
+        events.append(pending)
+    for event in events:
+        kinds[event.kind] += 1
+        if event.offender:
+            offenders[event.offender] += 1
+        if event.kind == "lag":
+            lag_ms.append(event.value)
+    return {
+        "events": dict(kinds),
+        "lag_total_ms": sum(lag_ms),
+        "lag_worst_ms": max(lag_ms, default=0),
+        "offenders": offenders.most_common(5),
+    }
+
+# --- Main ---
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Detects lag in the server log.")
+    sub = parser.add_subparsers(dest="action", required=True)
+    follow_parser = sub.add_parser("follow", help="print alerts as the log is written")
+    follow_parser.add_argument("--log", type=Path, default=LATEST_LOG)
+    follow_parser.add_argument("--from-start", action="store_true", help="parse a new file from its beginning")
+    scan_parser = sub.add_parser("scan", help="summarise the events of a log file")
+    scan_parser.add_argument("log", nargs="?", type=Path, default=LATEST_LOG)
+    args = parser.parse_args()
+
+    if args.action == "scan":
+        try:
+            summary = scan(args.log)
+        except OSError as e:
+            print(f"log_watch: {e}", file=sys.stderr)
+            return 1
+        print(json.dumps(summary, indent=2))
+        return 0
+
+    async def show(alert: Alert):
+        print(f"[{time.strftime('%H:%M:%S')}] {alert.text}", flush=True)
+
+    try:
+        asyncio.run(watch(show, args.log, args.from_start))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
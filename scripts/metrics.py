@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+# Requires: pip install matplotlib (only to draw graphs)
+
+"""
+Performance history of the server: TPS, MSPT, players, heap and JVM CPU.
+
+A collector samples the server every SAMPLE_INTERVAL seconds (RCON for
+TPS/MSPT/players, /proc for CPU, and for the heap the exporter's jcmd attaches,
+or its own every HEAP_INTERVAL without the bot) into a fixed-size, array-backed
+ring buffer. Every few samples the buffer is flushed to a SQLite
+file with three tiers: raw samples for two days, 5-minute averages for two
+weeks and hourly averages for a year. Downsampled rows keep the worst TPS and
+MSPT of their bucket, so short lag spikes stay visible in old data.
+
+The Telegram bot runs the collector in the background and answers
+/graph [1h|24h|7d]. From the command line:
+
+    metrics.py collect            # sample until Ctrl+C (when the bot isn't running)
+    metrics.py show [24h]         # averages and worst values of a period
+    metrics.py graph [24h] -o graph.png
+"""
+
+import io
+import os
+import re
+import sys
+import math
+import time
+import sqlite3
+import asyncio
+import argparse
+from array import array
+from pathlib import Path
+from datetime import datetime
+from rcon import RconClient, RconError, read_rcon_settings, server_status
+from supervisor import SupervisorError, async_request
+
+# --- Configuration ---
+METRICS_DB = Path(".cache/metrics.sqlite")
+# Seconds between samples
+SAMPLE_INTERVAL = 30
+# Samples kept in memory before they are written (10 x 30s = 5 min)
+FLUSH_SAMPLES = 10
+# Ring buffer capacity; samples beyond it are dropped if the disk can't be written
+BUFFER_SAMPLES = 240
+# Seconds jcmd may take to report the heap
+JCMD_TIMEOUT = 10
+# Seconds between the collector's own jcmd attaches (each one starts a JVM);
+# under the bot the exporter's cached figure is used instead
+HEAP_INTERVAL = 300
+FIELDS = ("tps", "mspt", "players", "heap_mb", "cpu")
+# (table, bucket seconds, retention seconds); each tier is built from the previous one
+TIERS = (
+    ("samples_raw", 0, 2 * 86400),
+    ("samples_5m", 300, 14 * 86400),
+    ("samples_1h", 3600, 400 * 86400),
+)
+# Finest tier a graph span may use (raw up to 6 h, 5 min up to 3 days)
+TIER_FOR_SPAN = ((6 * 3600, "samples_raw"), (3 * 86400, "samples_5m"), (math.inf, "samples_1h"))
+SPANS = {"1h": 3600, "6h": 6 * 3600, "24h": 86400, "3d": 3 * 86400, "7d": 7 * 86400, "30d": 30 * 86400}
+# MSPT above this means the server can't hold 20 TPS
+MSPT_BUDGET = 50
+HEAP_RE = re.compile(r"used (\d+)([KMG])")
+
+# --- Classes ---
+
+class SampleBuffer:
+    """
+    Fixed-capacity ring buffer of samples stored in typed arrays (no per-sample objects).
+
+    Args:
+        capacity (int): Samples kept; the oldest are overwritten when full.
+    """
+
+    def __init__(self, capacity: int = BUFFER_SAMPLES):
+        self.capacity = capacity
+        self.ts = array("q", [0] * capacity)
+        self.values = {field: array("d", [math.nan] * capacity) for field in FIELDS}
+        self.start = 0
+        self.count = 0
+
+    def append(self, ts: int, sample: dict):
+        index = (self.start + self.count) % self.capacity
+        if self.count == self.capacity:
+            self.start = (self.start + 1) % self.capacity
+        else:
+            self.count += 1
+        self.ts[index] = ts
+        for field in FIELDS:
+            value = sample.get(field)
+            self.values[field][index] = math.nan if value is None else value
+
+    def rows(self) -> list[tuple]:
+        """Buffered samples, oldest first, as (ts, tps, mspt, players, heap_mb, cpu)."""
+        rows = []
+        for i in range(self.count):
+            index = (self.start + i) % self.capacity
+            rows.append((self.ts[index], *(_none_if_nan(self.values[field][index]) for field in FIELDS)))
+        return rows
+
+    def clear(self):
+        self.start = self.count = 0
+
+
+class MetricsStore:
+    """
+    SQLite store with downsampled tiers. Each call opens its own connection,
+    so the store can be used from worker threads.
+
+    Args:
+        path (Path): Database file.
+    """
+
+    def __init__(self, path: Path = METRICS_DB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            for table, _, _ in TIERS:
+                db.execute(f"""CREATE TABLE IF NOT EXISTS {table} (
+                    ts INTEGER PRIMARY KEY, tps REAL, mspt REAL, players REAL, heap_mb REAL, cpu REAL,
+                    tps_min REAL, mspt_max REAL) WITHOUT ROWID""")
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def write(self, rows: list[tuple], now: float | None = None):
+        """Stores raw samples, refreshes the downsampled tiers and drops expired rows."""
+        if not rows:
+            return
+        now = time.time() if now is None else now
+        with self._connect() as db:
+            db.executemany("INSERT OR REPLACE INTO samples_raw VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                           [(*row, row[1], row[2]) for row in rows])
+            for (source, _, _), (table, bucket, _) in zip(TIERS, TIERS[1:]):
+                # Rebuild from the last (possibly incomplete) bucket onwards
+                (last,) = db.execute(f"SELECT COALESCE(MAX(ts), 0) FROM {table}").fetchone()
+                db.execute(f"""INSERT OR REPLACE INTO {table}
+                    SELECT ts / {bucket} * {bucket} AS bucket, AVG(tps), AVG(mspt), AVG(players),
+                           AVG(heap_mb), AVG(cpu), MIN(tps_min), MAX(mspt_max)
+                    FROM {source} WHERE ts >= ? GROUP BY bucket""", (last,))
+            for table, _, retention in TIERS:
+                db.execute(f"DELETE FROM {table} WHERE ts < ?", (int(now - retention),))
+
+    def series(self, span: float, now: float | None = None) -> list[tuple]:
+        """
+        Rows of the last 'span' seconds from the finest tier that covers them.
+
+        Returns:
+            list[tuple]: (ts, tps, mspt, players, heap_mb, cpu, tps_min, mspt_max), oldest first.
+        """
+        now = time.time() if now is None else now
+        table = next(table for limit, table in TIER_FOR_SPAN if span <= limit)
+        with self._connect() as db:
+            return db.execute(f"SELECT * FROM {table} WHERE ts >= ? ORDER BY ts", (int(now - span),)).fetchall()
+
+
+class Collector:
+    """
+    Samples the server periodically into a SampleBuffer and flushes it to a MetricsStore.
+
+    Args:
+        store (MetricsStore): Where samples end up.
+        fetch_status (callable): Async function returning rcon.server_status()
+                                 (the bot passes its cached status so both share queries).
+        interval (float): Seconds between samples.
+        fetch_heap (callable): Optional async function PID -> used heap in MB (the bot
+                               passes the exporter's); when it has nothing, the collector
+                               runs jcmd itself every HEAP_INTERVAL.
+    """
+
+    def __init__(self, store: MetricsStore, fetch_status, interval: float = SAMPLE_INTERVAL, fetch_heap=None):
+        self.store = store
+        self.fetch_status = fetch_status
+        self.interval = interval
+        self.fetch_heap = fetch_heap
+        self.buffer = SampleBuffer()
+        self._cpu = None  # (pid, cpu ticks, monotonic time) of the previous sample
+        self._heap = None  # (pid, heap MB, monotonic time) of the last own jcmd attach
+        self._lock = asyncio.Lock()
+
+    async def sample(self) -> dict | None:
+        """One sample, or None when the server isn't running."""
+        try:
+            pid = (await async_request("status"))["pid"]
+        except SupervisorError:
+            pid = None
+        if pid is None:
+            self._cpu = None
+            return None
+        heap = await self.fetch_heap(pid) if self.fetch_heap else None
+        sample = {"cpu": self._cpu_percent(pid), "heap_mb": heap if heap is not None else await self._own_heap(pid)}
+        try:
+            status = await self.fetch_status()
+        except RconError:
+            return sample  # booting: CPU and heap are still worth keeping
+        sample["tps"] = status["tps"][0] if status["tps"] else None
+        sample["mspt"] = status["mspt"]["avg"] if status["mspt"] else None
+        sample["players"] = status["players"]["online"]
+        return sample
+
+    async def _own_heap(self, pid: int) -> float | None:
+        """heap_used_mb(), reused between attaches for HEAP_INTERVAL."""
+        now = time.monotonic()
+        if self._heap is None or self._heap[0] != pid or now - self._heap[2] >= HEAP_INTERVAL:
+            self._heap = (pid, await heap_used_mb(pid), now)
+        return self._heap[1]
+
+    def _cpu_percent(self, pid: int) -> float | None:
+        """JVM CPU since the previous sample, as a percentage of the whole machine."""
+        ticks = process_cpu_ticks(pid)
+        now = time.monotonic()
+        previous, self._cpu = self._cpu, (pid, ticks, now) if ticks is not None else None
+        if ticks is None or previous is None or previous[0] != pid:
+            return None
+        elapsed = now - previous[2]
+        return 100 * (ticks - previous[1]) / os.sysconf("SC_CLK_TCK") / elapsed / (os.cpu_count() or 1)
+
+    async def flush(self):
+        """Writes the buffered samples (graphs call this first, so they include them)."""
+        async with self._lock:
+            rows = self.buffer.rows()
+            if not rows:
+                return
+            try:
+                await asyncio.to_thread(self.store.write, rows)
+            except sqlite3.Error as e:
+                print(f"metrics: can't write {self.store.path}: {e}", file=sys.stderr)
+                return  # kept in the ring buffer for the next attempt
+            self.buffer.clear()
+
+    async def run(self):
+        """Samples forever, aligned to the interval."""
+        try:
+            while True:
+                await asyncio.sleep(self.interval - time.time() % self.interval)
+                sample = await self.sample()
+                if sample is not None:
+                    self.buffer.append(int(time.time()), sample)
+                if self.buffer.count >= FLUSH_SAMPLES:
+                    await self.flush()
+        finally:
+            await self.flush()
+
+# --- Functions ---
+
+def _none_if_nan(value: float):
+    return None if math.isnan(value) else value
+
+
+def process_cpu_ticks(pid: int) -> int | None:
+    """User + system CPU time of a process in clock ticks, from /proc."""
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+    except OSError:
+        return None
+    fields = stat.rsplit(")", 1)[1].split()
+    return int(fields[11]) + int(fields[12])
+
+
+async def heap_used_mb(pid: int) -> float | None:
+    """Used Java heap via 'jcmd PID GC.heap_info' (works with -XX:+PerfDisableSharedMem)."""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            "jcmd", str(pid), "GC.heap_info",
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+    except OSError:
+        return None
+    try:
+        output, _ = await asyncio.wait_for(process.communicate(), JCMD_TIMEOUT)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        return None
+    match = HEAP_RE.search(output.decode("utf-8", errors="replace"))
+    if not match:
+        return None
+    return int(match.group(1)) / {"K": 1024, "M": 1, "G": 1 / 1024}[match.group(2)]
+
+
+def parse_span(text: str | None) -> tuple[str, int]:
+    """'24h' -> ('24h', 86400). Raises ValueError for unknown spans."""
+    label = (text or "24h").lower()
+    if label not in SPANS:
+        raise ValueError(f"unknown span '{text}' (use {', '.join(SPANS)})")
+    return label, SPANS[label]
+
+
+def summarize(rows: list[tuple]) -> dict:
+    """Averages and worst values of a series."""
+    def values(index):
+        return [row[index] for row in rows if row[index] is not None]
+
+    def average(index):
+        found = values(index)
+        return round(sum(found) / len(found), 2) if found else None
+
+    return {
+        "points": len(rows),
+        "tps_avg": average(1), "tps_min": min(values(6), default=None),
+        "mspt_avg": average(2), "mspt_max": max(values(7), default=None),
+        "players_avg": average(3), "players_max": max(values(3), default=None),
+        "heap_mb_avg": average(4), "cpu_avg": average(5),
+    }
+
+
+def render_graph(rows: list[tuple], label: str) -> bytes:
+    """Draws TPS, MSPT, players and heap/CPU panels. Returns a PNG."""
+    # matplotlib is only needed here and takes a while to import
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+
+    # A blank row where samples are missing (server stopped), so lines don't bridge the gap
+    steps = [b[0] - a[0] for a, b in zip(rows, rows[1:])]
+    gap = 3 * min(steps, default=SAMPLE_INTERVAL)
+    padded = []
+    for row in rows:
+        if padded and row[0] - padded[-1][0] > gap:
+            padded.append((padded[-1][0] + 1,) + (None,) * (len(row) - 1))
+        padded.append(row)
+    times = [datetime.fromtimestamp(row[0]) for row in padded]
+
+    def column(index):
+        return [math.nan if row[index] is None else row[index] for row in padded]
+
+    fig, axes = plt.subplots(4, 1, figsize=(9, 9), sharex=True)
+    fig.suptitle(f"Rendimiento del servidor ({label})")
+    tps, mspt, players, heap = axes
+    tps.plot(times, column(1), label="media", color="tab:green")
+    tps.plot(times, column(6), label="mínimo", color="tab:red", linewidth=0.7, alpha=0.7)
+    tps.set_ylim(0, 21)
+    tps.set_ylabel("TPS")
+    tps.legend(loc="lower left", fontsize="small")
+    mspt.plot(times, column(2), label="media", color="tab:blue")
+    mspt.plot(times, column(7), label="máximo", color="tab:red", linewidth=0.7, alpha=0.7)
+    mspt.axhline(MSPT_BUDGET, color="grey", linestyle="--", linewidth=0.8)
+    mspt.set_ylabel("MSPT")
+    mspt.legend(loc="upper left", fontsize="small")
+    players.step(times, column(3), where="post", color="tab:purple")
+    players.set_ylabel("Jugadores")
+    players.set_ylim(bottom=0)
+    heap.plot(times, column(4), color="tab:orange")
+    heap.set_ylabel("Heap (MB)")
+    heap.set_ylim(bottom=0)
+    cpu = heap.twinx()
+    cpu.plot(times, column(5), color="tab:gray", linewidth=0.7)
+    cpu.set_ylabel("CPU JVM (%)")
+    cpu.set_ylim(0, 100)
+    heap.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M" if SPANS[label] <= 86400 else "%d/%m"))
+    for ax in axes:
+        ax.grid(alpha=0.3)
+    fig.tight_layout()
+
+    output = io.BytesIO()
+    fig.savefig(output, format="png", dpi=100)
+    plt.close(fig)
+    return output.getvalue()
+
+# --- Main ---
+
+async def _collect(interval: float) -> int:
+    client = RconClient(*read_rcon_settings())
+
+    async def fetch_status():
+        return await server_status(client)
+
+    try:
+        await Collector(MetricsStore(), fetch_status, interval).run()
+    finally:
+        await client.close()
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Collects and shows the server's performance history.")
+    sub = parser.add_subparsers(dest="action", required=True)
+    collect_parser = sub.add_parser("collect", help="sample the server until interrupted")
+    collect_parser.add_argument("--interval", type=float, default=SAMPLE_INTERVAL, help="seconds between samples")
+    show_parser = sub.add_parser("show", help="print averages and worst values")
+    show_parser.add_argument("span", nargs="?", default="24h", help=", ".join(SPANS))
+    graph_parser = sub.add_parser("graph", help="draw a PNG graph")
+    graph_parser.add_argument("span", nargs="?", default="24h", help=", ".join(SPANS))
+    graph_parser.add_argument("-o", "--output", type=Path, default=Path("graph.png"))
+    args = parser.parse_args()
+
+    try:
+        if args.action == "collect":
+            return asyncio.run(_collect(args.interval))
+        label, span = parse_span(args.span)
+        rows = MetricsStore().series(span)
+        if args.action == "show":
+            for key, value in summarize(rows).items():
+                print(f"{key:12} {value}")
+        else:
+            if not rows:
+                print(f"No samples in the last {label}.", file=sys.stderr)
+                return 1
+            args.output.write_bytes(render_graph(rows, label))
+            print(f"Graph written to {args.output}")
+    except (ValueError, RconError, sqlite3.Error) as e:
+        print(f"metrics: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
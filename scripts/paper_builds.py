@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+
+# Requires: pip install requests
+
+"""
+Cached, checksum-verified Paper builds with atomic activation and rollback.
+
+Every build we download is kept in BUILDS_DIR (the last KEEP_BUILDS of them,
+plus whatever is active or was active before) and paper.jar is a symlink to
+the active one. A manifest records each cached build's version, number and
+SHA-256, which one is active and which one was active before.
+
+'update' asks the builds API once, and only downloads when the latest build
+isn't the one we already run. The download goes through safe_download
+(resumable, verified against the SHA-256 the API publishes) and the build is
+activated by swapping the symlink with os.replace(). The running server keeps
+the jar it opened, so an update can be downloaded and activated while playing
+and costs only the restart; 'rollback' points paper.jar back at the previous
+build, which is still on disk, in no time at all.
+
+A paper.jar that is still a regular file (installs from before this tool) is
+moved into the cache the first time, identified by its SHA-256 when the API
+knows it.
+
+    paper_builds.py update [--version 1.21.1] [--keep 3]   # exit 3 if already up to date
+    paper_builds.py list
+    paper_builds.py activate BUILD [--force]
+    paper_builds.py rollback [--force]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import requests
+from pathlib import Path
+from plugin_index import sha256_file
+from safe_download import DownloadError, download_file
+
+# --- Configuration ---
+PAPER_VERSION = os.environ.get("PAPER_VERSION", "1.21.1")
+API_URL = "https://api.papermc.io/v2/projects/paper/versions/{version}/builds"
+DOWNLOAD_URL = "https://api.papermc.io/v2/projects/paper/versions/{version}/builds/{build}/downloads/{name}"
+SERVER_JAR = Path("paper.jar")
+BUILDS_DIR = Path(".cache/paper")
+MANIFEST_FILE = BUILDS_DIR / "manifest.json"
+# Cached builds kept besides the active and the previous one
+KEEP_BUILDS = int(os.environ.get("PAPER_KEEP_BUILDS", 3))
+# Only builds from these channels are installed by 'update'
+CHANNELS = ("default",)
+# Seconds to wait for the builds API
+HTTP_TIMEOUT = 30
+# Exit code of 'update' when the latest build is already active
+EXIT_UP_TO_DATE = 3
+
+# --- Classes ---
+
+class PaperBuildError(Exception):
+    """Raised when a build can't be found, downloaded, verified or activated."""
+
+# --- Functions ---
+
+def load_manifest() -> dict:
+    try:
+        manifest = json.loads(MANIFEST_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        manifest = {}
+    manifest.setdefault("builds", {})
+    manifest.setdefault("history", [])
+    return manifest
+
+
+def save_manifest(manifest: dict):
+    BUILDS_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=BUILDS_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_FILE)
+
+
+def build_key(version: str, build) -> str:
+    return f"{version}-{build}"
+
+
+def fetch_builds(session, version: str) -> list[dict]:
+    """
+    The builds of a Minecraft version, oldest first, as the API lists them.
+
+    Raises:
+        PaperBuildError: If the API can't be reached or doesn't know the version.
+    """
+    try:
+        response = session.get(API_URL.format(version=version), timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        builds = response.json()["builds"]
+    except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+        raise PaperBuildError(f"can't list the builds of Paper {version}: {e}") from e
+    return [b for b in builds if b.get("downloads", {}).get("application")]
+
+
+def latest_build(builds: list[dict], channels=CHANNELS) -> dict:
+    stable = [b for b in builds if b.get("channel", "default") in channels]
+    if not stable:
+        raise PaperBuildError(f"no builds in the {'/'.join(channels)} channel")
+    return stable[-1]
+
+
+def _entry(version: str, build: dict) -> dict:
+    application = build["downloads"]["application"]
+    return {
+        "version": version,
+        "build": build["build"],
+        "file": application["name"],
+        "sha256": application["sha256"],
+        "channel": build.get("channel", "default"),
+        "released": build.get("time"),
+    }
+
+
+def adopt_server_jar(manifest: dict, version: str, builds: list[dict] | None = None) -> str | None:
+    """
+    Moves a regular paper.jar into the cache and links it, so it can be rolled back to.
+
+    The build is recognized by its SHA-256 among 'builds'; an unknown jar is kept as
+    'local-<hash>'. Returns the manifest key of the adopted build, None if there was
+    nothing to adopt.
+    """
+    if SERVER_JAR.is_symlink() or not SERVER_JAR.is_file():
+        return None
+    digest = sha256_file(SERVER_JAR)
+    match = next((b for b in builds or [] if b["downloads"]["application"]["sha256"] == digest), None)
+    if match:
+        key, entry = build_key(version, match["build"]), _entry(version, match)
+    else:
+        key = f"local-{digest[:12]}"
+        entry = {"version": None, "build": None, "file": f"paper-{key}.jar", "sha256": digest,
+                 "channel": None, "released": None}
+    BUILDS_DIR.mkdir(parents=True, exist_ok=True)
+    os.replace(SERVER_JAR, BUILDS_DIR / entry["file"])
+    entry["downloaded"] = time.time()
+    manifest["builds"][key] = entry
+    _link(BUILDS_DIR / entry["file"])
+    if manifest.get("active") not in (None, key):
+        manifest["previous"] = manifest["active"]
+    manifest["active"] = key
+    manifest["history"].append({"key": key, "activated": time.time()})
+    save_manifest(manifest)
+    return key
+
+
+def _link(target: Path):
+    """Points paper.jar at 'target' atomically (a relative link, so the server folder can move)."""
+    tmp = SERVER_JAR.with_name(f".{SERVER_JAR.name}.tmp")
+    tmp.unlink(missing_ok=True)
+    os.symlink(os.path.relpath(target, SERVER_JAR.parent), tmp)
+    os.replace(tmp, SERVER_JAR)
+
+
+def resolve_key(manifest: dict, name: str) -> str:
+    """Accepts a manifest key ('1.21.1-128') or a build number of the active version ('128')."""
+    if name in manifest["builds"]:
+        return name
+    active = manifest["builds"].get(manifest.get("active") or "", {})
+    key = build_key(active.get("version") or PAPER_VERSION, name)
+    if key in manifest["builds"]:
+        return key
+    raise PaperBuildError(f"build {name} isn't cached (see 'paper_builds.py list')")
+
+
+def activate(manifest: dict, key: str, force: bool = False) -> bool:
+    """
+    Verifies a cached build and swaps paper.jar to it. Returns False if it was already active.
+
+    Raises:
+        PaperBuildError: If the jar is missing or corrupt, or belongs to another Minecraft
+            version and 'force' isn't set (worlds upgraded by a newer version can't go back).
+    """
+    entry = manifest["builds"][key]
+    active_key = manifest.get("active")
+    if key == active_key and SERVER_JAR.is_symlink() and SERVER_JAR.exists():
+        return False
+    active_version = manifest["builds"].get(active_key or "", {}).get("version")
+    if not force and active_version and entry["version"] and entry["version"] != active_version:
+        raise PaperBuildError(f"{key} is for Minecraft {entry['version']}, the active build for {active_version}; "
+                              "use --force if the worlds can take it")
+    path = BUILDS_DIR / entry["file"]
+    if not path.is_file():
+        raise PaperBuildError(f"{path} is missing")
+    if sha256_file(path) != entry["sha256"]:
+        raise PaperBuildError(f"{path} doesn't match its SHA-256 any more")
+    _link(path)
+    if active_key and active_key != key:
+        manifest["previous"] = active_key
+    manifest["active"] = key
+    manifest["history"].append({"key": key, "activated": time.time()})
+    save_manifest(manifest)
+    return True
+
+
+def prune(manifest: dict, keep: int = KEEP_BUILDS) -> list[str]:
+    """Deletes the oldest cached builds beyond 'keep', never the active or the previous one."""
+    protected = {manifest.get("active"), manifest.get("previous")}
+    ordered = sorted(manifest["builds"], key=lambda k: manifest["builds"][k].get("downloaded", 0), reverse=True)
+    removed = []
+    for key in [k for k in ordered if k not in protected][keep:]:
+        (BUILDS_DIR / manifest["builds"][key]["file"]).unlink(missing_ok=True)
+        del manifest["builds"][key]
+        removed.append(key)
+    if removed:
+        save_manifest(manifest)
+    return removed
+
+
+def update(session, version: str = PAPER_VERSION, keep: int = KEEP_BUILDS, log=print) -> bool:
+    """
+    Installs the latest build of 'version' if it isn't the active one. Returns whether it changed.
+
+    Raises:
+        PaperBuildError: If the API fails or the download can't be verified.
+    """
+    manifest = load_manifest()
+    builds = fetch_builds(session, version)
+    latest = latest_build(builds)
+    key = build_key(version, latest["build"])
+    if adopt_server_jar(manifest, version, builds):
+        log(f"Current paper.jar cached as {manifest['active']}")
+    if manifest.get("active") == key and SERVER_JAR.exists():
+        log(f"Paper {key} is already the active build.")
+        return False
+
+    entry = manifest["builds"].get(key)
+    path = BUILDS_DIR / _entry(version, latest)["file"]
+    if entry is None or not path.is_file() or sha256_file(path) != entry["sha256"]:
+        entry = _entry(version, latest)
+        log(f"Downloading Paper {key} ({entry['file']})...")
+        BUILDS_DIR.mkdir(parents=True, exist_ok=True)
+        try:
+            download_file(session, DOWNLOAD_URL.format(version=version, build=latest["build"], name=entry["file"]),
+                          path, sha256=entry["sha256"], log=log)
+        except DownloadError as e:
+            raise PaperBuildError(f"Paper {key}: {e}") from e
+        entry["downloaded"] = time.time()
+        manifest["builds"][key] = entry
+        save_manifest(manifest)
+    else:
+        log(f"Paper {key} is already cached.")
+    activate(manifest, key, force=True)
+    log(f"paper.jar -> {path} (SHA-256 verified)")
+    for removed in prune(manifest, keep):
+        log(f"Removed cached build {removed}")
+    return True
+
+
+def rollback(manifest: dict, force: bool = False) -> str:
+    """Activates the previous build (or the newest other cached one). Returns its key."""
+    key = manifest.get("previous")
+    if key not in manifest["builds"]:
+        others = [k for k in manifest["builds"] if k != manifest.get("active")]
+        if not others:
+            raise PaperBuildError("there is no other cached build to roll back to")
+        key = max(others, key=lambda k: manifest["builds"][k].get("downloaded", 0))
+    activate(manifest, key, force)
+    return key
+
+
+def describe(manifest: dict) -> str:
+    if not manifest["builds"]:
+        return "No cached Paper builds (run 'paper_builds.py update')."
+    lines = []
+    for key, entry in sorted(manifest["builds"].items(), key=lambda item: item[1].get("downloaded", 0), reverse=True):
+        mark = "*" if key == manifest.get("active") else ("<" if key == manifest.get("previous") else " ")
+        size = (BUILDS_DIR / entry["file"]).stat().st_size / 2**20 if (BUILDS_DIR / entry["file"]).is_file() else 0
+        released = (entry.get("released") or "")[:10] or "?"
+        lines.append(f"{mark} {key:<20} released {released}  {size:5.1f} MiB  {entry['sha256'][:12]}")
+    lines.append("(* active, < previous: the target of 'rollback')")
+    return "\n".join(lines)
+
+# --- Main ---
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Cached, verified Paper builds with atomic activation and rollback.")
+    sub = parser.add_subparsers(dest="action", required=True)
+    update_parser = sub.add_parser("update", help="install the latest build if it isn't the active one")
+    update_parser.add_argument("--version", default=PAPER_VERSION, help="Minecraft version (default: %(default)s)")
+    update_parser.add_argument("--keep", type=int, default=KEEP_BUILDS, help="older builds to keep cached")
+    sub.add_parser("list", help="show the cached builds")
+    activate_parser = sub.add_parser("activate", help="point paper.jar at a cached build")
+    activate_parser.add_argument("build", help="build number or VERSION-BUILD")
+    activate_parser.add_argument("--force", action="store_true", help="allow another Minecraft version")
+    rollback_parser = sub.add_parser("rollback", help="go back to the previous build")
+    rollback_parser.add_argument("--force", action="store_true", help="allow another Minecraft version")
+    args = parser.parse_args()
+
+    try:
+        if args.action == "update":
+            with requests.Session() as session:
+                changed = update(session, args.version, args.keep)
+            return 0 if changed else EXIT_UP_TO_DATE
+        manifest = load_manifest()
+        if adopt_server_jar(manifest, PAPER_VERSION):
+            print(f"Current paper.jar cached as {manifest['active']}")
+        if args.action == "list":
+            print(describe(manifest))
+        elif args.action == "activate":
+            key = resolve_key(manifest, args.build)
+            if not activate(manifest, key, args.force):
+                print(f"{key} is already active")
+                return 0
+            print(f"paper.jar -> {key}")
+        else:
+            print(f"paper.jar -> {rollback(manifest, args.force)}")
+    except PaperBuildError as e:
+        print(f"paper_builds: {e}", file=sys.stderr)
+        return 1
+    if args.action in ("activate", "rollback"):
+        # The running server keeps the jar it opened
+        print("The change takes effect the next time the server starts.")
+    return 0
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,8 @@
 # Directorios
 PLUGINS_DIR="plugins"
 DEACTIVATED_DIR="deactivated_plugins"
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+PLUGIN_INDEX=(python3 "$SCRIPT_DIR/plugin_index.py" --plugins-dir "$PLUGINS_DIR")
 
 # Crear el directorio de desactivados si no existe
 mkdir -p "$DEACTIVATED_DIR"
@@ -12,12 +14,19 @@ mostrar_plugins() {
     clear
     echo -e "\n\033[1;34m=== Plugins Activos ===\033[0m"
     local active_found=false
-    for plugin in "$PLUGINS_DIR"/*.jar; do
-        if [[ -f "$plugin" ]]; then
-            echo -e "\e[32m$(basename "$plugin")\e[0m"
-            active_found=true
-        fi
-    done
+    # Nombre y versión desde el índice de plugins (solo se reabren los JAR que cambiaron)
+    local index_output
+    if index_output=$("${PLUGIN_INDEX[@]}" list 2>/dev/null) && [[ -n "$index_output" ]]; then
+        echo -e "\e[32m${index_output}\e[0m"
+        active_found=true
+    else
+        for plugin in "$PLUGINS_DIR"/*.jar; do
+            if [[ -f "$plugin" ]]; then
+                echo -e "\e[32m$(basename "$plugin")\e[0m"
+                active_found=true
+            fi
+        done
+    fi
     if ! $active_found; then
         echo -e "\e[31mNo hay plugins activos.\e[0m"
     fi
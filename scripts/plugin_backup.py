@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+
+# Requires: pip install pyyaml
+
+"""
+Content-addressed, deduplicated backup store for the plugins directory.
+
+Every JAR is stored once under plugin_backups/objects/<hash[:2]>/<hash>.jar,
+hardlinked from the plugins directory when possible (no bytes copied), and
+each snapshot is a small JSON manifest in plugin_backups/manifests/ listing
+the file name and hash of every JAR installed at that moment. A snapshot
+identical to the previous one is not written again.
+
+Rolling back hardlinks the objects of a manifest into the plugins directory
+with atomic renames, after taking a snapshot of the current state so the
+rollback itself can be undone.
+
+    plugin_backup.py snapshot [--label LABEL]
+    plugin_backup.py list
+    plugin_backup.py rollback [MANIFEST_ID|latest]
+    plugin_backup.py gc [--keep N]
+    plugin_backup.py verify
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+from datetime import datetime
+from plugin_index import PluginIndex, sha256_file
+
+# --- Configuration ---
+# Directory where your PaperMC plugins are located
+PLUGINS_DIR = Path("plugins")
+# Root of the backup store
+STORE_DIR = Path(os.environ.get("PLUGIN_BACKUP_DIR", "plugin_backups"))
+# Number of manifests kept by gc(); older ones and their unique objects are removed
+DEFAULT_KEEP = int(os.environ.get("PLUGIN_BACKUP_KEEP", 10))
+
+# --- Functions ---
+
+def _link_or_copy(src: Path, dst: Path):
+    """Hardlinks src to dst, copying only if a link isn't possible (e.g. another filesystem)."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def _write_json_atomic(path: Path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
+
+# --- Classes ---
+
+class BackupStore:
+    """
+    Content-addressed store of plugin JARs plus per-snapshot manifests.
+
+    Args:
+        store_dir (Path): Root directory of the store.
+        plugins_dir (Path): The plugins directory that is snapshotted and restored.
+    """
+
+    def __init__(self, store_dir: Path = STORE_DIR, plugins_dir: Path = PLUGINS_DIR):
+        self.store_dir = Path(store_dir)
+        self.plugins_dir = Path(plugins_dir)
+        self.objects_dir = self.store_dir / "objects"
+        self.manifests_dir = self.store_dir / "manifests"
+
+    def object_path(self, sha256: str) -> Path:
+        return self.objects_dir / sha256[:2] / f"{sha256}.jar"
+
+    def manifests(self) -> list[dict]:
+        """Returns every manifest, oldest first."""
+        result = []
+        for manifest_path in sorted(self.manifests_dir.glob("*.json")):
+            try:
+                with open(manifest_path, "r", encoding="utf-8") as f:
+                    result.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return result
+
+    def get_manifest(self, manifest_id: str) -> dict | None:
+        """Returns a manifest by id, or the newest one for 'latest'."""
+        manifests = self.manifests()
+        if manifest_id == "latest":
+            return manifests[-1] if manifests else None
+        return next((m for m in manifests if m["id"] == manifest_id), None)
+
+    def _store_object(self, jar_path: Path, sha256: str) -> bool:
+        """Adds a JAR to the store unless an identical one is already there. Returns True if added."""
+        target = self.object_path(sha256)
+        if target.exists():
+            return False
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(".tmp")
+        tmp.unlink(missing_ok=True)
+        _link_or_copy(jar_path, tmp)
+        os.replace(tmp, target)
+        return True
+
+    def snapshot(self, label: str = "manual", entries: list[dict] | None = None, log=print) -> dict:
+        """
+        Records the current plugin set.
+
+        Args:
+            label (str): Short description stored in the manifest (e.g. "pre-update").
+            entries (list[dict] | None): PluginIndex entries to reuse their hashes;
+                                         the index is refreshed if not given.
+            log (callable): Where progress messages are written (defaults to print).
+
+        Returns:
+            dict: The new manifest, or the previous one if nothing changed since.
+        """
+        if entries is None:
+            entries = PluginIndex(self.plugins_dir).refresh()
+
+        files = []
+        added = 0
+        for entry in entries:
+            jar_path = Path(entry["path"])
+            if self._store_object(jar_path, entry["sha256"]):
+                added += 1
+            files.append({
+                "file": jar_path.name,
+                "sha256": entry["sha256"],
+                "name": entry.get("name"),
+                "version": entry.get("version"),
+            })
+
+        previous = self.get_manifest("latest")
+        if previous and previous["files"] == files:
+            log(f"Plugin set unchanged since backup '{previous['id']}'; no new snapshot needed.")
+            return previous
+
+        manifest_id = datetime.now().strftime("%Y-%m-%d_%H%M%S")
+        suffix = 1
+        while (self.manifests_dir / f"{manifest_id}.json").exists():
+            suffix += 1
+            manifest_id = f"{datetime.now().strftime('%Y-%m-%d_%H%M%S')}_{suffix}"
+        manifest = {"id": manifest_id, "label": label, "created": datetime.now().isoformat(timespec="seconds"), "files": files}
+        _write_json_atomic(self.manifests_dir / f"{manifest_id}.json", manifest)
+        log(f"Backup '{manifest_id}' ({label}): {len(files)} plugins, {added} new objects stored.")
+        return manifest
+
+    def rollback(self, manifest_id: str = "latest", log=print) -> dict:
+        """
+        Restores the plugins directory to the state recorded in a manifest.
+
+        The current state is snapshotted first, so a rollback can be undone.
+        JARs not listed in the manifest are removed from the plugins directory
+        (they remain available in the pre-rollback snapshot).
+
+        Args:
+            manifest_id (str): Manifest to restore, or "latest".
+            log (callable): Where progress messages are written (defaults to print).
+
+        Returns:
+            dict: The restored manifest.
+
+        Raises:
+            ValueError: If the manifest doesn't exist or one of its objects is missing.
+        """
+        manifest = self.get_manifest(manifest_id)
+        if manifest is None:
+            raise ValueError(f"backup '{manifest_id}' not found")
+        for item in manifest["files"]:
+            if not self.object_path(item["sha256"]).exists():
+                raise ValueError(f"object for {item['file']} ({item['sha256'][:12]}) is missing from the store")
+
+        self.snapshot(label=f"pre-rollback to {manifest['id']}", log=log)
+
+        wanted = {item["file"] for item in manifest["files"]}
+        for jar_path in self.plugins_dir.glob("*.jar"):
+            if jar_path.name not in wanted:
+                jar_path.unlink()
+                log(f"  Removed {jar_path.name}")
+        for item in manifest["files"]:
+            dest = self.plugins_dir / item["file"]
+            tmp = dest.with_name(f".{dest.name}.rollback")
+            tmp.unlink(missing_ok=True)
+            _link_or_copy(self.object_path(item["sha256"]), tmp)
+            os.replace(tmp, dest)
+            log(f"  Restored {item['file']} ({item.get('name') or '?'} {item.get('version') or '?'})")
+        log(f"Plugins restored to backup '{manifest['id']}'.")
+        return manifest
+
+    def gc(self, keep: int = DEFAULT_KEEP, log=print) -> tuple[int, int]:
+        """
+        Removes all but the newest 'keep' manifests and the objects only they referenced.
+
+        Returns:
+            tuple[int, int]: (manifests removed, objects removed).
+        """
+        manifests = self.manifests()
+        expired = manifests[:-keep] if keep > 0 else manifests
+        for manifest in expired:
+            (self.manifests_dir / f"{manifest['id']}.json").unlink(missing_ok=True)
+
+        referenced = {item["sha256"] for manifest in manifests[len(expired):] for item in manifest["files"]}
+        removed_objects = 0
+        for object_path in self.objects_dir.glob("*/*.jar"):
+            if object_path.stem not in referenced:
+                object_path.unlink()
+                removed_objects += 1
+        if expired or removed_objects:
+            log(f"Backup GC: removed {len(expired)} old backups and {removed_objects} unreferenced objects.")
+        return len(expired), removed_objects
+
+    def verify(self, log=print) -> int:
+        """Re-hashes every stored object. Returns the number of corrupt or missing ones."""
+        bad = 0
+        for sha256 in sorted({item["sha256"] for m in self.manifests() for item in m["files"]}):
+            object_path = self.object_path(sha256)
+            if not object_path.exists():
+                log(f"  MISSING {sha256}")
+                bad += 1
+            elif sha256_file(object_path) != sha256:
+                log(f"  CORRUPT {object_path}")
+                bad += 1
+        log(f"Backup store verified: {bad} problems found.")
+        return bad
+
+# --- Main ---
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Deduplicated backups of the plugins directory.")
+    parser.add_argument("--plugins-dir", type=Path, default=PLUGINS_DIR, help=f"plugins directory (default: {PLUGINS_DIR})")
+    parser.add_argument("--store", type=Path, default=STORE_DIR, help=f"backup store (default: {STORE_DIR})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    snapshot_parser = sub.add_parser("snapshot", help="record the current plugin set")
+    snapshot_parser.add_argument("--label", default="manual")
+    sub.add_parser("list", help="list the recorded backups")
+    rollback_parser = sub.add_parser("rollback", help="restore the plugins of a backup")
+    rollback_parser.add_argument("manifest_id", nargs="?", default="latest")
+    gc_parser = sub.add_parser("gc", help="delete old backups and unreferenced objects")
+    gc_parser.add_argument("--keep", type=int, default=DEFAULT_KEEP, help=f"backups to keep (default: {DEFAULT_KEEP})")
+    sub.add_parser("verify", help="check the integrity of the stored objects")
+    args = parser.parse_args()
+
+    store = BackupStore(args.store, args.plugins_dir)
+    if args.command == "snapshot":
+        store.snapshot(args.label)
+    elif args.command == "list":
+        for manifest in store.manifests():
+            print(f"{manifest['id']:<22} {len(manifest['files']):>3} plugins  {manifest['label']}")
+    elif args.command == "rollback":
+        try:
+            store.rollback(args.manifest_id)
+        except ValueError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return 1
+    elif args.command == "gc":
+        store.gc(args.keep)
+    elif args.command == "verify":
+        return 1 if store.verify() else 0
+    return 0
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
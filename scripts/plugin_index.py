@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+
+# Requires: pip install pyyaml
+
+"""
+Persistent index of the metadata declared by each plugin JAR.
+
+Opening a JAR and parsing its plugin.yml (or paper-plugin.yml) is only done
+when the file is new or its size/mtime changed; if the content hash matches a
+JAR we already know (e.g. a renamed file) the old metadata is reused. Changed
+JARs are parsed in parallel. Everything else is answered from
+.cache/plugin-index.json.
+
+Used as a module by update-plugins.py and telegram_bot.py, and as a command by
+the shell scripts:
+
+    plugin_index.py list           # table with name, version and file
+    plugin_index.py list --json    # full index as JSON
+    plugin_index.py tsv            # "path<TAB>name<TAB>version" per JAR
+                                   # (just "path" if name or version is missing)
+"""
+
+import os
+import sys
+import json
+import hashlib
+import zipfile
+import argparse
+import tempfile
+import yaml
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Configuration ---
+# Directory where your PaperMC plugins are located
+PLUGINS_DIR = Path("plugins")
+# File where the index is persisted between runs
+INDEX_FILE = Path(os.environ.get("PLUGIN_INDEX_FILE", ".cache/plugin-index.json"))
+# Bump when the stored entry format changes, to force a rebuild
+INDEX_VERSION = 1
+# Descriptors we understand, in order of preference
+DESCRIPTORS = ("paper-plugin.yml", "plugin.yml")
+# Number of JARs parsed at the same time when rebuilding
+DEFAULT_WORKERS = 4
+
+# --- Functions ---
+
+def _as_list(value) -> list[str]:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(item) for item in value]
+    return [str(value)]
+
+
+def _paper_dependencies(info: dict) -> tuple[list[str], list[str]]:
+    """Splits paper-plugin.yml 'dependencies' into required and optional server dependencies."""
+    depends, softdepends = [], []
+    dependencies = info.get("dependencies")
+    server_deps = dependencies.get("server") if isinstance(dependencies, dict) else None
+    for dep_name, dep in (server_deps.items() if isinstance(server_deps, dict) else ()):
+        required = dep.get("required", True) if isinstance(dep, dict) else True
+        (depends if required else softdepends).append(str(dep_name))
+    return depends, softdepends
+
+
+def sha256_file(path: Path) -> str:
+    """Returns the hex SHA-256 of a file, read in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_jar_metadata(jar_path: Path) -> dict:
+    """
+    Parses the plugin descriptor of a JAR.
+
+    Args:
+        jar_path (Path): The plugin JAR to read.
+
+    Returns:
+        dict: Metadata with keys 'name', 'version', 'api_version', 'main', 'depend',
+              'softdepend', 'authors', 'website', 'descriptor' and 'error'. Fields
+              that can't be determined are None/empty and 'error' explains why.
+    """
+    meta = {
+        "name": None, "version": None, "api_version": None, "main": None,
+        "depend": [], "softdepend": [], "authors": [], "website": None,
+        "descriptor": None, "error": None,
+    }
+    try:
+        with zipfile.ZipFile(jar_path, "r") as jar_zip:
+            names = set(jar_zip.namelist())
+            descriptor = next((d for d in DESCRIPTORS if d in names), None)
+            if descriptor is None:
+                meta["error"] = "no plugin.yml or paper-plugin.yml"
+                return meta
+            with jar_zip.open(descriptor) as yml_file:
+                info = yaml.safe_load(yml_file) or {}
+    except (zipfile.BadZipFile, KeyError, yaml.YAMLError, OSError) as e:
+        meta["error"] = str(e)
+        return meta
+    if not isinstance(info, dict):
+        # e.g. a descriptor holding a bare string or a list
+        meta["error"] = f"{descriptor} is not a mapping ({type(info).__name__})"
+        return meta
+
+    meta["descriptor"] = descriptor
+    meta["name"] = str(info["name"]) if info.get("name") is not None else None
+    meta["version"] = str(info["version"]) if info.get("version") is not None else None
+    meta["api_version"] = str(info["api-version"]) if info.get("api-version") is not None else None
+    meta["main"] = info.get("main")
+    meta["website"] = str(info["website"]) if info.get("website") is not None else None
+    meta["authors"] = _as_list(info.get("author")) + _as_list(info.get("authors"))
+    if descriptor == "paper-plugin.yml":
+        meta["depend"], meta["softdepend"] = _paper_dependencies(info)
+    else:
+        meta["depend"] = _as_list(info.get("depend"))
+        meta["softdepend"] = _as_list(info.get("softdepend"))
+    return meta
+
+
+class PluginIndex:
+    """
+    Incrementally maintained metadata index for the JARs of a plugins directory.
+
+    Args:
+        plugins_dir (Path): Directory scanned for *.jar files.
+        index_file (Path): Where the index is persisted.
+    """
+
+    def __init__(self, plugins_dir: Path = PLUGINS_DIR, index_file: Path = INDEX_FILE):
+        self.plugins_dir = Path(plugins_dir)
+        self.index_file = Path(index_file)
+        self.entries: dict[str, dict] = {}
+        # How the last refresh() obtained each entry: reused, rehashed or parsed
+        self.stats = {"reused": 0, "rehashed": 0, "parsed": 0}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self.entries = data.get("entries", {})
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        """Writes the index atomically."""
+        try:
+            self.index_file.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.index_file.parent, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": INDEX_VERSION, "entries": self.entries}, f, indent=1)
+            os.replace(tmp_path, self.index_file)
+        except OSError as e:
+            print(f"Warning: could not save plugin index {self.index_file}: {e}", file=sys.stderr)
+
+    def _build_entry(self, jar_path: Path, stat: os.stat_result, by_hash: dict) -> tuple[dict, str]:
+        sha256 = sha256_file(jar_path)
+        known = by_hash.get(sha256)
+        if known:
+            meta = {k: v for k, v in known.items() if k not in ("path", "size", "mtime_ns", "sha256")}
+            how = "rehashed"
+        else:
+            meta = read_jar_metadata(jar_path)
+            how = "parsed"
+        entry = {"path": str(jar_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}
+        entry.update(meta)
+        return entry, how
+
+    def refresh(self, workers: int = DEFAULT_WORKERS, save: bool = True) -> list[dict]:
+        """
+        Brings the index up to date with the plugins directory.
+
+        Only JARs whose path, size or mtime changed are hashed, and only those
+        whose hash is unknown are opened and parsed.
+
+        Args:
+            workers (int): Number of JARs processed in parallel.
+            save (bool): Persist the index if anything changed.
+
+        Returns:
+            list[dict]: The entries of every JAR currently in the directory, sorted by path.
+        """
+        self.stats = dict.fromkeys(self.stats, 0)
+        jars = sorted(self.plugins_dir.glob("*.jar")) if self.plugins_dir.is_dir() else []
+        current: dict[str, dict] = {}
+        changed: list[tuple[Path, os.stat_result]] = []
+
+        for jar_path in jars:
+            try:
+                stat = jar_path.stat()
+            except OSError:
+                continue
+            entry = self.entries.get(str(jar_path))
+            if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                current[str(jar_path)] = entry
+                self.stats["reused"] += 1
+            else:
+                changed.append((jar_path, stat))
+
+        if changed:
+            by_hash = {entry["sha256"]: entry for entry in self.entries.values()}
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                built = pool.map(lambda item: self._build_entry(item[0], item[1], by_hash), changed)
+                for entry, how in built:
+                    current[entry["path"]] = entry
+                    self.stats[how] += 1
+
+        dirty = bool(changed) or set(current) != set(self.entries)
+        self.entries = current
+        if save and dirty:
+            self.save()
+        return [self.entries[path] for path in sorted(self.entries)]
+
+    def get(self, jar_path: Path) -> dict | None:
+        """Returns the entry of a JAR, or None if it isn't indexed."""
+        return self.entries.get(str(jar_path))
+
+# --- Main ---
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Shows the indexed metadata of the installed plugins.")
+    parser.add_argument("--plugins-dir", type=Path, default=PLUGINS_DIR, help=f"plugins directory (default: {PLUGINS_DIR})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    list_parser = sub.add_parser("list", help="print a table of the installed plugins")
+    list_parser.add_argument("--json", action="store_true", help="print the full index as JSON")
+    sub.add_parser("tsv", help="print path, name and version separated by tabs")
+    args = parser.parse_args()
+
+    index = PluginIndex(args.plugins_dir)
+    entries = index.refresh()
+
+    if args.command == "tsv":
+        for entry in entries:
+            # Empty fields would collapse when read with IFS=$'\t', so incomplete
+            # entries are printed as the bare path
+            if entry["name"] and entry["version"]:
+                print(f"{entry['path']}\t{entry['name']}\t{entry['version']}")
+            else:
+                print(entry["path"])
+    elif args.json:
+        print(json.dumps(entries, indent=2))
+    else:
+        for entry in entries:
+            name = entry["name"] or "?"
+            version = entry["version"] or "?"
+            print(f"{name:<24} {version:<20} {Path(entry['path']).name}")
+    return 0
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+
+# Requires: pip install requests pyyaml
+
+"""
+Finds where each installed plugin is published and what its newest build is.
+
+A plugin (as described by its plugin_index entry: name, authors, website) is
+mapped to projects on Hangar, Spiget and Modrinth:
+
+  1. Links in the plugin.yml 'website' field are used directly
+     (hangar.papermc.io/<owner>/<slug>, spigotmc.org/resources/<name>.<id>,
+     modrinth.com/plugin/<slug>).
+  2. Otherwise each repository is searched by name, and a result is only
+     accepted if its author is one of the plugin.yml authors or it links to
+     the plugin.yml website. Same-named projects by someone else are reported
+     and left unresolved.
+
+The mapping is saved in .cache/plugin-sources.json, so later runs skip the
+search calls entirely; projects that weren't found are searched again after
+NEGATIVE_TTL. An unresolved plugin can be mapped by hand there, e.g.
+
+    "SomePlugin": {"modrinth": {"project": "AbCd1234"}, "hangar": {"project": null, "manual": true}}
+
+(a "manual" null entry stops that repository from being searched). All
+repositories are then queried in parallel and the newest release compatible
+with the Minecraft series wins.
+
+    plugin_resolver.py            # resolves every installed plugin and prints the result
+    plugin_resolver.py --forget   # drops the saved mapping and searches again
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import requests
+from pathlib import Path
+from urllib.parse import quote, urlencode
+from concurrent.futures import ThreadPoolExecutor
+from http_cache import HttpCache
+
+# --- Configuration ---
+# Hangar API base URL
+HANGAR_API = "https://hangar.papermc.io/api/v1"
+# Hangar CDN base URL for direct file downloads
+HANGAR_CDN = "https://hangarcdn.papermc.io"
+# Spiget (SpigotMC mirror) API base URL
+SPIGET_API = "https://api.spiget.org/v2"
+# Modrinth API base URL
+MODRINTH_API = "https://api.modrinth.com/v2"
+# Modrinth loaders whose builds run on Paper
+MODRINTH_LOADERS = ["paper", "spigot", "bukkit"]
+
+# Repositories in order of preference when two offer the same version
+# (Hangar and Modrinth publish hashes, Spiget doesn't)
+SOURCES = ("hangar", "modrinth", "spiget")
+
+# File where the resolved plugin -> project mapping is kept
+MAPPING_FILE = Path(os.environ.get("PLUGIN_SOURCES_FILE", ".cache/plugin-sources.json"))
+# Seconds before a repository that had no match for a plugin is searched again
+NEGATIVE_TTL = 7 * 24 * 3600
+# Seconds to wait for a repository before giving up on a request
+HTTP_TIMEOUT = 30
+
+# --- Functions ---
+
+def normalize(name: str | None) -> str:
+    """Lower-cases a name and drops everything but letters and digits ("Tab-TPS" -> "tabtps")."""
+    return re.sub(r"[^a-z0-9]", "", (name or "").lower())
+
+
+def version_key(version: str | None) -> tuple[int, ...]:
+    """
+    Turns the leading dotted number of a version into a comparable tuple.
+
+    Suffixes are ignored ("1.4.40-paper-1.21" -> (1, 4, 40), "2.11.6-b3" -> (2, 11, 6)),
+    and so are trailing zeros ("1.4.0" -> (1, 4)).
+    """
+    match = re.search(r"\d+(?:\.\d+)*", version or "")
+    numbers = [int(n) for n in match.group().split(".")] if match else []
+    while numbers and numbers[-1] == 0:
+        numbers.pop()
+    return tuple(numbers)
+
+
+def is_newer(remote: str | None, local: str | None) -> bool:
+    """True if 'remote' is a strictly newer version than 'local'."""
+    return version_key(remote) > version_key(local)
+
+
+def links_from_website(website: str | None) -> dict:
+    """Extracts repository project ids from a plugin.yml 'website' URL."""
+    links = {}
+    if not website:
+        return links
+    match = re.search(r"hangar\.papermc\.io/([^/\s]+)/([^/\s?#]+)", website)
+    if match:
+        links["hangar"] = f"{match.group(1)}/{match.group(2)}"
+    match = re.search(r"spigotmc\.org/resources/(?:[^/\s]*\.)?(\d+)", website)
+    if match:
+        links["spiget"] = int(match.group(1))
+    match = re.search(r"modrinth\.com/(?:plugin|mod)/([^/\s?#]+)", website)
+    if match:
+        links["modrinth"] = match.group(1)
+    return links
+
+
+def url_key(url: str | None) -> str:
+    """Reduces a URL to host and path for comparisons ("https://www.GitHub.com/a/b/" -> "github.com/a/b")."""
+    url = re.sub(r"^[a-z]+://", "", (url or "").strip().lower())
+    return re.sub(r"^www\.", "", url).split("#")[0].rstrip("/")
+
+
+def _compatible(mc_versions, mc_series: str) -> bool:
+    return any(str(v).startswith(mc_series) for v in mc_versions or [])
+
+# --- Classes ---
+
+class PluginResolver:
+    """
+    Resolves plugins against Hangar, Spiget and Modrinth.
+
+    Args:
+        session (requests.Session): Shared HTTP session.
+        cache (HttpCache | None): Metadata cache for the API calls.
+        mc_series (str): Minecraft series builds must support (e.g. "1.21").
+        overrides (dict): Manual {plugin name: (hangar namespace, hangar slug)} mappings.
+        workers (int): Repository requests allowed in flight at the same time.
+        mapping_file (Path): Where the resolved mapping is persisted.
+    """
+
+    def __init__(self, session, cache: HttpCache | None, mc_series: str, overrides: dict | None = None,
+                 workers: int = 6, mapping_file: Path = MAPPING_FILE):
+        self.session = session
+        self.cache = cache
+        self.mc_series = mc_series
+        self.overrides = overrides or {}
+        self.mapping_file = Path(mapping_file)
+        self.pool = ThreadPoolExecutor(max_workers=max(len(SOURCES), workers))
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(self.mapping_file, "r", encoding="utf-8") as f:
+                self.mapping = json.load(f)
+        except (OSError, ValueError):
+            self.mapping = {}
+
+    # --- HTTP helpers ---
+
+    def _get_json(self, url: str, params: dict | None = None):
+        """Returns the decoded JSON of a GET, None on 404; raises on other errors."""
+        if params:
+            url = f"{url}?{urlencode(params)}"
+        if self.cache:
+            response = self.cache.get(self.session, url, timeout=HTTP_TIMEOUT)
+        else:
+            response = self.session.get(url, timeout=HTTP_TIMEOUT)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    # --- Mapping persistence ---
+
+    def save(self):
+        """Writes the mapping atomically if anything was resolved during this run."""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                self.mapping_file.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=self.mapping_file.parent, suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(self.mapping, f, indent=1, sort_keys=True)
+                os.replace(tmp_path, self.mapping_file)
+                self._dirty = False
+            except OSError as e:
+                print(f"Warning: could not save plugin sources {self.mapping_file}: {e}", file=sys.stderr)
+
+    def close(self):
+        self.save()
+        self.pool.shutdown(wait=True)
+
+    def _mapped(self, name: str, source: str):
+        """Returns (known, project) for a plugin in a repository from the saved mapping."""
+        with self._lock:
+            entry = self.mapping.get(name, {}).get(source)
+        if not entry:
+            return False, None
+        if (entry.get("project") is None and not entry.get("manual")
+                and time.time() - entry.get("resolved_at", 0) > NEGATIVE_TTL):
+            return False, None
+        return True, entry.get("project")
+
+    def _remember(self, name: str, source: str, project, unverified: list | None = None):
+        entry = {"project": project, "resolved_at": time.time()}
+        if unverified:
+            entry["unverified"] = unverified  # same-named projects, for a manual mapping
+        with self._lock:
+            self.mapping.setdefault(name, {})[source] = entry
+            self._dirty = True
+
+    # --- Project lookup (search) ---
+    # Each finder returns (project, unverified): the project whose author or links match the
+    # plugin.yml, or None plus the ids of same-named projects that couldn't be verified.
+
+    @staticmethod
+    def _verified(meta: dict, author: str | None, urls) -> bool:
+        if normalize(author) and normalize(author) in meta["authors_norm"]:
+            return True
+        return bool(meta["website"]) and meta["website"] in {url_key(u) for u in urls if u}
+
+    def _find_hangar(self, meta: dict):
+        data = self._get_json(f"{HANGAR_API}/projects", {"q": meta["name"], "limit": 10})
+        candidates = [p for p in (data or {}).get("result", []) if normalize(p.get("name")) == normalize(meta["name"])]
+        unverified = []
+        for p in candidates:
+            namespace = p["namespace"]
+            project = f"{namespace['owner']}/{namespace['slug']}"
+            urls = [link.get("url") for section in (p.get("settings") or {}).get("links") or []
+                    for link in section.get("links") or []]
+            if self._verified(meta, namespace["owner"], urls):
+                return project, []
+            unverified.append(project)
+        return None, unverified
+
+    def _find_spiget(self, meta: dict):
+        data = self._get_json(f"{SPIGET_API}/search/resources/{quote(meta['name'], safe='')}",
+                              {"field": "name", "size": 20})
+        candidates = [r for r in data or [] if normalize(r.get("name")) == normalize(meta["name"])]
+        # Prefer resources tested on our series
+        candidates.sort(key=lambda r: not _compatible(r.get("testedVersions"), self.mc_series))
+        unverified = []
+        for r in candidates:
+            urls = [r.get("sourceCodeLink"), r.get("donationLink")]
+            if not self._verified(meta, None, urls):
+                # Search results only carry the author id; the name costs one (cached) call
+                author_id = (r.get("author") or {}).get("id")
+                author = self._get_json(f"{SPIGET_API}/authors/{author_id}") if author_id is not None else None
+                if not self._verified(meta, (author or {}).get("name"), []):
+                    unverified.append(r["id"])
+                    continue
+            return r["id"], []
+        return None, unverified
+
+    def _find_modrinth(self, meta: dict):
+        facets = json.dumps([[f"categories:{loader}" for loader in MODRINTH_LOADERS]])
+        data = self._get_json(f"{MODRINTH_API}/search", {"query": meta["name"], "facets": facets, "limit": 10})
+        candidates = [h for h in (data or {}).get("hits", [])
+                      if normalize(meta["name"]) in (normalize(h.get("title")), normalize(h.get("slug")))]
+        unverified = []
+        for h in candidates:
+            # Search hits have no links; only the author can be checked
+            if self._verified(meta, h.get("author"), []):
+                return h["project_id"], []
+            unverified.append(h["project_id"])
+        return None, unverified
+
+    def project_for(self, meta: dict, source: str, log=print):
+        """Returns the project id of a plugin in a repository, searching only if it isn't mapped yet."""
+        name = meta["name"]
+        if source == "hangar" and name in self.overrides:
+            ns, slug = self.overrides[name]
+            return f"{ns}/{slug}"
+        known, project = self._mapped(name, source)
+        if known:
+            return project
+
+        project, unverified = meta["links"].get(source), []
+        if project is None:
+            finder = {"hangar": self._find_hangar, "spiget": self._find_spiget, "modrinth": self._find_modrinth}[source]
+            project, unverified = finder(meta)
+        if project:
+            log(f"    {source}: found {project}")
+        elif unverified:
+            log(f"    {source}: unresolved, same-named projects by other authors ({', '.join(map(str, unverified))}); "
+                f"map it by hand in {self.mapping_file} if one of them is right.")
+        else:
+            log(f"    {source}: not found")
+        self._remember(name, source, project, unverified)
+        return project
+
+    # --- Latest release per repository ---
+
+    def latest_hangar(self, project: str, log=print) -> dict | None:
+        ns, slug = project.split("/", 1)
+        latest = self._get_json(f"{HANGAR_API}/projects/{ns}/{slug.lower()}/versions/latest", {"channel": "Release"})
+        if not latest:
+            log(f"    hangar: no latest 'Release' version for {project}.")
+            return None
+        if latest.get("platform") != "PAPER" and "PAPER" not in latest.get("downloads", {}):
+            log(f"    hangar: incompatible platform for {project}: '{latest.get('platform', 'N/A')}'.")
+            return None
+        mc_versions = latest.get("minecraftVersions") or latest.get("platformDependencies", {}).get("PAPER", [])
+        if not _compatible(mc_versions, self.mc_series):
+            log(f"    hangar: {latest['name']} doesn't support {self.mc_series} (supports {', '.join(mc_versions)}).")
+            return None
+        paper = latest.get("downloads", {}).get("PAPER", {})
+        file_info = paper.get("fileInfo") or {}
+        file_name = latest.get("fileName") or file_info.get("name")
+        download_url = paper.get("downloadUrl") or f"{HANGAR_CDN}/plugins/{ns}/{slug}/versions/{latest['name']}/PAPER/{file_name}"
+        return {"source": "hangar", "project": project, "version": latest["name"],
+                "download_url": download_url, "sha256": file_info.get("sha256Hash"), "sha512": None}
+
+    def latest_spiget(self, project: int, log=print) -> dict | None:
+        resource = self._get_json(f"{SPIGET_API}/resources/{project}")
+        if not resource:
+            return None
+        if resource.get("external") or resource.get("file", {}).get("type") != ".jar":
+            log(f"    spiget: resource {project} is hosted externally; can't download it automatically.")
+            return None
+        if not _compatible(resource.get("testedVersions"), self.mc_series):
+            log(f"    spiget: resource {project} isn't tested on {self.mc_series}.")
+            return None
+        latest = self._get_json(f"{SPIGET_API}/resources/{project}/versions/latest")
+        if not latest:
+            return None
+        return {"source": "spiget", "project": project, "version": latest["name"],
+                "download_url": f"{SPIGET_API}/resources/{project}/download", "sha256": None, "sha512": None}
+
+    def latest_modrinth(self, project: str, log=print) -> dict | None:
+        versions = self._get_json(f"{MODRINTH_API}/project/{project}/version",
+                                  {"loaders": json.dumps(MODRINTH_LOADERS)})
+        for version in versions or []:
+            if version.get("version_type") != "release" or not _compatible(version.get("game_versions"), self.mc_series):
+                continue
+            files = version.get("files") or []
+            primary = next((f for f in files if f.get("primary")), files[0] if files else None)
+            if not primary:
+                continue
+            return {"source": "modrinth", "project": project, "version": version["version_number"],
+                    "download_url": primary["url"], "sha256": None, "sha512": primary.get("hashes", {}).get("sha512")}
+        log(f"    modrinth: no release of {project} supports {self.mc_series}.")
+        return None
+
+    def _latest_from(self, meta: dict, source: str, log) -> dict | None:
+        try:
+            project = self.project_for(meta, source, log)
+            if project is None:
+                return None
+            return getattr(self, f"latest_{source}")(project, log)
+        except requests.exceptions.RequestException as e:
+            log(f"    {source}: request failed: {e}")
+        except (ValueError, KeyError, TypeError) as e:
+            log(f"    {source}: unexpected API response: {e}")
+        return None
+
+    def resolve(self, entry: dict, log=print) -> dict | None:
+        """
+        Finds the newest compatible release of a plugin across all repositories.
+
+        Args:
+            entry (dict): The plugin_index entry of the plugin (needs at least 'name').
+            log (callable): Where progress messages are written (defaults to print).
+
+        Returns:
+            dict | None: The best release ('source', 'project', 'version', 'download_url',
+                         'sha256', 'sha512'), or None if no repository has one.
+        """
+        authors = entry.get("authors") or []
+        meta = {
+            "name": entry["name"],
+            "authors_norm": {normalize(a) for a in authors},
+            "links": links_from_website(entry.get("website")),
+            "website": url_key(entry.get("website")),
+        }
+        # Messages from the parallel lookups are collected per source to keep them in order
+        logs = {source: [] for source in SOURCES}
+        futures = {source: self.pool.submit(self._latest_from, meta, source, logs[source].append) for source in SOURCES}
+        releases = [futures[source].result() for source in SOURCES]
+        for source in SOURCES:
+            for line in logs[source]:
+                log(line)
+
+        releases = [r for r in releases if r]
+        if not releases:
+            return None
+        # Newest version wins; on a tie max() keeps the earlier (hash-verified) source in SOURCES
+        return max(releases, key=lambda r: version_key(r["version"]))
+
+# --- Main ---
+
+def main() -> int:
+    from plugin_index import PluginIndex
+
+    parser = argparse.ArgumentParser(description="Shows where each installed plugin is published.")
+    parser.add_argument("--mc-series", default="1.21", help="Minecraft series builds must support (default: 1.21)")
+    parser.add_argument("--forget", action="store_true", help="discard the saved mapping and search again")
+    args = parser.parse_args()
+
+    if args.forget:
+        MAPPING_FILE.unlink(missing_ok=True)
+    resolver = PluginResolver(requests.Session(), HttpCache(), args.mc_series)
+    try:
+        for entry in PluginIndex().refresh():
+            if not entry["name"]:
+                continue
+            print(f"{entry['name']} {entry['version']}")
+            release = resolver.resolve(entry)
+            if release:
+                print(f"  -> {release['source']} {release['project']}: {release['version']}")
+            else:
+                print("  -> no compatible release found")
+    finally:
+        resolver.close()
+    return 0
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+
+"""
+Idle-aware chunk pre-generation with Chunky, driven over RCON.
+
+Generating terrain while players explore is the main source of lag spikes,
+so this orchestrator pre-generates a square around the chosen seed's
+coordinates (saved by configure-server.py) while nobody is playing:
+
+    - starts a Chunky task for the target (world, center, radius)
+    - pauses it as soon as a player joins or MSPT stays above MSPT_PAUSE
+    - continues it once the server has been empty and calm for IDLE_GRACE
+    - keeps progress, rate and ETA in .cache/pregen.json, so they survive
+      server and bot restarts (Chunky keeps its own task position)
+
+The Telegram bot runs the orchestrator and answers /pregen; from the command line:
+
+    pregen.py start [--radius 2000] [--center X Z] [--world world]
+    pregen.py stop                # pause and stop resuming (Chunky keeps the task)
+    pregen.py cancel              # discard the task
+    pregen.py status
+    pregen.py run                 # orchestrate (when the bot isn't running)
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+from datetime import datetime
+from config_parsers import PropertiesDocument
+from rcon import RconClient, RconError, read_rcon_settings, server_status, strip_formatting
+
+# --- Configuration ---
+STATE_FILE = Path(".cache/pregen.json")
+SERVER_PROPERTIES = Path("server.properties")
+# Blocks from the center to each side of the square
+DEFAULT_RADIUS = 2000
+# Seconds between checks of players/MSPT/progress
+CHECK_INTERVAL = 30
+# Pause above MSPT_PAUSE for this many checks in a row; resume only below MSPT_RESUME
+MSPT_PAUSE = 60
+MSPT_RESUME = 40
+MSPT_STRIKES = 2
+# Seconds the server must stay empty and calm before generation continues
+IDLE_GRACE = 120
+# Weight of the newest measurement in the generation rate average
+RATE_SMOOTHING = 0.3
+PROGRESS_RE = re.compile(r"Processed: (\d+) chunks \((\d+(?:[.,]\d+)?)%\)")
+RATE_RE = re.compile(r"Rate: (\d+(?:[.,]\d+)?) cps")
+NO_TASK_RE = re.compile(r"No tasks? (?:running|to continue|exist|found)", re.IGNORECASE)
+
+# --- Classes ---
+
+class PregenError(Exception):
+    """Raised when there is no target or Chunky rejects a command."""
+
+
+class Pregen:
+    """
+    Reconciles the wanted generation state with Chunky every CHECK_INTERVAL.
+
+    Args:
+        command (callable): Async function running an RCON command and returning its answer.
+        fetch_status (callable): Async function returning rcon.server_status().
+        notify (callable): Optional async function receiving a message (e.g. "finished").
+        log (callable): Receives the orchestrator's own events.
+    """
+
+    def __init__(self, command, fetch_status, notify=None, log=print):
+        self.command = command
+        self.fetch_status = fetch_status
+        self.notify = notify
+        self.log = log
+        self._strikes = 0
+        self._idle_since = None
+        # The watcher's step() and the bot's start/stop/cancel share Chunky and the state file
+        self._lock = asyncio.Lock()
+
+    async def _chunky(self, *args) -> str:
+        answer = strip_formatting(await self.command("chunky " + " ".join(str(arg) for arg in args)))
+        if "confirm" in answer.lower():
+            answer = strip_formatting(await self.command("chunky confirm"))
+        return answer
+
+    async def start(self, radius: int | None = None, center: tuple[int, int] | None = None,
+                    world: str | None = None) -> dict:
+        """Enables generation for the saved (or given) target; a new target restarts from zero."""
+        async with self._lock:
+            return await self._start(radius, center, world)
+
+    async def _start(self, radius: int | None, center: tuple[int, int] | None, world: str | None) -> dict:
+        state = load_state()
+        target = {
+            "world": world or state.get("world") or level_name(),
+            "center": list(center) if center else state.get("center"),
+            "radius": radius or state.get("radius") or DEFAULT_RADIUS,
+        }
+        if target["center"] is None:
+            raise PregenError("no center: choose a seed in configure-server.py or pass --center X Z")
+        if any(target[key] != state.get(key) for key in target) or state.get("phase") in (None, "done", "cancelled"):
+            state = {**target, "phase": "new", "processed": 0, "percent": 0.0, "rate": None,
+                     "elapsed": 0.0, "started": datetime.now().isoformat(timespec="seconds")}
+        state["enabled"] = True
+        save_state(state)
+        return await self._step()
+
+    async def stop(self) -> dict:
+        """Pauses Chunky and stops resuming; the task can be continued with start()."""
+        async with self._lock:
+            return await self._stop()
+
+    async def _stop(self) -> dict:
+        state = load_state()
+        state["enabled"] = False
+        if state.get("phase") == "running":
+            await self._chunky("pause")
+            state["phase"] = "paused"
+            state["reason"] = "detenido a mano"
+        save_state(state)
+        return state
+
+    async def cancel(self) -> dict:
+        async with self._lock:
+            state = load_state()
+            await self._chunky("cancel")
+            state.update(enabled=False, phase="cancelled", reason=None)
+            save_state(state)
+            return state
+
+    async def _progress(self, state: dict) -> bool:
+        """Updates progress from 'chunky progress'. Returns whether a task is running."""
+        answer = await self._chunky("progress")
+        if (match := PROGRESS_RE.search(answer)):
+            processed, percent = int(match.group(1)), float(match.group(2).replace(",", "."))
+            now = time.time()
+            previous = state.get("sample")
+            if previous and processed > previous[0] and now > previous[1]:
+                rate = (processed - previous[0]) / (now - previous[1])
+                old = state.get("rate")
+                state["rate"] = rate if old is None else RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * old
+                state["elapsed"] = state.get("elapsed", 0.0) + now - previous[1]
+            elif state.get("rate") is None and (rate := RATE_RE.search(answer)):
+                state["rate"] = float(rate.group(1).replace(",", "."))
+            state["sample"] = [processed, now]
+            state["processed"], state["percent"] = processed, percent
+        else:
+            state.pop("sample", None)
+        running = "running" in answer.lower() and not NO_TASK_RE.search(answer)
+        return running
+
+    async def _finish(self, state: dict) -> dict:
+        state.update(phase="done", enabled=False, reason=None, percent=100.0, finished=datetime.now().isoformat(timespec="seconds"))
+        state.pop("sample", None)
+        save_state(state)
+        self.log(f"pre-generation finished: {state['processed']} chunks")
+        if self.notify:
+            await self.notify(f"🗺️ Pregeneración terminada: {state['processed']} chunks "
+                              f"(radio {state['radius']} en {state['world']}).")
+        return state
+
+    async def step(self) -> dict:
+        """One check: pause, continue or finish as needed. Returns the saved state."""
+        async with self._lock:
+            return await self._step()
+
+    async def _step(self) -> dict:
+        state = load_state()
+        if not state.get("enabled"):
+            return state
+        try:
+            status = await self.fetch_status()
+            running = await self._progress(state)
+        except RconError as e:
+            state["reason"] = f"servidor no disponible ({e})"
+            self._idle_since = None
+            save_state(state)
+            return state
+
+        if state.get("percent", 0) >= 100:
+            return await self._finish(state)
+
+        players = status["players"]["online"] or 0
+        mspt = status["mspt"]["avg"] if status["mspt"] else 0.0
+        self._strikes = self._strikes + 1 if mspt > MSPT_PAUSE else 0
+        busy_reason = None
+        if players > 0:
+            busy_reason = f"{players} jugador(es) conectado(s)"
+        elif self._strikes >= MSPT_STRIKES:
+            busy_reason = f"MSPT alto ({mspt:.0f} ms)"
+
+        now = time.monotonic()
+        if busy_reason or mspt > MSPT_RESUME:
+            self._idle_since = None
+        elif self._idle_since is None:
+            self._idle_since = now
+
+        if running and busy_reason:
+            await self._chunky("pause")
+            state.update(phase="paused", reason=busy_reason)
+            state.pop("sample", None)
+            self.log(f"pre-generation paused: {busy_reason}")
+        elif not running and self._idle_since is not None and now - self._idle_since >= IDLE_GRACE:
+            if state.get("phase") == "new":
+                for args in (("world", state["world"]), ("shape", "square"),
+                             ("center", *state["center"]), ("radius", state["radius"])):
+                    await self._chunky(*args)
+                answer = await self._chunky("start")
+            else:
+                answer = await self._chunky("continue")
+            if NO_TASK_RE.search(answer):
+                # Chunky keeps unfinished tasks across restarts and forgets them
+                # once done, so a task that can't be continued has finished
+                # between two checks
+                return await self._finish(state)
+            state.update(phase="running", reason=None)
+            self.log("pre-generation running")
+        elif not running:
+            state["phase"] = "waiting" if state.get("phase") != "new" else "new"
+            state["reason"] = busy_reason or ("esperando a que el servidor esté libre" if self._idle_since is None
+                                              else f"servidor libre, se reanuda en {IDLE_GRACE - (now - self._idle_since):.0f}s")
+        save_state(state)
+        return state
+
+    async def run(self, interval: float = CHECK_INTERVAL):
+        """Checks forever."""
+        while True:
+            try:
+                await self.step()
+            except (RconError, PregenError) as e:
+                self.log(f"pre-generation check failed: {e}")
+            except Exception as e:  # e.g. the state file can't be written; keep checking
+                self.log(f"pre-generation check failed: {e!r}")
+            await asyncio.sleep(interval)
+
+# --- Functions ---
+
+def load_state() -> dict:
+    try:
+        return json.loads(STATE_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state: dict):
+    """Writes the state atomically."""
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=STATE_FILE.parent, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def set_target(center: tuple[int, int], world: str | None = None, radius: int | None = None):
+    """Saves the pre-generation target (configure-server.py calls it with the seed's coordinates)."""
+    state = load_state()
+    state.update(center=list(center), world=world or state.get("world") or level_name(),
+                 radius=radius or state.get("radius") or DEFAULT_RADIUS)
+    save_state(state)
+
+
+def level_name(properties: Path = SERVER_PROPERTIES) -> str:
+    try:
+        return PropertiesDocument(properties.read_text(encoding="utf-8")).get("level-name") or "world"
+    except OSError:
+        return "world"
+
+
+def total_chunks(radius: int) -> int:
+    """Chunks in a square of 'radius' blocks around the center."""
+    side = 2 * -(-radius // 16) + 1
+    return side * side
+
+
+def expected_chunks(state: dict) -> float:
+    """Chunks of the whole task, from Chunky's percentage once known."""
+    if state.get("percent"):
+        return state["processed"] * 100 / state["percent"]
+    return total_chunks(state.get("radius", DEFAULT_RADIUS))
+
+
+def eta_seconds(state: dict) -> float | None:
+    if not state.get("rate"):
+        return None
+    return max(expected_chunks(state) - state.get("processed", 0), 0) / state["rate"]
+
+
+def format_duration(seconds: float | None) -> str:
+    if seconds is None:
+        return "?"
+    hours, rest = divmod(int(seconds), 3600)
+    return f"{hours}h {rest // 60:02d}m" if hours else f"{rest // 60}m {rest % 60:02d}s"
+
+
+def describe(state: dict) -> str:
+    """Summary for the bot and the CLI (Spanish, like the bot's replies)."""
+    if not state.get("center"):
+        return "🗺️ Sin objetivo de pregeneración. Elige una semilla en configure-server.py o usa --center."
+    phases = {"new": "pendiente", "running": "generando", "paused": "en pausa", "waiting": "esperando",
+              "done": "terminada", "cancelled": "cancelada"}
+    lines = [
+        f"🗺️ Pregeneración: {phases.get(state.get('phase'), 'sin iniciar')}"
+        + ("" if state.get("enabled") or state.get("phase") in ("done", "cancelled") else " (desactivada)"),
+        f"Mundo {state.get('world')}, centro {state['center'][0]} {state['center'][1]}, radio {state.get('radius')}",
+        f"Progreso: {state.get('percent', 0):.1f}% ({state.get('processed', 0)} chunks)",
+    ]
+    if state.get("phase") != "done":
+        rate = f"{state['rate']:.1f} chunks/s" if state.get("rate") else "?"
+        lines.append(f"Velocidad: {rate} · ETA: {format_duration(eta_seconds(state))} de generación")
+    if state.get("reason"):
+        lines.append(f"Motivo: {state['reason']}")
+    return "\n".join(lines)
+
+# --- Main ---
+
+async def _standalone(action: str, args) -> int:
+    client = RconClient(*read_rcon_settings())
+
+    async def fetch_status():
+        return await server_status(client)
+
+    pregen = Pregen(client.command, fetch_status)
+    try:
+        if action == "start":
+            state = await pregen.start(args.radius, tuple(args.center) if args.center else None, args.world)
+        elif action == "stop":
+            state = await pregen.stop()
+        elif action == "cancel":
+            state = await pregen.cancel()
+        else:
+            await pregen.run()
+            return 0
+    finally:
+        await client.close()
+    print(describe(state))
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Pre-generates chunks with Chunky while the server is idle.")
+    sub = parser.add_subparsers(dest="action", required=True)
+    start_parser = sub.add_parser("start", help="enable pre-generation")
+    start_parser.add_argument("--radius", type=int, help=f"blocks from the center (default: {DEFAULT_RADIUS})")
+    start_parser.add_argument("--center", type=int, nargs=2, metavar=("X", "Z"))
+    start_parser.add_argument("--world", help="world folder (default: level-name)")
+    sub.add_parser("stop", help="pause and stop resuming")
+    sub.add_parser("cancel", help="discard the Chunky task")
+    sub.add_parser("status", help="show progress and ETA")
+    sub.add_parser("run", help="orchestrate until interrupted")
+    args = parser.parse_args()
+
+    if args.action == "status":
+        print(describe(load_state()))
+        return 0
+    try:
+        return asyncio.run(_standalone(args.action, args))
+    except (RconError, PregenError) as e:
+        print(f"pregen: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 0
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
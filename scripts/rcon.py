@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+
+"""
+Asyncio RCON client with a persistent, auto-reconnecting connection.
+
+One TCP connection is opened and authenticated on first use and then shared
+by every caller. The server reads one packet per read and drops the
+connection if it finds more, so commands are serialised and each one is a
+strict request/response exchange. Minecraft splits long answers into several
+packets with no end marker, so once the first fragment of an answer arrives an
+invalid "sentinel" packet is sent; the server answers it after the command,
+which tells us the command's answer is complete. If the connection drops, the
+command fails with RconError (or is retried once if the connection had been
+idle) and the next command reconnects, with exponential backoff between
+failed attempts.
+
+    async with RconClient("127.0.0.1", 25575, password) as rcon:
+        tps, players = await asyncio.gather(rcon.command("tps"), rcon.command("list"))
+
+    status = await server_status(rcon)   # TPS, MSPT, players, chunks and entities
+
+The host, port and password are read from server.properties by
+read_rcon_settings(). From the command line:
+
+    rcon.py COMMAND...        # run a command and print its answer
+    rcon.py --status          # print the server status as JSON
+"""
+
+import re
+import sys
+import json
+import time
+import struct
+import asyncio
+import argparse
+import itertools
+from pathlib import Path
+from config_parsers import PropertiesDocument
+
+# --- Configuration ---
+SERVER_PROPERTIES = Path("server.properties")
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 25575
+# Seconds to wait for the connection, the login or an answer
+DEFAULT_TIMEOUT = 10
+# Reconnection backoff after a failed attempt (seconds, doubled up to the max)
+RECONNECT_BACKOFF = 1
+RECONNECT_BACKOFF_MAX = 30
+# Seconds a /status answer is reused before asking the server again
+STATUS_TTL = 5
+
+# Packet types of the Source RCON protocol used by Minecraft
+TYPE_RESPONSE = 0
+TYPE_COMMAND = 2
+TYPE_LOGIN = 3
+# Any other type is answered with "Unknown request ..." under the same id
+TYPE_SENTINEL = 200
+
+# Minecraft colour/format codes (§a, §l, ...)
+FORMAT_CODES = re.compile("§.")
+
+# --- Classes ---
+
+class RconError(Exception):
+    """Raised when the server can't be reached, rejects the login or drops the connection."""
+
+
+class RconClient:
+    """
+    Persistent RCON connection shared by concurrent callers.
+
+    Args:
+        host (str): Server address.
+        port (int): rcon.port of server.properties.
+        password (str): rcon.password of server.properties.
+        timeout (float): Seconds to wait for the connection, the login or an answer.
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, password: str = "",
+                 timeout: float = DEFAULT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._connect_lock = asyncio.Lock()
+        # One request on the wire at a time: the server reads one packet per read()
+        self._command_lock = asyncio.Lock()
+        self._ids = itertools.count(1)
+        self._backoff = 0
+        self._next_attempt = 0.0
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    @staticmethod
+    def _encode(request_id: int, packet_type: int, body: str) -> bytes:
+        payload = struct.pack("<ii", request_id, packet_type) + body.encode("utf-8") + b"\x00\x00"
+        return struct.pack("<i", len(payload)) + payload
+
+    @staticmethod
+    async def _read_packet(reader) -> tuple[int, int, str]:
+        (length,) = struct.unpack("<i", await reader.readexactly(4))
+        data = await reader.readexactly(length)
+        request_id, packet_type = struct.unpack("<ii", data[:8])
+        return request_id, packet_type, data[8:-2].decode("utf-8", errors="replace")
+
+    async def connect(self):
+        """
+        Opens and authenticates the connection if it isn't open already.
+
+        Raises:
+            RconError: If the server is unreachable, rejects the password, or a
+                       previous attempt failed less than the backoff delay ago.
+        """
+        async with self._connect_lock:
+            if self.connected:
+                return
+            wait = self._next_attempt - time.monotonic()
+            if wait > 0:
+                raise RconError(f"RCON unavailable, retrying in {wait:.0f}s")
+            try:
+                self._reader, self._writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), self.timeout)
+                login_id = next(self._ids)
+                self._writer.write(self._encode(login_id, TYPE_LOGIN, self.password))
+                await self._writer.drain()
+                request_id, _, _ = await asyncio.wait_for(self._read_packet(self._reader), self.timeout)
+                if request_id == -1:
+                    raise RconError("RCON password rejected")
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, RconError) as e:
+                self._drop_connection()
+                self._backoff = min(max(self._backoff * 2, RECONNECT_BACKOFF), RECONNECT_BACKOFF_MAX)
+                self._next_attempt = time.monotonic() + self._backoff
+                if isinstance(e, RconError):
+                    raise
+                raise RconError(f"can't connect to RCON at {self.host}:{self.port}: {e or type(e).__name__}") from e
+            self._backoff = 0
+            self._next_attempt = 0.0
+
+    def _drop_connection(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def _exchange(self, command: str) -> str:
+        """
+        Sends one command and collects its answer, one packet per round trip.
+
+        The sentinel goes out in its own write only after the first fragment of
+        the answer arrived, so the server never finds two packets in one read.
+        """
+        reader, writer = self._reader, self._writer
+        command_id, sentinel_id = next(self._ids), next(self._ids)
+        writer.write(self._encode(command_id, TYPE_COMMAND, command))
+        await writer.drain()
+        while True:
+            request_id, _, body = await self._read_packet(reader)
+            if request_id == command_id:
+                fragments = [body]
+                break
+        writer.write(self._encode(sentinel_id, TYPE_SENTINEL, ""))
+        await writer.drain()
+        while True:
+            request_id, _, body = await self._read_packet(reader)
+            if request_id == sentinel_id:
+                return "".join(fragments)
+            if request_id == command_id:
+                fragments.append(body)
+
+    async def command(self, command: str, timeout: float | None = None) -> str:
+        """
+        Runs a console command and returns its answer (format codes included).
+
+        Concurrent calls share the connection and are sent one after another.
+
+        Args:
+            command (str): The console command, without the leading slash.
+            timeout (float | None): Seconds to wait for the answer (defaults to the client's).
+
+        Raises:
+            RconError: If the server can't be reached or the answer doesn't arrive in time.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        async with self._command_lock:
+            for attempt in (1, 2):
+                reused = self.connected
+                if not reused:
+                    await self.connect()
+                try:
+                    return await asyncio.wait_for(self._exchange(command), timeout)
+                except asyncio.TimeoutError as e:
+                    # Late fragments would be read as the next command's answer
+                    self._drop_connection()
+                    raise RconError(f"no answer to '{command}' within {timeout}s") from e
+                except (OSError, asyncio.IncompleteReadError) as e:
+                    self._drop_connection()
+                    # A connection closed while idle (server restart): reconnect once
+                    if attempt == 2 or not reused:
+                        raise RconError(f"RCON connection lost: {e or type(e).__name__}") from e
+
+    async def close(self):
+        """Closes the connection."""
+        async with self._connect_lock:
+            self._drop_connection()
+
+
+class CoalescingCache:
+    """
+    Shares one in-flight call of an async function between concurrent callers
+    and reuses its result for 'ttl' seconds.
+
+    Args:
+        fetch (callable): Async function without arguments.
+        ttl (float): Seconds a result is reused.
+    """
+
+    def __init__(self, fetch, ttl: float = STATUS_TTL):
+        self.fetch = fetch
+        self.ttl = ttl
+        self._value = None
+        self._fetched_at = 0.0
+        self._task = None
+
+    async def get(self):
+        if self._value is not None and time.monotonic() - self._fetched_at < self.ttl:
+            return self._value
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._refresh())
+        # shield(): a cancelled caller must not cancel the query the others wait for
+        return await asyncio.shield(self._task)
+
+    async def _refresh(self):
+        try:
+            self._value = await self.fetch()
+            self._fetched_at = time.monotonic()
+            return self._value
+        finally:
+            self._task = None
+
+# --- Functions ---
+
+def strip_formatting(text: str) -> str:
+    """Removes Minecraft colour/format codes."""
+    return FORMAT_CODES.sub("", text)
+
+
+def read_rcon_settings(properties: Path = SERVER_PROPERTIES) -> tuple[str, int, str]:
+    """
+    Returns (host, port, password) from server.properties.
+
+    Raises:
+        RconError: If the file is missing or RCON is disabled.
+    """
+    try:
+        doc = PropertiesDocument(Path(properties).read_text(encoding="utf-8"))
+    except OSError as e:
+        raise RconError(f"can't read {properties}: {e}") from e
+    if doc.get("enable-rcon", "false").strip().lower() != "true":
+        raise RconError(f"RCON is disabled in {properties} (run configure-server.py)")
+    port = doc.get("rcon.port", "").strip()
+    return DEFAULT_HOST, int(port) if port.isdigit() else DEFAULT_PORT, doc.get("rcon.password", "")
+
+
+def parse_tps(answer: str) -> list[float]:
+    """TPS of the last 1, 5 and 15 minutes from Paper's 'tps' answer."""
+    text = strip_formatting(answer).split(":", 1)[-1]
+    return [float(value) for value in re.findall(r"\*?(\d+(?:\.\d+)?)", text)[:3]]
+
+
+def parse_mspt(answer: str) -> dict | None:
+    """Average/min/max tick time of the last 5 seconds from Paper's 'mspt' answer."""
+    values = re.findall(r"(\d+(?:\.\d+)?)/(\d+(?:\.\d+)?)/(\d+(?:\.\d+)?)", strip_formatting(answer))
+    if not values:
+        return None
+    avg, low, high = (float(v) for v in values[0])
+    return {"avg": avg, "min": low, "max": high}
+
+
+def parse_list(answer: str) -> dict:
+    """Online/max players and their names from the 'list' answer."""
+    text = strip_formatting(answer)
+    match = re.search(r"There are (\d+) (?:of a max of|out of maximum) (\d+) players online:?(.*)", text, re.DOTALL)
+    if not match:
+        return {"online": None, "max": None, "names": []}
+    names = [name.strip() for name in match.group(3).split(",") if name.strip()]
+    return {"online": int(match.group(1)), "max": int(match.group(2)), "names": names}
+
+
+def parse_chunkinfo_worlds(answer: str) -> dict[str, int]:
+    """Loaded chunks per world from Paper's 'paper chunkinfo *' answer."""
+    sections = re.findall(r"Chunks in ([^:\n]+):\s*Total:\s*(\d+)", strip_formatting(answer))
+    return {world.strip(): int(total) for world, total in sections if world.strip() != "all worlds"}
+
+
+def parse_chunkinfo(answer: str) -> int | None:
+    """Loaded chunks from Paper's 'paper chunkinfo *' answer (all worlds)."""
+    text = strip_formatting(answer)
+    if (match := re.search(r"Chunks in all worlds:\s*Total:\s*(\d+)", text)):
+        return int(match.group(1))
+    if (worlds := parse_chunkinfo_worlds(text)):
+        return sum(worlds.values())
+    totals = re.findall(r"Total:\s*(\d+)", text)
+    return sum(int(total) for total in totals) if totals else None
+
+
+def parse_entity_count(answer: str) -> int | None:
+    """Entities in all loaded chunks from 'execute if entity @e' ("Test passed, count: 57")."""
+    text = strip_formatting(answer)
+    if (match := re.search(r"count: (\d+)", text)):
+        return int(match.group(1))
+    return 0 if "Test failed" in text else None
+
+
+async def server_status(client: RconClient) -> dict:
+    """
+    Queries TPS, MSPT, players, loaded chunks and entities (queued on the shared connection).
+
+    Returns:
+        dict: {"tps": [1m, 5m, 15m], "mspt": {"avg", "min", "max"} | None,
+               "players": {"online", "max", "names"}, "chunks": int | None,
+               "chunks_by_world": {world: int}, "entities": int | None}.
+    """
+    tps, mspt, players, chunks, entities = await asyncio.gather(
+        client.command("tps"), client.command("mspt"),
+        client.command("list"), client.command("paper chunkinfo *"),
+        client.command("execute if entity @e"),
+    )
+    return {
+        "tps": parse_tps(tps),
+        "mspt": parse_mspt(mspt),
+        "players": parse_list(players),
+        "chunks": parse_chunkinfo(chunks),
+        "chunks_by_world": parse_chunkinfo_worlds(chunks),
+        "entities": parse_entity_count(entities),
+    }
+
+# --- Main ---
+
+async def _run(args) -> int:
+    host, port, password = read_rcon_settings(args.properties)
+    async with RconClient(args.host or host, args.port or port, password) as client:
+        if args.status:
+            print(json.dumps(await server_status(client), indent=2))
+        else:
+            print(strip_formatting(await client.command(" ".join(args.command))))
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Runs commands on the server over RCON.")
+    parser.add_argument("command", nargs="*", help="console command to run")
+    parser.add_argument("--status", action="store_true", help="print TPS, MSPT, players and loaded chunks as JSON")
+    parser.add_argument("--properties", type=Path, default=SERVER_PROPERTIES, help="server.properties to read the settings from")
+    parser.add_argument("--host", help=f"server address (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, help="RCON port (default: rcon.port of server.properties)")
+    args = parser.parse_args()
+    if not args.status and not args.command:
+        parser.error("a command or --status is required")
+
+    try:
+        return asyncio.run(_run(args))
+    except RconError as e:
+        print(f"rcon: {e}", file=sys.stderr)
+        return 1
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
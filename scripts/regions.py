@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+
+"""
+Analyzer and offline pruner for Anvil region files (world*/region/*.mca).
+
+Every region file is memory-mapped: the sector table gives each chunk's
+position and size without reading the chunk itself, and each chunk is
+decompressed only until InhabitedTime, Status, LastUpdate and its position
+have been found (the block sections that make up most of the NBT are never
+parsed). Region files are scanned in parallel by a process pool.
+
+Pruning removes the chunks players never spent time in (InhabitedTime), from
+region/ and from the matching entities/ and poi/ files, so the game simply
+generates them again if someone ever goes there. Chunks near the spawn and
+inside the pregen.py target are always kept. Region files are rewritten
+compacted, atomically, and only while the server is stopped.
+
+    regions.py scan [WORLD_DIR...] [--chunks] [--json] [-j N]
+    regions.py prune [WORLD_DIR...] [--max-inhabited SECONDS] [--spawn-radius BLOCKS] [--dry-run] [-j N]
+"""
+
+import os
+import re
+import sys
+import json
+import mmap
+import zlib
+import struct
+import argparse
+import tempfile
+from pathlib import Path
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pregen import load_state as load_pregen_state, level_name
+from supervisor import server_running
+
+# --- Configuration ---
+SECTOR = 4096
+HEADER_SIZE = 2 * SECTOR
+# Blocks around the spawn whose chunks are never pruned
+DEFAULT_SPAWN_RADIUS = 1024
+# Sibling folders whose region files hold per-chunk data of the same chunks
+CHUNK_DATA_DIRS = ("region", "entities", "poi")
+REGION_RE = re.compile(r"r\.(-?\d+)\.(-?\d+)\.mca$")
+# Fields read from each chunk (top level since 1.18, inside "Level" before)
+WANTED = {"InhabitedTime": 4, "LastUpdate": 4, "Status": 8, "xPos": 3, "zPos": 3}
+# Bytes of compressed input fed to the decompressor at a time
+READ_STEP = 16 * 1024
+TICKS_PER_SECOND = 20
+
+# --- Classes ---
+
+class RegionError(Exception):
+    """Raised when a region file or a chunk can't be read, or pruning isn't safe."""
+
+
+class NbtStream:
+    """
+    Sequential reader over a (possibly compressed) NBT payload.
+
+    Decompresses only as far as the reader gets, so stopping after the
+    wanted fields avoids inflating the rest of the chunk.
+    """
+
+    def __init__(self, data, compression: int):
+        self._data = memoryview(data)
+        self._pos_in = 0
+        self._buf = bytearray()
+        self._pos = 0
+        if compression == 1:
+            self._inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif compression == 2:
+            self._inflate = zlib.decompressobj()
+        elif compression == 3:
+            self._inflate = None
+            self._buf = bytearray(self._data)
+        else:
+            raise RegionError(f"unsupported chunk compression {compression}")
+
+    def read(self, n: int) -> bytes:
+        while len(self._buf) - self._pos < n:
+            if self._inflate is None or self._pos_in >= len(self._data):
+                raise RegionError("truncated NBT")
+            step = self._data[self._pos_in:self._pos_in + READ_STEP]
+            self._pos_in += len(step)
+            if self._pos > READ_STEP:
+                del self._buf[:self._pos]
+                self._pos = 0
+            self._buf += self._inflate.decompress(step)
+        chunk = bytes(self._buf[self._pos:self._pos + n])
+        self._pos += n
+        return chunk
+
+    def close(self):
+        """Releases the input, so a memory map it points into can be closed."""
+        self._data.release()
+
+    def unpack(self, fmt: str):
+        return struct.unpack(fmt, self.read(struct.calcsize(fmt)))[0]
+
+    def string(self) -> str:
+        return self.read(self.unpack(">H")).decode("utf-8", "replace")
+
+    def skip(self, tag: int):
+        """Skips the payload of a tag of the given type."""
+        fixed = {1: 1, 2: 2, 3: 4, 4: 8, 5: 4, 6: 8}
+        if tag in fixed:
+            self.read(fixed[tag])
+        elif tag in (7, 11, 12):
+            self.read(self.unpack(">i") * {7: 1, 11: 4, 12: 8}[tag])
+        elif tag == 8:
+            self.read(self.unpack(">H"))
+        elif tag == 9:
+            item, count = self.unpack(">b"), self.unpack(">i")
+            for _ in range(count):
+                self.skip(item)
+        elif tag == 10:
+            while (child := self.unpack(">b")) != 0:
+                self.read(self.unpack(">H"))
+                self.skip(child)
+        else:
+            raise RegionError(f"unknown NBT tag {tag}")
+
+    def value(self, tag: int):
+        formats = {1: ">b", 2: ">h", 3: ">i", 4: ">q", 5: ">f", 6: ">d"}
+        return self.string() if tag == 8 else self.unpack(formats[tag])
+
+
+# --- Functions ---
+
+def read_fields(stream: NbtStream, wanted: dict, descend: tuple = ("Level", "Data")) -> dict:
+    """
+    Reads the wanted scalar fields of the root compound, stopping as soon as all are found.
+
+    Args:
+        stream (NbtStream): Stream positioned at the root tag.
+        wanted (dict): Field name -> NBT tag type.
+        descend (tuple): Compounds searched as if they were the root (old chunk format, level.dat).
+
+    Returns:
+        dict: The fields found.
+    """
+    found = {}
+
+    def compound():
+        while (tag := stream.unpack(">b")) != 0:
+            name = stream.string()
+            if wanted.get(name) == tag:
+                found[name] = stream.value(tag)
+            elif tag == 10 and name in descend:
+                if compound():
+                    return True
+            else:
+                stream.skip(tag)
+            if len(found) == len(wanted):
+                return True
+        return False
+
+    if stream.unpack(">b") != 10:
+        raise RegionError("NBT root isn't a compound")
+    stream.read(stream.unpack(">H"))
+    compound()
+    return found
+
+
+def region_coords(path: Path) -> tuple[int, int]:
+    match = REGION_RE.search(path.name)
+    if not match:
+        raise RegionError(f"{path}: not a region file name")
+    return int(match.group(1)), int(match.group(2))
+
+
+def _chunk_payload(mm, path: Path, index: int, offset: int, rx: int, rz: int):
+    """Returns (compression, data) of a chunk; data is a zero-copy view of the map when possible."""
+    start = offset * SECTOR
+    length, compression = struct.unpack_from(">IB", mm, start)
+    if compression & 0x80:
+        # Oversized chunk stored in c.<x>.<z>.mcc next to the region file
+        external = path.with_name(f"c.{rx * 32 + index % 32}.{rz * 32 + index // 32}.mcc")
+        return compression & 0x7F, external.read_bytes()
+    if length < 1 or start + 4 + length > len(mm):
+        raise RegionError("chunk extends past the end of the file")
+    return compression, memoryview(mm)[start + 5:start + 4 + length]
+
+
+def _chunk_fields(mm, path: Path, index: int, offset: int, rx: int, rz: int) -> dict:
+    compression, data = _chunk_payload(mm, path, index, offset, rx, rz)
+    stream = NbtStream(data, compression)
+    try:
+        return read_fields(stream, WANTED)
+    finally:
+        # No view into the map may outlive it
+        stream.close()
+        if isinstance(data, memoryview):
+            data.release()
+
+
+def scan_region(path: Path, read_chunks: bool = True) -> dict:
+    """
+    Reads the sector table of a region file and, optionally, the wanted fields of each chunk.
+
+    Returns:
+        dict: {"path", "size", "chunks": [{"index", "x", "z", "sectors", "saved",
+               "inhabited", "last_update", "status"}], "errors"}.
+    """
+    rx, rz = region_coords(path)
+    report = {"path": str(path), "size": path.stat().st_size, "chunks": [], "errors": 0}
+    if report["size"] < HEADER_SIZE:
+        return report
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        locations = struct.unpack_from(">1024I", mm, 0)
+        timestamps = struct.unpack_from(">1024I", mm, SECTOR)
+        for index, location in enumerate(locations):
+            if not location:
+                continue
+            chunk = {"index": index, "x": rx * 32 + index % 32, "z": rz * 32 + index // 32,
+                     "sectors": location & 0xFF, "saved": timestamps[index]}
+            if read_chunks:
+                try:
+                    fields = _chunk_fields(mm, path, index, location >> 8, rx, rz)
+                    chunk["inhabited"] = fields.get("InhabitedTime")
+                    chunk["last_update"] = fields.get("LastUpdate")
+                    chunk["status"] = (fields.get("Status") or "?").removeprefix("minecraft:")
+                except (RegionError, OSError, zlib.error, struct.error) as e:
+                    chunk["error"] = str(e)
+                    report["errors"] += 1
+            report["chunks"].append(chunk)
+    return report
+
+
+def rewrite_region(path: Path, drop: set, dry_run: bool = False) -> tuple[int, int]:
+    """
+    Rewrites a region file without the chunks at the given indices, compacting its sectors.
+
+    Returns:
+        tuple[int, int]: File size before and after (0 if the file is removed).
+    """
+    before = path.stat().st_size
+    if before < HEADER_SIZE:
+        return before, before
+    rx, rz = region_coords(path)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        locations = struct.unpack_from(">1024I", mm, 0)
+        timestamps = struct.unpack_from(">1024I", mm, SECTOR)
+        if not any(locations[i] for i in drop):
+            return before, before
+        kept = [i for i, location in enumerate(locations) if location and i not in drop]
+        after = HEADER_SIZE + sum((locations[i] & 0xFF) * SECTOR for i in kept) if kept else 0
+        if dry_run:
+            return before, after
+        external = [path.with_name(f"c.{rx * 32 + i % 32}.{rz * 32 + i // 32}.mcc")
+                    for i in drop if locations[i] and mm[(locations[i] >> 8) * SECTOR + 4] & 0x80]
+        if kept:
+            new_locations, new_timestamps = [0] * 1024, [0] * 1024
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as out:
+                out.write(bytes(HEADER_SIZE))
+                sector = 2
+                for i in kept:
+                    offset, count = locations[i] >> 8, locations[i] & 0xFF
+                    out.write(mm[offset * SECTOR:(offset + count) * SECTOR].ljust(count * SECTOR, b"\0"))
+                    new_locations[i], new_timestamps[i] = (sector << 8) | count, timestamps[i]
+                    sector += count
+                out.seek(0)
+                out.write(struct.pack(">1024I", *new_locations) + struct.pack(">1024I", *new_timestamps))
+                out.flush()
+                os.fsync(out.fileno())
+    if kept:
+        os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        os.replace(tmp_path, path)
+    else:
+        path.unlink()
+    for mcc in external:
+        mcc.unlink(missing_ok=True)
+    return before, after
+
+
+def _protected(chunk: dict, areas: list) -> bool:
+    return any(x0 <= chunk["x"] <= x1 and z0 <= chunk["z"] <= z1 for x0, z0, x1, z1 in areas)
+
+
+def prune_region(path: Path, max_inhabited: int, areas: list, dry_run: bool) -> dict:
+    """
+    Removes the never-inhabited chunks of one region from region/, entities/ and poi/.
+
+    Args:
+        path (Path): The region/r.X.Z.mca file.
+        max_inhabited (int): Chunks inhabited for at most this many ticks are removed.
+        areas (list): Protected (min_x, min_z, max_x, max_z) squares, in chunks.
+        dry_run (bool): Only compute what would be removed.
+
+    Returns:
+        dict: {"path", "removed", "before", "after"} (bytes over the three folders).
+    """
+    report = scan_region(path)
+    drop = {chunk["index"] for chunk in report["chunks"]
+            if "error" not in chunk and chunk["inhabited"] is not None
+            and chunk["inhabited"] <= max_inhabited and not _protected(chunk, areas)}
+    result = {"path": str(path), "removed": len(drop), "before": 0, "after": 0}
+    for folder in CHUNK_DATA_DIRS:
+        sibling = path.parent.parent / folder / path.name
+        if sibling.exists():
+            before, after = rewrite_region(sibling, drop, dry_run) if drop else (sibling.stat().st_size,) * 2
+            result["before"] += before
+            result["after"] += after
+    return result
+
+
+def dimension_dirs(worlds: list[Path]) -> list[Path]:
+    """Folders holding a region/ folder: each world and its DIM-1/DIM1 subfolders."""
+    found = []
+    for world in worlds:
+        for candidate in (world, world / "DIM-1", world / "DIM1"):
+            if (candidate / "region").is_dir():
+                found.append(candidate)
+    return found
+
+
+def world_spawn(dimension: Path) -> tuple[int, int]:
+    """World spawn from level.dat (the origin for the nether and the end)."""
+    level_dat = dimension / "level.dat"
+    try:
+        fields = read_fields(NbtStream(level_dat.read_bytes(), 1), {"SpawnX": 3, "SpawnZ": 3})
+        return fields.get("SpawnX", 0), fields.get("SpawnZ", 0)
+    except (OSError, RegionError, zlib.error, struct.error):
+        return 0, 0
+
+
+def protected_areas(dimension: Path, spawn_radius: int) -> list:
+    """Chunk squares never pruned: around the spawn and the pre-generation target."""
+    def square(x: int, z: int, radius: int):
+        return ((x - radius) >> 4, (z - radius) >> 4, (x + radius) >> 4, (z + radius) >> 4)
+
+    areas = [square(*world_spawn(dimension), spawn_radius)]
+    pregen = load_pregen_state()
+    if pregen.get("center") and pregen.get("world") == dimension.name:
+        areas.append(square(*pregen["center"], pregen.get("radius", 0)))
+    return areas
+
+
+def region_summary(report: dict) -> dict:
+    chunks = report["chunks"]
+    never = [c for c in chunks if c.get("inhabited") == 0]
+    return {
+        "path": report["path"], "size": report["size"], "chunks": len(chunks), "errors": report["errors"],
+        "never_inhabited": len(never),
+        "never_inhabited_bytes": sum(c["sectors"] for c in never) * SECTOR,
+        "max_inhabited_s": max((c.get("inhabited") or 0 for c in chunks), default=0) / TICKS_PER_SECOND,
+        "status": dict(Counter(c.get("status", "?") for c in chunks)),
+    }
+
+
+def _mb(size: int) -> str:
+    return f"{size / (1024 * 1024):.1f} MB"
+
+# --- Main ---
+
+def scan(dimensions: list[Path], jobs: int, show_chunks: bool, as_json: bool) -> int:
+    output = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for dimension in dimensions:
+            regions = sorted((dimension / "region").glob("r.*.*.mca"))
+            reports = list(pool.map(scan_region, regions, chunksize=4))
+            extra = {folder: sum(p.stat().st_size for p in (dimension / folder).glob("r.*.*.mca"))
+                     for folder in CHUNK_DATA_DIRS[1:]}
+            output[str(dimension)] = {"regions": [region_summary(r) for r in reports], "other_bytes": extra}
+            if show_chunks:
+                for report, summary in zip(reports, output[str(dimension)]["regions"]):
+                    summary["chunk_list"] = report["chunks"]
+    if as_json:
+        print(json.dumps(output, indent=1))
+        return 0
+    for dimension, data in output.items():
+        regions = data["regions"]
+        total = sum(r["size"] for r in regions)
+        never = sum(r["never_inhabited_bytes"] for r in regions)
+        print(f"{dimension}: {len(regions)} regions, {sum(r['chunks'] for r in regions)} chunks, {_mb(total)} "
+              f"(+ entities {_mb(data['other_bytes']['entities'])}, poi {_mb(data['other_bytes']['poi'])}); "
+              f"never inhabited: {sum(r['never_inhabited'] for r in regions)} chunks, ~{_mb(never)}")
+        for r in sorted(regions, key=lambda r: r["size"], reverse=True):
+            status = ", ".join(f"{k} {v}" for k, v in sorted(r["status"].items()))
+            print(f"  {Path(r['path']).name:<16} {r['chunks']:>5} chunks {_mb(r['size']):>10}  "
+                  f"never inhabited {r['never_inhabited']:>4}  max {r['max_inhabited_s']:.0f}s  [{status}]"
+                  + (f"  {r['errors']} unreadable" if r["errors"] else ""))
+            for chunk in r.get("chunk_list", []):
+                inhabited = "?" if chunk.get("inhabited") is None else f"{chunk['inhabited'] / TICKS_PER_SECOND:.0f}s"
+                print(f"    chunk {chunk['x']:>6} {chunk['z']:>6}  {chunk['sectors'] * 4:>4} KB  inhabited {inhabited:>7}  "
+                      f"{chunk.get('status', '?')}  last update {chunk.get('last_update', '?')}"
+                      + (f"  ERROR {chunk['error']}" if "error" in chunk else ""))
+    return 0
+
+
+def prune(dimensions: list[Path], jobs: int, max_inhabited_s: int, spawn_radius: int, dry_run: bool) -> int:
+    if not dry_run and server_running():
+        raise RegionError("the server is running; stop it before pruning (or use --dry-run)")
+    max_ticks = max_inhabited_s * TICKS_PER_SECOND
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for dimension in dimensions:
+            regions = sorted((dimension / "region").glob("r.*.*.mca"))
+            areas = protected_areas(dimension, spawn_radius)
+            results = list(pool.map(prune_region, regions, [max_ticks] * len(regions),
+                                    [areas] * len(regions), [dry_run] * len(regions), chunksize=4))
+            removed = sum(r["removed"] for r in results)
+            saved = sum(r["before"] - r["after"] for r in results)
+            emptied = sum(1 for r in results if r["removed"] and not r["after"])
+            verb = "would remove" if dry_run else "removed"
+            print(f"{dimension}: {verb} {removed} chunks, {_mb(saved)} ({emptied} region files emptied)")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Reports and prunes the chunks stored in Anvil region files.")
+    sub = parser.add_subparsers(dest="action", required=True)
+    for name, help_text in (("scan", "per-region report"), ("prune", "remove never-inhabited chunks (server stopped)")):
+        action_parser = sub.add_parser(name, help=help_text)
+        action_parser.add_argument("worlds", nargs="*", type=Path, help="world folders (default: level-name*)")
+        action_parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    scan_parser = sub.choices["scan"]
+    scan_parser.add_argument("--chunks", action="store_true", help="list every chunk")
+    scan_parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    prune_parser = sub.choices["prune"]
+    prune_parser.add_argument("--max-inhabited", type=int, default=0, metavar="SECONDS",
+                              help="remove chunks players spent at most this long in (default: 0, never)")
+    prune_parser.add_argument("--spawn-radius", type=int, default=DEFAULT_SPAWN_RADIUS, metavar="BLOCKS",
+                              help=f"keep every chunk this close to the spawn (default: {DEFAULT_SPAWN_RADIUS})")
+    prune_parser.add_argument("--dry-run", action="store_true", help="only report what would be removed")
+    args = parser.parse_args()
+
+    worlds = args.worlds or sorted(p for p in Path(".").glob(f"{level_name()}*") if p.is_dir())
+    dimensions = dimension_dirs(worlds)
+    if not dimensions:
+        print("regions: no region folders found", file=sys.stderr)
+        return 1
+    try:
+        if args.action == "scan":
+            return scan(dimensions, args.jobs, args.chunks, args.json)
+        return prune(dimensions, args.jobs, args.max_inhabited, args.spawn_radius, args.dry_run)
+    except RegionError as e:
+        print(f"regions: {e}", file=sys.stderr)
+        return 1
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
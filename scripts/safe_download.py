@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+# Requires: pip install requests pyyaml
+
+"""
+Atomic, verified and resumable file downloads for plugin updates.
+
+The file is streamed to a hidden ".<name>.<url-hash>.part" file next to the destination
+(same filesystem, so the final rename is atomic). If the connection drops,
+the download resumes from where it stopped with an HTTP Range request, both
+within a run and across runs. The result is checked against the expected
+SHA-256/SHA-512 and/or plugin name before it replaces the destination with
+os.replace(), so the live JAR is never left truncated or half-written.
+
+Used as a module by update-plugins.py and as a command from shell scripts:
+
+    safe_download.py URL DEST [--sha256 HEX] [--sha512 HEX] [--expect-plugin NAME]
+"""
+
+import os
+import sys
+import time
+import hashlib
+import zipfile
+import argparse
+import requests
+from pathlib import Path
+from plugin_index import read_jar_metadata, sha256_file
+
+# --- Configuration ---
+# Seconds to wait for the server before giving up on a request
+HTTP_TIMEOUT = 30
+# Attempts (each one resuming the previous) before a download is abandoned
+DEFAULT_RETRIES = 4
+# Seconds to wait before the first retry; doubled on every further attempt
+RETRY_BACKOFF = 2
+# Size of the blocks written to disk while streaming
+CHUNK_SIZE = 64 * 1024
+
+# --- Classes ---
+
+class DownloadError(Exception):
+    """Raised when a file can't be downloaded or fails verification."""
+
+# --- Functions ---
+
+def partial_path(dest: Path, url: str) -> Path:
+    """
+    Returns the temporary file a download of 'url' to 'dest' is streamed into.
+
+    The URL is part of the name so a partial file is only ever resumed with
+    the same remote file it was started from.
+    """
+    url_hash = hashlib.sha1(url.encode("utf-8")).hexdigest()[:12]
+    return dest.with_name(f".{dest.name}.{url_hash}.part")
+
+
+def _fetch_into(session, url: str, part: Path, log) -> None:
+    """Streams 'url' into 'part', resuming from its current size when the server allows it."""
+    offset = part.stat().st_size if part.exists() else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+    with session.get(url, headers=headers, stream=True, timeout=HTTP_TIMEOUT) as response:
+        if offset and response.status_code == 416:
+            # Nothing left to fetch: the previous attempt already got the whole file
+            return
+        response.raise_for_status()
+        if offset and response.status_code == 206:
+            log(f"  Resuming download at {offset} bytes.")
+            mode = "ab"
+        else:
+            # Server ignored the Range header (or this is a fresh download)
+            mode = "wb"
+        with open(part, mode) as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _file_digest(path: Path, algorithm: str) -> str:
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def verify_file(path: Path, sha256: str | None = None, expect_plugin: str | None = None,
+                sha512: str | None = None) -> None:
+    """
+    Checks a downloaded JAR before it is installed.
+
+    Args:
+        path (Path): The file to check.
+        sha256 (str | None): Expected hex SHA-256, if the source publishes one.
+        expect_plugin (str | None): Plugin name its plugin.yml must declare.
+        sha512 (str | None): Expected hex SHA-512 (what Modrinth publishes).
+
+    Raises:
+        DownloadError: If any check fails.
+    """
+    if sha256:
+        actual = sha256_file(path)
+        if actual.lower() != sha256.lower():
+            raise DownloadError(f"SHA-256 mismatch: expected {sha256}, got {actual}")
+    if sha512:
+        actual = _file_digest(path, "sha512")
+        if actual.lower() != sha512.lower():
+            raise DownloadError(f"SHA-512 mismatch: expected {sha512}, got {actual}")
+    if not zipfile.is_zipfile(path):
+        raise DownloadError("downloaded file is not a valid JAR")
+    if expect_plugin:
+        meta = read_jar_metadata(path)
+        if meta["name"] != expect_plugin:
+            raise DownloadError(f"JAR declares plugin '{meta['name']}', expected '{expect_plugin}'")
+
+
+def download_file(session, url: str, dest: Path, sha256: str | None = None,
+                  expect_plugin: str | None = None, retries: int = DEFAULT_RETRIES, log=print,
+                  sha512: str | None = None) -> Path:
+    """
+    Downloads 'url' and atomically installs it at 'dest' once verified.
+
+    Args:
+        session: A requests.Session (or the requests module) used for the download.
+        url (str): The file to download.
+        dest (Path): Final location; replaced atomically, untouched on failure.
+        sha256 (str | None): Expected hex SHA-256 of the file.
+        expect_plugin (str | None): Plugin name the JAR must declare.
+        retries (int): Number of attempts, each one resuming the last.
+        log (callable): Where progress messages are written (defaults to print).
+        sha512 (str | None): Expected hex SHA-512 of the file.
+
+    Returns:
+        Path: The destination path.
+
+    Raises:
+        DownloadError: If the download can't be completed, fails verification or
+            can't be installed (filesystem errors included).
+    """
+    dest = Path(dest)
+    part = partial_path(dest, url)
+    # Partial files left by downloads of other versions can't be resumed any more
+    for stale in dest.parent.glob(f".{dest.name}.*.part"):
+        if stale != part:
+            try:
+                stale.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+    for attempt in range(1, retries + 1):
+        try:
+            _fetch_into(session, url, part, log)
+            break
+        except (requests.exceptions.RequestException, OSError) as e:
+            if attempt == retries:
+                # The partial file is kept so the next run can resume it
+                raise DownloadError(f"download failed after {retries} attempts: {e}") from e
+            wait = RETRY_BACKOFF * 2 ** (attempt - 1)
+            log(f"  Download interrupted ({e}); retrying in {wait}s...")
+            time.sleep(wait)
+
+    try:
+        verify_file(part, sha256, expect_plugin, sha512)
+    except DownloadError:
+        # A corrupt partial file must not be resumed next time
+        part.unlink(missing_ok=True)
+        raise
+    except OSError as e:
+        raise DownloadError(f"can't read the downloaded file: {e}") from e
+
+    try:
+        os.replace(part, dest)
+    except OSError as e:
+        raise DownloadError(f"can't install {dest}: {e}") from e
+    # Make the rename itself durable before reporting success
+    try:
+        dir_fd = os.open(dest.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError as e:
+        # The file is already in place; only a power cut could still undo the rename
+        log(f"  Warning: installed {dest.name} but couldn't sync {dest.parent}: {e}")
+    return dest
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Downloads a file atomically, with resume and verification.")
+    parser.add_argument("url")
+    parser.add_argument("dest", type=Path)
+    parser.add_argument("--sha256", help="expected hex SHA-256 of the file")
+    parser.add_argument("--sha512", help="expected hex SHA-512 of the file")
+    parser.add_argument("--expect-plugin", help="plugin name the downloaded JAR must declare")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help=f"download attempts (default: {DEFAULT_RETRIES})")
+    args = parser.parse_args()
+
+    try:
+        download_file(requests, args.url, args.dest, args.sha256, args.expect_plugin, args.retries, sha512=args.sha512)
+    except DownloadError as e:
+        print(f"safe_download: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+
+"""
+Native Server List Ping and GameSpy4 query clients, and the server health check.
+
+status() does what the multiplayer screen does: handshake, status request and
+ping/pong over the game port, returning the status JSON (MOTD, version,
+players) plus the measured round-trip latency. query() speaks the UDP query
+protocol (enable-query=true) and returns the full stat: plugins, map and the
+names of every player. Both have async versions for the bot.
+
+health() is the single "is the server up?" check used by the bot, main.sh and
+the updaters. It asks the supervisor for the process state and pings the game
+port, so it tells a server that accepts players apart from one that is still
+starting or stuck:
+
+    online        answering server-list pings
+    starting      supervised and booting (or restarting after a crash: backoff)
+    stopping      supervised and shutting down
+    unresponsive  the Java process is alive but the game port doesn't answer
+    stopped       no server process
+
+    server_ping.py status [HOST[:PORT]] [--json]
+    server_ping.py query [HOST[:PORT]] [--json]
+    server_ping.py check [--quiet]      # prints the state; exit 0 online, 10 stopped, 2 otherwise
+"""
+
+import sys
+import json
+import time
+import random
+import socket
+import struct
+import asyncio
+import argparse
+from pathlib import Path
+from config_parsers import PropertiesDocument
+from supervisor import SupervisorError, async_request, request, server_running
+
+# --- Configuration ---
+SERVER_PROPERTIES = Path("server.properties")
+DEFAULT_PORT = 25565
+DEFAULT_QUERY_PORT = 25565
+# Seconds allowed for the connection and each answer
+DEFAULT_TIMEOUT = 3
+MAX_PACKET = 2 * 1024 * 1024
+# Exit code of 'check' for a stopped server (1 is what Python exits with on a crash)
+EXIT_STOPPED = 10
+# Protocol version sent in the handshake; -1 asks for the server's own
+PROTOCOL_VERSION = -1
+
+# GameSpy4 query packets
+QUERY_MAGIC = b"\xfe\xfd"
+QUERY_HANDSHAKE = 9
+QUERY_STAT = 0
+QUERY_PADDING = b"\x00\x00\x00\x00"
+
+# --- Classes ---
+
+class ProtocolError(Exception):
+    """Raised when the other side sends something that isn't a valid packet or answer."""
+
+
+class _SocketReader:
+    """readexactly() over a blocking socket, so sync and async code share the packet parser."""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+
+    def readexactly(self, n: int) -> bytes:
+        data = bytearray()
+        while len(data) < n:
+            chunk = self.sock.recv(n - len(data))
+            if not chunk:
+                raise ProtocolError("connection closed by the server")
+            data += chunk
+        return bytes(data)
+
+# --- Functions ---
+
+def pack_varint(value: int) -> bytes:
+    value &= 0xFFFFFFFF
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def unpack_varint(data: bytes, pos: int = 0) -> tuple[int, int]:
+    result = 0
+    for shift in range(0, 35, 7):
+        if pos >= len(data):
+            raise ProtocolError("truncated varint")
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return (result - (1 << 32) if result & 0x80000000 else result), pos
+    raise ProtocolError("varint too long")
+
+
+def pack_string(text: str) -> bytes:
+    data = text.encode("utf-8")
+    return pack_varint(len(data)) + data
+
+
+def packet(packet_id: int, payload: bytes = b"") -> bytes:
+    body = pack_varint(packet_id) + payload
+    return pack_varint(len(body)) + body
+
+
+def _packet_length(header: bytes) -> int:
+    length, _ = unpack_varint(header)
+    if not 0 < length <= MAX_PACKET:
+        raise ProtocolError(f"bad packet length {length}")
+    return length
+
+
+def _split_packet(header: bytes, body: bytes) -> tuple[bytes, int, bytes]:
+    packet_id, pos = unpack_varint(body)
+    return header + body, packet_id, body[pos:]
+
+
+async def read_packet(reader, first: bytes = b"") -> tuple[bytes, int, bytes]:
+    """Reads one length-prefixed packet. Returns (raw bytes, packet id, payload)."""
+    header = bytearray(first)
+    while not header or header[-1] & 0x80:
+        if len(header) >= 5:
+            raise ProtocolError("packet length too long")
+        header += await reader.readexactly(1)
+    body = await reader.readexactly(_packet_length(bytes(header)))
+    return _split_packet(bytes(header), body)
+
+
+def read_packet_sync(reader: _SocketReader) -> tuple[bytes, int, bytes]:
+    """Blocking version of read_packet()."""
+    header = bytearray()
+    while not header or header[-1] & 0x80:
+        if len(header) >= 5:
+            raise ProtocolError("packet length too long")
+        header += reader.readexactly(1)
+    body = reader.readexactly(_packet_length(bytes(header)))
+    return _split_packet(bytes(header), body)
+
+
+def parse_handshake(payload: bytes) -> tuple[int, str, int, int]:
+    """Returns (protocol version, address, port, next state) of a handshake."""
+    protocol, pos = unpack_varint(payload)
+    length, pos = unpack_varint(payload, pos)
+    address = payload[pos:pos + length].decode("utf-8", "replace")
+    pos += length
+    port = struct.unpack_from(">H", payload, pos)[0]
+    next_state, _ = unpack_varint(payload, pos + 2)
+    return protocol, address, port, next_state
+
+
+def _status_requests(host: str, port: int) -> bytes:
+    """Handshake (next state: status) followed by the status request."""
+    handshake = pack_varint(PROTOCOL_VERSION) + pack_string(host) + struct.pack(">H", port) + pack_varint(1)
+    return packet(0x00, handshake) + packet(0x00)
+
+
+def _parse_status(packet_id: int, payload: bytes) -> dict:
+    if packet_id != 0x00:
+        raise ProtocolError(f"unexpected status packet {packet_id}")
+    length, pos = unpack_varint(payload)
+    try:
+        return json.loads(payload[pos:pos + length].decode("utf-8"))
+    except ValueError as e:
+        raise ProtocolError(f"invalid status JSON: {e}") from e
+
+
+def _check_pong(packet_id: int, payload: bytes, token: bytes):
+    if packet_id != 0x01 or payload != token:
+        raise ProtocolError("invalid pong")
+
+
+def status(host: str = "127.0.0.1", port: int = DEFAULT_PORT, timeout: float = DEFAULT_TIMEOUT) -> dict:
+    """
+    Server List Ping: the status JSON the server shows in the multiplayer screen.
+
+    Returns:
+        dict: The server's status, with "latency_ms" added (ping/pong round trip).
+
+    Raises:
+        OSError: If the server can't be reached or doesn't answer in time.
+        ProtocolError: If the answer isn't a valid status.
+    """
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        reader = _SocketReader(sock)
+        sock.sendall(_status_requests(host, port))
+        result = _parse_status(*read_packet_sync(reader)[1:])
+        token = struct.pack(">q", time.time_ns() // 1_000_000)
+        started = time.perf_counter()
+        sock.sendall(packet(0x01, token))
+        _check_pong(*read_packet_sync(reader)[1:], token)
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+async def async_status(host: str = "127.0.0.1", port: int = DEFAULT_PORT, timeout: float = DEFAULT_TIMEOUT) -> dict:
+    """Async version of status(); raises asyncio.TimeoutError on timeouts."""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(_status_requests(host, port))
+        await writer.drain()
+        result = _parse_status(*(await asyncio.wait_for(read_packet(reader), timeout))[1:])
+        token = struct.pack(">q", time.time_ns() // 1_000_000)
+        started = time.perf_counter()
+        writer.write(packet(0x01, token))
+        await writer.drain()
+        _check_pong(*(await asyncio.wait_for(read_packet(reader), timeout))[1:], token)
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    except asyncio.IncompleteReadError as e:
+        raise ProtocolError("connection closed by the server") from e
+    finally:
+        writer.close()
+    return result
+
+
+def query(host: str = "127.0.0.1", port: int = DEFAULT_QUERY_PORT, timeout: float = DEFAULT_TIMEOUT) -> dict:
+    """
+    GameSpy4 full stat over UDP (needs enable-query=true in server.properties).
+
+    Returns:
+        dict: The server's key/values (hostname, version, plugins, map, numplayers,
+            maxplayers...), "players" with the names online and "latency_ms".
+
+    Raises:
+        OSError: If the server doesn't answer in time.
+        ProtocolError: If the answer isn't a valid query response.
+    """
+    session = random.getrandbits(32) & 0x0F0F0F0F
+    session_bytes = struct.pack(">I", session)
+    with socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect((host, port))
+        started = time.perf_counter()
+        sock.send(QUERY_MAGIC + bytes([QUERY_HANDSHAKE]) + session_bytes)
+        answer = sock.recv(2048)
+        latency = (time.perf_counter() - started) * 1000
+        if answer[:5] != bytes([QUERY_HANDSHAKE]) + session_bytes:
+            raise ProtocolError("unexpected query handshake answer")
+        try:
+            token = int(answer[5:].split(b"\x00", 1)[0])
+        except ValueError as e:
+            raise ProtocolError("invalid challenge token") from e
+        sock.send(QUERY_MAGIC + bytes([QUERY_STAT]) + session_bytes + struct.pack(">i", token) + QUERY_PADDING)
+        answer = sock.recv(65535)
+    if answer[:5] != bytes([QUERY_STAT]) + session_bytes:
+        raise ProtocolError("unexpected query stat answer")
+    result = parse_full_stat(answer[5:])
+    result["latency_ms"] = round(latency, 1)
+    return result
+
+
+async def async_query(host: str = "127.0.0.1", port: int = DEFAULT_QUERY_PORT, timeout: float = DEFAULT_TIMEOUT) -> dict:
+    """Async version of query(), run in a worker thread (two small datagrams)."""
+    return await asyncio.to_thread(query, host, port, timeout)
+
+
+def parse_full_stat(data: bytes) -> dict:
+    """Parses the body of a full stat answer: 'splitnum' padding, key/value pairs, then players."""
+    pos = data.find(b"\x00\x80\x00")
+    if not data.startswith(b"splitnum") or pos < 0:
+        raise ProtocolError("invalid full stat")
+    pos += 3
+    result = {}
+    while True:
+        end = data.find(b"\x00", pos)
+        if end < 0:
+            raise ProtocolError("truncated full stat")
+        key = data[pos:end].decode("utf-8", "replace")
+        pos = end + 1
+        if not key:
+            break
+        end = data.find(b"\x00", pos)
+        if end < 0:
+            raise ProtocolError("truncated full stat")
+        result[key] = data[pos:end].decode("utf-8", "replace")
+        pos = end + 1
+    players = []
+    marker = data.find(b"\x01player_\x00\x00", pos)
+    if marker >= 0:
+        for name in data[marker + 10:].split(b"\x00"):
+            if not name:
+                break
+            players.append(name.decode("utf-8", "replace"))
+    result["players"] = players
+    for key in ("numplayers", "maxplayers", "hostport"):
+        if result.get(key, "").isdigit():
+            result[key] = int(result[key])
+    return result
+
+
+def motd_text(description) -> str:
+    """Flattens a status "description" (plain string or chat component) to text."""
+    if isinstance(description, str):
+        return description
+    if not isinstance(description, dict):
+        return ""
+    return description.get("text", "") + "".join(motd_text(part) for part in description.get("extra", []))
+
+
+def server_address(properties: Path = SERVER_PROPERTIES) -> tuple[str, int]:
+    """Where the server listens according to server.properties (server-ip, server-port)."""
+    try:
+        doc = PropertiesDocument(properties.read_text(encoding="utf-8"))
+    except OSError:
+        return "127.0.0.1", DEFAULT_PORT
+    host = (doc.get("server-ip") or "").strip()
+    port = (doc.get("server-port") or "").strip()
+    return host if host not in ("", "0.0.0.0", "::") else "127.0.0.1", int(port) if port.isdigit() else DEFAULT_PORT
+
+
+def query_address(properties: Path = SERVER_PROPERTIES) -> tuple[str, int]:
+    """Where the query protocol listens (query.port, on the server's address)."""
+    host, _ = server_address(properties)
+    try:
+        port = (PropertiesDocument(properties.read_text(encoding="utf-8")).get("query.port") or "").strip()
+    except OSError:
+        port = ""
+    return host, int(port) if port.isdigit() else DEFAULT_QUERY_PORT
+
+
+def _classify(supervised: dict | None, ping: dict | None, error: str | None) -> dict:
+    supervisor_state = supervised["state"] if supervised else None
+    if ping is not None:
+        state = "online"
+    elif supervisor_state in ("starting", "backoff"):
+        state = "starting"
+    elif supervisor_state == "stopping":
+        state = "stopping"
+    elif (supervised and supervised.get("pid") is not None) or (supervised is None and server_running()):
+        # A supervised "running" server whose port doesn't answer, or one started by hand
+        state = "unresponsive"
+    else:
+        state = "stopped"
+    return {
+        "state": state,
+        "supervisor": supervised,
+        "latency_ms": ping["latency_ms"] if ping else None,
+        "status": ping,
+        "error": error,
+    }
+
+
+def health(timeout: float = DEFAULT_TIMEOUT, properties: Path = SERVER_PROPERTIES) -> dict:
+    """
+    The server's health: supervisor state plus a server-list ping.
+
+    Returns:
+        dict: "state" (online, starting, stopping, unresponsive or stopped),
+            "supervisor" (its status, None if it isn't running), "latency_ms",
+            "status" (the ping's status JSON) and "error" (why the ping failed).
+    """
+    try:
+        supervised = request("status", timeout=5)
+    except SupervisorError:
+        supervised = None
+    ping, error = None, None
+    if supervised is None or supervised["state"] != "stopped":
+        try:
+            ping = status(*server_address(properties), timeout=timeout)
+        except (OSError, ProtocolError) as e:
+            error = str(e) or type(e).__name__
+    return _classify(supervised, ping, error)
+
+
+async def async_health(timeout: float = DEFAULT_TIMEOUT, properties: Path = SERVER_PROPERTIES) -> dict:
+    """Async version of health() for the Telegram bot."""
+    try:
+        supervised = await async_request("status")
+    except SupervisorError:
+        supervised = None
+    ping, error = None, None
+    if supervised is None or supervised["state"] != "stopped":
+        try:
+            ping = await async_status(*server_address(properties), timeout=timeout)
+        except (OSError, asyncio.TimeoutError, ProtocolError) as e:
+            error = str(e) or type(e).__name__
+    if ping is None and supervised is None:
+        # Only scans /proc, but keep the event loop free anyway
+        return await asyncio.to_thread(_classify, supervised, ping, error)
+    return _classify(supervised, ping, error)
+
+
+def _address(text: str | None, default: tuple[str, int]) -> tuple[str, int]:
+    if not text:
+        return default
+    host, _, port = text.rpartition(":") if text.count(":") == 1 else (text, "", "")
+    return host, int(port) if port else default[1]
+
+# --- Main ---
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Server List Ping / query client and server health check.")
+    sub = parser.add_subparsers(dest="action", required=True)
+    for name, help_text in (("status", "server-list ping (MOTD, version, players, latency)"),
+                            ("query", "UDP query full stat (plugins, map, player names)")):
+        action_parser = sub.add_parser(name, help=help_text)
+        action_parser.add_argument("address", nargs="?", help="HOST[:PORT] (default: from server.properties)")
+        action_parser.add_argument("--json", action="store_true")
+        action_parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    check_parser = sub.add_parser("check", help="print the server's health state")
+    check_parser.add_argument("--quiet", action="store_true", help="only set the exit code")
+    check_parser.add_argument("--json", action="store_true")
+    check_parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    args = parser.parse_args()
+
+    if args.action == "check":
+        try:
+            result = health(args.timeout)
+        except Exception as e:
+            # Never let a bug look like "stopped" to the scripts that only update a stopped server
+            print(f"server_ping: health check failed: {e!r}", file=sys.stderr)
+            return 2
+        if args.json:
+            print(json.dumps(result, indent=2, ensure_ascii=False))
+        elif not args.quiet:
+            print(result["state"])
+        return {"online": 0, "stopped": EXIT_STOPPED}.get(result["state"], 2)
+
+    try:
+        if args.action == "status":
+            result = status(*_address(args.address, server_address()), timeout=args.timeout)
+        else:
+            result = query(*_address(args.address, query_address()), timeout=args.timeout)
+    except (OSError, ProtocolError) as e:
+        print(f"server_ping: {e or type(e).__name__}", file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    elif args.action == "status":
+        players = result.get("players", {})
+        names = ", ".join(player.get("name", "?") for player in players.get("sample") or [])
+        print(f"MOTD:     {motd_text(result.get('description')).strip()}")
+        print(f"Version:  {result.get('version', {}).get('name', '?')} (protocol {result.get('version', {}).get('protocol', '?')})")
+        print(f"Players:  {players.get('online', '?')}/{players.get('max', '?')}" + (f" — {names}" if names else ""))
+        print(f"Latency:  {result['latency_ms']} ms")
+    else:
+        print(f"MOTD:     {result.get('hostname', '')}")
+        print(f"Version:  {result.get('version', '?')}  map: {result.get('map', '?')}")
+        print(f"Plugins:  {result.get('plugins') or '-'}")
+        print(f"Players:  {result.get('numplayers', '?')}/{result.get('maxplayers', '?')}"
+              + (f" — {', '.join(result['players'])}" if result["players"] else ""))
+        print(f"Latency:  {result['latency_ms']} ms")
+    return 0
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+
+"""
+Automatic spark profiling of MSPT spikes.
+
+Nobody is at the console when lag hits, so this watcher polls MSPT over RCON
+every CHECK_INTERVAL and, once the 5-second average has stayed at or above
+MSPT_THRESHOLD for SUSTAIN_SECONDS, runs spark's sampler (bundled with Paper)
+for PROFILE_SECONDS, recording only the ticks slower than the threshold:
+
+    spark profiler info
+    spark profiler start --only-ticks-over <ms> --timeout <s> --save-to-file
+    spark profiler info
+    spark profiler stop --save-to-file
+
+The report spark writes to plugins/spark/ is moved to profiles/ and parsed
+(spark's protobuf format, decoded here without extra dependencies) into a
+short summary of the hottest methods and plugins by self time, which the
+Telegram bot posts to the group. A COOLDOWN between runs keeps profiles from
+stacking. A profile already running (started by hand) is left alone: spark is
+asked before starting, and again before stopping so that only this watcher's
+own run is ever stopped.
+
+    spark_profiler.py watch              # when the bot isn't running
+    spark_profiler.py run [--seconds 60] # profile now
+    spark_profiler.py summary [FILE]     # summarise a .sparkprofile (default: newest)
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import shutil
+import struct
+import asyncio
+import argparse
+from pathlib import Path
+from datetime import datetime
+from collections import Counter
+from rcon import RconClient, RconError, parse_mspt, read_rcon_settings, strip_formatting
+
+# --- Configuration ---
+SPARK_DIR = Path("plugins/spark")
+PROFILES_DIR = Path("profiles")
+# Profiles kept in PROFILES_DIR (with their summaries)
+KEEP_PROFILES = 20
+MSPT_THRESHOLD = float(os.environ.get("SPARK_MSPT_THRESHOLD", 50))
+SUSTAIN_SECONDS = int(os.environ.get("SPARK_SUSTAIN_SECONDS", 15))
+PROFILE_SECONDS = int(os.environ.get("SPARK_PROFILE_SECONDS", 60))
+COOLDOWN = int(os.environ.get("SPARK_COOLDOWN", 1800))
+# Seconds between MSPT checks
+CHECK_INTERVAL = 5
+# Seconds to wait for spark to write the report after 'stop'
+SAVE_TIMEOUT = 30
+# Entries listed in the summary
+TOP = 5
+
+# --- Classes ---
+
+class ProfilerError(Exception):
+    """Raised when spark can't be started or its report can't be found or read."""
+
+
+class SpikeProfiler:
+    """
+    Watches MSPT and profiles sustained spikes with spark.
+
+    Args:
+        command (callable): Async function running an RCON command and returning its answer.
+        notify (callable): Optional async function receiving the summary text of each profile.
+        log (callable): Receives the watcher's own events.
+    """
+
+    def __init__(self, command, notify=None, log=print):
+        self.command = command
+        self.notify = notify
+        self.log = log
+        self.busy = False
+        self._above_since = None
+        self._last_run = None
+
+    async def profile(self, seconds: int = PROFILE_SECONDS, threshold: float = MSPT_THRESHOLD,
+                      trigger: str | None = None) -> dict:
+        """
+        Runs one bounded spark sampler run and summarises its report.
+
+        Returns:
+            dict: The summary (see summarize()), also saved next to the report.
+        """
+        if self.busy:
+            raise ProfilerError("a profile is already being recorded")
+        self.busy = True
+        try:
+            if (await self._active_profile())[0]:
+                raise ProfilerError("spark is already profiling (started by someone else)")
+            started = time.time()
+            answer = strip_formatting(await self.command(
+                f"spark profiler start --only-ticks-over {threshold:.0f} "
+                f"--timeout {seconds + SAVE_TIMEOUT} --save-to-file"))
+            if "already" in answer.lower():
+                raise ProfilerError("spark is already profiling (started by someone else)")
+            if "unknown" in answer.lower() or "not found" in answer.lower():
+                raise ProfilerError(f"spark didn't start: {answer.strip()[:200]}")
+            self.log(f"spark: profiling for {seconds}s ({trigger or 'manual'})")
+            await asyncio.sleep(seconds)
+            running, elapsed = await self._active_profile()
+            if not running:
+                raise ProfilerError("the profile was stopped before its end (by someone else)")
+            if elapsed is not None and elapsed < seconds - CHECK_INTERVAL:
+                # Ours was replaced by a younger one; it isn't ours to stop
+                raise ProfilerError(f"spark is running someone else's profile ({elapsed}s old); left alone")
+            await self.command("spark profiler stop --save-to-file")
+            report = await self._wait_for_report(started)
+        finally:
+            self.busy = False
+            self._last_run = time.monotonic()
+
+        PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+        target = PROFILES_DIR / datetime.fromtimestamp(started).strftime("%Y-%m-%d_%H%M%S.sparkprofile")
+        shutil.move(report, target)
+        summary = await asyncio.to_thread(summarize, target)
+        summary.update(trigger=trigger, seconds=seconds, threshold=threshold)
+        target.with_suffix(".json").write_text(json.dumps(summary, indent=1), encoding="utf-8")
+        prune_profiles()
+        return summary
+
+    async def _active_profile(self) -> tuple[bool, int | None]:
+        """Asks spark whether a profile is running and, if it says, for how many seconds."""
+        answer = strip_formatting(await self.command("spark profiler info")).lower()
+        # Paper's always-on background sampler is replaced by 'start', so it doesn't count
+        if "background" in answer or re.search(r"\b(not|no|isn't)\b[^.\n]*\b(running|active)\b", answer):
+            return False, None
+        match = re.search(r"profiled for (\d+)", answer)
+        return "running" in answer or match is not None, int(match.group(1)) if match else None
+
+    async def _wait_for_report(self, started: float) -> Path:
+        deadline = time.monotonic() + SAVE_TIMEOUT
+        while time.monotonic() < deadline:
+            reports = [p for p in SPARK_DIR.glob("**/*.sparkprofile") if p.stat().st_mtime >= started]
+            if reports:
+                newest = max(reports, key=lambda p: p.stat().st_mtime)
+                # Let spark finish writing it
+                size = newest.stat().st_size
+                await asyncio.sleep(1)
+                if newest.stat().st_size == size:
+                    return newest
+            await asyncio.sleep(1)
+        raise ProfilerError(f"spark didn't save a report in {SPARK_DIR} within {SAVE_TIMEOUT}s")
+
+    async def check(self):
+        """One MSPT check; profiles when the spike has lasted long enough and the cooldown is over."""
+        mspt = parse_mspt(await self.command("mspt"))
+        now = time.monotonic()
+        if mspt is None or mspt["avg"] < MSPT_THRESHOLD:
+            self._above_since = None
+            return
+        if self._above_since is None:
+            self._above_since = now
+        if now - self._above_since < SUSTAIN_SECONDS or self.busy:
+            return
+        if self._last_run is not None and now - self._last_run < COOLDOWN:
+            return
+        trigger = f"MSPT {mspt['avg']:.0f} ms durante {now - self._above_since:.0f}s"
+        self._above_since = None
+        try:
+            summary = await self.profile(trigger=trigger)
+        except ProfilerError as e:
+            self.log(f"spark: {e}")
+            return
+        if self.notify:
+            await self.notify(format_summary(summary))
+
+    async def watch(self, interval: float = CHECK_INTERVAL):
+        """Checks forever."""
+        while True:
+            try:
+                await self.check()
+            except RconError:
+                self._above_since = None  # server down or restarting
+            except Exception as e:  # a bad check must not stop automatic profiling
+                self._above_since = None
+                self.log(f"spark: check failed: {e!r}")
+            await asyncio.sleep(interval)
+
+# --- Functions ---
+
+def _varint(buf, pos: int) -> tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _fields(buf):
+    """Yields (field number, wire type, value) of a protobuf message."""
+    pos, end = 0, len(buf)
+    while pos < end:
+        key, pos = _varint(buf, pos)
+        number, wire = key >> 3, key & 7
+        if wire == 0:
+            value, pos = _varint(buf, pos)
+        elif wire == 1:
+            value, pos = buf[pos:pos + 8], pos + 8
+        elif wire == 2:
+            length, pos = _varint(buf, pos)
+            value, pos = buf[pos:pos + length], pos + length
+        elif wire == 5:
+            value, pos = buf[pos:pos + 4], pos + 4
+        else:
+            raise ProfilerError(f"unsupported protobuf wire type {wire}")
+        yield number, wire, value
+
+
+def _doubles(wire: int, value) -> list[float]:
+    if wire == 1:
+        return [struct.unpack("<d", value)[0]]
+    return list(struct.unpack(f"<{len(value) // 8}d", value))
+
+
+def _ints(wire: int, value) -> list[int]:
+    if wire == 0:
+        return [value]
+    result, pos = [], 0
+    while pos < len(value):
+        number, pos = _varint(value, pos)
+        result.append(number)
+    return result
+
+
+def _node(buf) -> dict:
+    """StackTraceNode: 1 time, 2 children, 3 class, 4 method, 8 times, 9 children_refs."""
+    node = {"class": "", "method": "", "time": 0.0, "times": [], "children": [], "refs": []}
+    for number, wire, value in _fields(buf):
+        if number == 1 and wire == 1:
+            node["time"] = struct.unpack("<d", value)[0]
+        elif number == 2:
+            node["children"].append(_node(value))
+        elif number == 3:
+            node["class"] = bytes(value).decode("utf-8", "replace")
+        elif number == 4:
+            node["method"] = bytes(value).decode("utf-8", "replace")
+        elif number == 8:
+            node["times"] += _doubles(wire, value)
+        elif number == 9:
+            node["refs"] += _ints(wire, value)
+    node["total"] = sum(node["times"]) if node["times"] else node["time"]
+    return node
+
+
+def parse_profile(data: bytes) -> tuple[list[dict], dict]:
+    """
+    Decodes spark's SamplerData into thread roots and the class -> plugin map.
+
+    Returns:
+        tuple[list[dict], dict]: Root nodes of every thread (with resolved children), class sources.
+    """
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    buf = memoryview(data)
+    roots, sources = [], {}
+    for number, _, value in _fields(buf):
+        if number == 2:
+            # ThreadNode: 3 children (nested, or flat with 5 children_refs as roots)
+            flat, refs = [], []
+            for t_number, t_wire, t_value in _fields(value):
+                if t_number == 3:
+                    flat.append(_node(t_value))
+                elif t_number == 5:
+                    refs += _ints(t_wire, t_value)
+            if refs:
+                for node in flat:
+                    node["children"] = [flat[i] for i in node["refs"] if i < len(flat)]
+                roots += [flat[i] for i in refs if i < len(flat)]
+            else:
+                roots += flat
+        elif number == 3:
+            entry = {n: bytes(v).decode("utf-8", "replace") for n, _, v in _fields(value)}
+            if 1 in entry and 2 in entry:
+                sources[entry[1]] = entry[2]
+    return roots, sources
+
+
+def summarize(path: Path, top: int = TOP) -> dict:
+    """Hottest methods and plugins of a report, by self time."""
+    try:
+        roots, sources = parse_profile(Path(path).read_bytes())
+    except (OSError, IndexError, struct.error, gzip.BadGzipFile) as e:
+        raise ProfilerError(f"{path}: can't read the report: {e}")
+    methods, plugins = Counter(), Counter()
+    total = 0.0
+    stack = [(root, None) for root in roots]
+    while stack:
+        node, plugin = stack.pop()
+        plugin = sources.get(node["class"], plugin)
+        own = node["total"] - sum(child["total"] for child in node["children"])
+        if own > 0:
+            methods[f"{node['class'].rsplit('.', 1)[-1]}.{node['method']}"] += own
+            plugins[plugin or "Paper/Minecraft"] += own
+            total += own
+        stack.extend((child, plugin) for child in node["children"])
+    total = total or 1.0
+
+    def share(counter: Counter) -> list:
+        return [[name, round(100 * value / total, 1)] for name, value in counter.most_common(top)]
+
+    return {"file": str(path), "methods": share(methods), "plugins": share(plugins)}
+
+
+def format_summary(summary: dict) -> str:
+    """Short Spanish summary for the Telegram group."""
+    lines = [f"🔬 Perfil de spark ({summary.get('trigger') or 'manual'}, {summary.get('seconds', '?')}s):"]
+    lines.append("Plugins: " + ", ".join(f"{name} {pct}%" for name, pct in summary["plugins"]))
+    lines.append("Métodos más costosos:")
+    lines += [f"  • {name} {pct}%" for name, pct in summary["methods"]]
+    lines.append(f"Informe: {summary['file']}")
+    return "\n".join(lines)
+
+
+def latest_summary() -> dict | None:
+    summaries = sorted(PROFILES_DIR.glob("*.json"))
+    try:
+        return json.loads(summaries[-1].read_text(encoding="utf-8")) if summaries else None
+    except (OSError, ValueError):
+        return None
+
+
+def prune_profiles(keep: int = KEEP_PROFILES):
+    for report in sorted(PROFILES_DIR.glob("*.sparkprofile"))[:-keep]:
+        report.unlink(missing_ok=True)
+        report.with_suffix(".json").unlink(missing_ok=True)
+
+# --- Main ---
+
+async def _with_client(action: str, args) -> int:
+    client = RconClient(*read_rcon_settings())
+    profiler = SpikeProfiler(client.command)
+    try:
+        if action == "watch":
+            profiler.notify = lambda text: asyncio.to_thread(print, text)
+            await profiler.watch()
+        else:
+            print(format_summary(await profiler.profile(args.seconds)))
+    finally:
+        await client.close()
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Profiles MSPT spikes with spark.")
+    sub = parser.add_subparsers(dest="action", required=True)
+    sub.add_parser("watch", help=f"profile when MSPT stays >= {MSPT_THRESHOLD:.0f} ms for {SUSTAIN_SECONDS}s")
+    run_parser = sub.add_parser("run", help="profile now")
+    run_parser.add_argument("--seconds", type=int, default=PROFILE_SECONDS)
+    summary_parser = sub.add_parser("summary", help="summarise a report")
+    summary_parser.add_argument("file", nargs="?", type=Path)
+    args = parser.parse_args()
+
+    try:
+        if args.action == "summary":
+            path = args.file or max(PROFILES_DIR.glob("*.sparkprofile"), default=None)
+            if path is None:
+                raise ProfilerError(f"no reports in {PROFILES_DIR}")
+            print(format_summary(summarize(path)))
+            return 0
+        return asyncio.run(_with_client(args.action, args))
+    except (RconError, ProfilerError) as e:
+        print(f"spark_profiler: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 0
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,50 +12,90 @@ if [[ ! -f paper.jar ]]; then
   exit 1
 fi
 
-# Asignación de memoria segura
-XMS="1536M"
-XMX="1536M"
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+
+# --no-attach: no abrir la consola al terminar (lo usa el bot de Telegram)
+ATTACH=true
+if [[ "${1:-}" == "--no-attach" ]]; then
+  ATTACH=false
+fi
+
+# Fichero con la línea de comandos efectiva del último arranque
+LAUNCH_FILE="launch-command.txt"
+
+# Argumentos de la JVM: los calcula tuning.py a partir del perfil guardado por
+# configure-server.py (server-tuning.json) o, si no hay, de uno "balanced":
+#   - heap según la memoria disponible ahora, dejando margen al sistema y a BlueMap
+#   - G1 con los flags de Aikar, o ZGC generacional con heaps grandes y núcleos de sobra
+#   - páginas grandes (HugePages/THP) si el kernel las ofrece
+# Si Python falla se usan los valores seguros de siempre.
+JVM_ARGS=()
+if JVM_OUTPUT="$(python3 "$SCRIPT_DIR/tuning.py" jvm-args 2>/dev/null)" && [[ -n "$JVM_OUTPUT" ]]; then
+  mapfile -t JVM_ARGS <<< "$JVM_OUTPUT"
+else
+  echo -e "${YELLOW}[!] No se pudo calcular el perfil; usando 1536M y G1.${RESET}"
+  JVM_ARGS=(
+    -server -Xms1536M -Xmx1536M
+    -XX:+UseG1GC -XX:+ParallelRefProcEnabled -XX:MaxGCPauseMillis=200
+    -XX:+UnlockExperimentalVMOptions -XX:+DisableExplicitGC -XX:+AlwaysPreTouch
+    -XX:G1NewSizePercent=30 -XX:G1MaxNewSizePercent=40 -XX:G1HeapRegionSize=8M
+    -XX:G1ReservePercent=20 -XX:G1HeapWastePercent=5 -XX:InitiatingHeapOccupancyPercent=15
+    -XX:G1MixedGCLiveThresholdPercent=90 -XX:SurvivorRatio=32 -XX:+PerfDisableSharedMem
+    -XX:MaxTenuringThreshold=1 -Dusing.aikars.flags=true -Daikars.new.flags=true
+  )
+fi
+
+GC="G1"
+GC_ID="g1"
+XMX="?"
+for arg in "${JVM_ARGS[@]}"; do
+  case "$arg" in
+    -Xmx*) XMX="${arg#-Xmx}" ;;
+    -XX:+UseZGC) GC="ZGC generacional"; GC_ID="zgc" ;;
+    -XX:+UseLargePages) PAGES="HugePages" ;;
+    -XX:+UseTransparentHugePages) PAGES="THP" ;;
+  esac
+done
+
+# Archivo CDS (clases precargadas de Paper y los plugins, ver warmup.py): se
+# reutiliza si paper.jar, plugins/ y Java no han cambiado; si no, se regenera
+# al detener el servidor
+CDS_ARGS=()
+if CDS_OUTPUT="$(python3 "$SCRIPT_DIR/warmup.py" cds-args --gc "$GC_ID" 2>/dev/null)" && [[ -n "$CDS_OUTPUT" ]]; then
+  mapfile -t CDS_ARGS <<< "$CDS_OUTPUT"
+  if [[ -f .cache/cds/server.jsa ]]; then
+    CDS="reutilizado (arranque en caliente)"
+  else
+    CDS="se creará al detener el servidor"
+  fi
+fi
 
 echo -e "${CYAN}${BOLD}Iniciando servidor:${RESET}"
-echo -e "  -Xms = ${YELLOW}${XMS}${RESET}"
-echo -e "  -Xmx = ${YELLOW}${XMX}${RESET}"
-
-# Flags Aikar para G1GC
-GC_FLAGS=(
-  -XX:+UseG1GC
-  -XX:+ParallelRefProcEnabled
-  -XX:MaxGCPauseMillis=200
-  -XX:+UnlockExperimentalVMOptions
-  -XX:+DisableExplicitGC
-  -XX:+AlwaysPreTouch
-  -XX:G1NewSizePercent=30
-  -XX:G1MaxNewSizePercent=40
-  -XX:G1HeapRegionSize=8M
-  -XX:G1ReservePercent=20
-  -XX:G1HeapWastePercent=5
-  -XX:InitiatingHeapOccupancyPercent=15
-  -XX:G1MixedGCLiveThresholdPercent=90
-  -XX:SurvivorRatio=32
-  -XX:+PerfDisableSharedMem
-  -XX:MaxTenuringThreshold=1
-  -Dusing.aikars.flags=true
-  -Daikars.new.flags=true
-)
-
-echo -e "${GREEN}[+] Lanzando servidor en screen 'minecraft'${RESET}"
-
-if ! screen -S minecraft -d -m java \
-  -server \
-  -Xms${XMS} -Xmx${XMX} \
-  "${GC_FLAGS[@]}" \
-  -jar paper.jar nogui; then
-  echo -e "${RED}[-] Error:${RESET} Falló al iniciar el servidor en screen. Verifica que screen esté instalado y funcionando."
+echo -e "  Heap     = ${YELLOW}${XMX}${RESET}"
+echo -e "  GC       = ${YELLOW}${GC}${RESET}"
+echo -e "  Páginas  = ${YELLOW}${PAGES:-normales}${RESET}"
+echo -e "  CDS      = ${YELLOW}${CDS:-no disponible}${RESET}"
+
+CMD=(java "${JVM_ARGS[@]}" "${CDS_ARGS[@]}" -jar paper.jar nogui)
+printf '%q ' "${CMD[@]}" > "$LAUNCH_FILE"
+echo >> "$LAUNCH_FILE"
+echo -e "  Comando  = ${YELLOW}${LAUNCH_FILE}${RESET}"
+
+echo -e "${GREEN}[+] Lanzando servidor con el supervisor${RESET}"
+
+# supervisor.py es dueño del proceso Java: guarda la consola en memoria, lo
+# reinicia si se cae o se cuelga y lo controlan el bot, main.sh y los updaters
+if ! python3 "$SCRIPT_DIR/supervisor.py" start -- "${CMD[@]}"; then
+  echo -e "${RED}[-] Error:${RESET} Falló al iniciar el servidor. Revisa ${BOLD}.cache/supervisor.log${RESET}."
   exit 1
 fi
 
 echo -e "${GREEN}[+] Servidor iniciado.${RESET}"
+if ! $ATTACH; then
+  exit 0
+fi
 echo
-echo -e "${CYAN}[-]Para ver la consola pulse ${BOLD}ENTER${CYAN}.${RESET}"
+echo -e "${CYAN}[-]Para ver la consola pulse ${BOLD}ENTER${CYAN} (Ctrl+C para salir sin detener el servidor).${RESET}"
 read
 
-screen -r minecraft
\ No newline at end of file
+exec python3 "$SCRIPT_DIR/supervisor.py" console
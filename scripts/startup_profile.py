@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+
+"""
+Per-plugin startup time breakdown, stored per boot, with regression flags.
+
+The startup section of a boot (launch to "Done (...)!") is cut into segments
+at the lines that mark a new phase, and each segment's wall time goes to:
+
+    jvm              launch to the first console line (JVM, Paperclip)
+    server           Paper's own work between the other phases
+    load:<plugin>    "[X] Loading server plugin X v1.2" (and its library downloads)
+    enable:<plugin>  "[X] Enabling X v1.2", until the next phase or an untagged Paper line
+    world            "Preparing level ..." (world and datapack loading)
+    spawn            "Preparing start region for dimension ..." (and Paper's "Time elapsed")
+    delayed init     "Running delayed init tasks" up to "Done"
+
+The supervisor saves every boot's console lines with millisecond offsets in
+.cache/boot-timeline.log, which is what 'record' reads by default; a log file
+(logs/latest.log, an old server_log.log, a rotated .log.gz) also works, with
+the one-second resolution of its timestamps.
+
+Each boot is stored in STATE_FILE with the Paper build and every plugin's
+version. A plugin whose startup time grew by REGRESSION_MS and REGRESSION_RATIO
+since its previous version (medians over the last boots of each version) is
+flagged once, and so is a Paper build that made the whole boot slower. The bot
+records every new boot and sends the flags to the group.
+
+    startup_profile.py record [--log FILE]   # store the last boot and print it
+    startup_profile.py show                   # breakdown of the last stored boot
+    startup_profile.py history [PLUGIN]       # boot (or plugin) times across boots
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import tempfile
+from pathlib import Path
+from statistics import median
+from log_watch import LATEST_LOG, LINE_RE
+from supervisor import BOOT_TIMELINE, DONE_RE
+
+# --- Configuration ---
+STATE_FILE = Path(".cache/startup-history.json")
+# Boots kept in the history
+MAX_BOOTS = 200
+# Boots of each version compared (medians, so one slow boot doesn't flag anything)
+REGRESSION_WINDOW = 5
+# Boots with the new version needed first (the first one often migrates configs)
+REGRESSION_MIN_BOOTS = 2
+# A plugin (or the whole boot after a Paper update) is flagged when it got this much slower...
+REGRESSION_MS = 1000
+# ...and at least this many times slower than with the previous version
+REGRESSION_RATIO = 1.5
+# Plugins listed by 'show' and in the bot's summary
+TOP_PLUGINS = 10
+# Seconds between checks for a new boot timeline (watch)
+CHECK_INTERVAL = 60
+
+LOAD_RE = re.compile(r"^\[(?P<tag>[^\]]+)\] Loading (?:server plugin )?(?P<name>\S+) v(?P<version>\S+)")
+LIBRARIES_RE = re.compile(r"^(?:\[SpigotLibraryLoader\] )?\[(?P<name>[^\]]+)\] Loading \d+ librar")
+ENABLE_RE = re.compile(r"^\[(?P<tag>[^\]]+)\] Enabling (?P<name>\S+) v(?P<version>\S+)")
+LEVEL_RE = re.compile(r'^Preparing level "(?P<name>[^"]+)"')
+SPAWN_RE = re.compile(r"^Preparing start region for dimension (?P<name>\S+)")
+SPAWN_ELAPSED_RE = re.compile(r"^Time elapsed: (?P<ms>\d+) ms")
+DELAYED_INIT_RE = re.compile(r"^Running delayed init tasks")
+SERVER_VERSION_RE = re.compile(r"This server is running (?P<software>\S+) version (?P<version>\S+(?: \(MC: [^)]+\))?)")
+TAGGED_RE = re.compile(r"^\[[^\]]+\] ")
+
+# --- Classes ---
+
+class StartupError(Exception):
+    """Raised when a log has no complete startup to parse."""
+
+# --- Functions ---
+
+def read_timeline(path: Path = BOOT_TIMELINE) -> tuple[float | None, list[tuple[float, str]]]:
+    """The supervisor's boot timeline: (launch time, [(ms since launch, console line)])."""
+    started, events = None, []
+    for line in path.read_text(encoding="utf-8", errors="replace").splitlines():
+        if line.startswith("# "):
+            started = float(line[2:])
+            continue
+        offset, _, text = line.partition("\t")
+        if offset.isdigit():
+            events.append((float(offset), text))
+    return started, events
+
+
+def read_log(path: Path) -> list[tuple[float, str]]:
+    """A log file's lines with ms offsets from its first timestamp (one-second resolution)."""
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+        lines = f.read().splitlines()
+    events, first, previous, day = [], None, None, 0
+    for line in lines:
+        match = LINE_RE.match(line)
+        if not match:
+            continue
+        h, m, s = (int(part) for part in match.group("time").split(":"))
+        seconds = h * 3600 + m * 60 + s
+        if previous is not None and seconds < previous:
+            day += 86400  # the boot crossed midnight
+        previous = seconds
+        seconds += day
+        first = seconds if first is None else first
+        events.append(((seconds - first) * 1000.0, line))
+    return events
+
+
+def parse_startup(events: list[tuple[float, str]], resolution_ms: int = 1) -> dict:
+    """
+    Attributes the wall time of the first startup in 'events' to plugins and phases.
+
+    Args:
+        events (list): (ms since launch, console line) pairs.
+        resolution_ms (int): Resolution of the offsets (1000 for log timestamps).
+
+    Returns:
+        dict: The boot: "total_ms", "paper", "paper_reported_s", "phases" (ms per
+            phase), "spawn" (ms per dimension) and "plugins" ({name: {"version",
+            "load", "enable"}}), plus a content hash in "id".
+
+    Raises:
+        StartupError: If there is no "Done" line.
+    """
+    phases = {"jvm": 0.0, "server": 0.0, "world": 0.0, "spawn": 0.0, "delayed init": 0.0}
+    plugins, spawn = {}, {}
+    paper, reported, digest = None, None, hashlib.sha1()
+    label, since, dimension = ("server", None), None, None
+
+    def plugin(name: str) -> dict:
+        return plugins.setdefault(name, {"version": None, "load": 0.0, "enable": 0.0})
+
+    def switch(new_label, at: float):
+        nonlocal label, since
+        if since is not None and new_label != label:
+            kind, name = label
+            if kind in ("load", "enable"):
+                plugin(name)[kind] += at - since
+            else:
+                phases[kind] += at - since
+        if new_label != label or since is None:
+            label, since = new_label, at
+
+    for offset, line in events:
+        match = LINE_RE.match(line)
+        message = match.group("message") if match else line
+        # Time and message only, so the console timeline and the log file give the same id
+        digest.update(f"{match.group('time') if match else ''}{message}".encode("utf-8", "replace"))
+        if since is None:
+            phases["jvm"] = offset
+            since = offset
+        if DONE_RE.search(message):
+            switch(None, offset)
+            reported = float(DONE_RE.search(message).group(1).replace(",", "."))
+            total = offset
+            break
+        if (m := SERVER_VERSION_RE.search(message)):
+            paper = re.sub(r"@\S+", "", m.group("version"))
+        if (m := LOAD_RE.match(message)):
+            plugin(m.group("name"))["version"] = m.group("version")
+            switch(("load", m.group("name")), offset)
+        elif (m := LIBRARIES_RE.match(message)):
+            switch(("load", m.group("name")), offset)
+        elif (m := ENABLE_RE.match(message)):
+            plugin(m.group("name"))["version"] = plugin(m.group("name"))["version"] or m.group("version")
+            switch(("enable", m.group("name")), offset)
+        elif LEVEL_RE.match(message):
+            switch(("world", None), offset)
+        elif (m := SPAWN_RE.match(message)):
+            dimension = m.group("name")
+            switch(("spawn", dimension), offset)
+        elif (m := SPAWN_ELAPSED_RE.match(message)):
+            if dimension:
+                spawn[dimension] = float(m.group("ms"))
+            switch(("server", None), offset)
+        elif DELAYED_INIT_RE.match(message):
+            switch(("delayed init", None), offset)
+        elif match and label[0] in ("load", "enable") and not TAGGED_RE.match(message):
+            # An untagged log line is Paper itself again (stack traces don't count)
+            switch(("server", None), offset)
+    else:
+        raise StartupError("no complete startup (no 'Done' line)")
+
+    for dimension in spawn:
+        spawn[dimension] = round(spawn[dimension])
+    return {
+        "id": digest.hexdigest()[:16],
+        "resolution_ms": resolution_ms,
+        "total_ms": round(total),
+        "paper": paper,
+        "paper_reported_s": reported,
+        "phases": {name: round(ms) for name, ms in phases.items()},
+        "spawn": spawn,
+        "plugins": {name: {**times, "load": round(times["load"]), "enable": round(times["enable"])}
+                    for name, times in plugins.items()},
+    }
+
+
+def plugin_ms(boot: dict, name: str) -> int | None:
+    times = boot["plugins"].get(name)
+    return times["load"] + times["enable"] if times else None
+
+
+def load_state() -> dict:
+    try:
+        state = json.loads(STATE_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        state = {}
+    state.setdefault("boots", [])
+    state.setdefault("flagged", [])
+    return state
+
+
+def save_state(state: dict):
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=STATE_FILE.parent, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def _version_change(boots: list[dict], value) -> tuple[list, list, str, str] | None:
+    """
+    Splits the history at the last change of value(boot) (a version): returns the
+    boots of the current and of the previous version (last REGRESSION_WINDOW of each)
+    and both versions, or None if the version never changed.
+    """
+    current = value(boots[-1])
+    for index in range(len(boots) - 2, -1, -1):
+        previous = value(boots[index])
+        if previous is not None and previous != current:
+            before = [b for b in boots[:index + 1] if value(b) == previous][-REGRESSION_WINDOW:]
+            after = [b for b in boots[index + 1:] if value(b) == current][-REGRESSION_WINDOW:]
+            return after, before, previous, current
+    return None
+
+
+def regressions(boots: list[dict]) -> list[dict]:
+    """Plugins (and Paper builds) of the last boot that are noticeably slower than their previous version."""
+    if len(boots) < 2:
+        return []
+    found = []
+    checks = [("Paper", lambda b: b.get("paper"), lambda b: b["total_ms"])]
+    for name in boots[-1]["plugins"]:
+        checks.append((name,
+                       lambda b, name=name: (b["plugins"].get(name) or {}).get("version"),
+                       lambda b, name=name: plugin_ms(b, name)))
+    for name, version_of, ms_of in checks:
+        change = _version_change(boots, version_of)
+        if change is None:
+            continue
+        after, before, old, new = change
+        if len(after) < REGRESSION_MIN_BOOTS:
+            continue
+        after_ms, before_ms = median(ms_of(b) for b in after), median(ms_of(b) for b in before)
+        if after_ms - before_ms >= REGRESSION_MS and after_ms >= REGRESSION_RATIO * before_ms:
+            found.append({"name": name, "from": old, "to": new,
+                          "before_ms": round(before_ms), "after_ms": round(after_ms), "boots": len(after)})
+    return found
+
+
+def record(log: Path | None = None) -> tuple[dict, list[dict]]:
+    """
+    Parses the last boot (the supervisor's timeline, or 'log') and stores it.
+
+    Returns:
+        tuple: The boot and the regressions flagged for the first time by it
+            (empty if the boot was already stored).
+
+    Raises:
+        StartupError: If there is nothing to parse.
+        OSError: If the file can't be read.
+    """
+    if log is None and BOOT_TIMELINE.exists():
+        started, events = read_timeline()
+        boot = parse_startup(events, resolution_ms=1)
+        boot["source"] = str(BOOT_TIMELINE)
+    else:
+        path = log or LATEST_LOG
+        started = path.stat().st_mtime
+        boot = parse_startup(read_log(path), resolution_ms=1000)
+        boot["source"] = str(path)
+    boot["started"] = started
+
+    state = load_state()
+    if any(b["id"] == boot["id"] for b in state["boots"]):
+        return boot, []
+    state["boots"] = (state["boots"] + [boot])[-MAX_BOOTS:]
+    new = []
+    for flag in regressions(state["boots"]):
+        key = f"{flag['name']}:{flag['from']}->{flag['to']}"
+        if key not in state["flagged"]:
+            state["flagged"].append(key)
+            new.append(flag)
+    save_state(state)
+    return boot, new
+
+
+async def watch(notify, interval: float = CHECK_INTERVAL):
+    """Records every boot the supervisor saves and passes the new regression flags to notify()."""
+    seen = None
+    while True:
+        try:
+            mtime = BOOT_TIMELINE.stat().st_mtime
+        except OSError:
+            mtime = None
+        if mtime is not None and mtime != seen:
+            seen = mtime
+            try:
+                _, flags = await asyncio.to_thread(record)
+                if flags:
+                    await notify(describe_regressions(flags))
+            except (OSError, StartupError) as e:
+                print(f"startup_profile: {e}", file=sys.stderr)
+        await asyncio.sleep(interval)
+
+
+def _seconds(ms: float) -> str:
+    return f"{ms / 1000:.1f} s"
+
+
+def describe(boot: dict, top: int = TOP_PLUGINS) -> str:
+    when = time.strftime("%Y-%m-%d %H:%M", time.localtime(boot["started"])) if boot.get("started") else "?"
+    phases = boot["phases"]
+    plugin_total = sum(t["load"] + t["enable"] for t in boot["plugins"].values())
+    lines = [
+        f"🚀 Arranque del {when}: {_seconds(boot['total_ms'])} hasta «Done»"
+        + (f" (Paper {boot['paper']})" if boot.get("paper") else ""),
+        f"  JVM y Paperclip: {_seconds(phases['jvm'])}",
+        f"  Paper: {_seconds(phases['server'])}",
+        f"  Plugins: {_seconds(plugin_total)} ({len(boot['plugins'])})",
+        f"  Mundos: {_seconds(phases['world'])}, zona de aparición: {_seconds(phases['spawn'])}"
+        + (" (" + ", ".join(f"{d.split(':')[-1]} {_seconds(ms)}" for d, ms in boot["spawn"].items()) + ")"
+           if boot["spawn"] else ""),
+        f"  Tareas finales: {_seconds(phases['delayed init'])}",
+    ]
+    slowest = sorted(boot["plugins"].items(), key=lambda item: item[1]["load"] + item[1]["enable"], reverse=True)
+    if slowest:
+        lines.append("Plugins más lentos (carga + activación):")
+        for name, times in slowest[:top]:
+            lines.append(f"  {name} {times['version'] or '?'}: {_seconds(times['load'] + times['enable'])}"
+                         f" ({_seconds(times['load'])} + {_seconds(times['enable'])})")
+    if boot.get("resolution_ms", 1) >= 1000:
+        lines.append("(desde el log: resolución de 1 s)")
+    return "\n".join(lines)
+
+
+def describe_regressions(flags: list[dict]) -> str:
+    lines = ["🐢 El arranque es más lento desde la última actualización:"]
+    for flag in flags:
+        lines.append(f"  {flag['name']} {flag['from']} → {flag['to']}: "
+                     f"{_seconds(flag['before_ms'])} → {_seconds(flag['after_ms'])} (mediana de {flag['boots']} arranque(s))")
+    return "\n".join(lines)
+
+
+def history(boots: list[dict], plugin: str | None = None) -> str:
+    lines = []
+    for boot in boots:
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(boot["started"])) if boot.get("started") else "?"
+        if plugin is None:
+            lines.append(f"{when}  {_seconds(boot['total_ms']):>8}  Paper {boot.get('paper') or '?'}")
+        elif plugin in boot["plugins"]:
+            times = boot["plugins"][plugin]
+            lines.append(f"{when}  {_seconds(plugin_ms(boot, plugin)):>8}  {plugin} {times['version'] or '?'}")
+    return "\n".join(lines) or "No boots recorded."
+
+# --- Main ---
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Per-plugin startup time breakdown and regression tracking.")
+    sub = parser.add_subparsers(dest="action", required=True)
+    record_parser = sub.add_parser("record", help="store the last boot and print its breakdown")
+    record_parser.add_argument("--log", type=Path, help=f"parse this log instead of {BOOT_TIMELINE}")
+    sub.add_parser("show", help="breakdown of the last stored boot")
+    history_parser = sub.add_parser("history", help="boot times (or one plugin's) across boots")
+    history_parser.add_argument("plugin", nargs="?")
+    args = parser.parse_args()
+
+    if args.action == "record":
+        try:
+            boot, flags = record(args.log)
+        except (OSError, StartupError) as e:
+            print(f"startup_profile: {e}", file=sys.stderr)
+            return 1
+        print(describe(boot))
+        if flags:
+            print(describe_regressions(flags))
+        return 0
+    boots = load_state()["boots"]
+    if args.action == "show":
+        if not boots:
+            print("No boots recorded (run 'startup_profile.py record').")
+            return 1
+        print(describe(boots[-1]))
+    else:
+        print(history(boots, args.plugin))
+    return 0
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
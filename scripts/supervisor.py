@@ -0,0 +1,631 @@
+#!/usr/bin/env python3
+
+"""
+Process supervisor for the Minecraft server (replaces screen).
+
+A small daemon owns the Java process directly: it reads its console through a
+pipe into a bounded ring buffer, writes console commands to its stdin, tracks
+its PID and state, and restarts it with exponential backoff when it crashes or
+hangs: a boot without "Done" within the start timeout is killed, a running
+server whose RCON stops answering is stopped cleanly ("stop", then TERM/KILL)
+and started again; tick hangs are left to Paper's own watchdog. A clean exit
+(code 0, e.g. "stop" from the console or RCON) is not restarted. The daemon
+lives as long as the server and is controlled through a Unix socket by this
+CLI, the Telegram bot, main.sh and the update scripts:
+
+    supervisor.py start [-- CMD...]   # start (CMD defaults to launch-command.txt)
+    supervisor.py stop                # "stop" on the console, then TERM/KILL
+    supervisor.py restart
+    supervisor.py status [--json]     # exit code 0 while the server process is alive
+    supervisor.py send say hola       # console command
+    supervisor.py logs [-n 50]        # last lines of the ring buffer
+    supervisor.py console             # live console (Ctrl+C/Ctrl+D detaches)
+
+States: starting -> running -> stopping -> stopped, plus "backoff" while
+waiting to restart after a crash or hang.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shlex
+import signal
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from collections import deque
+from datetime import datetime
+from rcon import RconClient, RconError, read_rcon_settings
+
+# --- Configuration ---
+SOCKET_FILE = Path(".cache/supervisor.sock")
+# Daemon output (its own events; the server writes logs/latest.log itself)
+DAEMON_LOG = Path(".cache/supervisor.log")
+# Command written by start.sh, used when "start" gets no command
+LAUNCH_FILE = Path("launch-command.txt")
+# Console lines kept in memory
+BUFFER_LINES = 2000
+# Console lines of the last boot with their millisecond offsets since launch (read by startup_profile.py)
+BOOT_TIMELINE = Path(".cache/boot-timeline.log")
+TIMELINE_LINES = 20000
+# Seconds to reach "Done" before the boot is considered hung (world generation on a Pi is slow)
+START_TIMEOUT = 900
+# Seconds to wait after "stop" before SIGTERM, and after SIGTERM before SIGKILL
+STOP_TIMEOUT = 120
+KILL_TIMEOUT = 15
+# Liveness check over RCON while running: interval and failures before a restart
+HEALTH_INTERVAL = 30
+HEALTH_FAILURES = 3
+# Restart backoff after a crash (seconds, doubled up to the max); reset after a stable run
+RESTART_BACKOFF = 5
+RESTART_BACKOFF_MAX = 300
+STABLE_AFTER = 600
+# Paper's line when the server is ready: Done (12.345s)! For help, type "help"
+DONE_RE = re.compile(r'Done \((\d+(?:[.,]\d+)?)s\)!')
+# Servers not started by the supervisor (any Paper jar name, e.g. paper-1.21.1-128.jar)
+SERVER_PATTERN = r"java .*-jar \S*paper\S*\.jar"
+
+# --- Classes ---
+
+class SupervisorError(Exception):
+    """Raised when the supervisor isn't running or rejects a request."""
+
+
+class Supervisor:
+    """
+    Owns one server process and restarts it when it crashes or hangs.
+
+    Args:
+        command (list[str]): Server command line (java ... -jar paper.jar nogui).
+        log (callable): Receives the supervisor's own events.
+    """
+
+    def __init__(self, command: list[str], log=print):
+        self.command = command
+        self.log = log
+        self.state = "stopped"
+        self.process = None
+        self.started_at = None
+        self.ready_at = None
+        self.timeline = []
+        self.last_exit = None
+        self.last_reason = None
+        self.restarts = 0
+        self.buffer = deque(maxlen=BUFFER_LINES)
+        self.finished = asyncio.Event()
+        self._followers: set[asyncio.Queue] = set()
+        self._stopping = False
+        self._hung = None
+        self._backoff = 0
+        self._restart_at = None
+        self._restart_task = None
+        self._tasks = []
+
+    def _set_state(self, state: str, reason: str | None = None):
+        self.state = state
+        if reason:
+            self.last_reason = reason
+        self.log(f"[{datetime.now():%H:%M:%S}] {state}" + (f": {reason}" if reason else ""))
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        return {
+            "state": self.state,
+            "pid": self.process.pid if self.alive else None,
+            "uptime": round(now - self.started_at) if self.alive and self.started_at else None,
+            "boot_seconds": round(self.ready_at - self.started_at, 1) if self.ready_at and self.started_at else None,
+            "restarts": self.restarts,
+            "last_exit": self.last_exit,
+            "last_reason": self.last_reason,
+            "restart_in": round(max(self._restart_at - now, 0)) if self._restart_at else None,
+            "command": self.command,
+            "buffered_lines": len(self.buffer),
+        }
+
+    async def start(self) -> dict:
+        """Starts the server unless its process is already alive."""
+        if self.alive:
+            return self.status()
+        if self._restart_task is not None:
+            self._restart_task.cancel()
+            self._restart_task = self._restart_at = None
+        self._stopping = False
+        self._hung = None
+        self.finished.clear()
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT, start_new_session=True, limit=1 << 20,
+        )
+        self.started_at = time.monotonic()
+        self.ready_at = None
+        self.timeline = [f"# {time.time():.3f}"]
+        self._set_state("starting", f"pid {self.process.pid}")
+        self._tasks = [asyncio.create_task(self._pump(self.process)),
+                       asyncio.create_task(self._watchdog(self.process))]
+        return self.status()
+
+    async def _pump(self, process):
+        """Copies console output to the ring buffer and followers, then handles the exit."""
+        while line := await process.stdout.readline():
+            text = line.decode("utf-8", errors="replace").rstrip("\r\n")
+            self.buffer.append(text)
+            for queue in list(self._followers):
+                try:
+                    queue.put_nowait(text)
+                except asyncio.QueueFull:
+                    self._followers.discard(queue)  # too slow; it gets disconnected
+            if self.state == "starting" and len(self.timeline) < TIMELINE_LINES:
+                self.timeline.append(f"{(time.monotonic() - self.started_at) * 1000:.0f}\t{text}")
+            if self.state == "starting" and DONE_RE.search(text):
+                self.ready_at = time.monotonic()
+                self._set_state("running", f"ready in {self.ready_at - self.started_at:.1f}s")
+                self._save_timeline()
+        code = await process.wait()
+        for task in self._tasks:
+            if task is not asyncio.current_task():
+                task.cancel()
+        await self._on_exit(code)
+
+    def _save_timeline(self):
+        try:
+            BOOT_TIMELINE.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=BOOT_TIMELINE.parent, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write("\n".join(self.timeline) + "\n")
+            os.replace(tmp_path, BOOT_TIMELINE)
+        except OSError as e:
+            self.log(f"can't write {BOOT_TIMELINE}: {e}")
+        self.timeline = []
+
+    async def _on_exit(self, code: int):
+        self.last_exit = code
+        ran = time.monotonic() - self.started_at
+        if self._stopping:
+            self._set_state("stopped", f"exit code {code}")
+            return
+        if code == 0 and not self._hung:
+            self._set_state("stopped", "clean shutdown")
+            self.finished.set()
+            return
+        if ran >= STABLE_AFTER:
+            self._backoff = 0
+        self._backoff = min(max(self._backoff * 2, RESTART_BACKOFF), RESTART_BACKOFF_MAX)
+        self._restart_at = time.monotonic() + self._backoff
+        self._set_state("backoff", f"{self._hung or f'crashed (exit code {code})'}, restarting in {self._backoff}s")
+        self._restart_task = asyncio.create_task(self._restart_later(self._backoff))
+
+    async def _restart_later(self, delay: float):
+        await asyncio.sleep(delay)
+        self._restart_task = self._restart_at = None
+        self.restarts += 1
+        try:
+            await self.start()
+        except OSError as e:
+            self.process = None
+            self.started_at = time.monotonic()
+            await self._on_exit(-1)
+            self.log(f"can't start the server: {e}")
+
+    async def _watchdog(self, process):
+        """Kills a stuck boot or stops a server whose RCON stops answering; _pump restarts it."""
+        try:
+            rcon = RconClient(*read_rcon_settings(), timeout=HEALTH_INTERVAL / 2)
+        except RconError:
+            rcon = None  # without RCON only the boot is watched
+        failures = 0
+        try:
+            while process.returncode is None:
+                await asyncio.sleep(HEALTH_INTERVAL)
+                if self.state == "starting":
+                    if time.monotonic() - self.started_at > START_TIMEOUT:
+                        await self._kill_hung(process, f"no 'Done' after {START_TIMEOUT}s")
+                        return
+                    continue
+                if self.state != "running" or rcon is None:
+                    continue
+                try:
+                    await rcon.command("list")
+                    failures = 0
+                except RconError as e:
+                    failures += 1
+                    self.log(f"RCON health check failed ({failures}/{HEALTH_FAILURES}): {e}")
+                    if failures >= HEALTH_FAILURES:
+                        # Could be a long GC pause or save: give it the normal "stop" path.
+                        # Real tick hangs are Paper's own watchdog's job.
+                        await self._restart_unresponsive(process, f"RCON unresponsive for {failures * HEALTH_INTERVAL}s")
+                        return
+        finally:
+            if rcon is not None:
+                await rcon.close()
+
+    async def _kill_hung(self, process, reason: str):
+        self._hung = f"hung ({reason})"
+        self.log(f"killing pid {process.pid}: {self._hung}")
+        _signal_group(process, signal.SIGKILL)
+
+    async def _restart_unresponsive(self, process, reason: str):
+        """Stops the server cleanly ("stop", then TERM/KILL); _pump restarts it after the exit."""
+        self._hung = f"hung ({reason})"
+        self._set_state("stopping", self._hung)
+        await self._terminate(process, STOP_TIMEOUT)
+
+    async def _terminate(self, process, timeout: float):
+        """Sends "stop" and escalates to SIGTERM and SIGKILL until the process exits."""
+        try:
+            await self.send("stop")
+        except (OSError, SupervisorError):
+            pass
+        for sig, wait in ((None, timeout), (signal.SIGTERM, KILL_TIMEOUT), (signal.SIGKILL, None)):
+            if sig is not None:
+                self.log(f"server still running, sending {sig.name}")
+                _signal_group(process, sig)
+            try:
+                await asyncio.wait_for(process.wait(), wait)
+                break
+            except asyncio.TimeoutError:
+                continue
+
+    async def send(self, line: str):
+        """Writes a command to the server console."""
+        if not self.alive:
+            raise SupervisorError("the server isn't running")
+        self.process.stdin.write(line.rstrip("\n").encode("utf-8") + b"\n")
+        await self.process.stdin.drain()
+
+    async def stop(self, timeout: float = STOP_TIMEOUT) -> dict:
+        """
+        Stops the server with "stop", then SIGTERM and SIGKILL if it doesn't exit.
+
+        Args:
+            timeout (float): Seconds to wait after "stop".
+        """
+        if self._restart_task is not None:
+            self._restart_task.cancel()
+            self._restart_task = self._restart_at = None
+        if self.alive:
+            self._stopping = True
+            self._set_state("stopping")
+            await self._terminate(self.process, timeout)
+            # Let _pump record the exit before answering
+            await asyncio.wait(self._tasks, timeout=KILL_TIMEOUT)
+        self.state = "stopped"
+        return self.status()
+
+    async def restart(self) -> dict:
+        await self.stop()
+        self.restarts += 1
+        return await self.start()
+
+    async def handle(self, reader, writer):
+        """Serves one JSON request per connection: {"op": ..., ...}."""
+        op = None
+        try:
+            request = json.loads(await reader.readline() or "{}")
+            op = request.get("op")
+            if op == "follow":
+                await self._follow(writer, int(request.get("lines", 50)))
+                return
+            if op == "status":
+                response = self.status()
+            elif op == "start":
+                response = await self.start()
+            elif op == "stop":
+                response = await self.stop(float(request.get("wait", STOP_TIMEOUT)))
+            elif op == "restart":
+                response = await self.restart()
+            elif op == "send":
+                await self.send(request["line"])
+                response = self.status()
+            elif op == "logs":
+                lines = int(request.get("lines", 50))
+                response = {"lines": list(self.buffer)[-lines:] if lines > 0 else []}
+            else:
+                raise SupervisorError(f"unknown request: {op!r}")
+            response = {"ok": True, **response}
+        except (SupervisorError, OSError, ValueError, KeyError) as e:
+            response = {"ok": False, "error": str(e)}
+        try:
+            writer.write(json.dumps(response).encode("utf-8") + b"\n")
+            await writer.drain()
+        except OSError:
+            pass
+        finally:
+            writer.close()
+            # The daemon exits once the stop has been answered
+            if op == "stop" and response["ok"]:
+                self.finished.set()
+
+    async def _follow(self, writer, lines: int):
+        """Streams the last 'lines' lines and then every new one until the client leaves."""
+        queue = asyncio.Queue(maxsize=BUFFER_LINES)
+        for text in list(self.buffer)[-lines:] if lines > 0 else []:
+            queue.put_nowait(text)
+        self._followers.add(queue)
+        try:
+            while queue in self._followers:
+                try:
+                    text = await asyncio.wait_for(queue.get(), 1)
+                except asyncio.TimeoutError:
+                    if writer.is_closing():
+                        break
+                    continue
+                writer.write(text.encode("utf-8") + b"\n")
+                await writer.drain()
+        except OSError:
+            pass
+        finally:
+            self._followers.discard(queue)
+            writer.close()
+
+# --- Functions ---
+
+def _signal_group(process, sig: signal.Signals):
+    """Signals the server's whole session, so no child keeps the console pipe open."""
+    try:
+        os.killpg(process.pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+def request(op: str, timeout: float | None = STOP_TIMEOUT + KILL_TIMEOUT + 10, **params) -> dict:
+    """
+    Sends a request to the running supervisor.
+
+    Raises:
+        SupervisorError: If the supervisor isn't running or the request failed.
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(SOCKET_FILE))
+            sock.sendall(json.dumps({"op": op, **params}).encode("utf-8") + b"\n")
+            data = sock.makefile("rb").readline()
+    except (FileNotFoundError, ConnectionRefusedError) as e:
+        raise SupervisorError("the supervisor isn't running") from e
+    except OSError as e:
+        raise SupervisorError(f"supervisor request failed: {e}") from e
+    return _check(data)
+
+
+async def async_request(op: str, **params) -> dict:
+    """Async version of request() for the Telegram bot."""
+    try:
+        reader, writer = await asyncio.open_unix_connection(str(SOCKET_FILE))
+    except (FileNotFoundError, ConnectionRefusedError) as e:
+        raise SupervisorError("the supervisor isn't running") from e
+    try:
+        writer.write(json.dumps({"op": op, **params}).encode("utf-8") + b"\n")
+        await writer.drain()
+        data = await reader.readline()
+    except OSError as e:
+        raise SupervisorError(f"supervisor request failed: {e}") from e
+    finally:
+        writer.close()
+    return _check(data)
+
+
+def _check(data: bytes) -> dict:
+    if not data:
+        raise SupervisorError("the supervisor closed the connection")
+    response = json.loads(data)
+    if not response.pop("ok", False):
+        raise SupervisorError(response.get("error", "request failed"))
+    return response
+
+
+def server_running() -> bool:
+    """Whether a server process is alive, supervised or not."""
+    try:
+        if request("status", timeout=5)["pid"] is not None:
+            return True
+    except SupervisorError:
+        pass
+    return server_process() is not None
+
+
+def server_process() -> int | None:
+    """PID of a process whose command line matches SERVER_PATTERN (read from /proc, like pgrep -f)."""
+    pattern = re.compile(SERVER_PATTERN)
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit() or int(entry.name) == os.getpid():
+            continue
+        try:
+            cmdline = (entry / "cmdline").read_bytes()
+        except OSError:
+            continue
+        if pattern.search(cmdline.replace(b"\0", b" ").decode("utf-8", "replace")):
+            return int(entry.name)
+    return None
+
+
+def launch_command() -> list[str]:
+    """The command start.sh wrote to launch-command.txt."""
+    try:
+        command = shlex.split(LAUNCH_FILE.read_text(encoding="utf-8"))
+    except OSError as e:
+        raise SupervisorError(f"no command given and {LAUNCH_FILE} can't be read (run start.sh): {e}") from e
+    if not command:
+        raise SupervisorError(f"{LAUNCH_FILE} is empty (run start.sh)")
+    return command
+
+
+def spawn_daemon(command: list[str], wait: float = 10) -> dict:
+    """Starts the supervisor daemon in the background and returns the first status."""
+    DAEMON_LOG.parent.mkdir(parents=True, exist_ok=True)
+    with open(DAEMON_LOG, "ab") as log:
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "daemon", "--", *command],
+                         stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                         start_new_session=True)
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            return request("status", timeout=5)
+        except SupervisorError:
+            if time.monotonic() > deadline:
+                raise SupervisorError(f"the supervisor didn't start, see {DAEMON_LOG}")
+            time.sleep(0.2)
+
+
+async def run_daemon(command: list[str]) -> int:
+    """Runs the supervisor until the server is stopped on purpose or exits cleanly."""
+    SOCKET_FILE.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        request("status", timeout=5)
+        print("supervisor already running", file=sys.stderr)
+        return 1
+    except SupervisorError:
+        SOCKET_FILE.unlink(missing_ok=True)  # left over by a daemon that died
+
+    supervisor = Supervisor(command, log=lambda message: print(message, flush=True))
+    server = await asyncio.start_unix_server(supervisor.handle, path=str(SOCKET_FILE))
+    async def shutdown():
+        await supervisor.stop()
+        supervisor.finished.set()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        loop.add_signal_handler(sig, lambda: asyncio.ensure_future(shutdown()))
+    try:
+        await supervisor.start()
+        await supervisor.finished.wait()
+    finally:
+        server.close()
+        SOCKET_FILE.unlink(missing_ok=True)
+        if supervisor.alive:
+            await supervisor.stop()
+    return 0
+
+
+async def console(lines: int = 50) -> int:
+    """Shows the live console and sends what is typed; Ctrl+C or Ctrl+D detaches."""
+    try:
+        reader, writer = await asyncio.open_unix_connection(str(SOCKET_FILE))
+    except (FileNotFoundError, ConnectionRefusedError):
+        print("El servidor no está en ejecución.", file=sys.stderr)
+        return 1
+    writer.write(json.dumps({"op": "follow", "lines": lines}).encode("utf-8") + b"\n")
+    await writer.drain()
+
+    async def show():
+        while line := await reader.readline():
+            sys.stdout.write(line.decode("utf-8", errors="replace"))
+            sys.stdout.flush()
+
+    stdin = asyncio.StreamReader()
+    await asyncio.get_running_loop().connect_read_pipe(lambda: asyncio.StreamReaderProtocol(stdin), sys.stdin)
+    output = asyncio.create_task(show())
+    try:
+        while True:
+            typed = asyncio.create_task(stdin.readline())
+            await asyncio.wait({typed, output}, return_when=asyncio.FIRST_COMPLETED)
+            if output.done() or not typed.done() or not typed.result():
+                typed.cancel()
+                break
+            if typed.result().strip():
+                await async_request("send", line=typed.result().decode("utf-8", errors="replace").strip())
+    except SupervisorError as e:
+        print(f"supervisor: {e}", file=sys.stderr)
+    finally:
+        output.cancel()
+        writer.close()
+    return 0
+
+
+def print_status(status: dict):
+    print(f"State:    {status['state']}")
+    if status["pid"]:
+        print(f"PID:      {status['pid']}")
+    if status["uptime"] is not None:
+        print(f"Uptime:   {status['uptime']}s")
+    if status["boot_seconds"] is not None:
+        print(f"Boot:     {status['boot_seconds']}s")
+    print(f"Restarts: {status['restarts']}")
+    if status["last_reason"]:
+        print(f"Last:     {status['last_reason']}")
+    if status["restart_in"] is not None:
+        print(f"Restart:  in {status['restart_in']}s")
+
+# --- Main ---
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Supervises the Minecraft server process.")
+    sub = parser.add_subparsers(dest="action", required=True)
+    start_parser = sub.add_parser("start", help="start the server (and the supervisor)")
+    start_parser.add_argument("server_command", nargs=argparse.REMAINDER,
+                              help="-- java ... (default: launch-command.txt)")
+    stop_parser = sub.add_parser("stop", help="stop the server")
+    stop_parser.add_argument("--timeout", type=float, default=STOP_TIMEOUT, help="seconds to wait after 'stop'")
+    sub.add_parser("restart", help="restart the server")
+    status_parser = sub.add_parser("status", help="show the state; exit code 0 while the server is alive")
+    status_parser.add_argument("--json", action="store_true")
+    status_parser.add_argument("-q", "--quiet", action="store_true")
+    send_parser = sub.add_parser("send", help="run a console command")
+    send_parser.add_argument("line", nargs="+")
+    logs_parser = sub.add_parser("logs", help="print the last console lines")
+    logs_parser.add_argument("-n", "--lines", type=int, default=50)
+    console_parser = sub.add_parser("console", help="attach to the live console")
+    console_parser.add_argument("-n", "--lines", type=int, default=50)
+    daemon_parser = sub.add_parser("daemon", help=argparse.SUPPRESS)
+    daemon_parser.add_argument("server_command", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    command = getattr(args, "server_command", None) or []
+    if command[:1] == ["--"]:
+        command = command[1:]
+    try:
+        if args.action == "daemon":
+            return asyncio.run(run_daemon(command or launch_command()))
+        if args.action == "start":
+            try:
+                status = request("start")
+            except SupervisorError:
+                status = spawn_daemon(command or launch_command())
+            print_status(status)
+            return 0
+        if args.action == "status":
+            try:
+                status = request("status", timeout=5)
+            except SupervisorError:
+                running = server_running()
+                if args.json:
+                    print(json.dumps({"state": "unsupervised" if running else "stopped"}))
+                elif not args.quiet:
+                    print("State:    " + ("running (not supervised)" if running else "stopped"))
+                return 0 if running else 1
+            if args.json:
+                print(json.dumps(status, indent=2))
+            elif not args.quiet:
+                print_status(status)
+            return 0 if status["pid"] is not None else 1
+        if args.action == "stop":
+            print_status(request("stop", timeout=args.timeout + KILL_TIMEOUT + 10, wait=args.timeout))
+        elif args.action == "restart":
+            print_status(request("restart"))
+        elif args.action == "send":
+            request("send", line=" ".join(args.line))
+        elif args.action == "logs":
+            print("\n".join(request("logs", lines=args.lines)["lines"]))
+        elif args.action == "console":
+            try:
+                return asyncio.run(console(args.lines))
+            except KeyboardInterrupt:
+                pass
+            finally:
+                print("\n[consola cerrada; el servidor sigue en ejecución]")
+    except SupervisorError as e:
+        print(f"supervisor: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
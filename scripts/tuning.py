@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+
+"""
+Hardware-aware tuning profiles for the server.
+
+Reads the host (usable CPU cores, RAM, type of storage under the server
+directory) and the planned max-players, and computes one coherent set of
+values for server.properties, spigot.yml, BlueMap and the JVM heap, so a
+Raspberry Pi with 2 GB and a 16-core machine don't get the same settings.
+
+Named profiles change the trade-offs:
+
+    balanced      sensible defaults for the host
+    low-latency   shorter simulation and entity ranges, BlueMap kept to one thread
+    max-players   host capacity goes to player slots instead of view distance
+    low-memory    smallest heap and view distance, for small or shared hosts
+
+configure-server.py applies the chosen profile and saves it to server-tuning.json.
+start.sh builds the java command line from it with jvm_args(): the heap is
+capped by the memory actually available at launch, the collector is G1
+(Aikar's flags) or generational ZGC depending on heap size, cores and Java
+version, and large pages are enabled when the kernel offers them.
+
+    tuning.py show [--profile NAME] [--max-players N] [--json]   # computed values
+    tuning.py jvm-args                                            # one java argument per line
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+# --- Configuration ---
+# Where the applied profile is saved (in the server root)
+TUNING_FILE = Path(os.environ.get("SERVER_TUNING_FILE", "server-tuning.json"))
+PROFILES = {
+    "balanced": "Sensible defaults for this host.",
+    "low-latency": "Shorter simulation and entity ranges so ticks stay well under 50 ms.",
+    "max-players": "Host capacity goes to player slots instead of view distance.",
+    "low-memory": "Smallest heap and view distance, for small or shared hosts.",
+}
+DEFAULT_PROFILE = "balanced"
+DEFAULT_MAX_PLAYERS = 3
+# Heap limits in MB; beyond ~10 GB G1 pauses grow without helping a small server
+MIN_HEAP_MB = 1024
+MAX_HEAP_MB = 10240
+# Memory left free at launch for the OS, BlueMap's off-heap buffers and the bot (MB)
+LAUNCH_HEADROOM_MB = 512
+# Generational ZGC pays off from this heap size on, and needs spare cores for its threads
+ZGC_MIN_HEAP_MB = 8192
+ZGC_MIN_CORES = 4
+# First Java release with generational ZGC (default mode from 23 on)
+ZGC_GENERATIONAL_JAVA = 21
+# Aikar's G1 flags (https://docs.papermc.io/paper/aikars-flags); region/young-gen
+# sizes depend on the heap and are added by gc_flags()
+AIKAR_FLAGS = [
+    "-XX:+UseG1GC",
+    "-XX:+ParallelRefProcEnabled",
+    "-XX:MaxGCPauseMillis=200",
+    "-XX:+UnlockExperimentalVMOptions",
+    "-XX:+DisableExplicitGC",
+    "-XX:+AlwaysPreTouch",
+    "-XX:G1HeapWastePercent=5",
+    "-XX:G1MixedGCLiveThresholdPercent=90",
+    "-XX:G1RSetUpdatingPauseTimePercent=5",
+    "-XX:SurvivorRatio=32",
+    "-XX:+PerfDisableSharedMem",
+    "-XX:MaxTenuringThreshold=1",
+    "-Dusing.aikars.flags=https://mcflags.emc.gs",
+    "-Daikars.new.flags=true",
+]
+ZGC_FLAGS = [
+    "-XX:+UseZGC",
+    "-XX:+DisableExplicitGC",
+    "-XX:+AlwaysPreTouch",
+    "-XX:+PerfDisableSharedMem",
+]
+# Spigot entity ranges the profiles scale from (the values used so far)
+BASE_ACTIVATION_RANGE = {
+    "animals": 24, "monsters": 24, "raiders": 48, "misc": 8,
+    "water": 8, "villagers": 24, "flying-monsters": 24,
+}
+BASE_TRACKING_RANGE = {
+    "players": 96, "animals": 48, "monsters": 48, "misc": 32, "display": 64, "other": 32,
+}
+
+# --- Host detection ---
+
+def _read(path) -> str | None:
+    try:
+        return Path(path).read_text(encoding="utf-8", errors="replace").strip()
+    except OSError:
+        return None
+
+
+def detect_cores() -> int:
+    """Cores this process may use: affinity mask, further limited by a cgroup CPU quota."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    quota = (_read("/sys/fs/cgroup/cpu.max") or "").split()
+    if len(quota) == 2 and quota[0] != "max":
+        cores = min(cores, max(1, -(-int(quota[0]) // int(quota[1]))))
+    return cores
+
+
+def detect_ram_mb() -> int:
+    """Total RAM in MB, or the cgroup memory limit if it is lower."""
+    ram_mb = 0
+    for line in (_read("/proc/meminfo") or "").splitlines():
+        if line.startswith("MemTotal:"):
+            ram_mb = int(line.split()[1]) // 1024
+            break
+    if not ram_mb:
+        try:
+            ram_mb = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+        except (ValueError, OSError, AttributeError):
+            ram_mb = 2048
+    limit = _read("/sys/fs/cgroup/memory.max")
+    if limit and limit.isdigit():
+        ram_mb = min(ram_mb, int(limit) // (1024 * 1024))
+    return ram_mb
+
+
+def detect_storage(path: Path = Path(".")) -> str:
+    """
+    Type of the block device holding 'path'.
+
+    Returns:
+        str: "ssd", "hdd", "sd" (SD/eMMC cards, as on a Raspberry Pi) or "unknown".
+    """
+    try:
+        dev = os.stat(path).st_dev
+        block = Path(f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}").resolve()
+    except OSError:
+        return "unknown"
+    # Partitions have no queue/ of their own; their parent device does
+    for device in (block, block.parent):
+        if device.name.startswith("mmcblk"):
+            return "sd"
+        rotational = _read(device / "queue" / "rotational")
+        if rotational is not None:
+            return "hdd" if rotational == "1" else "ssd"
+    return "unknown"
+
+
+def detect_model() -> str | None:
+    """Board model (e.g. "Raspberry Pi 4 Model B Rev 1.4") when the device tree has one."""
+    model = _read("/proc/device-tree/model")
+    return model.rstrip("\x00") if model else None
+
+
+def detect_available_mb() -> int | None:
+    """MemAvailable in MB (free memory plus reclaimable cache), or None if unknown."""
+    for line in (_read("/proc/meminfo") or "").splitlines():
+        if line.startswith("MemAvailable:"):
+            return int(line.split()[1]) // 1024
+    return None
+
+
+def detect_java_version(java: str = "java") -> str | None:
+    """Full 'java -version' output of the java on PATH, or None if it can't be run."""
+    try:
+        result = subprocess.run([java, "-version"], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return (result.stderr + result.stdout).strip() or None
+
+
+def detect_java_major(java: str = "java", version: str | None = None) -> int | None:
+    """Major version (8, 17, 21, ...) of the java on PATH, or parsed from a 'java -version' output."""
+    version = version or detect_java_version(java)
+    match = re.search(r'version "(\d+)(?:\.(\d+))?', version or "")
+    if not match:
+        return None
+    major = int(match.group(1))
+    # Java 8 and older report themselves as 1.x
+    return int(match.group(2) or 0) if major == 1 else major
+
+
+def detect_large_pages(heap_mb: int) -> str | None:
+    """
+    The large-page flag the kernel supports for a heap of heap_mb.
+
+    Returns:
+        str | None: "-XX:+UseLargePages" if enough explicit huge pages are reserved,
+                    "-XX:+UseTransparentHugePages" if THP is set to always or madvise,
+                    None otherwise.
+    """
+    meminfo = {}
+    for line in (_read("/proc/meminfo") or "").splitlines():
+        key, _, value = line.partition(":")
+        if value.split():
+            meminfo[key] = int(value.split()[0])
+    reserved_kb = meminfo.get("HugePages_Total", 0) * meminfo.get("Hugepagesize", 0)
+    if reserved_kb and reserved_kb >= heap_mb * 1024:
+        return "-XX:+UseLargePages"
+    thp = _read("/sys/kernel/mm/transparent_hugepage/enabled") or ""
+    if "[always]" in thp or "[madvise]" in thp:
+        return "-XX:+UseTransparentHugePages"
+    return None
+
+
+def detect_host(path: Path = Path(".")) -> dict:
+    """Returns the host facts the profiles are computed from."""
+    return {
+        "cores": detect_cores(),
+        "ram_mb": detect_ram_mb(),
+        "storage": detect_storage(path),
+        "model": detect_model(),
+    }
+
+# --- Profiles ---
+
+def _round_down(value: float, step: int) -> int:
+    return int(value // step * step)
+
+
+def _scale_ranges(base: dict, factor: float) -> dict:
+    """Scales entity ranges, keeping them multiples of 8 blocks and at least 8."""
+    return {key: max(8, _round_down(value * factor + 4, 8)) for key, value in base.items()}
+
+
+def compute_heap_mb(host: dict, max_players: int, profile: str = DEFAULT_PROFILE) -> int:
+    """
+    Heap for the JVM (used for both -Xms and -Xmx).
+
+    The OS, BlueMap's web server, the bot and the page cache keep a share of
+    the RAM; within what is left the heap grows with the player count.
+    """
+    ram_mb = host["ram_mb"]
+    if profile == "low-memory":
+        available = ram_mb - max(768, ram_mb // 3)
+        wanted = 1024 + 128 * max_players
+    else:
+        available = ram_mb - max(512, ram_mb // 4)
+        wanted = 2048 + (384 if profile == "max-players" else 256) * max_players
+    heap_mb = min(available, wanted, MAX_HEAP_MB)
+    # On very small hosts the minimum wins over the reserve (but never all of the RAM)
+    heap_mb = max(heap_mb, min(MIN_HEAP_MB, ram_mb - 256))
+    return max(256, _round_down(heap_mb, 128))
+
+
+def compute_profile(host: dict, max_players: int = DEFAULT_MAX_PLAYERS, profile: str = DEFAULT_PROFILE) -> dict:
+    """
+    Computes the tuning values of a profile for a host.
+
+    Args:
+        host (dict): As returned by detect_host().
+        max_players (int): Planned player slots.
+        profile (str): One of PROFILES.
+
+    Returns:
+        dict: {"profile", "host", "max_players", "jvm", "server.properties",
+               "spigot.yml", "bluemap"}, each section holding the keys to set.
+
+    Raises:
+        ValueError: If the profile doesn't exist.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"unknown profile '{profile}' (choose from {', '.join(PROFILES)})")
+    cores = max(1, host["cores"])
+    slow_disk = host["storage"] in ("hdd", "sd")
+    heap_mb = compute_heap_mb(host, max_players, profile)
+
+    # View distance mostly costs chunk loading/sending (cores, disk) and memory;
+    # simulation distance costs tick time
+    view_distance = 6 + min(cores, 8) // 2 + min(heap_mb // 2048, 3) - max_players // 20
+    if slow_disk:
+        view_distance -= 1
+    simulation_distance = view_distance - 4
+    range_factor = 1.0
+    render_threads = max(1, min(4, (cores - 2) // 2))
+
+    if profile == "low-latency":
+        simulation_distance -= 2
+        range_factor = 0.75
+        render_threads = 1
+    elif profile == "max-players":
+        view_distance -= 2
+        simulation_distance -= 1
+        range_factor = 0.75
+        render_threads = max(1, min(2, cores // 4))
+    elif profile == "low-memory":
+        view_distance = min(view_distance, 6)
+        simulation_distance = 4
+        range_factor = 0.75
+        render_threads = 1
+    if slow_disk:
+        # BlueMap renders are I/O bound there; more threads only compete with chunk saving
+        render_threads = 1
+
+    view_distance = max(5, min(view_distance, 16))
+    simulation_distance = max(4, min(simulation_distance, view_distance))
+
+    return {
+        "profile": profile,
+        "host": host,
+        "max_players": max_players,
+        "jvm": {"xms_mb": heap_mb, "xmx_mb": heap_mb},
+        "server.properties": {
+            "view-distance": view_distance,
+            "simulation-distance": simulation_distance,
+            "entity-broadcast-range-percentage": 50 if range_factor == 1.0 else 40,
+        },
+        "spigot.yml": {
+            "mob-spawn-range": min(4, simulation_distance),
+            "entity-activation-range": _scale_ranges(BASE_ACTIVATION_RANGE, range_factor),
+            "entity-tracking-range": _scale_ranges(BASE_TRACKING_RANGE, range_factor),
+        },
+        "bluemap": {"render-thread-count": render_threads},
+    }
+
+
+def launch_heap_mb(tuning: dict, available_mb: int | None) -> int:
+    """The profile's heap, reduced if less memory than that (plus headroom) is available right now."""
+    heap_mb = tuning["jvm"]["xmx_mb"]
+    if available_mb is not None:
+        heap_mb = min(heap_mb, available_mb - LAUNCH_HEADROOM_MB)
+    return max(512, _round_down(heap_mb, 128))
+
+
+def select_gc(heap_mb: int, cores: int, java_major: int | None) -> str:
+    """
+    Chooses the collector: "zgc" (generational) for large heaps with cores to spare, else "g1".
+
+    G1 with Aikar's flags is the better fit for the small heaps of a home
+    server; generational ZGC keeps pauses sub-millisecond on big heaps but
+    needs Java 21+ and costs concurrent CPU.
+    """
+    if java_major and java_major >= ZGC_GENERATIONAL_JAVA and heap_mb >= ZGC_MIN_HEAP_MB and cores >= ZGC_MIN_CORES:
+        return "zgc"
+    return "g1"
+
+
+def gc_flags(gc: str, heap_mb: int, java_major: int | None) -> list[str]:
+    """JVM flags for the chosen collector."""
+    if gc == "zgc":
+        flags = list(ZGC_FLAGS)
+        if java_major is not None and java_major < 23:
+            # Generational mode is the default (and the only one) from Java 23 on
+            flags.insert(1, "-XX:+ZGenerational")
+        return flags
+    if heap_mb >= 12 * 1024:
+        sizes = ["-XX:G1NewSizePercent=40", "-XX:G1MaxNewSizePercent=50", "-XX:G1HeapRegionSize=16M",
+                 "-XX:G1ReservePercent=15", "-XX:InitiatingHeapOccupancyPercent=20"]
+    else:
+        sizes = ["-XX:G1NewSizePercent=30", "-XX:G1MaxNewSizePercent=40", "-XX:G1HeapRegionSize=8M",
+                 "-XX:G1ReservePercent=20", "-XX:InitiatingHeapOccupancyPercent=15"]
+    # The size flags are experimental, so they go after UnlockExperimentalVMOptions
+    return AIKAR_FLAGS[:5] + sizes + AIKAR_FLAGS[5:]
+
+
+def jvm_args(tuning: dict, available_mb: int | None = None, java_major: int | None = None,
+             large_pages: str | None = None) -> list[str]:
+    """
+    Builds the JVM arguments (everything between "java" and "-jar") for a profile.
+
+    Args:
+        tuning (dict): A profile from compute_profile() or load_profile().
+        available_mb (int | None): Memory available right now; caps the heap.
+        java_major (int | None): Java major version, used to pick the collector.
+        large_pages (str | None): Flag from detect_large_pages(), if any.
+
+    Returns:
+        list[str]: The arguments, heap first.
+    """
+    heap_mb = launch_heap_mb(tuning, available_mb)
+    gc = select_gc(heap_mb, tuning["host"]["cores"], java_major)
+    args = ["-server", f"-Xms{heap_mb}M", f"-Xmx{heap_mb}M"]
+    args += gc_flags(gc, heap_mb, java_major)
+    if large_pages:
+        args.append(large_pages)
+    return args
+
+
+def current_jvm_args(host: dict | None = None, java_major: int | None = None) -> list[str]:
+    """
+    JVM arguments for starting the server now: the saved profile (or a
+    computed balanced one) adapted to the memory available at this moment.
+
+    Args:
+        host (dict | None): Host facts; detected if not given. If given, the
+                            profile is recomputed for it instead of loaded.
+        java_major (int | None): Java major version; detected if not given.
+    """
+    tuning = load_profile() if host is None else None
+    if tuning is None:
+        tuning = compute_profile(host or detect_host(), _server_max_players())
+    else:
+        # The saved host may be stale (e.g. the disk was moved to another machine)
+        tuning["host"] = detect_host()
+    available_mb = detect_available_mb()
+    heap_mb = launch_heap_mb(tuning, available_mb)
+    if java_major is None:
+        java_major = detect_java_major()
+    return jvm_args(tuning, available_mb, java_major, detect_large_pages(heap_mb))
+
+
+def save_profile(tuning: dict, path: Path = TUNING_FILE):
+    """Writes the applied profile atomically."""
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(tuning, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_profile(path: Path = TUNING_FILE) -> dict | None:
+    """Returns the saved profile, or None if there isn't a valid one."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            tuning = json.load(f)
+        return tuning if "jvm" in tuning else None
+    except (OSError, ValueError):
+        return None
+
+
+def _server_max_players(properties: Path = Path("server.properties")) -> int:
+    for line in (_read(properties) or "").splitlines():
+        if line.startswith("max-players="):
+            value = line.split("=", 1)[1].strip()
+            if value.isdigit():
+                return int(value)
+    return DEFAULT_MAX_PLAYERS
+
+
+def print_profile(tuning: dict):
+    host = tuning["host"]
+    print(f"Host: {host.get('model') or 'unknown model'}, {host['cores']} cores, "
+          f"{host['ram_mb']} MB RAM, {host['storage']} storage")
+    print(f"Profile: {tuning['profile']} ({PROFILES[tuning['profile']]}) for {tuning['max_players']} players")
+    print(f"  JVM heap                 -Xms{tuning['jvm']['xms_mb']}M -Xmx{tuning['jvm']['xmx_mb']}M")
+    for section in ("server.properties", "spigot.yml", "bluemap"):
+        for key, value in tuning[section].items():
+            if isinstance(value, dict):
+                value = ", ".join(f"{k}={v}" for k, v in value.items())
+            print(f"  {section:<18} {key} = {value}")
+
+# --- Main ---
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Computes hardware-aware tuning profiles for the server.")
+    parser.add_argument("--cores", type=int, help="override the detected number of cores")
+    parser.add_argument("--ram-mb", type=int, help="override the detected RAM in MB")
+    parser.add_argument("--storage", choices=("ssd", "hdd", "sd", "unknown"), help="override the detected storage type")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show_parser = sub.add_parser("show", help="print the values a profile would apply")
+    show_parser.add_argument("--profile", choices=PROFILES, default=DEFAULT_PROFILE)
+    show_parser.add_argument("--max-players", type=int, help="player slots (default: from server.properties)")
+    show_parser.add_argument("--json", action="store_true", help="print the profile as JSON")
+    sub.add_parser("jvm-args", help="print the java arguments for the saved profile (or a computed balanced one), one per line")
+    args = parser.parse_args()
+
+    host = detect_host()
+    overridden = False
+    for key in ("cores", "ram_mb", "storage"):
+        if getattr(args, key) is not None:
+            host[key] = getattr(args, key)
+            overridden = True
+
+    if args.command == "jvm-args":
+        for arg in current_jvm_args(host if overridden else None):
+            print(arg)
+        return 0
+
+    max_players = args.max_players if args.max_players else _server_max_players()
+    tuning = compute_profile(host, max_players, args.profile)
+    if args.json:
+        print(json.dumps(tuning, indent=2))
+    else:
+        print_profile(tuning)
+    return 0
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
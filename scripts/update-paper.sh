@@ -1,47 +1,48 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
-# 0) Verificar que el servidor no esté en ejecución
-if pgrep -f "java.*-Xmx.*-jar paper\.jar nogui" >/dev/null; then
-  echo "ERROR: El servidor está en ejecución. Deténlo antes de actualizar."
-  exit 1
-fi
+# Duración y resultado de esta ejecución para el exportador de métricas
+trap 'python3 "$(dirname "${BASH_SOURCE[0]}")/exporter.py" record update-paper "$SECONDS" "$?" || true' EXIT
+
+# 0) Estado del servidor: el build nuevo se descarga y activa aunque esté en
+#    marcha (sigue usando el jar que abrió) y se aplica en el próximo reinicio
+#    (server_ping.py: 10 = detenido; 0 = en línea, 2 = arrancando, sin responder o error)
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+health_rc=0
+python3 "$SCRIPT_DIR/server_ping.py" check --quiet || health_rc=$?
 
 # Versión de Minecraft/Paper que quieres usar
 PAPER_VERSION="1.21.1"
 
-# Directorio base del servidor (ajusta si quieres otro)
-SERVER_DIR="$(pwd)"
-
-# Comprobamos que jq está instalado
-if ! command -v jq &>/dev/null; then
-  echo "ERROR: jq no está instalado. Instálalo (por ejemplo: sudo apt install jq) y vuelve a ejecutar."
+# 1) Una consulta a la API de builds: solo se descarga si el último build no es
+#    el activo; se verifica el SHA-256 publicado y paper.jar pasa a apuntar al
+#    nuevo build (enlace a .cache/paper/, se guardan los últimos builds).
+#    Volver al anterior: python3 scripts/paper_builds.py rollback
+echo "[$(date +'%F %T')] Comprobando builds de Paper ${PAPER_VERSION}..."
+update_rc=0
+python3 "$SCRIPT_DIR/paper_builds.py" update --version "$PAPER_VERSION" || update_rc=$?
+if [[ "$update_rc" == "3" ]]; then
+  echo "[$(date +'%F %T')] paper.jar ya está en el último build; no hay nada que actualizar."
+  exit 0
+elif [[ "$update_rc" != "0" ]]; then
+  echo "ERROR: no se pudo actualizar Paper (ver el mensaje anterior)."
   exit 1
 fi
 
-# URL de la API para listar builds
-API_URL="https://api.papermc.io/v2/projects/paper/versions/${PAPER_VERSION}/builds"
-
-echo "[$(date +'%F %T')] Obteniendo datos de builds de Paper ${PAPER_VERSION}..."
-# Descarga el JSON completo, extrae el último build y el nombre del JAR
-API_RESPONSE=$(curl -s "${API_URL}")
-LATEST_BUILD=$(jq -r '.builds | last | .build' <<<"$API_RESPONSE")
-JAR_NAME=$(jq -r '.builds | last | .downloads.application.name' <<<"$API_RESPONSE")
+echo "[$(date +'%F %T')] ¡Listo! paper.jar apunta al nuevo build de Paper ${PAPER_VERSION}."
 
-# Validaciones
-if [[ -z "$LATEST_BUILD" || -z "$JAR_NAME" ]]; then
-  echo "ERROR: no se pudo obtener el último build o el nombre del JAR (¿versión o API incorrecta?)."
-  exit 1
+if [[ "$health_rc" != "10" ]]; then
+  echo "El servidor sigue con el build anterior hasta que se reinicie: python3 scripts/supervisor.py restart"
+  echo "Si el nuevo build da problemas: python3 scripts/paper_builds.py rollback"
+  exit 0
 fi
 
-echo "[$(date +'%F %T')] Último build disponible: ${LATEST_BUILD}"
-echo "[$(date +'%F %T')] Nombre de JAR a descargar: ${JAR_NAME}"
-
-# Construimos la URL de descarga usando el nombre oficial
-DOWNLOAD_URL="https://api.papermc.io/v2/projects/paper/versions/${PAPER_VERSION}/builds/${LATEST_BUILD}/downloads/${JAR_NAME}"
-
-echo "[$(date +'%F %T')] Descargando Paper ${PAPER_VERSION}-${LATEST_BUILD}..."
-curl -fL "${DOWNLOAD_URL}" -o "${SERVER_DIR}/paper.jar"
-
-echo "[$(date +'%F %T')] ¡Listo! paper.jar ha sido actualizado al build ${LATEST_BUILD}."
+# Calentamiento: parchea Paper y genera el archivo CDS ahora, para que el
+# próximo arranque no pague ese tiempo. Se puede omitir con WARMUP=0.
+if [[ "${WARMUP:-1}" != "0" ]]; then
+  echo "[$(date +'%F %T')] Preparando el arranque (parche de Paperclip y archivo CDS)..."
+  if ! python3 "$SCRIPT_DIR/warmup.py" prepare; then
+    echo "AVISO: el calentamiento falló; el primer arranque será más lento."
+  fi
+fi
 echo "Ahora puedes arrancar el servidor con ./start.sh"
@@ -3,34 +3,40 @@
 # Requires: pip install requests pyyaml
 
 import re
-import zipfile
-import shutil
+import time
+import argparse
 import requests
-import yaml
 from pathlib import Path
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from http_cache import HttpCache, DEFAULT_TTL
+from plugin_index import PluginIndex
+from safe_download import download_file, DownloadError
+from plugin_backup import BackupStore, DEFAULT_KEEP
+from plugin_resolver import PluginResolver, SOURCES, is_newer
 
 # --- Configuration ---
 # Directory where your PaperMC plugins are located
 PLUGINS_DIR = Path("plugins")
 
-# Root directory for plugin backups. A subdirectory named with the current timestamp
-# will be created inside this root for each run.
-BACKUP_ROOT = Path("plugin_backups") / datetime.now().strftime("%Y-%m-%d_%H%M%S")
+# Number of plugin backups kept in the deduplicated store (see plugin_backup.py).
+# Before updating, the whole plugin set is recorded there; identical JARs are
+# only stored once, so repeated runs don't pile up copies of the same bytes.
+BACKUP_KEEP = DEFAULT_KEEP
 
 # Full Minecraft version string (e.g., "1.21.1")
 MC_PREFIX_FULL = "1.21.1"
-# Derived Minecraft series (e.g., "1.21") used for Hangar compatibility checks
+# Derived Minecraft series (e.g., "1.21") used for compatibility checks
 MC_SERIES = ".".join(MC_PREFIX_FULL.split(".", 2)[:2])
 
-# Hangar API base URL
-HANGAR_API = "https://hangar.papermc.io/api/v1"
-# Hangar CDN base URL for direct file downloads
-HANGAR_CDN = "https://hangarcdn.papermc.io"
+# Number of plugins checked/downloaded at the same time (1 = serial run).
+# All workers share a single pooled HTTP session, so connections to the
+# plugin repositories are reused instead of paying a new TCP+TLS handshake per request.
+DEFAULT_JOBS = 4
 
 # Manual mapping of detected plugin names to Hangar (namespace, slug)
-# Add your plugins here if the automatic detection isn't sufficient
-# or if the name in the JAR doesn't match the Hangar slug.
+# Plugins are found automatically on Hangar, Modrinth and Spiget (see plugin_resolver.py);
+# add a plugin here only if the automatic detection picks the wrong Hangar project.
 # Example: "Chunky": ("pop4959", "Chunky") -> Plugin named "Chunky" by user "pop4959" with slug "Chunky"
 PLUGIN_MAP = {
     "Chunky": ("pop4959", "Chunky"),
@@ -41,68 +47,198 @@ PLUGIN_MAP = {
 
 # --- Functions ---
 
-def get_latest_hangar_version(ns: str, slug: str, mc_series: str) -> dict | None:
+def make_session(pool_size: int) -> requests.Session:
     """
-    Fetches the latest compatible 'Release' version data for a plugin from Hangar.
+    Creates an HTTP session whose connection pool is large enough for every worker.
 
     Args:
-        ns (str): The Hangar project namespace (user/organization name).
-        slug (str): The Hangar project slug (URL-friendly name).
-        mc_series (str): The Minecraft series (e.g., "1.21") to check compatibility against.
+        pool_size (int): Maximum number of concurrent connections per host.
 
     Returns:
-        dict | None: A dictionary containing the latest version data if found and compatible,
-                     otherwise None.
+        requests.Session: A session that can be shared between worker threads.
     """
-    slug_lower = slug.lower()
-    url = f"{HANGAR_API}/projects/{ns}/{slug_lower}/versions/latest?channel=Release"
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def detect_plugin(jar_path: Path, entry: dict | None, log=print) -> tuple[str, str] | None:
+    """
+    Detects the plugin name and version of a JAR, from its indexed plugin.yml or its filename.
+
+    Args:
+        jar_path (Path): The plugin JAR to inspect.
+        entry (dict | None): The PluginIndex entry of the JAR, if any.
+        log (callable): Where progress messages are written (defaults to print).
+
+    Returns:
+        tuple[str, str] | None: (name, version) if both could be determined, otherwise None.
+    """
+    # The descriptor inside the JAR is authoritative; the index only reopens
+    # the JAR when it changed since the last run
+    if entry and entry.get("name") and entry.get("version"):
+        log(f"  Detected from {entry['descriptor']}: Name='{entry['name']}', Version='{entry['version']}'")
+        return entry["name"], entry["version"]
+
+    if entry and entry.get("error"):
+        log(f"  Warning: Could not read the plugin descriptor of {jar_path.name} ({entry['error']}).")
+
+    # Fall back to detecting plugin name and version from filename
+    # Regex: captures anything before the last dash as name, and everything after as version
+    # Version regex: (\d+(?:\.[0-9A-Za-z\-]+)*) matches digits, then optionally non-digits, hyphens, and more digits/alphas.
+    filename_match = re.match(r"^(.+)-(\d+(?:\.[0-9A-Za-z\-]+)*)$", jar_path.stem)
+    if filename_match:
+        plugin_name, local_version = filename_match.groups()
+        log(f"  Detected from filename: Name='{plugin_name}', Version='{local_version}'")
+        return plugin_name, local_version
+
+    log(f"  Warning: Could not determine plugin name or local version for {jar_path.name}. Skipping.")
+    return None
+
+
+def check_plugin(jar_path: Path, entry: dict | None, resolver: PluginResolver) -> dict:
+    """
+    Resolves a single JAR against every plugin repository and decides whether it needs an update.
+
+    Messages are buffered in the returned dict instead of printed, so that
+    concurrent workers don't interleave their output.
+
+    Args:
+        jar_path (Path): The plugin JAR to check.
+        entry (dict | None): The PluginIndex entry of the JAR.
+        resolver (PluginResolver): Shared resolver for Hangar, Modrinth and Spiget.
+
+    Returns:
+        dict: The check result with keys 'jar', 'name', 'local_version', 'remote_version',
+              'source', 'download_url' (None when no update is needed), 'sha256', 'sha512',
+              'log' and 'check_time'.
+    """
+    started = time.perf_counter()
+    result = {
+        "jar": jar_path,
+        "name": None,
+        "local_version": None,
+        "remote_version": None,
+        "source": None,
+        "download_url": None,
+        "sha256": None,
+        "sha512": None,
+        "log": [],
+        "check_time": 0.0,
+        "download_time": 0.0,
+    }
+    log = result["log"].append
+
+    try:
+        detected = detect_plugin(jar_path, entry, log)
+        if not detected:
+            return result
+        plugin_name, local_version = detected
+        result["name"], result["local_version"] = plugin_name, local_version
+
+        # Find the newest compatible release on Hangar, Modrinth and Spiget
+        log(f"  Looking for the latest release of {plugin_name} (MC Series: {MC_SERIES})...")
+        release = resolver.resolve({**(entry or {}), "name": plugin_name}, log)
+
+        if not release:
+            log(f"  No compatible release found for {plugin_name}.")
+            return result
+
+        remote_ver = release["version"]
+        result["remote_version"] = remote_ver
+        result["source"] = f"{release['source']}:{release['project']}"
+
+        log(f"  Local version: {local_version}, Latest version: {remote_ver} ({result['source']})")
+
+        # Compare versions; never downgrade to an older build published elsewhere
+        if not is_newer(remote_ver, local_version):
+            log(f"  {plugin_name} is already up-to-date (version {local_version}).")
+        else:
+            log(f"  Update available for {plugin_name}: {local_version} -> {remote_ver}")
+            result["download_url"] = release["download_url"]
+            result["sha256"] = release["sha256"]
+            result["sha512"] = release["sha512"]
+        return result
+    finally:
+        result["check_time"] = time.perf_counter() - started
+
+
+def update_plugin(task: dict, session: requests.Session) -> dict:
+    """
+    Replaces a plugin JAR with the version found by check_plugin().
+
+    The new JAR is downloaded next to the old one (resuming after interruptions),
+    verified against the hash published by the repository and swapped in with an atomic
+    rename, so the live JAR is never left half-written. The old JAR must already
+    be recorded in the backup store (see main()).
+
+    Args:
+        task (dict): A result from check_plugin() with a 'download_url'.
+        session (requests.Session): Shared HTTP session.
+
+    Returns:
+        dict: The same task, with 'updated', 'download_time' and extra 'log' lines filled in.
+    """
+    started = time.perf_counter()
+    jar_path = task["jar"]
+    plugin_name = task["name"]
+    remote_ver = task["remote_version"]
+    download_url = task["download_url"]
+    log = task["log"].append
+    task["updated"] = False
+
     try:
-        response = requests.get(url)
-        # If the project or version is not found, Hangar returns 404
-        if response.status_code == 404:
-            print(f"    No latest 'Release' version found on Hangar for {ns}/{slug_lower}.")
-            return None
-        response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
-
-        latest = response.json()
-
-        # Check if the platform is PAPER
-        if latest.get("platform") != "PAPER":
-            print(f"    Incompatible platform for {ns}/{slug}: Expected 'PAPER', got '{latest.get('platform', 'N/A')}'.")
-            return None
-
-        # Check Minecraft version compatibility
-        compatible = False
-        for mc_version in latest.get("minecraftVersions", []):
-            if mc_version.startswith(mc_series):
-                compatible = True
-                break
-        if not compatible:
-            print(f"    No compatible Minecraft version found for {ns}/{slug}. Required series: {mc_series}. Available: {', '.join(latest.get('minecraftVersions', []))}.")
-            return None
-
-        return latest
-    except requests.exceptions.RequestException as e:
-        print(f"  Error fetching latest Hangar version for {ns}/{slug}: {e}")
-        return None
-    except ValueError as e: # For JSON decoding errors
-        print(f"  Error parsing Hangar API response for {ns}/{slug}: {e}")
-        return None
+        if not task.get("sha256") and not task.get("sha512"):
+            log(f"  Warning: {task['source']} publishes no hash for this version; only the JAR structure will be checked.")
+        log(f"  Downloading new version from: {download_url}")
+        try:
+            download_file(session, download_url, jar_path, sha256=task.get("sha256"),
+                          expect_plugin=plugin_name, log=log, sha512=task.get("sha512"))
+            task["updated"] = True
+            log(f"  Successfully downloaded, verified and installed {jar_path.name} version {remote_ver}.")
+        except DownloadError as e:
+            log(f"  Error updating {plugin_name}: {e}. The installed JAR was left untouched.")
+        return task
+    finally:
+        task["download_time"] = time.perf_counter() - started
+
+
+def print_timings(results: list[dict], total_time: float):
+    """Prints the per-plugin and total wall time of the run."""
+    print("\n--- Timings ---")
+    for result in results:
+        label = result["name"] or result["jar"].name
+        line = f"  {label:<30} check {result['check_time']:6.2f}s"
+        if result["download_url"]:
+            status = "updated" if result.get("updated") else "failed"
+            line += f"  download {result['download_time']:6.2f}s ({status})"
+        print(line)
+    print(f"  {'Total wall time':<30} {total_time:6.2f}s")
+
+
+def parse_args() -> argparse.Namespace:
+    """Parses the command line options."""
+    parser = argparse.ArgumentParser(description="Updates PaperMC plugins from Hangar, Modrinth and Spiget.")
+    parser.add_argument("-j", "--jobs", type=int, default=DEFAULT_JOBS,
+                        help=f"number of plugins checked/downloaded in parallel (default: {DEFAULT_JOBS}, 1 = serial)")
+    parser.add_argument("--cache-ttl", type=int, default=DEFAULT_TTL,
+                        help=f"seconds repository responses are reused without revalidation (default: {DEFAULT_TTL})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always fetch fresh metadata from the repositories")
+    return parser.parse_args()
 
 
 def main():
     """
     Main function to automate PaperMC plugin updates.
     """
-    # 1. Create backup directory
-    try:
-        BACKUP_ROOT.mkdir(parents=True, exist_ok=True)
-        print(f"Created backup directory: {BACKUP_ROOT}")
-    except OSError as e:
-        print(f"Error creating backup directory {BACKUP_ROOT}: {e}. Exiting.")
-        return
+    args = parse_args()
+    jobs = max(1, args.jobs)
+    run_started = time.perf_counter()
 
-    # 2. Process each JAR file in the plugins directory
+    # 1. Collect the JAR files in the plugins directory
     if not PLUGINS_DIR.exists():
         print(f"Plugins directory '{PLUGINS_DIR}' not found. Please ensure it exists.")
         return
@@ -110,114 +246,50 @@ def main():
         print(f"'{PLUGINS_DIR}' is not a directory. Please provide a valid plugins directory.")
         return
 
-    plugin_jars = sorted(PLUGINS_DIR.glob("*.jar"))
-    if not plugin_jars:
+    index = PluginIndex(PLUGINS_DIR)
+    entries = index.refresh(workers=jobs)
+    if not entries:
         print(f"No .jar files found in '{PLUGINS_DIR}'.")
         return
-
-    for jar_path in plugin_jars:
-        print(f"\n--- Processing: {jar_path.name} ---")
-        plugin_name = None
-        local_version = None
-        current_jar_stem = jar_path.stem
-
-        # Attempt to detect plugin name and version from filename
-        # Regex: captures anything before the last dash as name, and everything after as version
-        # Version regex: (\d+(?:\.[0-9A-Za-z\-]+)*) matches digits, then optionally non-digits, hyphens, and more digits/alphas.
-        filename_match = re.match(r"^(.+)-(\d+(?:\.[0-9A-Za-z\-]+)*)$", current_jar_stem)
-        if filename_match:
-            plugin_name, local_version = filename_match.groups()
-            print(f"  Detected from filename: Name='{plugin_name}', Version='{local_version}'")
-        else:
-            # If filename parsing fails, try reading plugin.yml inside the JAR
-            try:
-                with zipfile.ZipFile(jar_path, 'r') as jar_zip:
-                    # Check if plugin.yml exists in the JAR
-                    if 'plugin.yml' in jar_zip.namelist():
-                        with jar_zip.open('plugin.yml') as yml_file:
-                            plugin_info = yaml.safe_load(yml_file)
-                            plugin_name = plugin_info.get('name')
-                            local_version = plugin_info.get('version')
-                        if plugin_name and local_version:
-                            print(f"  Detected from plugin.yml: Name='{plugin_name}', Version='{local_version}'")
-                        else:
-                            print(f"  Warning: Could not find 'name' or 'version' in plugin.yml for {jar_path.name}. Skipping.")
-                            continue
-                    else:
-                        print(f"  Warning: No plugin.yml found inside {jar_path.name}. Skipping.")
-                        continue
-            except (zipfile.BadZipFile, KeyError, yaml.YAMLError, FileNotFoundError) as e:
-                # Catch errors related to zip file corruption, missing plugin.yml entries, or YAML parsing issues
-                print(f"  Warning: Could not parse {jar_path.name} (Error: {e}). Skipping.")
-                continue
-
-        # Ensure we have a plugin name and version
-        if not plugin_name or not local_version:
-            print(f"  Warning: Could not determine plugin name or local version for {jar_path.name}. Skipping.")
-            continue
-
-        # 3. Check against PLUGIN_MAP for Hangar mapping
-        if plugin_name not in PLUGIN_MAP:
-            print(f"  Plugin '{plugin_name}' is not in PLUGIN_MAP. Please add `'{plugin_name}': ('HangarNamespace', 'HangarSlug'),` to PLUGIN_MAP to enable updates for this plugin. Skipping.")
-            continue
-
-        ns, slug = PLUGIN_MAP[plugin_name]
-        print(f"  Mapped to Hangar: Namespace='{ns}', Slug='{slug}'")
-
-        # 4. Fetch latest Hangar version
-        print(f"  Fetching latest compatible Hangar version for {ns}/{slug} (MC Series: {MC_SERIES})...")
-        latest_hangar_data = get_latest_hangar_version(ns, slug, MC_SERIES)
-
-        if not latest_hangar_data:
-            print(f"  No compatible release found on Hangar for {plugin_name}.")
-            continue
-
-        remote_ver = latest_hangar_data["name"]
-        file_name = latest_hangar_data["fileName"]
-        # Construct the download URL using CDN
-        download_url = f"{HANGAR_CDN}/plugins/{ns}/{slug}/versions/{remote_ver}/PAPER/{file_name}"
-
-        print(f"  Local version: {local_version}, Remote Hangar version: {remote_ver}")
-
-        # 5. Compare versions and download if newer
-        if remote_ver == local_version:
-            print(f"  {plugin_name} is already up-to-date (version {local_version}).")
-        else:
-            print(f"  Update available for {plugin_name}: {local_version} -> {remote_ver}")
-            backup_path = BACKUP_ROOT / jar_path.name
-            print(f"  Backing up current plugin '{jar_path.name}' to '{backup_path}'...")
-            try:
-                shutil.copyfile(jar_path, backup_path)
-                print("  Backup successful.")
-            except IOError as e:
-                print(f"  Error backing up {jar_path.name}: {e}. Skipping update for this plugin.")
-                continue
-
-            print(f"  Downloading new version from: {download_url}")
+    print(f"Plugin index: {index.stats['reused']} reused, {index.stats['rehashed']} rehashed, "
+          f"{index.stats['parsed']} parsed.")
+
+    # Every plugin queries all repositories at once, so size the pools for that
+    session = make_session(jobs * len(SOURCES))
+    cache = HttpCache(ttl=args.cache_ttl, enabled=not args.no_cache)
+    resolver = PluginResolver(session, cache, MC_SERIES, overrides=PLUGIN_MAP, workers=jobs * len(SOURCES))
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        # 2. Resolve every plugin against all repositories in parallel
+        print(f"Checking {len(entries)} plugins ({jobs} in parallel)...")
+        try:
+            results = list(pool.map(lambda entry: check_plugin(Path(entry["path"]), entry, resolver), entries))
+        finally:
+            resolver.close()
+        for result in results:
+            print(f"\n--- Processing: {result['jar'].name} ---")
+            print("\n".join(result["log"]))
+            result["log"].clear()
+
+        # 3. Back up the current plugin set, then download the updates in parallel
+        pending = [result for result in results if result["download_url"]]
+        if pending:
+            store = BackupStore(plugins_dir=PLUGINS_DIR)
             try:
-                # Use stream=True to handle large files efficiently
-                response = requests.get(download_url, stream=True)
-                response.raise_for_status()  # Raise HTTPError for bad status codes
-
-                # Overwrite the original JAR file with the new one
-                with open(jar_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                print(f"  Successfully downloaded and updated {jar_path.name} to version {remote_ver}.")
-            except requests.exceptions.RequestException as e:
-                print(f"  Error downloading new version for {plugin_name}: {e}. Attempting to restore backup.")
-                try:
-                    shutil.copyfile(backup_path, jar_path)
-                    print("  Backup restored successfully.")
-                except IOError as restore_e:
-                    print(f"  CRITICAL ERROR: Failed to restore backup for {plugin_name} after download failure: {restore_e}")
-            except IOError as e:
-                print(f"  Error writing new JAR file for {plugin_name}: {e}. Attempting to restore backup.")
-                try:
-                    shutil.copyfile(backup_path, jar_path)
-                    print("  Backup restored successfully.")
-                except IOError as restore_e:
-                    print(f"  CRITICAL ERROR: Failed to restore backup for {plugin_name} after write failure: {restore_e}")
+                manifest = store.snapshot(label="pre-update", entries=entries)
+            except OSError as e:
+                print(f"Error backing up the plugins: {e}. Exiting without updating.")
+                return
+            print(f"\nUpdating {len(pending)} plugins ({jobs} in parallel)...")
+            for task in pool.map(lambda task: update_plugin(task, session), pending):
+                print(f"\n--- Updating: {task['jar'].name} ---")
+                print("\n".join(task["log"]))
+
+    if pending:
+        store.gc(BACKUP_KEEP)
+        print(f"\nTo undo this update run: python3 scripts/plugin_backup.py rollback {manifest['id']}")
+
+    print_timings(results, time.perf_counter() - run_started)
+    print(cache.summary())
 
 # --- Main Guard ---
 if __name__ == "__main__":
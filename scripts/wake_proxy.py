@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+
+"""
+Sleep-when-idle front-end on the game port, with wake-on-join.
+
+Listens on the public game port (PROXY_PORT) and forwards every connection
+to the real server on 127.0.0.1:<server-port> while it runs. When it doesn't:
+
+    - server-list pings are answered from the last status the server sent
+      (MiniMOTD's MOTD, icon and max players), with nobody online
+    - a real login starts the server through start.sh, like the bot's /start,
+      and the player is disconnected with "starting, retry in Xs" (X is the
+      average of the previous boots)
+
+Every player goes through the proxy, so it knows when nobody is online; after
+IDLE_MINUTES without players (double-checked over RCON, and never while
+pregen.py is generating) the server is stopped cleanly through the supervisor.
+
+server.properties needs server-port=25566 and server-ip=127.0.0.1 so the
+proxy can take port 25565. Run it from the server folder, e.g. from cron:
+
+    @reboot cd /path/to/server && python3 scripts/wake_proxy.py serve
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+from config_parsers import PropertiesDocument
+from pregen import load_state as load_pregen_state
+from rcon import RconClient, RconError, parse_list, read_rcon_settings
+from server_ping import ProtocolError, async_status, pack_string, packet, parse_handshake, read_packet, server_address
+from supervisor import SupervisorError, async_request
+
+# --- Configuration ---
+PROXY_HOST = os.environ.get("WAKE_PROXY_HOST", "0.0.0.0")
+PROXY_PORT = int(os.environ.get("WAKE_PROXY_PORT", 25565))
+# Minutes without players before the server is stopped
+IDLE_MINUTES = int(os.environ.get("WAKE_PROXY_IDLE_MINUTES", 15))
+# Send a PROXY protocol v1 header so the server sees the players' real addresses
+# (needs proxies.proxy-protocol: true in config/paper-global.yml)
+PROXY_PROTOCOL = os.environ.get("WAKE_PROXY_PROTOCOL", "") == "1"
+SERVER_PROPERTIES = Path("server.properties")
+STATE_FILE = Path(".cache/wake-proxy.json")
+START_COMMAND = [str(Path(__file__).resolve().parent / "start.sh"), "--no-attach"]
+# Seconds between idle checks and refreshes of the cached status
+CHECK_INTERVAL = 30
+# Boot time assumed before the first measured one
+DEFAULT_BOOT_SECONDS = 90
+# Seconds allowed to read a client's first packets
+CLIENT_TIMEOUT = 10
+# Seconds a wake waits for a stop in progress (supervisor's "stop" + TERM/KILL) to finish
+STOPPING_TIMEOUT = 180
+
+# --- Classes ---
+
+class WakeProxy:
+    """
+    Forwards connections to the server, answers for it while it sleeps and wakes it on login.
+
+    Args:
+        backend (tuple[str, int]): Address of the real server.
+        idle_minutes (int): Minutes without players before stopping the server.
+    """
+
+    def __init__(self, backend: tuple[str, int], idle_minutes: int = IDLE_MINUTES):
+        self.backend = backend
+        self.idle_minutes = idle_minutes
+        self.players = 0            # forwarded login connections open right now
+        self.state = load_state()
+        self._idle_since = None
+        self._boot_started = None   # when the proxy woke the server
+        self._wake_task = None
+        self._server_state = "stopped"
+
+    async def server_state(self) -> str:
+        try:
+            self._server_state = (await async_request("status"))["state"]
+        except SupervisorError:
+            self._server_state = "stopped"
+        return self._server_state
+
+    def boot_eta(self) -> int:
+        expected = self.state.get("boot_seconds", DEFAULT_BOOT_SECONDS)
+        if self._boot_started is None:
+            return round(expected)
+        return max(5, round(expected - (time.monotonic() - self._boot_started)))
+
+    async def wake(self):
+        """Starts the server through the usual start path (start.sh, like the bot's /start)."""
+        # start.sh does nothing while the daemon of a stopping server is still alive
+        deadline = time.monotonic() + STOPPING_TIMEOUT
+        while await self.server_state() == "stopping":
+            if time.monotonic() > deadline:
+                print("wake_proxy: the server is still stopping, not waking it", file=sys.stderr)
+                self._boot_started = None
+                return
+            await asyncio.sleep(1)
+        print("wake_proxy: login while sleeping, starting the server")
+        process = await asyncio.create_subprocess_exec(
+            *START_COMMAND, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+        if await process.wait() != 0:
+            print("wake_proxy: start.sh failed", file=sys.stderr)
+            self._boot_started = None
+
+    def _wake_failed(self) -> bool:
+        """True when wake() has already returned; with the server "stopped" that means the boot failed."""
+        return self._boot_started is not None and self._wake_task is not None and self._wake_task.done()
+
+    async def handle(self, reader, writer):
+        try:
+            first = await asyncio.wait_for(reader.readexactly(1), CLIENT_TIMEOUT)
+            if first == b"\xfe":
+                # Legacy (pre-1.7) ping: only the real server can answer it
+                if await self.server_state() == "running":
+                    await self._forward(first, reader, writer, login=False)
+                return
+            raw, packet_id, payload = await asyncio.wait_for(read_packet(reader, first), CLIENT_TIMEOUT)
+            if packet_id != 0:
+                return
+            protocol, _, _, next_state = parse_handshake(payload)
+            if await self.server_state() == "running" and await self._forward(raw, reader, writer, login=next_state != 1):
+                return
+            if next_state == 1:
+                await asyncio.wait_for(self._answer_status(reader, writer, protocol), CLIENT_TIMEOUT)
+            else:
+                if self._server_state == "stopped" and self._wake_failed():
+                    self._boot_started = None
+                if self._server_state not in ("starting", "running") and self._boot_started is None:
+                    # "stopping" included: wake() waits for the stop to finish first
+                    self._boot_started = time.monotonic()
+                    self._wake_task = asyncio.create_task(self.wake())
+                message = f"⏳ El servidor se está iniciando. Vuelve a entrar en unos {self.boot_eta()} s."
+                writer.write(packet(0x00, pack_string(json.dumps({"text": message}))))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ProtocolError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _answer_status(self, reader, writer, protocol: int):
+        """Status request -> cached status; ping -> pong."""
+        _, packet_id, _ = await read_packet(reader)
+        if packet_id != 0x00:
+            return
+        status = self.sleeping_status(protocol)
+        writer.write(packet(0x00, pack_string(json.dumps(status, ensure_ascii=False))))
+        await writer.drain()
+        _, packet_id, payload = await read_packet(reader)
+        if packet_id == 0x01:
+            writer.write(packet(0x01, payload))
+            await writer.drain()
+
+    def sleeping_status(self, protocol: int) -> dict:
+        """The last status the server sent, with nobody online."""
+        status = dict(self.state.get("status") or {
+            "version": {"name": "Paper", "protocol": protocol},
+            "description": {"text": "💤 Servidor dormido: entra para despertarlo"},
+            "players": {"max": max_players()},
+        })
+        status["players"] = {**status.get("players", {}), "online": 0, "sample": []}
+        return status
+
+    async def _forward(self, first: bytes, reader, writer, login: bool) -> bool:
+        """Pipes the connection to the server. Returns False if the server isn't listening yet."""
+        try:
+            backend_reader, backend_writer = await asyncio.open_connection(*self.backend)
+        except OSError:
+            return False
+        if PROXY_PROTOCOL:
+            client, server = writer.get_extra_info("peername"), writer.get_extra_info("sockname")
+            family = "TCP6" if ":" in client[0] else "TCP4"
+            backend_writer.write(f"PROXY {family} {client[0]} {server[0]} {client[1]} {server[1]}\r\n".encode())
+        backend_writer.write(first)
+        if login:
+            self.players += 1
+            self._idle_since = None
+        try:
+            await asyncio.gather(_pipe(reader, backend_writer), _pipe(backend_reader, writer))
+        finally:
+            backend_writer.close()
+            if login:
+                self.players -= 1
+        return True
+
+    async def check(self):
+        """Refreshes the cached status and stops the server after IDLE_MINUTES without players."""
+        state = await self.server_state()
+        if state != "running":
+            self._idle_since = None
+            if state == "stopped" and self._wake_failed():
+                self._boot_started = None
+            return
+        if self._boot_started is not None:
+            boot = time.monotonic() - self._boot_started
+            previous = self.state.get("boot_seconds")
+            self.state["boot_seconds"] = boot if previous is None else 0.5 * boot + 0.5 * previous
+            self._boot_started = None
+        try:
+            status = await async_status(*self.backend, timeout=5)
+            status.pop("latency_ms", None)
+            self.state["status"] = status
+            save_state(self.state)
+        except (OSError, asyncio.TimeoutError, ProtocolError, ValueError):
+            pass
+
+        now = time.monotonic()
+        if self.players:
+            self._idle_since = None
+            return
+        if self._idle_since is None:
+            self._idle_since = now
+            return
+        if now - self._idle_since < self.idle_minutes * 60 or load_pregen_state().get("enabled"):
+            return
+        if await players_online() != 0:
+            self._idle_since = now  # someone connected another way
+            return
+        print(f"wake_proxy: no players for {self.idle_minutes} min, stopping the server")
+        self._idle_since = None
+        try:
+            await async_request("stop")
+        except SupervisorError as e:
+            print(f"wake_proxy: couldn't stop the server: {e}", file=sys.stderr)
+
+    async def serve(self, host: str = PROXY_HOST, port: int = PROXY_PORT):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"wake_proxy: listening on {host}:{port}, server at {self.backend[0]}:{self.backend[1]}")
+        async with server:
+            while True:
+                try:
+                    await self.check()
+                except Exception as e:  # a bad check must not take the proxy down
+                    print(f"wake_proxy: check failed: {e}", file=sys.stderr)
+                await asyncio.sleep(CHECK_INTERVAL)
+
+# --- Functions ---
+
+async def _pipe(reader, writer):
+    try:
+        while (data := await reader.read(65536)):
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        if writer.can_write_eof():
+            try:
+                writer.write_eof()
+            except OSError:
+                pass
+
+
+async def players_online() -> int | None:
+    """Players online according to RCON, or None if RCON isn't reachable."""
+    try:
+        async with RconClient(*read_rcon_settings()) as client:
+            return parse_list(await client.command("list"))["online"]
+    except RconError:
+        return None
+
+
+def max_players(properties: Path = SERVER_PROPERTIES) -> int:
+    try:
+        value = (PropertiesDocument(properties.read_text(encoding="utf-8")).get("max-players") or "").strip()
+    except OSError:
+        value = ""
+    return int(value) if value.isdigit() else 20
+
+
+def load_state() -> dict:
+    try:
+        return json.loads(STATE_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state: dict):
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=STATE_FILE.parent, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, STATE_FILE)
+
+# --- Main ---
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Game-port proxy that stops the server when idle and starts it on join.")
+    sub = parser.add_subparsers(dest="action", required=True)
+    serve_parser = sub.add_parser("serve", help="run the proxy")
+    serve_parser.add_argument("--host", default=PROXY_HOST)
+    serve_parser.add_argument("--port", type=int, default=PROXY_PORT)
+    serve_parser.add_argument("--idle-minutes", type=int, default=IDLE_MINUTES)
+    args = parser.parse_args()
+
+    backend = server_address()
+    if backend[1] == args.port:
+        print(f"wake_proxy: the server also uses port {args.port}; set server-port=25566 and "
+              f"server-ip=127.0.0.1 in {SERVER_PROPERTIES}", file=sys.stderr)
+        return 1
+    try:
+        asyncio.run(WakeProxy(backend, args.idle_minutes).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+
+"""
+Faster server starts: Paperclip pre-patching and a class-data-sharing archive.
+
+Every start the JVM loads and verifies thousands of Paper and plugin classes,
+and the first boot after update-paper.sh also runs Paperclip's patch step.
+The warm-up mode does both ahead of time, while nobody is waiting:
+
+  1. runs Paperclip with -Dpaperclip.patchonly=true, so the patched server
+     jar and its libraries are ready before the next boot;
+  2. boots the server once with -XX:ArchiveClassesAtExit to write a dynamic
+     AppCDS archive of every class loaded by Paper and the plugins, stopping
+     it as soon as it reports "Done";
+  3. boots it again with the archive and reports cold vs warm startup times.
+
+The archive belongs to one paper.jar + plugins/ + JDK + collector
+combination (its fingerprint). start.sh asks for the arguments with
+'warmup.py cds-args': a valid archive is reused; a stale or missing one is
+deleted and recreated when that run stops (-XX:+AutoCreateSharedArchive on
+Java 19+, -XX:ArchiveClassesAtExit on 13-18).
+
+    warmup.py prepare [--no-measure] [--timeout S]   # patch + archive + timings
+    warmup.py cds-args [--gc g1|zgc]                  # java arguments for start.sh
+    warmup.py status                                  # archive state and last timings
+    warmup.py clear                                   # delete the archive
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import hashlib
+import argparse
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from datetime import datetime
+from tuning import current_jvm_args, detect_java_version, detect_java_major
+from supervisor import DONE_RE, server_running
+
+# --- Configuration ---
+SERVER_JAR = Path("paper.jar")
+PLUGINS_DIR = Path("plugins")
+# Archive and its metadata (fingerprint, timings)
+CDS_DIR = Path(os.environ.get("CDS_DIR", ".cache/cds"))
+ARCHIVE_FILE = CDS_DIR / "server.jsa"
+META_FILE = CDS_DIR / "server.json"
+# Java versions that support dynamic archives / automatic (re)creation
+DYNAMIC_CDS_JAVA = 13
+AUTO_CDS_JAVA = 19
+# Seconds a warm-up boot may take to reach "Done" (world generation on a Pi is slow)
+DEFAULT_TIMEOUT = 900
+# Seconds to wait for the server (and the archive dump) after "stop"
+STOP_TIMEOUT = 300
+
+# --- Classes ---
+
+class WarmupError(Exception):
+    """Raised when a warm-up boot fails or times out."""
+
+# --- Functions ---
+
+def _gc_of(jvm_args: list[str]) -> str:
+    return "zgc" if "-XX:+UseZGC" in jvm_args else "g1"
+
+
+def fingerprint(java_version: str | None, gc: str) -> str:
+    """
+    Identifies what an archive was built for: paper.jar, every plugin JAR
+    (name, size, mtime), the JDK and the collector.
+    """
+    def stat_of(path: Path):
+        st = path.stat()
+        return [path.name, st.st_size, st.st_mtime_ns]
+
+    plugins = sorted(PLUGINS_DIR.glob("*.jar")) if PLUGINS_DIR.is_dir() else []
+    data = {
+        "paper": stat_of(SERVER_JAR) if SERVER_JAR.exists() else None,
+        "plugins": [stat_of(jar) for jar in plugins],
+        "java": java_version,
+        "gc": gc,
+    }
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def load_meta() -> dict:
+    try:
+        with open(META_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_meta(meta: dict):
+    """Writes the archive metadata atomically."""
+    META_FILE.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=META_FILE.parent, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, META_FILE)
+
+
+def archive_is_valid(meta: dict, current: str) -> bool:
+    return ARCHIVE_FILE.exists() and meta.get("fingerprint") == current
+
+
+def cds_args(gc: str) -> list[str]:
+    """
+    Java arguments that reuse the archive, or recreate it when it is stale.
+
+    A stale archive is deleted first; the new one is written when the server
+    started with these arguments stops. The metadata records the fingerprint
+    the new archive will have.
+
+    Args:
+        gc (str): Collector of this start ("g1" or "zgc").
+
+    Returns:
+        list[str]: Arguments to put before -jar (empty before Java 13).
+    """
+    java_version = detect_java_version()
+    java_major = detect_java_major(version=java_version)
+    if java_major is None or java_major < DYNAMIC_CDS_JAVA:
+        return []
+
+    current = fingerprint(java_version, gc)
+    meta = load_meta()
+    if archive_is_valid(meta, current):
+        if java_major >= AUTO_CDS_JAVA:
+            return [f"-XX:SharedArchiveFile={ARCHIVE_FILE}", "-XX:+AutoCreateSharedArchive"]
+        return [f"-XX:SharedArchiveFile={ARCHIVE_FILE}"]
+
+    ARCHIVE_FILE.unlink(missing_ok=True)
+    # Timings of the old archive no longer describe the new one
+    save_meta({"fingerprint": current, "java": java_version, "gc": gc,
+               "created": datetime.now().isoformat(timespec="seconds"), "source": "start.sh"})
+    if java_major >= AUTO_CDS_JAVA:
+        return [f"-XX:SharedArchiveFile={ARCHIVE_FILE}", "-XX:+AutoCreateSharedArchive"]
+    return [f"-XX:ArchiveClassesAtExit={ARCHIVE_FILE}"]
+
+
+def patch_server(log=print) -> float:
+    """Runs Paperclip's patch step only. Returns the seconds it took."""
+    start = time.monotonic()
+    result = subprocess.run(["java", "-Dpaperclip.patchonly=true", "-jar", str(SERVER_JAR)],
+                            capture_output=True, text=True)
+    elapsed = time.monotonic() - start
+    if result.returncode != 0:
+        output = (result.stdout + result.stderr).strip().splitlines()[-5:]
+        raise WarmupError("Paperclip patch failed:\n  " + "\n  ".join(output))
+    log(f"Paperclip patch: {elapsed:.1f}s (no longer paid by the first boot after an update).")
+    return elapsed
+
+
+def timed_boot(jvm_args: list[str], extra_args: list[str], timeout: int) -> dict:
+    """
+    Boots the server, stops it as soon as it reports "Done" and measures it.
+
+    Returns:
+        dict: {"wall_s": seconds from launch to "Done", "paper_s": Paper's own
+               figure, "stop_s": seconds from "stop" to exit (includes any archive dump)}.
+
+    Raises:
+        WarmupError: If the server exits early or doesn't finish in time.
+    """
+    cmd = ["java", *jvm_args, *extra_args, "-jar", str(SERVER_JAR), "nogui"]
+    start = time.monotonic()
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, text=True, errors="replace",
+                               start_new_session=True)
+
+    def kill():
+        # The whole process group, so nothing is left holding the output pipe
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    # Kills the server if a phase hangs, which also ends the output loops below
+    timed_out = threading.Event()
+
+    def watchdog(seconds: int) -> threading.Timer:
+        def expire():
+            timed_out.set()
+            kill()
+        timer = threading.Timer(seconds, expire)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    tail = []
+    paper_s = None
+    timer = watchdog(timeout)
+    try:
+        for line in process.stdout:
+            tail = (tail + [line.rstrip()])[-10:]
+            match = DONE_RE.search(line)
+            if match:
+                paper_s = float(match.group(1).replace(",", "."))
+                break
+        timer.cancel()
+        if timed_out.is_set():
+            raise WarmupError(f"server didn't finish starting within {timeout}s")
+        if paper_s is None:
+            raise WarmupError("server exited before finishing its startup:\n  " + "\n  ".join(tail))
+        wall_s = time.monotonic() - start
+
+        stop_start = time.monotonic()
+        timer = watchdog(STOP_TIMEOUT)
+        process.stdin.write("stop\n")
+        process.stdin.flush()
+        # Keep draining the output so the server never blocks on a full pipe
+        for _ in process.stdout:
+            pass
+        process.wait()
+        timer.cancel()
+        if timed_out.is_set():
+            raise WarmupError(f"server didn't stop within {STOP_TIMEOUT}s")
+        return {"wall_s": round(wall_s, 2), "paper_s": paper_s, "stop_s": round(time.monotonic() - stop_start, 2)}
+    finally:
+        timer.cancel()
+        if process.poll() is None:
+            kill()
+            process.wait()
+
+
+def prepare(measure: bool = True, timeout: int = DEFAULT_TIMEOUT, log=print) -> dict:
+    """
+    Warm-up mode: patch, build the archive with a cold boot and time a warm boot.
+
+    Returns:
+        dict: The saved metadata, including the timings.
+
+    Raises:
+        WarmupError: If the server is running, Java is too old or a boot fails.
+    """
+    if server_running():
+        raise WarmupError("the server is running; stop it before the warm-up")
+    if not SERVER_JAR.exists():
+        raise WarmupError(f"{SERVER_JAR} not found")
+    java_version = detect_java_version()
+    java_major = detect_java_major(version=java_version)
+    if java_major is None or java_major < DYNAMIC_CDS_JAVA:
+        raise WarmupError(f"dynamic CDS archives need Java {DYNAMIC_CDS_JAVA}+ (found {java_major})")
+
+    patch_s = patch_server(log)
+    jvm_args = current_jvm_args(java_major=java_major)
+    gc = _gc_of(jvm_args)
+    CDS_DIR.mkdir(parents=True, exist_ok=True)
+    ARCHIVE_FILE.unlink(missing_ok=True)
+
+    log("Cold boot (without archive, writing it at exit)...")
+    cold = timed_boot(jvm_args, [f"-XX:ArchiveClassesAtExit={ARCHIVE_FILE}"], timeout)
+    if not ARCHIVE_FILE.exists():
+        raise WarmupError("the JVM didn't write the archive (see its output for CDS warnings)")
+    log(f"  ready after {cold['wall_s']:.1f}s (Paper: {cold['paper_s']:.1f}s); "
+        f"archive written in {cold['stop_s']:.1f}s ({ARCHIVE_FILE.stat().st_size // (1024 * 1024)} MB)")
+
+    meta = {
+        "fingerprint": fingerprint(java_version, gc), "java": java_version, "gc": gc,
+        "created": datetime.now().isoformat(timespec="seconds"), "source": "warmup",
+        "patch_s": round(patch_s, 2), "cold": cold,
+    }
+    if measure:
+        log("Warm boot (with archive)...")
+        warm = timed_boot(jvm_args, [f"-XX:SharedArchiveFile={ARCHIVE_FILE}"], timeout)
+        meta["warm"] = warm
+        log(f"  ready after {warm['wall_s']:.1f}s (Paper: {warm['paper_s']:.1f}s)")
+    save_meta(meta)
+    print_report(meta, log)
+    return meta
+
+
+def print_report(meta: dict, log=print):
+    cold, warm = meta.get("cold"), meta.get("warm")
+    if not cold:
+        return
+    log(f"Cold start: {cold['wall_s']:.1f}s to 'Done' (Paper reports {cold['paper_s']:.1f}s)")
+    if warm:
+        saved = cold["wall_s"] - warm["wall_s"]
+        percent = saved / cold["wall_s"] * 100 if cold["wall_s"] else 0
+        log(f"Warm start: {warm['wall_s']:.1f}s to 'Done' (Paper reports {warm['paper_s']:.1f}s), "
+            f"{saved:.1f}s ({percent:.0f}%) faster")
+
+# --- Main ---
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Pre-patches Paper and manages the CDS archive for faster starts.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    prepare_parser = sub.add_parser("prepare", help="patch Paper, build the archive and time cold vs warm starts")
+    prepare_parser.add_argument("--no-measure", action="store_true", help="skip the warm boot used for the timings")
+    prepare_parser.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT,
+                                help=f"seconds a boot may take (default: {DEFAULT_TIMEOUT})")
+    cds_parser = sub.add_parser("cds-args", help="print the java arguments for the archive, one per line")
+    cds_parser.add_argument("--gc", choices=("g1", "zgc"), default="g1", help="collector of this start")
+    sub.add_parser("status", help="show whether the archive is valid and the last timings")
+    sub.add_parser("clear", help="delete the archive")
+    args = parser.parse_args()
+
+    if args.command == "prepare":
+        try:
+            prepare(measure=not args.no_measure, timeout=args.timeout)
+        except WarmupError as e:
+            print(f"warmup: {e}", file=sys.stderr)
+            return 1
+    elif args.command == "cds-args":
+        for arg in cds_args(args.gc):
+            print(arg)
+    elif args.command == "status":
+        meta = load_meta()
+        java_version = detect_java_version()
+        gc = meta.get("gc") or _gc_of(current_jvm_args(java_major=detect_java_major(version=java_version)))
+        if archive_is_valid(meta, fingerprint(java_version, gc)):
+            print(f"Archive {ARCHIVE_FILE}: valid, built {meta.get('created')} by {meta.get('source')}")
+        elif ARCHIVE_FILE.exists():
+            print(f"Archive {ARCHIVE_FILE}: stale (paper.jar, plugins or Java changed); recreated on the next start")
+        else:
+            print(f"Archive {ARCHIVE_FILE}: none yet; created when the server next stops")
+        print_report(meta)
+    elif args.command == "clear":
+        ARCHIVE_FILE.unlink(missing_ok=True)
+        META_FILE.unlink(missing_ok=True)
+        print("CDS archive removed.")
+    return 0
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
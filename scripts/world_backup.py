@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+
+"""
+Incremental, chunk-deduplicated backups of the worlds (level-name*).
+
+A backup has two phases:
+
+    1. With saving paused over RCON (save-off, save-all flush), only the
+       region headers are read and the chunks whose save timestamp changed
+       since the previous backup are copied to a staging folder, together
+       with the small non-region files (level.dat, playerdata, ...). Saving
+       is resumed (save-on) right after, usually within seconds.
+    2. With the server saving normally again, a process pool decompresses the
+       staged chunks, hashes their NBT and stores each new one once,
+       LZMA-compressed, under world_backups/objects/<hash[:2]>/<hash>.
+
+Each region file is recorded as a table object (save timestamp and hash of
+each of its 1024 chunks), so an unchanged region costs one line in the
+manifest and an hour of play only stores the chunks that were saved in it.
+Restoring rebuilds the region files of a backup (the server must be stopped),
+after backing up the current state so the restore can be undone.
+
+    world_backup.py snapshot [--label LABEL] [-j N]
+    world_backup.py list
+    world_backup.py restore [BACKUP_ID|latest] [-j N]
+    world_backup.py gc [--keep N]
+"""
+
+import os
+import sys
+import json
+import lzma
+import zlib
+import shutil
+import struct
+import asyncio
+import hashlib
+import argparse
+import tempfile
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from pregen import level_name
+from regions import HEADER_SIZE, REGION_RE, SECTOR, region_coords
+from rcon import RconClient, RconError, read_rcon_settings
+from supervisor import server_running
+
+# --- Configuration ---
+# Root of the backup store
+STORE_DIR = Path(os.environ.get("WORLD_BACKUP_DIR", "world_backups"))
+# Number of backups kept by gc()
+DEFAULT_KEEP = int(os.environ.get("WORLD_BACKUP_KEEP", 48))
+# LZMA preset of the stored objects (higher is smaller but slower on a Pi)
+COMPRESS_PRESET = 3
+# Files never backed up (the server holds them open or rewrites them)
+SKIPPED_NAMES = {"session.lock"}
+# One table row: save timestamp + SHA-256 of the chunk NBT (zeros for an empty slot)
+ROW = struct.Struct(">I32s")
+EMPTY_DIGEST = bytes(32)
+# Region files are rebuilt with zlib, the server's default compression
+RESTORE_COMPRESSION = 2
+# Seconds 'save-all flush' may take (every dirty chunk is written; slow on an SD card)
+FLUSH_TIMEOUT = int(os.environ.get("WORLD_BACKUP_FLUSH_TIMEOUT", 300))
+
+# --- Classes ---
+
+class BackupError(Exception):
+    """Raised when a backup or a restore can't be done safely."""
+
+
+class WorldBackupStore:
+    """
+    Content-addressed store of chunks, region tables and world files plus per-backup manifests.
+
+    Args:
+        store_dir (Path): Root directory of the store.
+        jobs (int): Worker processes used to compress and decompress objects.
+    """
+
+    def __init__(self, store_dir: Path = STORE_DIR, jobs: int | None = None):
+        self.store_dir = Path(store_dir)
+        self.objects_dir = self.store_dir / "objects"
+        self.manifests_dir = self.store_dir / "manifests"
+        self.staging_dir = self.store_dir / "staging"
+        self.jobs = jobs or os.cpu_count()
+
+    def manifests(self) -> list[dict]:
+        """Returns every manifest, oldest first."""
+        result = []
+        for manifest_path in sorted(self.manifests_dir.glob("*.json")):
+            try:
+                result.append(json.loads(manifest_path.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue
+        return result
+
+    def get_manifest(self, backup_id: str) -> dict | None:
+        """Returns a manifest by id, or the newest one for 'latest'."""
+        manifests = self.manifests()
+        if backup_id == "latest":
+            return manifests[-1] if manifests else None
+        return next((m for m in manifests if m["id"] == backup_id), None)
+
+    def load_table(self, digest: str) -> list[tuple[int, bytes]]:
+        data = get_object(self.objects_dir, digest)
+        return [ROW.unpack_from(data, i * ROW.size) for i in range(1024)]
+
+    def _stage(self, worlds: list[Path], staging: Path, previous: dict) -> tuple[dict, list]:
+        """
+        Phase 1 (saving paused): copies changed chunks and small files to the staging folder.
+
+        Returns:
+            tuple[dict, list]: {region: (timestamps, previous table, staged chunk indices,
+                               previous table digest)}, and the staged non-region files.
+        """
+        regions, files = {}, []
+        for world in worlds:
+            for path in sorted(world.rglob("*")):
+                if not path.is_file() or path.name in SKIPPED_NAMES or path.suffix in (".mcc", ".tmp"):
+                    continue
+                rel = path.as_posix()
+                if path.suffix == ".mca" and REGION_RE.search(path.name):
+                    old_digest = previous.get("regions", {}).get(rel)
+                    old_table = self.load_table(old_digest) if old_digest else None
+                    regions[rel] = _stage_region(path, staging / "regions" / rel, old_table) + (old_digest,)
+                else:
+                    target = staging / "files" / rel
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copyfile(path, target)
+                    files.append(rel)
+        return regions, files
+
+    def snapshot(self, label: str = "manual", worlds: list[Path] | None = None, log=print) -> dict:
+        """
+        Backs up the worlds, pausing the server's saves only while changed chunks are copied.
+
+        Args:
+            label (str): Short description stored in the manifest (e.g. "hourly").
+            worlds (list[Path] | None): World folders (default: level-name*).
+            log (callable): Where progress messages are written (defaults to print).
+
+        Returns:
+            dict: The new manifest, or the previous one if nothing changed since.
+        """
+        worlds = worlds or default_worlds()
+        if not worlds:
+            raise BackupError("no world folders found")
+        previous = self.get_manifest("latest") or {}
+        backup_id = datetime.now().strftime("%Y-%m-%d_%H%M%S")
+        suffix = 1
+        while (self.manifests_dir / f"{backup_id}.json").exists():
+            suffix += 1
+            backup_id = f"{datetime.now().strftime('%Y-%m-%d_%H%M%S')}_{suffix}"
+        staging = self.staging_dir / backup_id
+        shutil.rmtree(staging, ignore_errors=True)
+
+        started = datetime.now()
+        try:
+            regions, files = asyncio.run(_with_saving_paused(lambda: self._stage(worlds, staging, previous), log))
+            log(f"Saving resumed after {(datetime.now() - started).total_seconds():.1f}s; compressing in the background...")
+            self.objects_dir.mkdir(parents=True, exist_ok=True)
+            staged = [(rel, str(staging / "regions" / rel)) for rel, entry in regions.items() if entry[2]]
+            with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+                packed = dict(zip((rel for rel, _ in staged),
+                                  pool.map(_pack_region, [p for _, p in staged], [self.objects_dir] * len(staged))))
+                file_results = list(pool.map(_pack_file, [staging / "files" / rel for rel in files],
+                                             [self.objects_dir] * len(files)))
+
+            added = sum(size for _, size in file_results)
+            region_digests, changed = {}, 0
+            for rel, (timestamps, old_table, staged_indices, old_digest) in regions.items():
+                if not staged_indices and old_table and all(
+                        (timestamp != 0) == (row[1] != EMPTY_DIGEST) for timestamp, row in zip(timestamps, old_table)):
+                    region_digests[rel] = old_digest
+                    continue
+                new_chunks, size = packed.get(rel, ({}, 0))
+                added += size
+                changed += len(new_chunks)
+                rows = []
+                for index, timestamp in enumerate(timestamps):
+                    if index in new_chunks:
+                        rows.append(ROW.pack(timestamp, new_chunks[index]))
+                    elif timestamp and old_table:
+                        rows.append(ROW.pack(timestamp, old_table[index][1]))
+                    else:
+                        rows.append(ROW.pack(0, EMPTY_DIGEST))
+                table = b"".join(rows)
+                digest = hashlib.sha256(table).hexdigest()
+                added += put_object(self.objects_dir, digest, table)
+                region_digests[rel] = digest
+
+            file_digests = {rel: digest for rel, (digest, _) in zip(files, file_results)}
+            if previous and previous["regions"] == region_digests and previous["files"] == file_digests:
+                log(f"Worlds unchanged since backup '{previous['id']}'; no new backup needed.")
+                return previous
+            manifest = {
+                "id": backup_id, "label": label, "created": started.isoformat(timespec="seconds"),
+                "worlds": [w.as_posix() for w in worlds],
+                "regions": region_digests,
+                "files": file_digests,
+                "changed_chunks": changed, "added_bytes": added,
+            }
+            _write_json_atomic(self.manifests_dir / f"{backup_id}.json", manifest)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        log(f"Backup '{backup_id}' ({label}): {len(region_digests)} region files, {changed} changed chunks, "
+            f"{len(files)} other files, {added / (1024 * 1024):.1f} MB added to the store.")
+        return manifest
+
+    def restore(self, backup_id: str = "latest", log=print) -> dict:
+        """
+        Rebuilds the worlds of a backup in place. The server must be stopped.
+
+        The current state is backed up first, so a restore can be undone.
+
+        Raises:
+            BackupError: If the server is running or the backup doesn't exist.
+        """
+        if server_running():
+            raise BackupError("the server is running; stop it before restoring")
+        manifest = self.get_manifest(backup_id)
+        if manifest is None:
+            raise BackupError(f"backup '{backup_id}' not found")
+        worlds = [Path(w) for w in manifest["worlds"]]
+        if any(w.exists() for w in worlds):
+            self.snapshot(label=f"pre-restore to {manifest['id']}", worlds=[w for w in worlds if w.exists()], log=log)
+
+        building = {world: world.with_name(f".{world.name}.restore") for world in worlds}
+        for target in building.values():
+            shutil.rmtree(target, ignore_errors=True)
+
+        def destination(rel: str) -> Path:
+            world = Path(rel.split("/", 1)[0])
+            return building[world] / rel.split("/", 1)[1]
+
+        rels = list(manifest["regions"])
+        with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+            list(pool.map(_restore_region, [manifest["regions"][rel] for rel in rels],
+                          [destination(rel) for rel in rels], [self.objects_dir] * len(rels)))
+            list(pool.map(_restore_file, list(manifest["files"].values()),
+                          [destination(rel) for rel in manifest["files"]], [self.objects_dir] * len(manifest["files"])))
+
+        for world, target in building.items():
+            target.mkdir(parents=True, exist_ok=True)
+            old = world.with_name(f".{world.name}.old")
+            shutil.rmtree(old, ignore_errors=True)
+            if world.exists():
+                os.replace(world, old)
+            os.replace(target, world)
+            shutil.rmtree(old, ignore_errors=True)
+            log(f"  Restored {world}")
+        log(f"Worlds restored to backup '{manifest['id']}' ({manifest['created']}).")
+        return manifest
+
+    def gc(self, keep: int = DEFAULT_KEEP, log=print) -> tuple[int, int]:
+        """
+        Removes all but the newest 'keep' backups and the objects only they referenced.
+
+        Returns:
+            tuple[int, int]: (backups removed, objects removed).
+        """
+        manifests = self.manifests()
+        expired = manifests[:-keep] if keep > 0 else manifests
+        for manifest in expired:
+            (self.manifests_dir / f"{manifest['id']}.json").unlink(missing_ok=True)
+
+        referenced = set()
+        for manifest in manifests[len(expired):]:
+            referenced.update(manifest["files"].values())
+            for digest in set(manifest["regions"].values()) - referenced:
+                referenced.add(digest)
+                referenced.update(row[1].hex() for row in self.load_table(digest) if row[1] != EMPTY_DIGEST)
+        removed_objects = 0
+        for object_path in self.objects_dir.glob("*/*"):
+            if object_path.name not in referenced:
+                object_path.unlink()
+                removed_objects += 1
+        if expired or removed_objects:
+            log(f"Backup GC: removed {len(expired)} old backups and {removed_objects} unreferenced objects.")
+        return len(expired), removed_objects
+
+# --- Functions ---
+
+def _write_json_atomic(path: Path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def default_worlds() -> list[Path]:
+    return sorted(p for p in Path(".").glob(f"{level_name()}*") if p.is_dir() and (p / "level.dat").exists())
+
+
+def object_path(objects_dir: Path, digest: str) -> Path:
+    return Path(objects_dir) / digest[:2] / digest
+
+
+def put_object(objects_dir: Path, digest: str, data: bytes) -> int:
+    """Stores data compressed unless already present. Returns the bytes added to the store."""
+    target = object_path(objects_dir, digest)
+    if target.exists():
+        return 0
+    target.parent.mkdir(parents=True, exist_ok=True)
+    packed = lzma.compress(data, preset=COMPRESS_PRESET)
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(packed)
+    os.replace(tmp_path, target)
+    return len(packed)
+
+
+def get_object(objects_dir: Path, digest: str) -> bytes:
+    try:
+        return lzma.decompress(object_path(objects_dir, digest).read_bytes())
+    except (OSError, lzma.LZMAError) as e:
+        raise BackupError(f"object {digest[:12]} is missing or corrupt: {e}")
+
+
+async def _with_saving_paused(stage, log):
+    """Runs stage() with the world saves paused over RCON (directly if the server is stopped)."""
+    if not server_running():
+        return stage()
+    settings = read_rcon_settings()
+    client = RconClient(*settings)
+    try:
+        # Inside the try: a 'save-off' that timed out may still have been applied
+        await client.command("save-off")
+        log("Saves paused; flushing the world to disk...")
+        await client.command("save-all flush", timeout=FLUSH_TIMEOUT)
+        result = stage()
+    except RconError as e:
+        raise BackupError(f"RCON failed while pausing saves for the backup: {e}")
+    finally:
+        await client.close()
+        resumed = await _resume_saving(settings, log)
+    if not resumed:
+        raise BackupError("the backup was staged, but saving is still off: run 'save-on' on the console")
+    return result
+
+
+async def _resume_saving(settings: tuple, log, attempts: int = 3) -> bool:
+    """Sends 'save-on' on a fresh connection, retrying; returns whether it got through."""
+    for attempt in range(1, attempts + 1):
+        client = RconClient(*settings)
+        try:
+            await client.command("save-on")
+            return True
+        except RconError as e:
+            log(f"Couldn't resume saving ({attempt}/{attempts}): {e}")
+        finally:
+            await client.close()
+        if attempt < attempts:
+            await asyncio.sleep(2 * attempt)
+    log("WARNING: saving is still off on the server; run 'save-on' on the console now.")
+    return False
+
+
+def _stage_region(path: Path, target: Path, old_table: list | None) -> tuple[list, list | None, list]:
+    """
+    Copies the chunks saved since the previous backup into a staging file.
+
+    The staging file is a list of (index, compression, payload) records;
+    external (.mcc) chunks are inlined.
+
+    Returns:
+        tuple: (save timestamps of the 1024 slots, previous table, indices staged).
+    """
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE:
+            return [0] * 1024, old_table, []
+        locations = struct.unpack_from(">1024I", header, 0)
+        timestamps = [timestamp if location else 0
+                      for location, timestamp in zip(locations, struct.unpack_from(">1024I", header, SECTOR))]
+        changed = [i for i, location in enumerate(locations) if location and (
+            old_table is None or old_table[i][0] != timestamps[i] or old_table[i][1] == EMPTY_DIGEST)]
+        if not changed:
+            return timestamps, old_table, []
+        rx, rz = region_coords(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        staged = []
+        with open(target, "wb") as out:
+            for index in changed:
+                f.seek((locations[index] >> 8) * SECTOR)
+                length, compression = struct.unpack(">IB", f.read(5))
+                if compression & 0x80:
+                    mcc = path.with_name(f"c.{rx * 32 + index % 32}.{rz * 32 + index // 32}.mcc")
+                    payload, compression = mcc.read_bytes(), compression & 0x7F
+                else:
+                    payload = f.read(length - 1)
+                    if len(payload) != length - 1:
+                        # Truncated record: leave the chunk out rather than store garbage
+                        timestamps[index] = 0
+                        continue
+                out.write(struct.pack(">HBI", index, compression, len(payload)) + payload)
+                staged.append(index)
+    return timestamps, old_table, staged
+
+
+def _decompress_chunk(compression: int, payload: bytes) -> bytes:
+    if compression == 1:
+        return zlib.decompress(payload, 16 + zlib.MAX_WBITS)
+    if compression == 2:
+        return zlib.decompress(payload)
+    if compression == 3:
+        return payload
+    raise BackupError(f"unsupported chunk compression {compression} (use region-file-compression=deflate)")
+
+
+def _pack_region(staged_path: str, objects_dir: Path) -> tuple[dict, int]:
+    """Worker: hashes and stores the staged chunks of one region. Returns ({index: digest}, bytes added)."""
+    digests, added = {}, 0
+    with open(staged_path, "rb") as f:
+        while (head := f.read(7)):
+            index, compression, size = struct.unpack(">HBI", head)
+            raw = _decompress_chunk(compression, f.read(size))
+            digest = hashlib.sha256(raw).digest()
+            added += put_object(objects_dir, digest.hex(), raw)
+            digests[index] = digest
+    return digests, added
+
+
+def _pack_file(path: Path, objects_dir: Path) -> tuple[str, int]:
+    """Worker: stores one non-region file. Returns (digest, bytes added)."""
+    data = path.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    return digest, put_object(objects_dir, digest, data)
+
+
+def _restore_region(table_digest: str, dest: Path, objects_dir: Path):
+    """Worker: rebuilds one region file (and its .mcc files) from its table."""
+    data = get_object(objects_dir, table_digest)
+    rows = [ROW.unpack_from(data, i * ROW.size) for i in range(1024)]
+    rx, rz = region_coords(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    locations, timestamps = [0] * 1024, [0] * 1024
+    with open(dest, "wb") as out:
+        out.write(bytes(HEADER_SIZE))
+        sector = 2
+        for index, (timestamp, digest) in enumerate(rows):
+            if digest == EMPTY_DIGEST:
+                continue
+            payload = zlib.compress(get_object(objects_dir, digest.hex()))
+            record = struct.pack(">IB", len(payload) + 1, RESTORE_COMPRESSION) + payload
+            count = -(-len(record) // SECTOR)
+            if count > 255:
+                dest.with_name(f"c.{rx * 32 + index % 32}.{rz * 32 + index // 32}.mcc").write_bytes(payload)
+                record, count = struct.pack(">IB", 1, RESTORE_COMPRESSION | 0x80), 1
+            out.write(record.ljust(count * SECTOR, b"\0"))
+            locations[index], timestamps[index] = (sector << 8) | count, timestamp
+            sector += count
+        out.seek(0)
+        out.write(struct.pack(">1024I", *locations) + struct.pack(">1024I", *timestamps))
+
+
+def _restore_file(digest: str, dest: Path, objects_dir: Path):
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    dest.write_bytes(get_object(objects_dir, digest))
+
+# --- Main ---
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Incremental, chunk-deduplicated backups of the worlds.")
+    parser.add_argument("--store", type=Path, default=STORE_DIR, help=f"backup store (default: {STORE_DIR})")
+    parser.add_argument("-j", "--jobs", type=int, help="worker processes (default: one per CPU)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    snapshot_parser = sub.add_parser("snapshot", help="back up the worlds")
+    snapshot_parser.add_argument("--label", default="manual")
+    sub.add_parser("list", help="list the backups")
+    restore_parser = sub.add_parser("restore", help="restore the worlds of a backup (server stopped)")
+    restore_parser.add_argument("backup_id", nargs="?", default="latest")
+    gc_parser = sub.add_parser("gc", help="delete old backups and unreferenced objects")
+    gc_parser.add_argument("--keep", type=int, default=DEFAULT_KEEP, help=f"backups to keep (default: {DEFAULT_KEEP})")
+    args = parser.parse_args()
+
+    store = WorldBackupStore(args.store, args.jobs)
+    try:
+        if args.command == "snapshot":
+            store.snapshot(args.label)
+        elif args.command == "list":
+            for manifest in store.manifests():
+                print(f"{manifest['id']:<20} {manifest['changed_chunks']:>7} chunks changed  "
+                      f"{manifest['added_bytes'] / (1024 * 1024):>8.1f} MB added  {manifest['label']}")
+        elif args.command == "restore":
+            store.restore(args.backup_id)
+        elif args.command == "gc":
+            store.gc(args.keep)
+    except BackupError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+# --- Main Guard ---
+if __name__ == "__main__":
+    sys.exit(main())
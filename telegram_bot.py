@@ -1,49 +1,270 @@
 from telegram import Update
 from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes
-import subprocess
+from telegram.error import TelegramError
+from pathlib import Path
+import asyncio
+import functools
+import os
+import sys
+
+SERVER_DIR = Path(__file__).resolve().parent
+# Los módulos compartidos con los scripts de mantenimiento viven en scripts/
+sys.path.insert(0, str(SERVER_DIR / "scripts"))
+from plugin_index import PluginIndex
+from rcon import RconClient, RconError, CoalescingCache, read_rcon_settings, server_status
+from supervisor import SupervisorError, async_request
+from server_ping import async_health
+from log_watch import watch
+from metrics import Collector, MetricsStore, parse_span, render_graph, SPANS
+from exporter import Exporter, EXPORTER_HOST, EXPORTER_PORT
+from pregen import Pregen, PregenError, describe, load_state
+from bluemap_scheduler import RenderScheduler, load_state as load_render_state
+from spark_profiler import SpikeProfiler, format_summary, latest_summary
+from startup_profile import describe as describe_startup, load_state as load_startups, watch as watch_startups
 
 GROUP_CHAT_ID = <YOUR_GROUP_CHAT_ID>
 BOT_TOKEN = "<YOUR_BOT_TOKEN>"
-START_COMMAND = 'screen -S minecraft -d -m bash -c "java -Xmx2048M -jar paper-1.21.1-128.jar nogui | tee server_log.log"'
+# El mismo lanzador que usa el menú (heap, GC y páginas grandes según el perfil)
+START_COMMAND = [str(SERVER_DIR / "scripts" / "start.sh"), "--no-attach"]
+SERVER_PROPERTIES = SERVER_DIR / "server.properties"
+
+# Conexión RCON persistente, compartida por todos los comandos del bot
+rcon_client = None
+
+
+async def get_rcon() -> RconClient:
+    """Devuelve la conexión RCON, recreándola si cambió el puerto o la contraseña."""
+    global rcon_client
+    host, port, password = read_rcon_settings(SERVER_PROPERTIES)
+    if rcon_client is None or (rcon_client.host, rcon_client.port, rcon_client.password) != (host, port, password):
+        if rcon_client is not None:
+            await rcon_client.close()
+        rcon_client = RconClient(host, port, password)
+    return rcon_client
+
+
+async def fetch_status():
+    return await server_status(await get_rcon())
+
+# Varios /status seguidos en el grupo comparten una única consulta cada pocos segundos
+status_cache = CoalescingCache(fetch_status)
+
+async def rcon_command(command: str) -> str:
+    return await (await get_rcon()).command(command)
+
+# Historial de TPS/MSPT/jugadores/heap/CPU para /graph (se crea al arrancar el bot)
+collector = None
+# Pregeneración de chunks con Chunky mientras no hay nadie jugando
+pregenerator = None
 
 
 async def start_server(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message.chat_id == GROUP_CHAT_ID:
-        check_command = "screen -list | grep -q 'minecraft'"
-        check_result = subprocess.run(check_command, shell=True)
-
-        if check_result.returncode == 0:
+        if (await async_health())["state"] != "stopped":
             await update.message.reply_text("⚠️ El servidor ya está ejecutado.")
         else:
-            subprocess.Popen(START_COMMAND, shell=True)
-            await update.message.reply_text("🟢 Servidor de Minecraft iniciado!")
+            process = await asyncio.create_subprocess_exec(
+                *START_COMMAND, cwd=SERVER_DIR,
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+            )
+            if await process.wait() == 0:
+                await update.message.reply_text("🟢 Servidor de Minecraft iniciado!")
+            else:
+                await update.message.reply_text("❌ No se pudo iniciar el servidor. Revisa start.sh en la consola.")
             
 async def stop_server(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message.chat_id == GROUP_CHAT_ID:
-        subprocess.run("screen -S minecraft -p 0 -X stuff 'stop\\n'", shell=True, check=True)
+        try:
+            # Escribe "stop" en la consola y espera a que Java termine (TERM/KILL si no)
+            await async_request("stop")
+        except SupervisorError:
+            # Servidor arrancado fuera del supervisor: se detiene por RCON
+            try:
+                rcon = await get_rcon()
+                await rcon.connect()
+            except RconError:
+                await update.message.reply_text("⚠️ El servidor no está en ejecución.")
+                return
+            try:
+                await rcon.command("stop")
+            except RconError:
+                pass  # el servidor puede cerrar la conexión antes de contestar
         await update.message.reply_text("🔴 Servidor de Minecraft detenido.")
 
 async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    check_command = "screen -list | grep -q 'minecraft'"
-    check_result = subprocess.run(check_command, shell=True)
-
-    if check_result.returncode == 0:
-        await update.message.reply_text("🟢 El servidor de Minecraft está actualmente en ejecución.")
-    else:
+    # Supervisor + ping al puerto del juego: distingue "arrancando" de "atascado"
+    health = await async_health()
+    state = health["supervisor"] or {}
+    if health["state"] == "stopped":
         await update.message.reply_text("🔴 El servidor de Minecraft está actualmente detenido.")
+        return
+    if health["state"] == "stopping":
+        await update.message.reply_text("🟠 El servidor de Minecraft se está deteniendo.")
+        return
+    if state.get("state") == "backoff":
+        await update.message.reply_text(
+            f"🟠 El servidor se ha caído ({state['last_reason']}). Se reiniciará en {state['restart_in']}s."
+        )
+        return
+    if health["state"] == "starting":
+        await update.message.reply_text("🟡 El servidor de Minecraft está arrancando.")
+        return
+    if health["state"] == "unresponsive":
+        await update.message.reply_text(
+            "🟠 El proceso del servidor está en marcha, pero no acepta conexiones (¿atascado al arrancar?)."
+        )
+        return
+
+    try:
+        info = await status_cache.get()
+    except RconError:
+        await update.message.reply_text("🟢 El servidor de Minecraft está en ejecución (RCON no responde).")
+        return
+
+    tps = " / ".join(f"{value:.1f}" for value in info["tps"]) or "?"
+    mspt = f"{info['mspt']['avg']:.1f} ms (máx. {info['mspt']['max']:.1f})" if info["mspt"] else "?"
+    players = info["players"]
+    online = f"{players['online']}/{players['max']}" if players["online"] is not None else "?"
+    if players["names"]:
+        online += " — " + ", ".join(players["names"])
+    chunks = info["chunks"] if info["chunks"] is not None else "?"
+    entities = info["entities"] if info["entities"] is not None else "?"
+    render = load_render_state()
+    modes = {"full": "renderizando", "low": "a baja prioridad", "paused": "en pausa"}
+    bluemap = modes.get(render.get("mode"), "?")
+    if render.get("seconds"):
+        bluemap += f" (limitado {(render['seconds']['low'] + render['seconds']['paused']) / 3600:.1f} h en total)"
+    await update.message.reply_text(
+        "🟢 El servidor de Minecraft está actualmente en ejecución.\n"
+        f"⏱️ TPS (1m/5m/15m): {tps}\n"
+        f"⚙️ MSPT (5s): {mspt}\n"
+        f"👥 Jugadores: {online}\n"
+        f"🧱 Chunks cargados: {chunks}\n"
+        f"🐄 Entidades: {entities}\n"
+        f"🗺️ BlueMap: {bluemap}\n"
+        f"📶 Latencia: {health['latency_ms']:.0f} ms"
+    )
+
+async def plugins(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # El índice solo reabre los JAR que cambiaron desde la última consulta
+    entries = await asyncio.to_thread(PluginIndex().refresh)
+    if not entries:
+        await update.message.reply_text("📦 No hay plugins instalados.")
+        return
+    lines = [f"• {entry['name'] or Path(entry['path']).name} {entry['version'] or '?'}" for entry in entries]
+    await update.message.reply_text("📦 Plugins instalados:\n" + "\n".join(lines))
+
+async def graph(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        label, span = parse_span(context.args[0] if context.args else None)
+    except ValueError:
+        await update.message.reply_text(f"Uso: /graph [{'|'.join(SPANS)}]")
+        return
+    # Incluye las muestras que aún están en memoria
+    await collector.flush()
+    rows = await asyncio.to_thread(collector.store.series, span)
+    if not rows:
+        await update.message.reply_text(f"📈 Aún no hay datos de las últimas {label}.")
+        return
+    try:
+        image = await asyncio.to_thread(render_graph, rows, label)
+    except ImportError:
+        await update.message.reply_text("📈 Para dibujar gráficas hace falta matplotlib: pip install matplotlib")
+        return
+    await update.message.reply_photo(photo=image, caption=f"📈 Rendimiento del servidor ({label})")
+
+async def pregen(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    action = context.args[0].lower() if context.args else "status"
+    if action == "status":
+        await update.message.reply_text(describe(load_state()))
+        return
+    if update.message.chat_id != GROUP_CHAT_ID:
+        return
+    try:
+        if action == "start":
+            radius = int(context.args[1]) if len(context.args) > 1 else None
+            state = await pregenerator.start(radius)
+        elif action == "stop":
+            state = await pregenerator.stop()
+        elif action == "cancel":
+            state = await pregenerator.cancel()
+        else:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text("Uso: /pregen [status|start [radio]|stop|cancel]")
+        return
+    except (PregenError, RconError) as e:
+        await update.message.reply_text(f"❌ No se pudo cambiar la pregeneración: {e}")
+        return
+    await update.message.reply_text(describe(state))
+
+async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    summary = latest_summary()
+    if summary is None:
+        await update.message.reply_text("🔬 Aún no se ha grabado ningún perfil de spark.")
+        return
+    await update.message.reply_text(format_summary(summary))
+
+async def startup(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    boots = load_startups()["boots"]
+    if not boots:
+        await update.message.reply_text("🚀 Aún no se ha registrado ningún arranque.")
+        return
+    await update.message.reply_text(describe_startup(boots[-1]))
+
+async def send_to_group(application, text: str, what: str = "el aviso"):
+    """Envía un aviso de una tarea en segundo plano al grupo; si Telegram falla, solo lo registra."""
+    try:
+        await application.bot.send_message(chat_id=GROUP_CHAT_ID, text=text)
+    except TelegramError as e:
+        print(f"No se pudo enviar {what}: {e}")
+
+async def start_background_tasks(application):
+    """Arranca el historial de rendimiento, las métricas de Prometheus, el aviso de lag,
+    la pregeneración, el control de BlueMap, el perfilado de picos de MSPT y el
+    seguimiento de los tiempos de arranque."""
+    # /metrics se sirve desde una caché, así que un scrape nunca lanza comandos RCON
+    exporter = Exporter(status_cache.get)
+    application.create_task(exporter.serve(EXPORTER_HOST, EXPORTER_PORT))
+    global collector
+    # El heap sale del jcmd que ya lanza el exportador (cada jcmd arranca una JVM)
+    collector = Collector(MetricsStore(), status_cache.get, fetch_heap=exporter.heap_used_mb)
+    application.create_task(collector.run())
+
+    send_lag = functools.partial(send_to_group, application, what="el aviso de lag")
+    application.create_task(watch(lambda alert: send_lag(alert.text)))
+
+    global pregenerator
+    pregenerator = Pregen(rcon_command, status_cache.get,
+                          functools.partial(send_to_group, application, what="el aviso de pregeneración"))
+    application.create_task(pregenerator.run())
+    # BlueMap renderiza a baja prioridad o se pausa mientras hay jugadores o lag
+    application.create_task(RenderScheduler(rcon_command, status_cache.get).run())
+    application.create_task(SpikeProfiler(
+        rcon_command, functools.partial(send_to_group, application, what="el perfil de spark")).watch())
+    # Cada arranque se guarda con sus tiempos por plugin; avisa si una actualización lo ralentizó
+    application.create_task(watch_startups(
+        functools.partial(send_to_group, application, what="el aviso de arranque lento")))
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     help_text = (
         "📜 *Comandos Disponibles*:\n\n"
         "/start o /iniciar - Inicia el servidor de Minecraft.\n"
         "/stop o /detener - Detiene el servidor de Minecraft.\n"
-        "/status o /estado - Muestra el estado del servidor.\n"
+        "/status o /estado - Muestra el estado del servidor (TPS, MSPT, jugadores y chunks).\n"
+        "/graph [1h|24h|7d] - Gráfica de TPS, MSPT, jugadores, heap y CPU.\n"
+        "/pregen [start [radio]|stop|cancel] - Progreso y control de la pregeneración de chunks.\n"
+        "/perfil - Resumen del último perfil de spark grabado durante un pico de lag.\n"
+        "/arranque - Tiempo del último arranque por fase y plugins más lentos.\n"
+        "/plugins - Muestra los plugins instalados y sus versiones.\n"
         "/help o /ayuda - Muestra esta ayuda."
     )
     await update.message.reply_text(help_text, parse_mode='Markdown')
 
 if __name__ == "__main__":
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    # Los módulos de scripts/ usan rutas relativas a la carpeta del servidor
+    os.chdir(SERVER_DIR)
+    app = ApplicationBuilder().token(BOT_TOKEN).post_init(start_background_tasks).build()
     app.add_handler(CommandHandler("start", start_server))
     app.add_handler(CommandHandler("iniciar", start_server))
     app.add_handler(CommandHandler("stop", stop_server))
@@ -52,4 +273,12 @@ if __name__ == "__main__":
     app.add_handler(CommandHandler("ayuda", help_command))
     app.add_handler(CommandHandler("status", status))
     app.add_handler(CommandHandler("estado", status))
+    app.add_handler(CommandHandler("plugins", plugins))
+    app.add_handler(CommandHandler("graph", graph))
+    app.add_handler(CommandHandler("grafica", graph))
+    app.add_handler(CommandHandler("pregen", pregen))
+    app.add_handler(CommandHandler("perfil", profile))
+    app.add_handler(CommandHandler("profile", profile))
+    app.add_handler(CommandHandler("arranque", startup))
+    app.add_handler(CommandHandler("startup", startup))
     app.run_polling()